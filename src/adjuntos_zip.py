@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+XML dentro de adjuntos .zip.
+
+Muchos proveedores envían la factura y la respuesta de Hacienda dentro de
+un .zip. ``xml_en_zip`` abre el adjunto en memoria (o, con el lector
+nativo, directamente sobre sus bloques del PST con
+``ContenidoAdjunto.abrir``): ``zipfile`` lee solo el directorio central
+del final del archivo y descomprime por partes únicamente los miembros
+``.xml``. Los .zip sin XML se descartan sin leer nada más y nunca se
+escribe el archivo comprimido en disco.
+
+Los límites se comprueban con los tamaños del directorio central antes de
+descomprimir, y se vuelven a comprobar al leer (el directorio puede
+mentir): un miembro que supere ``MAX_XML_SIZE_MB`` se omite.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import io
+import re
+import zipfile
+
+from config import MAX_XML_SIZE_MB, ZIP_MAX_MEMBERS, ZIP_READ_CHUNK_KB
+
+ZIP_PATTERN = re.compile(r".+\.zip$", re.IGNORECASE)
+XML_PATTERN_MIEMBRO = re.compile(r".+\.xml$", re.IGNORECASE)
+
+
+def nombre_miembro(ruta):
+    """Nombre de archivo de un miembro, sin sus directorios (evita rutas como ../../x.xml)."""
+    return ruta.replace("\\", "/").rsplit("/", 1)[-1]
+
+
+def _abrir(origen):
+    """Archivo con seek sobre el adjunto: bytes en memoria o contenido que sigue en el PST."""
+    if hasattr(origen, "abrir"):
+        return origen.abrir()
+    return io.BytesIO(origen)
+
+
+def _leer_miembro(archivo_zip, info, limite):
+    """Descomprimir un miembro por partes, cortando si supera ``limite`` bytes."""
+    partes = []
+    leidos = 0
+    with archivo_zip.open(info) as miembro:
+        while True:
+            parte = miembro.read(ZIP_READ_CHUNK_KB * 1024)
+            if not parte:
+                break
+            leidos += len(parte)
+            if leidos > limite:
+                return None
+            partes.append(parte)
+    return b"".join(partes)
+
+
+def _seleccionar_xml(nombre, _tamano):
+    return "" if XML_PATTERN_MIEMBRO.match(nombre) else None
+
+
+def xml_en_zip(origen, seleccionar=None, max_xml_mb=MAX_XML_SIZE_MB, max_miembros=ZIP_MAX_MEMBERS):
+    """
+    Extraer en memoria los XML de un adjunto .zip.
+
+    Args:
+        origen: bytes del adjunto u objeto con ``abrir()`` (``ContenidoAdjunto``)
+        seleccionar: ``f(nombre, tamano)`` -> etiqueta de los miembros a extraer o None
+            (por defecto, los ``.xml`` con etiqueta ""); se llama antes de descomprimir
+        max_xml_mb (int): Tamaño máximo descomprimido de cada XML
+        max_miembros (int): Entradas máximas del directorio central
+
+    Returns:
+        tuple: (lista de (nombre, datos, etiqueta) de los XML, lista de (nombre, motivo) omitidos)
+
+    Raises:
+        zipfile.BadZipFile: Si el adjunto no es un zip válido
+    """
+    limite = max_xml_mb * 1024 * 1024
+    seleccionar = seleccionar or _seleccionar_xml
+    xml, omitidos = [], []
+    with _abrir(origen) as archivo, zipfile.ZipFile(archivo) as archivo_zip:
+        miembros = archivo_zip.infolist()
+        if len(miembros) > max_miembros:
+            raise zipfile.BadZipFile(f"{len(miembros):,} entradas (máximo {max_miembros:,})")
+        for info in miembros:
+            nombre = nombre_miembro(info.filename)
+            # Directorios, metadatos de macOS (__MACOSX/._x.xml) y todo lo que no se pide
+            if info.is_dir() or "__MACOSX/" in info.filename:
+                continue
+            etiqueta = seleccionar(nombre, info.file_size)
+            if etiqueta is None:
+                continue
+            if info.flag_bits & 0x1:
+                omitidos.append((nombre, "cifrado con contraseña"))
+                continue
+            if info.file_size > limite:
+                omitidos.append((nombre, f"supera {max_xml_mb} MB"))
+                continue
+            try:
+                datos = _leer_miembro(archivo_zip, info, limite)
+            except (zipfile.BadZipFile, NotImplementedError, EOFError, OSError) as e:
+                # CRC incorrecto, método de compresión no soportado o datos truncados
+                omitidos.append((nombre, str(e) or type(e).__name__))
+                continue
+            if datos is None:
+                omitidos.append((nombre, f"supera {max_xml_mb} MB al descomprimir"))
+            elif datos:
+                xml.append((nombre, datos, etiqueta))
+    return xml, omitidos
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+"""
+Almacenamiento comprimido de los XML extraídos.
+
+Los comprobantes electrónicos se comprimen 8-10 veces. Con ``--compress``
+el extractor guarda cada XML como ``FE-123.xml.gz`` (gzip) o
+``FE-123.xml.zst`` (zstd) y todas las herramientas posteriores los leen
+de forma transparente con ``abrir_xml``, que descomprime en streaming:
+quien solo necesita el tag raíz o la Clave lee unos pocos KB.
+
+Para archivos tan pequeños zstd rinde mucho más con un diccionario
+entrenado sobre el propio corpus. Se entrena con
+``python almacen_comprimido.py --dir salida --train-dict`` y se guarda en
+``xml_facturacion/.diccionario.zstd``, que es el que usa el extractor al
+comprimir. Cada versión se conserva además como
+``.diccionario-<dict_id>.zstd`` (y una copia en ``ZSTD_DICT_STORE_DIR``):
+al leer, el dict_id de la cabecera de cada .zst indica qué versión hace
+falta, así que ni reentrenar ni mover los archivos a otra carpeta los deja
+ilegibles.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import argparse
+import gzip
+import importlib.util
+import os
+import random
+import threading
+from pathlib import Path
+
+from config import (
+    GZIP_COMPRESSION_LEVEL,
+    ZSTD_COMPRESSION_LEVEL,
+    ZSTD_DICT_MAX_SAMPLES,
+    ZSTD_DICT_SIZE_KB,
+    ZSTD_DICT_STORE_DIR,
+)
+from limitador_io import limitar
+
+# zstandard se importa al leer o escribir el primer .zst: los comandos que no lo usan no lo cargan
+ZSTD_AVAILABLE = importlib.util.find_spec("zstandard") is not None
+
+FORMATOS_COMPRESION = ("ninguna", "gzip", "zstd")
+EXTENSIONES = {"gzip": ".gz", "zstd": ".zst"}
+NIVELES_COMPRESION = {"gzip": (0, 9), "zstd": (1, 22)}  # Rango admitido por formato
+ARCHIVO_DICCIONARIO = ".diccionario.zstd"
+
+_diccionarios = {}  # directorio -> ZstdCompressionDict (o None si no hay)
+_diccionarios_por_id = {}  # dict_id -> ZstdCompressionDict
+_lock_diccionarios = threading.Lock()
+
+
+def _zstd():
+    """Módulo zstandard (importado la primera vez que hace falta)."""
+    import zstandard
+    return zstandard
+
+
+def validar_nivel_compresion(formato, nivel):
+    """
+    Comprobar el nivel de compresión de un formato.
+
+    Returns:
+        int: El nivel como entero, o None si no se indicó (o no hay compresión)
+
+    Raises:
+        ValueError: Si el nivel no es un entero dentro del rango del formato
+    """
+    if nivel is None or formato not in NIVELES_COMPRESION:
+        return None
+    if isinstance(nivel, bool) or not isinstance(nivel, (int, str)):
+        raise ValueError(f"Nivel de compresión inválido: {nivel!r}")
+    try:
+        nivel = int(nivel)
+    except ValueError:
+        raise ValueError(f"Nivel de compresión inválido: {nivel!r}")
+    minimo, maximo = NIVELES_COMPRESION[formato]
+    if not minimo <= nivel <= maximo:
+        raise ValueError(f"El nivel de compresión de {formato} va de {minimo} a {maximo} (se indicó {nivel})")
+    return nivel
+
+
+def sufijo_compresion(nombre):
+    """'.gz', '.zst' o '' según el sufijo de compresión del nombre."""
+    nombre = str(nombre).lower()
+    for extension in EXTENSIONES.values():
+        if nombre.endswith(extension):
+            return extension
+    return ""
+
+
+def nombre_sin_compresion(nombre):
+    """Nombre del XML sin el sufijo de compresión ('FE-1.xml.zst' -> 'FE-1.xml')."""
+    sufijo = sufijo_compresion(nombre)
+    return nombre[:-len(sufijo)] if sufijo else nombre
+
+
+def es_xml(ruta):
+    """True si la ruta es un XML, comprimido o no."""
+    return nombre_sin_compresion(Path(ruta).name).lower().endswith(".xml")
+
+
+def buscar_xml(directorio, recursivo=True):
+    """Recorrer los XML (.xml, .xml.gz, .xml.zst) de un directorio."""
+    patron = Path(directorio).rglob("*") if recursivo else Path(directorio).glob("*")
+    for ruta in patron:
+        if es_xml(ruta) and ruta.is_file():
+            yield ruta
+
+
+def _cargar_diccionario(directorio):
+    directorio = Path(directorio)
+    with _lock_diccionarios:
+        if directorio in _diccionarios:
+            return _diccionarios[directorio]
+
+    diccionario = None
+    candidato = directorio / ARCHIVO_DICCIONARIO
+    if candidato.is_file():
+        diccionario = _zstd().ZstdCompressionDict(candidato.read_bytes())
+    elif directorio.parent != directorio:
+        diccionario = _cargar_diccionario(directorio.parent)
+
+    with _lock_diccionarios:
+        _diccionarios[directorio] = diccionario
+        if diccionario is not None:
+            _diccionarios_por_id.setdefault(diccionario.dict_id(), diccionario)
+    return diccionario
+
+
+def nombre_diccionario(dict_id):
+    """Nombre de la versión de un diccionario: '.diccionario-<dict_id>.zstd'."""
+    return f".diccionario-{dict_id}.zstd"
+
+
+def diccionario_por_id(dict_id, directorio):
+    """
+    Diccionario con el que se comprimió un .zst, según el dict_id de su cabecera.
+
+    Se busca la versión en el directorio del archivo y en sus padres (también
+    un ``.diccionario.zstd`` antiguo con ese id) y por último en ZSTD_DICT_STORE_DIR.
+
+    Raises:
+        OSError: Si no se encuentra ningún diccionario con ese id
+    """
+    with _lock_diccionarios:
+        if dict_id in _diccionarios_por_id:
+            return _diccionarios_por_id[dict_id]
+
+    directorio = Path(directorio).resolve()
+    for carpeta in (directorio, *directorio.parents, ZSTD_DICT_STORE_DIR):
+        for nombre in (nombre_diccionario(dict_id), ARCHIVO_DICCIONARIO):
+            candidato = carpeta / nombre
+            if not candidato.is_file():
+                continue
+            diccionario = _zstd().ZstdCompressionDict(candidato.read_bytes())
+            if diccionario.dict_id() == dict_id:
+                with _lock_diccionarios:
+                    return _diccionarios_por_id.setdefault(dict_id, diccionario)
+    raise OSError(f"No se encuentra el diccionario zstd {dict_id} ({nombre_diccionario(dict_id)}) "
+                  f"con que se comprimió un archivo de {directorio}")
+
+
+def dict_id_archivo(archivo):
+    """dict_id de la cabecera de un .zst abierto en binario (0 = sin diccionario); deja el archivo al inicio."""
+    cabecera = archivo.read(18)  # Tamaño máximo de la cabecera de trama
+    archivo.seek(0)
+    return _zstd().get_frame_parameters(cabecera).dict_id
+
+
+def buscar_diccionario(directorio):
+    """Diccionario zstd que aplica a un directorio (None si no hay o zstd no está instalado)."""
+    if not ZSTD_AVAILABLE:
+        return None
+    return _cargar_diccionario(Path(directorio).resolve())
+
+
+def abrir_xml(ruta):
+    """
+    Abrir un XML en modo binario descomprimiendo en streaming si hace falta.
+
+    Returns:
+        Objeto archivo de solo lectura; se usa con ``with`` o se pasa a
+        ET.iterparse / ET.parse, que solo leen lo que necesitan.
+    """
+    ruta = Path(ruta)
+    limitar()
+    sufijo = sufijo_compresion(ruta.name)
+    if sufijo == ".gz":
+        return gzip.open(ruta, "rb")
+    if sufijo == ".zst":
+        if not ZSTD_AVAILABLE:
+            raise OSError(f"Se requiere el paquete 'zstandard' para leer {ruta.name}")
+        archivo = open(ruta, "rb")
+        try:
+            dict_id = dict_id_archivo(archivo)
+            diccionario = diccionario_por_id(dict_id, ruta.parent) if dict_id else None
+        except (OSError, _zstd().ZstdError):
+            archivo.close()
+            raise
+        descompresor = _zstd().ZstdDecompressor(dict_data=diccionario)
+        return descompresor.stream_reader(archivo, closefd=True)
+    return open(ruta, "rb")
+
+
+def leer_xml(ruta, limite=None):
+    """Leer el contenido descomprimido de un XML (o solo sus primeros ``limite`` bytes)."""
+    with abrir_xml(ruta) as f:
+        if limite is None:
+            return f.read()
+        # Los lectores en streaming pueden devolver menos de lo pedido en cada read()
+        partes = []
+        restante = limite
+        while restante > 0:
+            bloque = f.read(restante)
+            if not bloque:
+                break
+            partes.append(bloque)
+            restante -= len(bloque)
+        return b"".join(partes)
+
+
+class CompresorXML:
+    """Comprime XML para guardarlos como .xml.gz o .xml.zst (seguro entre hilos)."""
+
+    def __init__(self, formato="ninguna", nivel=None, diccionario=None):
+        """
+        Inicializar el compresor.
+
+        Args:
+            formato (str): Uno de FORMATOS_COMPRESION
+            nivel (int): Nivel de compresión (None = el de config.py)
+            diccionario: ZstdCompressionDict entrenado (solo zstd)
+        """
+        if formato not in FORMATOS_COMPRESION:
+            raise ValueError(f"Compresión desconocida '{formato}' (use {', '.join(FORMATOS_COMPRESION)})")
+        if formato == "zstd" and not ZSTD_AVAILABLE:
+            raise ValueError("La compresión zstd requiere el paquete 'zstandard' (pip install zstandard)")
+        self.formato = formato
+        self.diccionario = diccionario
+        nivel = validar_nivel_compresion(formato, nivel)
+        if nivel is None:
+            nivel = ZSTD_COMPRESSION_LEVEL if formato == "zstd" else GZIP_COMPRESSION_LEVEL
+        self.nivel = nivel
+        # ZstdCompressor no admite llamadas simultáneas desde varios hilos
+        self._local = threading.local()
+
+    @property
+    def activo(self):
+        return self.formato != "ninguna"
+
+    @property
+    def extension(self):
+        """Sufijo que se añade al nombre del XML ('' sin compresión)."""
+        return EXTENSIONES.get(self.formato, "")
+
+    def describir(self):
+        if not self.activo:
+            return "sin compresión"
+        texto = f"{self.formato} nivel {self.nivel}"
+        if self.diccionario is not None:
+            texto += f" con diccionario ({len(self.diccionario.as_bytes()) // 1024} KB)"
+        return texto
+
+    def _compresor_zstd(self):
+        compresor = getattr(self._local, "compresor", None)
+        if compresor is None:
+            compresor = _zstd().ZstdCompressor(level=self.nivel, dict_data=self.diccionario)
+            self._local.compresor = compresor
+        return compresor
+
+    def comprimir(self, datos):
+        """Devolver los bytes a guardar en disco."""
+        if self.formato == "gzip":
+            # mtime=0: mismo XML, mismos bytes (útil para deduplicar copias de seguridad)
+            return gzip.compress(bytes(datos), compresslevel=self.nivel, mtime=0)
+        if self.formato == "zstd":
+            return self._compresor_zstd().compress(bytes(datos))
+        return datos
+
+
+def _guardar(destino, datos):
+    temporal = destino.with_name(destino.name + ".tmp")
+    temporal.write_bytes(datos)
+    os.replace(temporal, destino)
+
+
+def entrenar_diccionario(directorio, tamano_kb=ZSTD_DICT_SIZE_KB, max_muestras=ZSTD_DICT_MAX_SAMPLES,
+                         recomprimir=False):
+    """
+    Entrenar un diccionario zstd con una muestra de los XML de un directorio.
+
+    El diccionario nuevo pasa a ser el activo; las versiones anteriores se
+    conservan como ``.diccionario-<dict_id>.zstd``.
+
+    Args:
+        recomprimir (bool): Recomprimir con el diccionario nuevo los .zst que ya hay
+
+    Returns:
+        Path: Ruta del diccionario guardado (``directorio/.diccionario.zstd``)
+
+    Raises:
+        ValueError: Si hay .zst en el directorio y no se pide recomprimirlos
+    """
+    if not ZSTD_AVAILABLE:
+        raise ValueError("Entrenar un diccionario requiere el paquete 'zstandard' (pip install zstandard)")
+
+    directorio = Path(directorio)
+    rutas = list(buscar_xml(directorio))
+    comprimidos = [ruta for ruta in rutas if sufijo_compresion(ruta.name) == ".zst"]
+    if comprimidos and not recomprimir:
+        raise ValueError(f"{len(comprimidos):,} XML de {directorio} ya están en .zst; use --recompress para "
+                         "recomprimirlos con el diccionario nuevo")
+    if len(rutas) > max_muestras:
+        rutas = random.sample(rutas, max_muestras)
+    muestras = [leer_xml(ruta) for ruta in rutas]
+    if len(muestras) < 10:
+        raise ValueError(f"Se necesitan al menos 10 XML para entrenar un diccionario ({len(muestras)} encontrados)")
+
+    diccionario = _zstd().train_dictionary(tamano_kb * 1024, muestras)
+    datos = diccionario.as_bytes()
+    version = nombre_diccionario(diccionario.dict_id())
+
+    # Conservar la versión activa anterior antes de sustituirla
+    destino = directorio / ARCHIVO_DICCIONARIO
+    if destino.is_file():
+        anterior = _zstd().ZstdCompressionDict(destino.read_bytes())
+        copia = directorio / nombre_diccionario(anterior.dict_id())
+        if not copia.exists():
+            _guardar(copia, anterior.as_bytes())
+    _guardar(directorio / version, datos)
+    try:
+        ZSTD_DICT_STORE_DIR.mkdir(parents=True, exist_ok=True)
+        _guardar(ZSTD_DICT_STORE_DIR / version, datos)
+    except OSError as e:
+        print(f"⚠️  No se pudo copiar el diccionario a {ZSTD_DICT_STORE_DIR}: {e}")
+    _guardar(destino, datos)
+    with _lock_diccionarios:
+        _diccionarios.clear()
+        _diccionarios_por_id[diccionario.dict_id()] = diccionario
+
+    if comprimidos:
+        compresor = CompresorXML("zstd", diccionario=diccionario)
+        recomprimidos = 0
+        for ruta in comprimidos:
+            with open(ruta, "rb") as f:
+                if dict_id_archivo(f) == diccionario.dict_id():
+                    continue
+            _guardar(ruta, compresor.comprimir(leer_xml(ruta)))
+            recomprimidos += 1
+        print(f"🗜️  {recomprimidos:,} archivos .zst recomprimidos con el diccionario nuevo")
+    return destino
+
+
+def convertir_directorio(directorio, compresor):
+    """
+    Recomprimir en su sitio los XML de un directorio al formato del compresor.
+
+    Cada archivo se escribe primero como temporal y luego sustituye al
+    original, así una interrupción nunca deja un XML a medias.
+
+    Returns:
+        tuple: (convertidos, bytes_antes, bytes_despues)
+    """
+    convertidos = 0
+    antes = 0
+    despues = 0
+    for ruta in list(buscar_xml(directorio)):
+        if sufijo_compresion(ruta.name) == compresor.extension:
+            continue
+        datos = leer_xml(ruta)
+        destino = ruta.with_name(nombre_sin_compresion(ruta.name) + compresor.extension)
+        if destino.exists():
+            print(f"⚠️  Ya existe {destino.name}; se omite {ruta.name}")
+            continue
+        temporal = destino.with_name(destino.name + ".tmp")
+        temporal.write_bytes(compresor.comprimir(datos))
+        os.replace(temporal, destino)
+        antes += ruta.stat().st_size
+        despues += destino.stat().st_size
+        os.remove(ruta)
+        convertidos += 1
+    return convertidos, antes, despues
+
+
+def main():
+    """Entrenar el diccionario o (des)comprimir un directorio de XML existente."""
+    parser = argparse.ArgumentParser(description="Almacenamiento comprimido de XML extraídos")
+    parser.add_argument("--dir", required=True, help="Directorio con XML (ej. salida/xml_facturacion)")
+    parser.add_argument("--train-dict", action="store_true", help="Entrenar el diccionario zstd con los XML del directorio")
+    parser.add_argument("--dict-size-kb", type=int, default=ZSTD_DICT_SIZE_KB, help="Tamaño del diccionario")
+    parser.add_argument("--recompress", action="store_true",
+                        help="Con --train-dict, recomprimir con el diccionario nuevo los .zst existentes")
+    parser.add_argument("--convert", choices=FORMATOS_COMPRESION,
+                        help="Recomprimir los XML al formato indicado ('ninguna' descomprime)")
+    parser.add_argument("--level", type=int, default=None, help="Nivel de compresión")
+    args = parser.parse_args()
+
+    directorio = Path(args.dir)
+    if not directorio.is_dir():
+        print(f"❌ El directorio {directorio} no existe.")
+        return
+
+    try:
+        if args.train_dict:
+            destino = entrenar_diccionario(directorio, args.dict_size_kb, recomprimir=args.recompress)
+            print(f"📚 Diccionario guardado en {destino}")
+
+        if args.convert:
+            diccionario = buscar_diccionario(directorio) if args.convert == "zstd" else None
+            compresor = CompresorXML(args.convert, args.level, diccionario)
+            print(f"🗜️  Convirtiendo a {compresor.describir()}...")
+            convertidos, antes, despues = convertir_directorio(directorio, compresor)
+            ratio = f" (x{antes / despues:.1f})" if despues else ""
+            print(f"✅ {convertidos:,} archivos: {antes / 1024 / 1024:.1f} MB -> {despues / 1024 / 1024:.1f} MB{ratio}")
+    except ValueError as e:
+        print(f"❌ {e}")
+
+
+if __name__ == "__main__":
+    main()
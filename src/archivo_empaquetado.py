@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Salida empaquetada: XML extraídos dentro de paquetes ZIP o TAR.
+
+Escribir cientos de miles de archivos de 5-15 KB está dominado por el
+costo de metadatos del sistema de archivos, el antivirus y las copias de
+seguridad. En modo empaquetado cada XML se añade a un paquete con tamaño
+máximo (``paquete_00001.zip``, ``paquete_00002.zip``...) y se registra en
+un índice lateral ``indice_paquetes.jsonl`` con una línea por documento:
+
+    {"nombre": "Inbox/FE-123.xml", "paquete": "paquete_00001.zip",
+     "offset": 1234, "longitud": 4321, "tamano": 10132,
+     "compresion": "deflate", "sha256": "..."}
+
+``nombre`` es la ruta virtual del documento (la que tendría como archivo
+suelto dentro de xml_facturacion/). Filtrar y renombrar trabajan sobre el
+índice: "mover" o "renombrar" un documento es cambiar su ``nombre`` y
+reescribir el índice, sin tocar los paquetes.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tarfile
+import threading
+import zipfile
+import zlib
+from pathlib import Path, PurePosixPath
+
+from almacen_comprimido import buscar_xml, leer_xml
+from config import PACK_SHARD_SIZE_MB
+
+ARCHIVO_INDICE = "indice_paquetes.jsonl"
+FORMATOS = ("zip", "tar")
+
+
+class EmpaquetadorXML:
+    """Añade documentos a paquetes con tamaño máximo y mantiene el índice lateral."""
+
+    def __init__(self, raiz, formato="zip", tamano_max_mb=PACK_SHARD_SIZE_MB):
+        """
+        Inicializar el empaquetador.
+
+        Args:
+            raiz (Path): Directorio donde se crean paquetes e índice (xml_facturacion/)
+            formato (str): 'zip' (deflate) o 'tar' (sin comprimir)
+            tamano_max_mb (int): Tamaño a partir del cual se abre un paquete nuevo
+        """
+        if formato not in FORMATOS:
+            raise ValueError(f"Formato de paquete desconocido '{formato}' (use {', '.join(FORMATOS)})")
+        self.raiz = Path(raiz)
+        self.formato = formato
+        self.tamano_max = int(tamano_max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._paquete = None
+        self._nombre_paquete = None
+        self._archivo_paquete = None
+        self._indice = None
+        self._nombres = set()
+        self.documentos = 0
+
+    def abrir(self):
+        """Abrir el índice (añadiendo a uno existente) y preparar el siguiente paquete."""
+        self.raiz.mkdir(parents=True, exist_ok=True)
+        ruta_indice = self.raiz / ARCHIVO_INDICE
+        if ruta_indice.exists():
+            for entrada in leer_indice(ruta_indice):
+                self._nombres.add(entrada["nombre"].lower())
+        self._indice = open(ruta_indice, "a", encoding="utf-8")
+
+    def _siguiente_paquete(self):
+        self._cerrar_paquete()
+        numero = 1
+        while (self.raiz / f"paquete_{numero:05d}.{self.formato}").exists():
+            numero += 1
+        self._nombre_paquete = f"paquete_{numero:05d}.{self.formato}"
+        ruta = self.raiz / self._nombre_paquete
+        if self.formato == "zip":
+            self._paquete = zipfile.ZipFile(ruta, "w", compression=zipfile.ZIP_DEFLATED)
+        else:
+            self._archivo_paquete = open(ruta, "wb")
+            self._paquete = tarfile.open(fileobj=self._archivo_paquete, mode="w", format=tarfile.PAX_FORMAT)
+
+    def _cerrar_paquete(self):
+        if self._paquete is not None:
+            self._paquete.close()
+            self._paquete = None
+        if self._archivo_paquete is not None:
+            self._archivo_paquete.close()
+            self._archivo_paquete = None
+
+    def _tamano_actual(self):
+        if self.formato == "zip":
+            return self._paquete.fp.tell()
+        return self._archivo_paquete.tell()
+
+    def nombre_unico(self, nombre):
+        """Reservar un nombre virtual libre (nombre, nombre_001...) sin tocar disco."""
+        base, ext = os.path.splitext(nombre)
+        candidato = nombre
+        contador = 1
+        while candidato.lower() in self._nombres:
+            candidato = f"{base}_{contador:03d}{ext}"
+            contador += 1
+        self._nombres.add(candidato.lower())
+        return candidato
+
+    def agregar(self, nombre, datos):
+        """
+        Añadir un documento (seguro entre hilos).
+
+        Args:
+            nombre (str): Ruta virtual relativa con '/' (ej. 'Inbox/FE-123.xml')
+            datos (bytes): Contenido del XML
+
+        Returns:
+            str: Nombre virtual final (con sufijo si ya existía)
+        """
+        datos = bytes(datos)
+        sha256 = hashlib.sha256(datos).hexdigest()
+        with self._lock:
+            nombre = self.nombre_unico(nombre)
+            if self._paquete is None or self._tamano_actual() >= self.tamano_max:
+                self._siguiente_paquete()
+
+            miembro = f"{self.documentos:08d}_{PurePosixPath(nombre).name}"
+            if self.formato == "zip":
+                info = zipfile.ZipInfo(miembro)
+                info.compress_type = zipfile.ZIP_DEFLATED
+                self._paquete.writestr(info, datos)
+                # Datos tras la cabecera local: 30 bytes + nombre + campo extra
+                offset = info.header_offset + 30 + len(info.filename.encode("utf-8")) + len(info.extra)
+                longitud = info.compress_size
+                compresion = "deflate"
+            else:
+                info = tarfile.TarInfo(miembro)
+                info.size = len(datos)
+                self._paquete.addfile(info, _LectorBytes(datos))
+                # Los datos terminan en el último bloque de 512 bytes escrito
+                bloques = -(-len(datos) // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+                offset = self._archivo_paquete.tell() - bloques
+                longitud = len(datos)
+                compresion = "ninguna"
+
+            entrada = {
+                "nombre": nombre,
+                "paquete": self._nombre_paquete,
+                "miembro": miembro,
+                "offset": offset,
+                "longitud": longitud,
+                "tamano": len(datos),
+                "compresion": compresion,
+                "sha256": sha256,
+            }
+            self._indice.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+            self.documentos += 1
+            return nombre
+
+    def cerrar(self):
+        """Cerrar el paquete en curso y el índice."""
+        with self._lock:
+            self._cerrar_paquete()
+            if self._indice:
+                self._indice.close()
+                self._indice = None
+
+
+class _LectorBytes:
+    """Objeto archivo mínimo para tarfile.addfile sin copiar los bytes a BytesIO."""
+
+    def __init__(self, datos):
+        self._vista = memoryview(datos)
+        self._pos = 0
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            n = len(self._vista) - self._pos
+        trozo = self._vista[self._pos:self._pos + n]
+        self._pos += len(trozo)
+        return bytes(trozo)
+
+
+def leer_indice(ruta_indice):
+    """Leer las entradas de un índice JSONL."""
+    entradas = []
+    with open(ruta_indice, encoding="utf-8") as f:
+        for linea in f:
+            linea = linea.strip()
+            if linea:
+                entradas.append(json.loads(linea))
+    return entradas
+
+
+def buscar_indice(directorio):
+    """Encontrar el índice de paquetes en un directorio o en su xml_facturacion/ (None si no hay)."""
+    directorio = Path(directorio)
+    for candidato in (directorio, directorio / "xml_facturacion"):
+        if (candidato / ARCHIVO_INDICE).is_file():
+            return candidato
+    return None
+
+
+class LectorPaquetes:
+    """Lectura posicionada de documentos a partir de entradas del índice."""
+
+    def __init__(self, raiz):
+        self.raiz = Path(raiz)
+        self._abiertos = {}
+
+    def leer(self, entrada, verificar=False):
+        """
+        Leer el contenido de un documento con una sola lectura posicionada.
+
+        Args:
+            entrada (dict): Entrada del índice
+            verificar (bool): Comprobar el sha256 registrado
+        """
+        f = self._abiertos.get(entrada["paquete"])
+        if f is None:
+            f = open(self.raiz / entrada["paquete"], "rb")
+            self._abiertos[entrada["paquete"]] = f
+        f.seek(entrada["offset"])
+        datos = f.read(entrada["longitud"])
+        if entrada.get("compresion") == "deflate":
+            datos = zlib.decompress(datos, -15)
+        if verificar and hashlib.sha256(datos).hexdigest() != entrada.get("sha256"):
+            raise ValueError(f"Hash no coincide para {entrada['nombre']} en {entrada['paquete']}")
+        return datos
+
+    def cerrar(self):
+        for f in self._abiertos.values():
+            f.close()
+        self._abiertos = {}
+
+
+class IndicePaquetes(LectorPaquetes):
+    """Vista de lectura/escritura sobre paquetes existentes a través de su índice."""
+
+    def __init__(self, raiz):
+        super().__init__(raiz)
+        self.ruta_indice = self.raiz / ARCHIVO_INDICE
+        self.entradas = leer_indice(self.ruta_indice)
+        self._nombres = {e["nombre"].lower() for e in self.entradas}
+
+    def __iter__(self):
+        return iter(list(self.entradas))
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def nombre_unico(self, nombre):
+        """Nombre virtual libre (nombre, nombre_001...) dentro del índice."""
+        base, ext = os.path.splitext(nombre)
+        candidato = nombre
+        contador = 1
+        while candidato.lower() in self._nombres:
+            candidato = f"{base}_{contador:03d}{ext}"
+            contador += 1
+        return candidato
+
+    def existe(self, nombre):
+        return nombre.lower() in self._nombres
+
+    def renombrar(self, entrada, nuevo_nombre):
+        """Cambiar el nombre virtual de un documento (equivale a mover el archivo)."""
+        self._nombres.discard(entrada["nombre"].lower())
+        entrada["nombre"] = nuevo_nombre
+        self._nombres.add(nuevo_nombre.lower())
+
+    def guardar(self):
+        """Reescribir el índice de forma atómica (archivo temporal + os.replace)."""
+        temporal = self.ruta_indice.with_suffix(".jsonl.tmp")
+        with open(temporal, "w", encoding="utf-8") as f:
+            for entrada in self.entradas:
+                f.write(json.dumps(entrada, ensure_ascii=False) + "\n")
+        os.replace(temporal, self.ruta_indice)
+
+
+def listar_documentos(directorio):
+    """
+    Documentos XML de un directorio de salida, empaquetado o no.
+
+    Returns:
+        tuple: (raiz_paquetes, documentos) donde documentos son entradas del
+        índice si la salida está empaquetada (raiz_paquetes no es None) o
+        rutas de archivo (.xml, .xml.gz, .xml.zst) en caso contrario
+    """
+    raiz_paquetes = buscar_indice(directorio)
+    if raiz_paquetes is not None:
+        return raiz_paquetes, leer_indice(raiz_paquetes / ARCHIVO_INDICE)
+    return None, list(buscar_xml(directorio))
+
+
+def leer_documento(documento, lector=None):
+    """
+    Leer un documento devuelto por ``listar_documentos``.
+
+    Args:
+        documento: Entrada del índice o ruta de archivo
+        lector (LectorPaquetes): Necesario para entradas del índice
+
+    Returns:
+        tuple: (nombre, bytes descomprimidos)
+    """
+    if isinstance(documento, dict):
+        return documento["nombre"], lector.leer(documento)
+    return str(documento), leer_xml(documento)
+
+
+def nombre_relativo_seguro(nombre):
+    """True si un nombre del índice es una ruta relativa que no sale de su directorio."""
+    ruta = PurePosixPath(nombre)
+    return bool(ruta.parts) and not ruta.is_absolute() and not any(
+        parte in (".", "..") or "\\" in parte or ":" in parte for parte in ruta.parts)
+
+
+def desempaquetar(raiz, destino, filtro_prefijo=""):
+    """Escribir como archivos sueltos los documentos del índice (opcionalmente por prefijo)."""
+    indice = IndicePaquetes(raiz)
+    destino = Path(destino)
+    escritos = 0
+    try:
+        for entrada in indice:
+            if filtro_prefijo and not entrada["nombre"].startswith(filtro_prefijo):
+                continue
+            if not nombre_relativo_seguro(entrada["nombre"]):
+                # Un índice manipulado no debe escribir fuera del destino
+                print(f"⚠️ Nombre no válido en el índice, se omite: {entrada['nombre']!r}")
+                continue
+            ruta = destino.joinpath(*PurePosixPath(entrada["nombre"]).parts)
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            ruta.write_bytes(indice.leer(entrada, verificar=True))
+            escritos += 1
+    finally:
+        indice.cerrar()
+    return escritos
+
+
+def main():
+    """Listar o desempaquetar un directorio de salida empaquetado."""
+    parser = argparse.ArgumentParser(description="Consultar o desempaquetar XML guardados en paquetes")
+    parser.add_argument("--dir", required=True, help="Directorio de salida (o su xml_facturacion/)")
+    parser.add_argument("--extract-to", help="Desempaquetar todos los documentos en este directorio")
+    parser.add_argument("--prefix", default="", help="Solo documentos cuyo nombre empiece así")
+    args = parser.parse_args()
+
+    raiz = buscar_indice(args.dir)
+    if raiz is None:
+        print(f"❌ No se encontró {ARCHIVO_INDICE} en {args.dir}")
+        return
+
+    if args.extract_to:
+        escritos = desempaquetar(raiz, args.extract_to, args.prefix)
+        print(f"✅ {escritos:,} documentos escritos en {args.extract_to}")
+        return
+
+    for entrada in leer_indice(raiz / ARCHIVO_INDICE):
+        if entrada["nombre"].startswith(args.prefix):
+            print(f"{entrada['nombre']}\t{entrada['paquete']}\t{entrada['tamano']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,7 @@ Autor: Generado automáticamente
 Fecha: 2025-10-07
 """
 
+import os
 import re
 from pathlib import Path
 
@@ -49,6 +50,133 @@ MAX_LOG_FIELD_LENGTH = 100  # Longitud máxima de campos en CSV
 
 # Configuración de progreso
 PROGRESS_UPDATE_INTERVAL = 100  # Actualizar progreso cada N archivos
+PROGRESS_UPDATE_SECONDS = 0.5  # Refrescar la ventana de progreso como máximo cada N segundos
+
+# Pipeline productor/consumidor (hilo COM -> hilos de escritura)
+PIPELINE_WRITER_THREADS = 4  # Hilos que escriben XML a disco y registran el log
+PIPELINE_QUEUE_SIZE = 256  # Adjuntos en memoria como máximo (contrapresión sobre COM)
+
+# Reintentos ante errores transitorios de Outlook COM (servidor ocupado, llamada rechazada)
+COM_RETRY_MAX_ATTEMPTS = 4  # Intentos por llamada, incluido el primero
+COM_RETRY_BASE_DELAY = 0.25  # Segundos de espera tras el primer fallo (se duplica en cada intento)
+COM_RETRY_MAX_DELAY = 8.0  # Tope de espera entre intentos
+COM_RETRY_BUDGET = 2000  # Reintentos totales permitidos por ejecución
+COM_CIRCUIT_THRESHOLD = 25  # Fallos transitorios seguidos que provocan una pausa larga
+COM_CIRCUIT_COOLDOWN_SECONDS = 30  # Duración de esa pausa
+
+# Registro de errores (el listado completo va a reportes/errores.jsonl)
+ERROR_SAMPLE_SIZE = 20  # Errores de muestra incluidos en el reporte final
+
+# Salida empaquetada (--output-mode zip/tar)
+PACK_SHARD_SIZE_MB = 256  # Tamaño a partir del cual se abre un paquete nuevo
+
+# Almacenamiento comprimido (--compress gzip/zstd)
+GZIP_COMPRESSION_LEVEL = 6
+ZSTD_COMPRESSION_LEVEL = 9  # Con diccionario, niveles altos apenas mejoran en archivos de 5-15 KB
+ZSTD_DICT_SIZE_KB = 112  # Tamaño del diccionario entrenado sobre el corpus
+ZSTD_DICT_MAX_SAMPLES = 20000  # XML usados como muestra para entrenar el diccionario
+# Copia de cada diccionario entrenado, por dict_id, para leer .zst movidos fuera de su salida
+ZSTD_DICT_STORE_DIR = Path.home() / ".pstextractor" / "diccionarios_zstd"
+
+# Validación XSD (--validate): esquemas oficiales de Hacienda v4.3/v4.4 copiados localmente
+XSD_DIR = Path(__file__).parent / "esquemas_xsd"
+VALIDATION_WORKERS = max(1, (os.cpu_count() or 2) - 1)  # Procesos que validan en paralelo
+VALIDATION_BATCH_SIZE = 200  # Documentos por tarea enviada a cada proceso
+VALIDATION_MAX_ERRORS_PER_DOC = 5  # Errores de esquema guardados por documento
+
+# Verificación de firmas XAdES (--verify-signatures), sin conexión
+TRUST_ANCHORS_DIR = Path(__file__).parent / "anclas_confianza"  # Certificados raíz/intermedios de confianza
+SIGNATURE_BATCH_SIZE = 100  # Documentos por tarea enviada a cada proceso
+SIGNATURE_MAX_CHAIN_LENGTH = 6  # Niveles máximos de la cadena firmante -> ancla
+
+# Vigilancia de carpeta (vigilante_correo.py): ingesta continua de .eml/.msg exportados
+WATCH_DEBOUNCE_SECONDS = 0.25  # Silencio exigido tras el último cambio de un archivo antes de procesarlo
+WATCH_POLL_SECONDS = 0.5  # Intervalo de sondeo cuando no hay inotify
+WATCH_RESCAN_SECONDS = 60  # Con inotify, sondeo de respaldo de la carpeta de entrada (y siempre tras desbordarse la cola)
+WATCH_BATCH_MAX = 200  # Correos procesados como máximo por lote
+
+# Lector nativo de PST (lector_pst.py): lectura de adjuntos ordenada por desplazamiento
+PST_READ_ORDER_WINDOW_MB = 64  # Bytes de adjuntos acumulados antes de leerlos en orden
+PST_READ_ORDER_MAX_ITEMS = 20000  # ...o adjuntos anotados, aunque sean pequeños
+PST_COALESCE_GAP_KB = 64  # Bloques separados por menos de esto se leen en una sola lectura
+PST_MAX_READ_MB = 8  # Tamaño máximo de cada lectura fusionada
+PST_USE_MMAP = True  # Proyectar el PST en memoria; los adjuntos se copian a disco sin pasar por bytes intermedios
+PST_STREAM_BUFFER_KB = 256  # Búfer reutilizado por cada escritura vectorial de un adjunto
+PST_CACHE_MB = 32  # Caché LRU de páginas de B-tree, heaps y esquemas de PC/TC (0 = sin caché)
+
+# Extracción distribuida (extraccion_distribuida.py): varios procesos/equipos sobre un mismo PST
+DIST_UNIT_MESSAGES = 2000  # Filas de la tabla de contenido por unidad de trabajo
+DIST_HEARTBEAT_SECONDS = 30  # Cada cuánto renueva un trabajador la marca de su reclamo
+DIST_CLAIM_TIMEOUT_SECONDS = 600  # Reclamo sin renovar durante este tiempo = trabajador caído
+
+# Correos adjuntos a otros correos (reenvíos como adjunto .msg / message/rfc822)
+NESTED_MESSAGE_MAX_DEPTH = 3  # Niveles de correos embebidos en los que se buscan XML (0 = ninguno)
+
+# Adjuntos .zip (adjuntos_zip.py): se leen en memoria y solo se extraen sus miembros .xml
+ZIP_INSPECT_ATTACHMENTS = True  # Buscar XML dentro de los adjuntos .zip al extraer
+ZIP_MAX_MEMBERS = 1000  # Entradas máximas del directorio central (más = archivo sospechoso, se omite)
+ZIP_READ_CHUNK_KB = 64  # Tamaño de cada lectura al descomprimir un miembro
+
+# Reglas de selección de adjuntos (reglas_adjuntos.py): qué adjuntos se extraen y a qué
+# subdirectorio de xml_facturacion/ va cada uno. Se evalúan en orden y gana la primera que
+# se cumple. Claves: "nombre" (regex o patrón compilado), "categoria" ("" = raíz) y, opcionales,
+# "mime" (prefijos), "min_kb", "max_mb" (sin tope si se omite) y "dominios" del remitente.
+ATTACHMENT_RULE_SETS = {
+    # Cualquier .xml, todos juntos (comportamiento original)
+    "todos": [
+        {"nombre": r".+\.xml$", "categoria": ""},
+    ],
+    # Un subdirectorio por tipo de comprobante según los patrones de arriba; el resto de .xml en otros/
+    "tipo": [
+        {"nombre": XML_PATTERN, "categoria": "FE"},
+        *({"nombre": patron, "categoria": tipo} for tipo, patron in ADDITIONAL_PATTERNS.items()),
+        {"nombre": r".+\.xml$", "categoria": "otros"},
+    ],
+}
+ATTACHMENT_RULES_DEFAULT = "todos"  # Conjunto usado si no se indica --attachment-rules
+
+# Preparación local (--staging-dir): los XML se escriben en un disco local rápido y un hilo
+# los traslada por lotes al destino final (recurso de red lento)
+STAGING_BATCH_FILES = 256  # Archivos por lote de traslado
+STAGING_BATCH_SECONDS = 2.0  # Espera máxima para completar un lote antes de trasladarlo
+STAGING_MOVER_THREADS = 8  # Copias simultáneas al destino (la latencia de red domina)
+STAGING_MAX_PENDING_MB = 512  # Datos pendientes de trasladar antes de frenar la escritura local
+STAGING_DURABILITY = "lote"  # fsync en destino: "ninguna", "lote" (al cerrar cada lote) o "archivo"
+
+# Límites de E/S (limitador_io.py) compartidos por lecturas del PST, escrituras y movimientos
+IO_LIMIT_MB_S = 0  # MB/s máximos (0 = sin límite)
+IO_LIMIT_OPS_S = 0  # Operaciones de E/S por segundo (0 = sin límite)
+IO_BURST_SECONDS = 1.0  # Ráfaga admitida, en segundos de la tasa configurada
+IO_LIMITS_POLL_SECONDS = 2.0  # Cada cuánto se comprueba si cambió el archivo de --io-limits-file
+
+# Índice de Claves (indice_claves.py) para detectar duplicados en rename_xml_por_clave.py
+CLAVE_INDEX_MERGE_ENTRIES = 100000  # Claves nuevas en un set (~100 bytes c/u) antes de empaquetarlas ordenadas
+
+# Planes de movimientos (--plan/--apply) de rename_xml_por_clave.py y filtrar_xml_hacienda.py
+PLAN_APPLY_THREADS = 8  # Hilos que verifican huellas y mueven archivos (la latencia de red domina)
+
+# Movimientos masivos (movimiento_masivo.py) de filtrar_xml_hacienda.py
+MOVE_THREADS = 8  # Movimientos simultáneos
+MOVE_RETRY_ATTEMPTS = 5  # Pasadas sobre los archivos que otro proceso tenía bloqueados
+MOVE_RETRY_DELAY_SECONDS = 0.5  # Espera antes de la primera pasada (se duplica en cada una)
+MOVE_COPY_CHUNK_MB = 8  # Bytes por llamada de copia en el núcleo entre volúmenes distintos
+
+# Explorador de resultados (explorador_resultados.py): tabla virtual sobre remitentes_pst.csv
+EXPLORER_PAGE_ROWS = 500  # Filas leídas del CSV de una vez (solo se leen las páginas que se ven o se filtran)
+EXPLORER_CACHE_PAGES = 64  # Páginas ya leídas que se conservan en memoria
+EXPLORER_POLL_MS = 500  # Cada cuánto se buscan filas nuevas mientras la extracción sigue
+EXPLORER_STEP_MS = 40  # Tiempo máximo de cada tramo de indexado o filtrado (la ventana sigue respondiendo)
+EXPLORER_INDEX_CHUNK_MB = 8  # Bytes del CSV indexados por tramo
+EXPLORER_FILTER_DELAY_MS = 250  # Pausa tras la última tecla antes de aplicar un filtro
+EXPLORER_EVENTS_SECONDS = 0.05  # Con el explorador abierto durante la extracción, cada cuánto se atienden teclado y ratón
+
+# Servicio HTTP de trabajos (servicio_trabajos.py): extracciones enviadas por otros sistemas
+API_HOST = "127.0.0.1"  # Solo local por defecto; no exponer sin --token
+API_PORT = 8765
+API_WORKERS = 1  # Extracciones simultáneas (Outlook serializa las llamadas COM de todos modos)
+API_QUEUE_SIZE = 16  # Trabajos en espera como máximo; al llenarse se responde 503
+API_HISTORY_SIZE = 200  # Trabajos terminados que se conservan para consulta
+API_MAX_BODY_KB = 64  # Tamaño máximo del cuerpo JSON de una petición
 
 # === CONFIGURACIÓN DE VALIDACIÓN ===
 
@@ -176,6 +304,8 @@ DEFAULT_CONFIG = {
     "max_xml_size_mb": MAX_XML_SIZE_MB,
     "max_log_field_length": MAX_LOG_FIELD_LENGTH,
     "progress_update_interval": PROGRESS_UPDATE_INTERVAL,
+    "pipeline_writer_threads": PIPELINE_WRITER_THREADS,
+    "pipeline_queue_size": PIPELINE_QUEUE_SIZE,
     "valid_extensions": {
         "email": VALID_EMAIL_EXTENSIONS,
         "pst": VALID_PST_EXTENSIONS,
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Disposición (layout) del directorio de salida de XML extraídos.
+
+Por defecto cada XML va a ``xml_facturacion/<carpeta de Outlook>``, lo que
+junta todas las "Inbox" de un almacén en un solo directorio gigante. Este
+módulo define esquemas alternativos con un número acotado de entradas
+por directorio:
+
+- ``carpeta``: último segmento de la carpeta de Outlook (comportamiento original)
+- ``ruta``: ruta completa de la carpeta de Outlook (sin colisiones entre carpetas)
+- ``fecha``: ``AAAA/MM`` de recepción del correo
+- ``emisor``: cédula del emisor y ``AAAA-MM`` tomados de la Clave (``sin_clave/`` si no hay)
+- ``hash``: dos niveles de prefijo hexadecimal (256 x 256 directorios)
+
+A cualquier esquema se le pueden añadir niveles de hash al final
+(``niveles_hash``) para repartir carpetas hoja muy grandes en 256 cubetas
+por nivel.
+
+El esquema usado se guarda en ``xml_facturacion/.disposicion.json`` para
+que ``filtrar_xml_hacienda.py`` y ``rename_xml_por_clave.py`` lo respeten.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import hashlib
+import json
+import re
+from pathlib import Path
+
+ARCHIVO_DISPOSICION = ".disposicion.json"
+ESQUEMAS = ("carpeta", "ruta", "fecha", "emisor", "hash")
+
+# <Clave> de 50 dígitos: país(3) día(2) mes(2) año(2) emisor(12) consecutivo(20) situación(1) seguridad(8)
+CLAVE_REGEX = re.compile(rb"<(?:[\w.-]+:)?Clave>\s*(\d{50})\s*</", re.IGNORECASE)
+BYTES_BUSQUEDA_CLAVE = 16 * 1024  # La Clave aparece al inicio del documento
+
+
+def sanitizar_componente(nombre, por_defecto="carpeta"):
+    """Sanear un nombre de carpeta para el sistema de archivos de Windows."""
+    if not nombre:
+        return por_defecto
+    invalid = '<>:"/\\|?*'
+    sanitized = ''.join('_' if ch in invalid else ch for ch in str(nombre))
+    sanitized = sanitized.strip().strip('.')
+    return sanitized or por_defecto
+
+
+def buscar_clave_en_bytes(datos):
+    """Buscar la Clave de 50 dígitos en el inicio de un XML ya cargado en memoria."""
+    if not datos:
+        return ""
+    coincidencia = CLAVE_REGEX.search(bytes(datos[:BYTES_BUSQUEDA_CLAVE]))
+    return coincidencia.group(1).decode("ascii") if coincidencia else ""
+
+
+def partes_clave(clave):
+    """
+    Descomponer una Clave de Hacienda.
+
+    Returns:
+        dict: emisor, anio, mes, dia (vacío si la clave no tiene 50 dígitos)
+    """
+    if not clave or len(clave) != 50 or not clave.isdigit():
+        return {}
+    return {
+        "dia": clave[3:5],
+        "mes": clave[5:7],
+        "anio": "20" + clave[7:9],
+        "emisor": clave[9:21],
+    }
+
+
+class DisposicionSalida:
+    """Calcula el subdirectorio de cada XML según el esquema configurado."""
+
+    def __init__(self, esquema="carpeta", niveles_hash=0):
+        """
+        Inicializar la disposición.
+
+        Args:
+            esquema (str): Uno de ESQUEMAS
+            niveles_hash (int): Niveles de cubetas hexadecimales añadidos al final (0-3)
+        """
+        if esquema not in ESQUEMAS:
+            raise ValueError(f"Esquema de salida desconocido '{esquema}' (use {', '.join(ESQUEMAS)})")
+        if not 0 <= int(niveles_hash) <= 3:
+            raise ValueError("niveles_hash debe estar entre 0 y 3")
+        self.esquema = esquema
+        self.niveles_hash = int(niveles_hash)
+
+    @property
+    def fragmentada(self):
+        """True si el esquema no es el original por carpeta."""
+        return self.esquema != "carpeta" or self.niveles_hash > 0
+
+    @property
+    def depende_de_clave(self):
+        """True si la ubicación final de un XML se deduce de su Clave."""
+        return self.esquema in ("emisor", "hash")
+
+    @staticmethod
+    def _cubetas(semilla, niveles):
+        digest = hashlib.sha1(semilla).hexdigest()
+        return [digest[2 * i:2 * i + 2] for i in range(niveles)]
+
+    def partes(self, ruta_carpeta="", fecha=None, clave="", datos=None):
+        """
+        Segmentos del subdirectorio relativo a ``xml_facturacion``.
+
+        Args:
+            ruta_carpeta (str): Ruta de la carpeta de Outlook ('Raiz/Inbox/Facturas')
+            fecha (datetime): Fecha de recepción del correo
+            clave (str): Clave del documento (si ya se conoce)
+            datos (bytes): Contenido del XML (para Clave o hash si hacen falta)
+        """
+        if self.depende_de_clave and not clave and datos is not None:
+            clave = buscar_clave_en_bytes(datos)
+
+        if self.esquema == "carpeta":
+            segmentos = [p for p in str(ruta_carpeta).split('/') if p]
+            partes = [sanitizar_componente(segmentos[-1]) if segmentos else "sin_carpeta"]
+        elif self.esquema == "ruta":
+            segmentos = [sanitizar_componente(p) for p in str(ruta_carpeta).split('/') if p]
+            partes = segmentos or ["sin_carpeta"]
+        elif self.esquema == "fecha":
+            if fecha is not None and hasattr(fecha, "year"):
+                partes = [f"{fecha.year:04d}", f"{fecha.month:02d}"]
+            else:
+                partes = ["sin_fecha"]
+        elif self.esquema == "emisor":
+            info = partes_clave(clave)
+            partes = [info["emisor"], f"{info['anio']}-{info['mes']}"] if info else ["sin_clave"]
+        else:  # hash
+            partes = []
+
+        niveles = 2 if self.esquema == "hash" and self.niveles_hash == 0 else self.niveles_hash
+        if niveles:
+            if clave:
+                semilla = clave.encode("ascii")
+            elif datos is not None:
+                semilla = bytes(datos)
+            else:
+                semilla = str(ruta_carpeta).encode("utf-8")
+            partes.extend(self._cubetas(semilla, niveles))
+
+        return partes
+
+    def subdirectorio(self, raiz, **kwargs):
+        """Ruta absoluta del subdirectorio dentro de ``raiz`` (ver ``partes``)."""
+        return Path(raiz).joinpath(*self.partes(**kwargs))
+
+    def describir(self):
+        texto = self.esquema
+        if self.niveles_hash and self.esquema != "hash":
+            texto += f" + {self.niveles_hash} nivel(es) de hash"
+        return texto
+
+    def guardar(self, raiz):
+        """Guardar el esquema en ``raiz/.disposicion.json``."""
+        datos = {"version": 1, "esquema": self.esquema, "niveles_hash": self.niveles_hash}
+        with open(Path(raiz) / ARCHIVO_DISPOSICION, "w", encoding="utf-8") as f:
+            json.dump(datos, f)
+
+    @classmethod
+    def cargar(cls, raiz):
+        """Leer el esquema de ``raiz/.disposicion.json`` (None si no existe o es inválido)."""
+        try:
+            with open(Path(raiz) / ARCHIVO_DISPOSICION, encoding="utf-8") as f:
+                datos = json.load(f)
+            return cls(datos.get("esquema", "carpeta"), datos.get("niveles_hash", 0))
+        except (OSError, ValueError, TypeError):
+            return None
+
+
+def buscar_disposicion(directorio):
+    """
+    Encontrar la disposición que aplica a un directorio de XML.
+
+    Busca ``.disposicion.json`` en el propio directorio, en su subcarpeta
+    ``xml_facturacion`` y en los directorios padre.
+
+    Returns:
+        tuple: (raiz, DisposicionSalida) o (None, None) si no hay marcador
+    """
+    directorio = Path(directorio).resolve()
+    candidatos = [directorio / "xml_facturacion", directorio, *directorio.parents]
+    for candidato in candidatos:
+        if (candidato / ARCHIVO_DISPOSICION).is_file():
+            disposicion = DisposicionSalida.cargar(candidato)
+            if disposicion:
+                return candidato, disposicion
+    return None, None
+
+
+def agregar_argumentos_disposicion(parser):
+    """Registrar en un ArgumentParser las opciones de disposición de salida."""
+    parser.add_argument("--layout", choices=ESQUEMAS, default="carpeta",
+                        help="Organización de xml_facturacion/ (por defecto: carpeta)")
+    parser.add_argument("--hash-levels", type=int, default=0, choices=range(0, 4), metavar="N",
+                        help="Niveles de cubetas hexadecimales (256 por nivel) para acotar archivos por carpeta")
@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Clasificación de errores de Outlook COM y reintentos con espera exponencial.
+
+Bajo carga Outlook rechaza llamadas (RPC_E_CALL_REJECTED, "servidor
+ocupado") aunque el correo esté perfectamente bien. Este módulo:
+- clasifica cada excepción COM como transitoria, permanente o fatal,
+- reintenta las transitorias con espera exponencial y jitter,
+- limita los reintentos con un presupuesto por ejecución y un
+  cortacircuitos que pausa tras muchos fallos seguidos,
+- guarda los EntryID que no se pudieron leer para revisitarlos al final
+  de la ejecución en lugar de repetir todo el trabajo.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import random
+import time
+
+from config import (
+    COM_CIRCUIT_COOLDOWN_SECONDS,
+    COM_CIRCUIT_THRESHOLD,
+    COM_RETRY_BASE_DELAY,
+    COM_RETRY_BUDGET,
+    COM_RETRY_MAX_ATTEMPTS,
+    COM_RETRY_MAX_DELAY,
+)
+
+# Categorías de error
+TRANSITORIO = "transitorio"  # Reintentar: Outlook ocupado o sin recursos momentáneamente
+PERMANENTE = "permanente"  # No reintentar: el elemento está dañado o no es accesible
+FATAL = "fatal"  # Abortar: Outlook se cerró o el PST dejó de estar disponible
+
+# HRESULT (como enteros sin signo de 32 bits)
+HRESULTS_TRANSITORIOS = {
+    0x80010001,  # RPC_E_CALL_REJECTED
+    0x8001010A,  # RPC_E_SERVERCALL_RETRYLATER
+    0x8004010B,  # MAPI_E_BUSY
+    0x8004010E,  # MAPI_E_NOT_ENOUGH_RESOURCES
+    0x80040115,  # MAPI_E_NETWORK_ERROR
+    0x80040401,  # MAPI_E_TIMEOUT
+    0x8007000E,  # E_OUTOFMEMORY / MAPI_E_NOT_ENOUGH_MEMORY
+}
+
+HRESULTS_FATALES = {
+    0x80010007,  # RPC_E_SERVER_DIED
+    0x80010012,  # RPC_E_SERVER_DIED_DNE
+    0x80010108,  # RPC_E_DISCONNECTED
+    0x800706BA,  # RPC_S_SERVER_UNAVAILABLE
+    0x800706BE,  # RPC_S_CALL_FAILED
+}
+
+
+def _hresult_sin_signo(valor):
+    try:
+        return int(valor) & 0xFFFFFFFF
+    except (TypeError, ValueError):
+        return None
+
+
+def obtener_hresults(exc):
+    """
+    Extraer los HRESULT de una excepción COM (pywintypes.com_error).
+
+    Devuelve el HRESULT externo y, si existe, el scode interno de excepinfo,
+    que es donde Outlook suele informar la causa real.
+    """
+    codigos = []
+    externo = getattr(exc, "hresult", None)
+    if externo is None and getattr(exc, "args", None):
+        externo = exc.args[0]
+    externo = _hresult_sin_signo(externo)
+    if externo is not None:
+        codigos.append(externo)
+
+    excepinfo = getattr(exc, "excepinfo", None)
+    if excepinfo is None and len(getattr(exc, "args", ())) > 2:
+        excepinfo = exc.args[2]
+    if isinstance(excepinfo, tuple) and len(excepinfo) > 5:
+        interno = _hresult_sin_signo(excepinfo[5])
+        if interno:
+            codigos.append(interno)
+
+    return codigos
+
+
+def clasificar_error(exc):
+    """
+    Clasificar una excepción de Outlook COM.
+
+    Returns:
+        str: TRANSITORIO, PERMANENTE o FATAL
+    """
+    codigos = obtener_hresults(exc)
+    if any(c in HRESULTS_FATALES for c in codigos):
+        return FATAL
+    if any(c in HRESULTS_TRANSITORIOS for c in codigos):
+        return TRANSITORIO
+
+    # Sin código reconocible: buscar pistas en el mensaje (Outlook en inglés o español)
+    texto = str(exc).lower()
+    if any(p in texto for p in ("busy", "ocupado", "retry later", "call was rejected",
+                                "llamada fue rechazada", "rechazó la llamada")):
+        return TRANSITORIO
+    if any(p in texto for p in ("disconnected", "desconectado", "server is unavailable",
+                                "servidor no está disponible")):
+        return FATAL
+    return PERMANENTE
+
+
+def describir_error(exc):
+    """Texto corto con categoría y HRESULT para logs y reportes."""
+    codigos = obtener_hresults(exc)
+    codigo = f" [0x{codigos[-1]:08X}]" if codigos else ""
+    return f"{clasificar_error(exc)}{codigo}: {exc}"
+
+
+class CircuitoAbierto(Exception):
+    """El presupuesto de reintentos se agotó o hay demasiados fallos seguidos."""
+
+
+class ErrorFatalCOM(Exception):
+    """Outlook dejó de responder; no tiene sentido seguir la ejecución."""
+
+
+class PoliticaReintentos:
+    """Reintentos con espera exponencial, presupuesto global y cortacircuitos."""
+
+    def __init__(self, max_intentos=COM_RETRY_MAX_ATTEMPTS, espera_inicial=COM_RETRY_BASE_DELAY,
+                 espera_maxima=COM_RETRY_MAX_DELAY, presupuesto=COM_RETRY_BUDGET,
+                 umbral_circuito=COM_CIRCUIT_THRESHOLD, pausa_circuito=COM_CIRCUIT_COOLDOWN_SECONDS,
+                 dormir=time.sleep):
+        """
+        Inicializar la política.
+
+        Args:
+            max_intentos (int): Intentos por llamada (incluido el primero)
+            espera_inicial (float): Segundos de espera tras el primer fallo
+            espera_maxima (float): Tope de espera entre intentos
+            presupuesto (int): Reintentos totales permitidos en la ejecución
+            umbral_circuito (int): Fallos transitorios seguidos que abren el circuito
+            pausa_circuito (float): Segundos de pausa cuando el circuito se abre
+            dormir (callable): Función de espera (inyectable)
+        """
+        self.max_intentos = max(1, max_intentos)
+        self.espera_inicial = espera_inicial
+        self.espera_maxima = espera_maxima
+        self.presupuesto = presupuesto
+        self.umbral_circuito = umbral_circuito
+        self.pausa_circuito = pausa_circuito
+        self.dormir = dormir
+
+        self.reintentos = 0
+        self.fallos_seguidos = 0
+        self.aperturas_circuito = 0
+
+    @property
+    def presupuesto_agotado(self):
+        return self.reintentos >= self.presupuesto
+
+    def _espera(self, intento):
+        espera = min(self.espera_maxima, self.espera_inicial * (2 ** intento))
+        # Jitter completo para no sincronizar reintentos con otros clientes de Outlook
+        return random.uniform(espera / 2, espera)
+
+    def _registrar_fallo_transitorio(self):
+        self.fallos_seguidos += 1
+        if self.fallos_seguidos >= self.umbral_circuito:
+            # Outlook está saturado: dejarle respirar una vez antes de seguir (semiabierto)
+            self.aperturas_circuito += 1
+            self.fallos_seguidos = 0
+            print(f"⏸️ Outlook saturado; pausa de {self.pausa_circuito:.0f}s antes de continuar")
+            self.dormir(self.pausa_circuito)
+
+    def ejecutar(self, funcion, *args, **kwargs):
+        """
+        Ejecutar una llamada COM reintentando los errores transitorios.
+
+        Raises:
+            ErrorFatalCOM: Si el error indica que Outlook ya no está disponible
+            CircuitoAbierto: Si se agotó el presupuesto de reintentos
+            Exception: El error original si es permanente o se agotaron los intentos
+        """
+        intento = 0
+        while True:
+            try:
+                resultado = funcion(*args, **kwargs)
+                self.fallos_seguidos = 0
+                return resultado
+            except Exception as e:
+                categoria = clasificar_error(e)
+                if categoria == FATAL:
+                    raise ErrorFatalCOM(describir_error(e)) from e
+                if categoria != TRANSITORIO:
+                    raise
+
+                self._registrar_fallo_transitorio()
+                intento += 1
+                if intento >= self.max_intentos:
+                    raise
+                if self.presupuesto_agotado:
+                    raise CircuitoAbierto(
+                        f"Presupuesto de {self.presupuesto} reintentos agotado: {describir_error(e)}"
+                    ) from e
+
+                self.reintentos += 1
+                self.dormir(self._espera(intento - 1))
+
+
+class ColaReintentos:
+    """EntryID de elementos que fallaron de forma transitoria, para revisitarlos al final."""
+
+    def __init__(self):
+        self.pendientes = []
+        self._vistos = set()
+        self.recuperados = 0
+        self.perdidos = 0
+
+    def agregar(self, entry_id, ruta_carpeta, motivo):
+        """Registrar un elemento para reintento (sin duplicados)."""
+        if not entry_id or entry_id in self._vistos:
+            return False
+        self._vistos.add(entry_id)
+        self.pendientes.append((entry_id, ruta_carpeta, motivo))
+        return True
+
+    def __len__(self):
+        return len(self.pendientes)
+
+    def vaciar(self):
+        """Devolver y olvidar los elementos pendientes."""
+        pendientes, self.pendientes = self.pendientes, []
+        return pendientes
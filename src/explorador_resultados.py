@@ -0,0 +1,554 @@
+#!/usr/bin/env python3
+"""
+Explorador de resultados de una extracción.
+
+El log ``remitentes_pst.csv`` de un PST grande tiene cientos de miles de
+filas; cargarlo entero en una tabla de Tk (un ítem de Treeview por fila)
+congela la ventana durante minutos. Este explorador nunca carga el CSV:
+
+1. ``IndiceLog`` guarda solo la posición en bytes de cada línea (8 bytes
+   por fila) y lee las filas por páginas de ``EXPLORER_PAGE_ROWS`` cuando
+   se ven o se filtran; una caché LRU conserva las últimas páginas.
+2. La tabla tiene tantos ítems como filas caben en pantalla; al desplazarse
+   se reescriben sus valores con la página que corresponde.
+3. Los filtros por remitente, carpeta y fecha (``BusquedaIncremental``)
+   recorren el índice por tramos de ``EXPLORER_STEP_MS``; al escribir más
+   letras en un filtro se refinan los resultados anteriores en lugar de
+   volver a recorrer todo el log.
+4. Mientras la extracción sigue, cada ``EXPLORER_POLL_MS`` se indexan las
+   líneas nuevas del CSV y la tabla las muestra; si la vista está al final,
+   la sigue.
+
+Se abre desde la ventana de progreso ("Ver resultados") o por separado::
+
+    python explorador_resultados.py salida/
+    python explorador_resultados.py salida/remitentes_pst.csv --sender proveedor --since 2025-01-01
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import argparse
+import os
+import sys
+import time
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+
+from config import (
+    DEFAULT_LOG_NAMES, EXPLORER_CACHE_PAGES, EXPLORER_FILTER_DELAY_MS, EXPLORER_INDEX_CHUNK_MB,
+    EXPLORER_PAGE_ROWS, EXPLORER_POLL_MS, EXPLORER_STEP_MS,
+)
+from filtros_extraccion import parsear_fecha
+
+# Campos del log: archivo_xml,remitente,asunto,fecha_email,fecha_procesamiento,carpeta_origen,tamaño_bytes
+CAMPOS_LOG = 7
+CAMPO_REMITENTE = 1
+CAMPO_FECHA = 3
+CAMPO_CARPETA = 5
+
+# Fechas comparadas como texto: 'YYYY-MM-DD HH:MM' ordena igual que la fecha
+_FORMATO_FECHA = "%Y-%m-%d %H:%M"
+
+
+def parsear_linea(linea):
+    """Convertir una línea del log (bytes) en una tupla de CAMPOS_LOG textos."""
+    campos = linea.decode("utf-8", errors="replace").rstrip("\r\n").split(",")
+    if len(campos) > CAMPOS_LOG:
+        # registrar_en_log cambia las comas de los demás campos por ';': las que sobran son del nombre del XML
+        sobran = len(campos) - CAMPOS_LOG
+        campos = [",".join(campos[:sobran + 1])] + campos[sobran + 1:]
+    campos += [""] * (CAMPOS_LOG - len(campos))
+    return tuple(campos)
+
+
+class IndiceLog:
+    """Posición de cada línea del CSV y lectura por páginas con caché LRU."""
+
+    def __init__(self, ruta, filas_pagina=EXPLORER_PAGE_ROWS, paginas_cache=EXPLORER_CACHE_PAGES):
+        self.ruta = Path(ruta)
+        self.filas_pagina = max(1, int(filas_pagina))
+        self.paginas_cache = max(1, int(paginas_cache))
+        self._archivo = None
+        self._identidad = None
+        self._inicios = array("Q")
+        self._indexado = 0  # Bytes indexados: hasta el último salto de línea visto
+        self._paginas = OrderedDict()
+        self.pendiente = False  # Quedan bytes escritos sin indexar
+
+    def __len__(self):
+        return len(self._inicios)
+
+    def _reiniciar(self):
+        if self._archivo is not None:
+            self._archivo.close()
+            self._archivo = None
+        self._inicios = array("Q")
+        self._indexado = 0
+        self._paginas.clear()
+
+    def actualizar(self, max_bytes=EXPLORER_INDEX_CHUNK_MB * 1024 * 1024):
+        """
+        Indexar las líneas completas añadidas al CSV desde la última llamada.
+
+        Lee como mucho ``max_bytes``; ``pendiente`` indica si queda más por
+        indexar. Una línea a medio escribir se indexa en la llamada siguiente.
+
+        Returns:
+            int: Filas nuevas
+        """
+        try:
+            info = os.stat(self.ruta)
+        except FileNotFoundError:
+            self.pendiente = False
+            return 0
+        identidad = (info.st_dev, info.st_ino)
+        if identidad != self._identidad or info.st_size < self._indexado:
+            # Log nuevo (otra extracción sobre la misma salida): se empieza de cero
+            self._reiniciar()
+            self._identidad = identidad
+        if info.st_size == self._indexado:
+            self.pendiente = False
+            return 0
+
+        archivo = self._abrir()
+        archivo.seek(self._indexado)
+        bloque = archivo.read(min(max(1, int(max_bytes)), info.st_size - self._indexado))
+        ultimo = bloque.rfind(b"\n")
+        if ultimo < 0:
+            self.pendiente = False
+            return 0
+        base = self._indexado
+        posicion = bloque.find(b"\n") + 1 if base == 0 else 0  # Encabezado
+        antes = len(self._inicios)
+        while posicion <= ultimo:
+            self._inicios.append(base + posicion)
+            posicion = bloque.index(b"\n", posicion) + 1
+        self._indexado = base + ultimo + 1
+        self.pendiente = self._indexado < info.st_size
+        # La última página cacheada pudo quedar incompleta
+        self._paginas.pop(antes // self.filas_pagina, None)
+        return len(self._inicios) - antes
+
+    def _abrir(self):
+        if self._archivo is None:
+            self._archivo = open(self.ruta, "rb")
+        return self._archivo
+
+    def _pagina(self, numero):
+        pagina = self._paginas.get(numero)
+        if pagina is not None:
+            self._paginas.move_to_end(numero)
+            return pagina
+        primera = numero * self.filas_pagina
+        ultima = min(primera + self.filas_pagina, len(self._inicios))
+        inicio = self._inicios[primera]
+        fin = self._inicios[ultima] if ultima < len(self._inicios) else self._indexado
+        archivo = self._abrir()
+        archivo.seek(inicio)
+        pagina = [parsear_linea(linea) for linea in archivo.read(fin - inicio).splitlines()]
+        self._paginas[numero] = pagina
+        if len(self._paginas) > self.paginas_cache:
+            self._paginas.popitem(last=False)
+        return pagina
+
+    def fila(self, indice):
+        """Fila ``indice`` (0 = primera tras el encabezado) como tupla de textos."""
+        return self._pagina(indice // self.filas_pagina)[indice % self.filas_pagina]
+
+    def cerrar(self):
+        self._reiniciar()
+        self._identidad = None
+
+
+class FiltroResultados:
+    """Filtro de filas del log por remitente, carpeta (subcadenas) y fecha del correo."""
+
+    def __init__(self, remitente="", carpeta="", desde="", hasta=""):
+        """
+        Args:
+            remitente (str): Texto contenido en el remitente (sin distinguir mayúsculas)
+            carpeta (str): Texto contenido en la carpeta de origen
+            desde (str): Fecha mínima 'YYYY-MM-DD' o 'YYYY-MM-DD HH:MM'
+            hasta (str): Fecha máxima (un día suelto incluye el día entero)
+
+        Raises:
+            ValueError: Si alguna fecha no es válida
+        """
+        self.remitente = remitente.strip().casefold()
+        self.carpeta = carpeta.strip().casefold()
+        inicio = parsear_fecha(desde)
+        fin = parsear_fecha(hasta, fin_de_dia=True)
+        self.desde = inicio.strftime(_FORMATO_FECHA) if inicio else ""
+        self.hasta = fin.strftime(_FORMATO_FECHA) if fin else ""
+
+    @property
+    def vacio(self):
+        return not (self.remitente or self.carpeta or self.desde or self.hasta)
+
+    def admite(self, fila):
+        if self.remitente and self.remitente not in fila[CAMPO_REMITENTE].casefold():
+            return False
+        if self.carpeta and self.carpeta not in fila[CAMPO_CARPETA].casefold():
+            return False
+        if self.desde or self.hasta:
+            fecha = fila[CAMPO_FECHA][:16]
+            if not fecha[:4].isdigit():
+                return False
+            if self.desde and fecha < self.desde:
+                return False
+            if self.hasta and fecha >= self.hasta:
+                return False
+        return True
+
+    def restringe(self, anterior):
+        """True si toda fila que admite este filtro la admite ``anterior`` (basta refinar sus resultados)."""
+        return (anterior.remitente in self.remitente
+                and anterior.carpeta in self.carpeta
+                and self.desde >= anterior.desde
+                and (not anterior.hasta or (self.hasta and self.hasta <= anterior.hasta)))
+
+
+class BusquedaIncremental:
+    """Filas del índice que cumplen un filtro, calculadas por tramos de tiempo acotado."""
+
+    def __init__(self, indice, filtro, anterior=None):
+        """
+        Args:
+            indice (IndiceLog): Log indexado
+            filtro (FiltroResultados): Filtro a aplicar
+            anterior (BusquedaIncremental): Búsqueda previa; si terminó y el filtro nuevo
+                la restringe, solo se revisan sus coincidencias
+        """
+        self.indice = indice
+        self.filtro = filtro
+        self.coincidencias = array("Q")
+        self._candidatas = None
+        self._siguiente_candidata = 0
+        self._revisadas = 0  # Filas del índice ya revisadas (o cubiertas por las candidatas)
+        if (anterior is not None and not anterior.filtro.vacio and anterior.completa
+                and filtro.restringe(anterior.filtro)):
+            self._candidatas = anterior.coincidencias
+            self._revisadas = anterior._revisadas
+
+    @property
+    def completa(self):
+        if self.filtro.vacio:
+            return True
+        return self._candidatas is None and self._revisadas >= len(self.indice)
+
+    def __len__(self):
+        return len(self.indice) if self.filtro.vacio else len(self.coincidencias)
+
+    def __getitem__(self, posicion):
+        """Número de fila del índice que ocupa ``posicion`` en los resultados."""
+        return posicion if self.filtro.vacio else self.coincidencias[posicion]
+
+    def avanzar(self, segundos):
+        """Revisar filas hasta agotar ``segundos`` o alcanzar el final del índice."""
+        if self.filtro.vacio:
+            return
+        limite = time.monotonic() + segundos
+        admite = self.filtro.admite
+        fila = self.indice.fila
+        tramo = self.indice.filas_pagina
+        while self._candidatas is not None:
+            fin = min(self._siguiente_candidata + tramo, len(self._candidatas))
+            for posicion in range(self._siguiente_candidata, fin):
+                numero = self._candidatas[posicion]
+                if admite(fila(numero)):
+                    self.coincidencias.append(numero)
+            self._siguiente_candidata = fin
+            if fin >= len(self._candidatas):
+                self._candidatas = None
+            if time.monotonic() >= limite:
+                return
+        total = len(self.indice)
+        while self._revisadas < total:
+            fin = min(self._revisadas + tramo, total)
+            for numero in range(self._revisadas, fin):
+                if admite(fila(numero)):
+                    self.coincidencias.append(numero)
+            self._revisadas = fin
+            if time.monotonic() >= limite:
+                return
+
+
+class ExploradorResultados:
+    """Ventana con la tabla virtual del log, filtros y actualización en vivo."""
+
+    # (campo del log, título, ancho, alineación)
+    COLUMNAS = (
+        (0, "Archivo", 170, "w"),
+        (1, "Remitente", 190, "w"),
+        (2, "Asunto", 240, "w"),
+        (3, "Fecha del correo", 140, "w"),
+        (5, "Carpeta", 210, "w"),
+        (6, "Tamaño", 80, "e"),
+    )
+
+    def __init__(self, ruta_log, maestro=None, vaciar_log=None,
+                 remitente="", carpeta="", desde="", hasta=""):
+        """
+        Args:
+            ruta_log (str): remitentes_pst.csv de la extracción
+            maestro: Ventana Tk de la que cuelga el explorador (None = ventana propia)
+            vaciar_log: Función que vuelca al disco el log de una extracción en curso
+            remitente, carpeta, desde, hasta (str): Filtros iniciales
+        """
+        import tkinter as tk
+        from tkinter import ttk
+
+        self.indice = IndiceLog(ruta_log)
+        self.vaciar_log = vaciar_log
+        self.busqueda = BusquedaIncremental(self.indice, FiltroResultados())
+        self.primera = 0  # Posición en los resultados de la primera fila visible
+        self.visibles = 1
+        self.seguir_final = vaciar_log is not None  # En vivo, la vista sigue a las filas nuevas
+        self.seleccionada = None
+        self._items = []
+        self._alto_encabezado = 24
+        self._alto_fila = 20
+        self._filtro_programado = None
+        self._pintando = False
+        self.activa = False
+
+        self.ventana = tk.Toplevel(maestro) if maestro is not None else tk.Tk()
+        self.ventana.title(f"Resultados - {Path(ruta_log).parent.name or ruta_log}")
+        self.ventana.geometry("1060x560")
+        self.ventana.minsize(600, 300)
+
+        # Filtros
+        marco_filtros = tk.Frame(self.ventana)
+        marco_filtros.pack(fill="x", padx=10, pady=8)
+        self.variables = {}
+        self.entradas = {}
+        for clave, etiqueta, ancho, valor in (("remitente", "Remitente:", 24, remitente),
+                                             ("carpeta", "Carpeta:", 24, carpeta),
+                                             ("desde", "Desde:", 16, desde),
+                                             ("hasta", "Hasta:", 16, hasta)):
+            tk.Label(marco_filtros, text=etiqueta, font=("Arial", 9)).pack(side="left", padx=(6, 2))
+            variable = tk.StringVar(self.ventana, value=valor)
+            entrada = tk.Entry(marco_filtros, textvariable=variable, width=ancho)
+            entrada.pack(side="left")
+            variable.trace_add("write", self._filtro_cambiado)
+            self.variables[clave] = variable
+            self.entradas[clave] = entrada
+        self._color_entrada = self.entradas["desde"].cget("fg")
+        tk.Label(marco_filtros, text="(YYYY-MM-DD)", font=("Arial", 8), fg="gray").pack(side="left", padx=4)
+
+        # Tabla: solo tantos ítems como filas visibles, con barra de desplazamiento propia
+        marco_tabla = tk.Frame(self.ventana)
+        marco_tabla.pack(fill="both", expand=True, padx=10)
+        self.tabla = ttk.Treeview(marco_tabla, columns=[str(c[0]) for c in self.COLUMNAS],
+                                  show="headings", selectmode="browse")
+        for campo, titulo, ancho, alineacion in self.COLUMNAS:
+            self.tabla.heading(str(campo), text=titulo, anchor=alineacion)
+            self.tabla.column(str(campo), width=ancho, anchor=alineacion, stretch=campo != 6)
+        self.barra = ttk.Scrollbar(marco_tabla, orient="vertical", command=self._desplazar)
+        self.barra.pack(side="right", fill="y")
+        self.tabla.pack(side="left", fill="both", expand=True)
+
+        self.tabla.bind("<Configure>", self._recalcular_visibles)
+        self.tabla.bind("<<TreeviewSelect>>", self._al_seleccionar)
+        self.tabla.bind("<MouseWheel>", self._rueda)
+        self.tabla.bind("<Button-4>", lambda _e: self._mover(self.primera - 3))
+        self.tabla.bind("<Button-5>", lambda _e: self._mover(self.primera + 3))
+        for tecla, desplazamiento in (("<Up>", lambda: -1), ("<Down>", lambda: 1),
+                                      ("<Prior>", lambda: -self.visibles), ("<Next>", lambda: self.visibles)):
+            self.tabla.bind(tecla, lambda _e, d=desplazamiento: self._mover(self.primera + d()))
+        self.tabla.bind("<Home>", lambda _e: self._mover(0))
+        self.tabla.bind("<End>", lambda _e: self._mover(len(self.busqueda)))
+
+        # Estado
+        self.etiqueta_estado = tk.Label(self.ventana, text="Indexando...", font=("Arial", 9),
+                                        fg="gray", anchor="w")
+        self.etiqueta_estado.pack(fill="x", padx=10, pady=6)
+
+        self.ventana.bind("<Destroy>", self._al_destruir)
+        self.activa = True
+        if any((remitente, carpeta, desde, hasta)):
+            self._aplicar_filtro()
+        self.ventana.after(0, self._ciclo)
+
+    # === Ciclo de actualización ===
+
+    def _ciclo(self):
+        """Indexar filas nuevas, avanzar el filtro y repintar, sin pasar de EXPLORER_STEP_MS."""
+        if not self.activa:
+            return
+        limite = time.monotonic() + EXPLORER_STEP_MS / 1000
+        try:
+            if self.vaciar_log is not None:
+                self.vaciar_log()
+            while self.indice.actualizar() and self.indice.pendiente and time.monotonic() < limite:
+                pass
+            self.busqueda.avanzar(max(0.0, limite - time.monotonic()))
+            self._pintar()
+        except OSError as e:
+            self.etiqueta_estado.config(text=f"⚠️ No se pudo leer {self.indice.ruta}: {e}")
+        # Con trabajo pendiente se sigue en el próximo tramo; si no, se espera a filas nuevas
+        ocupado = self.indice.pendiente or not self.busqueda.completa
+        self.ventana.after(EXPLORER_STEP_MS if ocupado else EXPLORER_POLL_MS, self._ciclo)
+
+    def _al_destruir(self, evento):
+        if evento.widget is self.ventana:
+            self.activa = False
+            self.indice.cerrar()
+
+    # === Filtros ===
+
+    def _filtro_cambiado(self, *_args):
+        if self._filtro_programado is not None:
+            self.ventana.after_cancel(self._filtro_programado)
+        self._filtro_programado = self.ventana.after(EXPLORER_FILTER_DELAY_MS, self._aplicar_filtro)
+
+    def _aplicar_filtro(self):
+        self._filtro_programado = None
+        textos = {clave: variable.get() for clave, variable in self.variables.items()}
+        invalidas = []
+        for clave in ("desde", "hasta"):
+            try:
+                parsear_fecha(textos[clave])
+            except ValueError:
+                invalidas.append(clave)
+            self.entradas[clave].config(fg="red" if clave in invalidas else self._color_entrada)
+        if invalidas:
+            self.etiqueta_estado.config(text="⚠️ Fecha inválida (use YYYY-MM-DD o 'YYYY-MM-DD HH:MM')")
+            return
+        filtro = FiltroResultados(**textos)
+        self.busqueda = BusquedaIncremental(self.indice, filtro, anterior=self.busqueda)
+        self.seleccionada = None
+        if not self.seguir_final:
+            self.primera = 0
+        self.busqueda.avanzar(EXPLORER_STEP_MS / 1000)
+        self._pintar()
+
+    # === Desplazamiento ===
+
+    def _recalcular_visibles(self, _evento=None):
+        if self._items:
+            caja = self.tabla.bbox(self._items[0])
+            if caja:
+                self._alto_encabezado, self._alto_fila = caja[1], max(1, caja[3])
+        alto = self.tabla.winfo_height()
+        visibles = max(1, (alto - self._alto_encabezado) // self._alto_fila)
+        while len(self._items) < visibles:
+            self._items.append(self.tabla.insert("", "end", values=()))
+        while len(self._items) > visibles:
+            self.tabla.delete(self._items.pop())
+        self.visibles = visibles
+        self._mover(self.primera)
+
+    def _desplazar(self, accion, cantidad, unidad=None):
+        """Órdenes de la barra de desplazamiento: ('moveto', fracción) o ('scroll', n, 'units'|'pages')."""
+        if accion == "moveto":
+            self._mover(round(float(cantidad) * len(self.busqueda)))
+        elif accion == "scroll":
+            paso = self.visibles if unidad == "pages" else 1
+            self._mover(self.primera + int(cantidad) * paso)
+
+    def _rueda(self, evento):
+        # Windows da múltiplos de 120; macOS, unidades sueltas
+        pasos = evento.delta // 120 if abs(evento.delta) >= 120 else evento.delta
+        return self._mover(self.primera - 3 * pasos)
+
+    def _mover(self, primera):
+        total = len(self.busqueda)
+        ultima_primera = max(0, total - self.visibles)
+        self.primera = max(0, min(int(primera), ultima_primera))
+        self.seguir_final = self.primera >= ultima_primera
+        self._pintar()
+        return "break"  # Treeview no debe desplazarse por su cuenta: sus ítems son solo los visibles
+
+    def _al_seleccionar(self, _evento):
+        if self._pintando:
+            return
+        seleccion = self.tabla.selection()
+        if seleccion and seleccion[0] in self._items:
+            self.seleccionada = self.primera + self._items.index(seleccion[0])
+
+    # === Pintado ===
+
+    def _pintar(self):
+        total = len(self.busqueda)
+        if self.seguir_final:
+            self.primera = max(0, total - self.visibles)
+        self._pintando = True
+        try:
+            for desplazamiento, item in enumerate(self._items):
+                posicion = self.primera + desplazamiento
+                if posicion < total:
+                    fila = self.indice.fila(self.busqueda[posicion])
+                    valores = [fila[campo] for campo, *_ in self.COLUMNAS]
+                    if valores[-1].isdigit():
+                        valores[-1] = f"{int(valores[-1]):,}"
+                else:
+                    valores = ()
+                self.tabla.item(item, values=valores)
+                if posicion == self.seleccionada:
+                    self.tabla.selection_set(item)
+                elif item in self.tabla.selection():
+                    self.tabla.selection_remove(item)
+            self.tabla.yview_moveto(0)
+        finally:
+            self._pintando = False
+
+        if total:
+            self.barra.set(self.primera / total, min(1.0, (self.primera + self.visibles) / total))
+        else:
+            self.barra.set(0.0, 1.0)
+
+        filas = len(self.indice)
+        if self.busqueda.filtro.vacio:
+            texto = f"{filas:,} XML"
+        else:
+            texto = f"{total:,} de {filas:,} XML cumplen el filtro"
+        if self.indice.pendiente:
+            texto += "  ·  indexando el log..."
+        elif not self.busqueda.completa:
+            texto += "  ·  filtrando..."
+        if self.vaciar_log is not None:
+            texto += "  ·  en vivo"
+        self.etiqueta_estado.config(text=texto)
+
+
+def main():
+    """Abrir el explorador sobre el log de una extracción."""
+    parser = argparse.ArgumentParser(
+        description="Explorar el log de una extracción (remitentes_pst.csv) sin cargarlo entero en memoria",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ejemplos de uso:
+  %(prog)s salida/
+  %(prog)s salida/remitentes_pst.csv --sender proveedor --since 2025-01-01
+
+Si la extracción sigue en curso, las filas nuevas aparecen a medida que se escriben.
+        """,
+    )
+    parser.add_argument("ruta", help="Directorio de salida de la extracción o su remitentes_pst.csv")
+    parser.add_argument("--sender", default="", help="Mostrar solo remitentes que contengan este texto")
+    parser.add_argument("--folder", default="", help="Mostrar solo carpetas de origen que contengan este texto")
+    parser.add_argument("--since", default="", help="Correos desde esta fecha (YYYY-MM-DD o 'YYYY-MM-DD HH:MM')")
+    parser.add_argument("--until", default="", help="Correos hasta esta fecha (incluida si es un día)")
+    args = parser.parse_args()
+
+    ruta = Path(args.ruta)
+    if ruta.is_dir():
+        ruta = ruta / DEFAULT_LOG_NAMES["pst"]
+    if not ruta.exists():
+        parser.error(f"No existe el log {ruta}")
+    try:
+        FiltroResultados(args.sender, args.folder, args.since, args.until)
+    except ValueError as e:
+        parser.error(str(e))
+
+    explorador = ExploradorResultados(ruta, remitente=args.sender, carpeta=args.folder,
+                                      desde=args.since, hasta=args.until)
+    explorador.ventana.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
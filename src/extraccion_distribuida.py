@@ -0,0 +1,721 @@
+#!/usr/bin/env python3
+"""
+Extracción distribuida de un PST grande entre varios procesos o equipos.
+
+Un PST de archivo de 100 GB tarda demasiado aunque la escritura vaya en
+paralelo: la lectura de un único proceso es el cuello de botella. Con el
+lector nativo (``lector_pst.py``) varios procesos pueden leer el mismo
+PST a la vez, así que el trabajo se reparte así:
+
+1. ``planificar``: recorre la jerarquía de carpetas (aplicando los
+   filtros de carpeta) y divide cada tabla de contenido en tramos de
+   ``DIST_UNIT_MESSAGES`` filas. Las unidades quedan en
+   ``<salida>/distribucion/manifiesto.json`` junto con los filtros, la
+   disposición y la compresión, para que todos los trabajadores usen la
+   misma configuración.
+2. ``trabajar``: cada trabajador (en este u otro equipo que vea el mismo
+   directorio de salida) reclama unidades creando en exclusiva
+   ``reclamos/<unidad>.json`` y renueva su fecha cada
+   ``DIST_HEARTBEAT_SECONDS``. Un reclamo sin renovar durante
+   ``DIST_CLAIM_TIMEOUT_SECONDS`` se considera abandonado y otro
+   trabajador lo toma (si tras retirarlo resulta estar vigente, lo
+   devuelve). Un trabajador solo renueva o borra los reclamos que llevan
+   su nombre; si su latido ve que el reclamo ya es de otro, interrumpe la
+   unidad, borra lo que había escrito y no deja resumen. Cada intento de
+   una unidad escribe en ``registros/`` su CSV, su JSONL de errores y un
+   diario con cada XML creado (``<unidad>.<trabajador>.*``); al reclamar
+   una unidad se borran los XML y registros de intentos anteriores, y al
+   terminar se deja el resumen en ``hechos/``.
+3. ``combinar``: une los registros en ``remitentes_pst.csv`` y
+   ``reportes/errores.jsonl`` en el orden del manifiesto (y, dentro de cada
+   unidad, ordenados; solo los del intento que dejó el resumen) y genera
+   el reporte, de modo que el resultado no depende de qué trabajador hizo
+   cada unidad.
+
+Los XML van directamente a ``xml_facturacion/``: los nombres únicos se
+crean en modo exclusivo, seguro entre procesos. Solo se admite salida en
+archivos sueltos (los paquetes zip/tar tienen un índice único).
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+
+from almacen_comprimido import FORMATOS_COMPRESION, ZSTD_AVAILABLE
+from config import (
+    ATTACHMENT_RULE_SETS,
+    ATTACHMENT_RULES_DEFAULT,
+    DIST_CLAIM_TIMEOUT_SECONDS,
+    DIST_HEARTBEAT_SECONDS,
+    DIST_UNIT_MESSAGES,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_WRITER_THREADS,
+    PST_CACHE_MB,
+)
+from disposicion_salida import DisposicionSalida, agregar_argumentos_disposicion, sanitizar_componente
+from extractor_xml_pst_gui import ORDENES_LECTURA, ExtractorXMLPSTGUI
+from filtros_extraccion import FiltroExtraccion, agregar_argumentos_filtro, filtro_desde_argumentos
+from lector_pst import AlmacenPST
+from limitador_io import agregar_argumentos_io, configurar_limites_desde_argumentos
+from reglas_adjuntos import ReglasAdjuntos
+
+DIRECTORIO_DISTRIBUCION = "distribucion"
+VERSION_MANIFIESTO = 1
+# Registros de cada intento de una unidad: CSV, errores y diario de XML creados
+SUFIJOS_INTENTO = (".csv", ".errores.jsonl", ".salidas.txt")
+CABECERA_LOG = "archivo_xml,remitente,asunto,fecha_email,fecha_procesamiento,carpeta_origen,tamaño_bytes\n"
+
+
+def directorio_distribucion(salida):
+    return Path(salida) / DIRECTORIO_DISTRIBUCION
+
+
+def escribir_json_atomico(ruta, datos):
+    """Escribir un JSON de forma que nadie lea nunca un archivo a medias."""
+    temporal = ruta.with_name(f"{ruta.name}.{socket.gethostname()}-{os.getpid()}.tmp")
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=1)
+    os.replace(temporal, ruta)
+
+
+def crear_exclusivo(ruta, datos):
+    """Crear un archivo JSON solo si no existe (FileExistsError si otro llegó antes)."""
+    descriptor = os.open(ruta, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    with os.fdopen(descriptor, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False)
+
+
+def prefijo_intento(id_unidad, trabajador):
+    """Prefijo de los registros de un intento de una unidad: ``<unidad>.<trabajador>``."""
+    return f"{id_unidad}.{sanitizar_componente(trabajador, por_defecto='trabajador')}"
+
+
+def dueno_reclamo(ruta):
+    """Trabajador que figura en un reclamo (None si no existe o no se puede leer)."""
+    try:
+        with open(ruta, encoding="utf-8") as f:
+            return json.load(f).get("trabajador")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def cargar_manifiesto(salida):
+    ruta = directorio_distribucion(salida) / "manifiesto.json"
+    if not ruta.exists():
+        raise FileNotFoundError(f"No hay manifiesto en {ruta.parent}; ejecute primero 'planificar'")
+    with open(ruta, encoding="utf-8") as f:
+        manifiesto = json.load(f)
+    if manifiesto.get("version") != VERSION_MANIFIESTO:
+        raise ValueError(f"Versión de manifiesto no soportada ({manifiesto.get('version')})")
+    return manifiesto
+
+
+def planificar(pst_file, salida, filtro=None, disposicion=None, compresion="ninguna",
+               orden_lectura="desplazamiento", mensajes_por_unidad=DIST_UNIT_MESSAGES,
+               reglas=ATTACHMENT_RULES_DEFAULT):
+    """
+    Dividir el PST en unidades de trabajo y escribir el manifiesto.
+
+    Args:
+        pst_file (str): Archivo PST
+        salida (str): Directorio de salida compartido por todos los trabajadores
+        filtro (FiltroExtraccion): Filtros de la extracción
+        disposicion (DisposicionSalida): Organización de xml_facturacion/
+        compresion (str): 'ninguna', 'gzip' o 'zstd'
+        orden_lectura (str): Orden de lectura de adjuntos de cada trabajador
+        mensajes_por_unidad (int): Filas de la tabla de contenido por unidad
+        reglas (str): Conjunto de reglas de adjuntos de config.ATTACHMENT_RULE_SETS
+
+    Returns:
+        dict: Manifiesto escrito
+    """
+    if mensajes_por_unidad < 1:
+        raise ValueError("mensajes_por_unidad debe ser al menos 1")
+    pst_file = Path(pst_file).resolve()
+    filtro = filtro or FiltroExtraccion()
+    disposicion = disposicion or DisposicionSalida()
+    directorio = directorio_distribucion(salida)
+    if (directorio / "manifiesto.json").exists():
+        raise FileExistsError(f"Ya existe un manifiesto en {directorio}; use otro directorio de salida")
+
+    unidades = []
+    omitidas = []
+    with AlmacenPST(pst_file, cache_mb=PST_CACHE_MB) as pst:
+        nombre_raiz = pst.nombre_almacen() or pst_file.stem
+
+        # Mismo orden (preorden) y mismas podas que la extracción secuencial
+        def recorrer(nid, ruta):
+            if filtro.carpeta_descartable(ruta):
+                omitidas.append(ruta)
+                return
+            if filtro.carpeta_permitida(ruta):
+                total = pst.num_mensajes(nid)
+                for desde in range(0, total, mensajes_por_unidad):
+                    unidades.append({
+                        "id": f"u{len(unidades) + 1:06d}",
+                        "carpeta": nid,
+                        "ruta": ruta,
+                        "desde": desde,
+                        "hasta": min(desde + mensajes_por_unidad, total),
+                    })
+            for nid_sub, nombre in pst.subcarpetas(nid):
+                recorrer(nid_sub, f"{ruta}/{nombre}")
+
+        recorrer(pst.nid_subarbol_ipm(), nombre_raiz)
+
+    estado = pst_file.stat()
+    manifiesto = {
+        "version": VERSION_MANIFIESTO,
+        "creado": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "pst": str(pst_file),
+        "tamano_pst": estado.st_size,
+        "modificado_pst": estado.st_mtime,
+        "filtro": filtro.como_dict(),
+        "disposicion": {"esquema": disposicion.esquema, "niveles_hash": disposicion.niveles_hash},
+        "compresion": compresion,
+        "orden_lectura": orden_lectura,
+        "reglas": reglas,
+        "mensajes_por_unidad": mensajes_por_unidad,
+        "carpetas_omitidas": omitidas,
+        "unidades": unidades,
+    }
+
+    for subdirectorio in ("reclamos", "hechos", "registros"):
+        (directorio / subdirectorio).mkdir(parents=True, exist_ok=True)
+    # Preparar la salida una sola vez (los trabajadores no tocan .disposicion.json)
+    ExtractorXMLPSTGUI(pst_file, salida, disposicion=disposicion, interactivo=False).setup_directories()
+    escribir_json_atomico(directorio / "manifiesto.json", manifiesto)
+
+    mensajes = sum(u["hasta"] - u["desde"] for u in unidades)
+    print(f"🗺️ Manifiesto creado: {len(unidades):,} unidades ({mensajes:,} correos) en {directorio}")
+    if omitidas:
+        print(f"⏭️ {len(omitidas)} carpetas omitidas por filtro")
+    return manifiesto
+
+
+class TrabajadorDistribuido:
+    """Proceso que reclama unidades del manifiesto y las extrae con el lector nativo."""
+
+    def __init__(self, salida, id_trabajador=None, pst_file=None, hilos_escritura=PIPELINE_WRITER_THREADS,
+                 tamano_cola=PIPELINE_QUEUE_SIZE, cache_pst_mb=PST_CACHE_MB):
+        """
+        Inicializar el trabajador.
+
+        Args:
+            salida (str): Directorio de salida con el manifiesto
+            id_trabajador (str): Nombre en reclamos y reportes (por defecto equipo-pid)
+            pst_file (str): Ruta del PST en este equipo (por defecto la del manifiesto)
+            hilos_escritura (int): Hilos que escriben los XML de cada unidad
+            tamano_cola (int): Adjuntos en memoria como máximo
+            cache_pst_mb (int): Memoria de la caché del lector nativo
+        """
+        self.salida = Path(salida)
+        self.directorio = directorio_distribucion(salida)
+        self.manifiesto = cargar_manifiesto(salida)
+        self.id = id_trabajador or f"{socket.gethostname()}-{os.getpid()}"
+        self.pst_file = Path(pst_file or self.manifiesto["pst"])
+        self.hilos_escritura = hilos_escritura
+        self.tamano_cola = tamano_cola
+        self.cache_pst_mb = cache_pst_mb
+
+        self.unidades_procesadas = 0
+        self.correos_procesados = 0
+        self.xml_extraidos = 0
+        self._reclamo_actual = None
+        # Se activa cuando el latido ve que el reclamo en curso pasó a otro trabajador
+        self._reclamo_perdido = threading.Event()
+        self._detener = threading.Event()
+
+    def _ruta_reclamo(self, id_unidad):
+        return self.directorio / "reclamos" / f"{id_unidad}.json"
+
+    def _ruta_hecho(self, id_unidad):
+        return self.directorio / "hechos" / f"{id_unidad}.json"
+
+    def comprobar_pst(self):
+        """Verificar que el PST visto por este equipo es el mismo que se planificó."""
+        if not self.pst_file.is_file():
+            raise FileNotFoundError(f"El PST no existe en este equipo: {self.pst_file} (use --input-pst)")
+        if self.pst_file.stat().st_size != self.manifiesto["tamano_pst"]:
+            raise ValueError(f"El tamaño de {self.pst_file} no coincide con el del manifiesto; "
+                             "el PST cambió desde la planificación")
+
+    def reclamar(self, id_unidad):
+        """
+        Intentar reclamar una unidad.
+
+        Returns:
+            bool: True si este trabajador la procesa
+        """
+        if self._ruta_hecho(id_unidad).exists():
+            return False
+        ruta = self._ruta_reclamo(id_unidad)
+        datos = {"trabajador": self.id, "desde": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+        try:
+            crear_exclusivo(ruta, datos)
+        except FileExistsError:
+            try:
+                edad = time.time() - ruta.stat().st_mtime
+            except FileNotFoundError:
+                return False  # Se liberó justo ahora; se reintenta en la siguiente pasada
+            if edad < DIST_CLAIM_TIMEOUT_SECONDS:
+                return False
+            # Reclamo abandonado: solo un trabajador consigue renombrarlo
+            vencido = ruta.with_name(f"{ruta.name}.vencido-{self.id}")
+            try:
+                os.rename(ruta, vencido)
+            except OSError:
+                return False
+            # Entre el stat y el rename otro trabajador pudo renovarlo o retomarlo: lo renombrado
+            # sería su reclamo vigente, no el abandonado
+            try:
+                edad = time.time() - vencido.stat().st_mtime
+            except FileNotFoundError:
+                return False
+            if edad < DIST_CLAIM_TIMEOUT_SECONDS:
+                self._devolver_reclamo(vencido, ruta)
+                return False
+            os.remove(vencido)
+            print(f"⚠️ Reclamo de {id_unidad} sin renovar desde hace {edad:.0f} s; se retoma")
+            try:
+                crear_exclusivo(ruta, datos)
+            except FileExistsError:
+                return False
+
+        # El anterior dueño pudo terminar entre la comprobación y el reclamo
+        if self._ruta_hecho(id_unidad).exists():
+            self.liberar(id_unidad)
+            return False
+        self._reclamo_perdido.clear()
+        self._reclamo_actual = ruta
+        return True
+
+    def limpiar_intentos(self, id_unidad, conservar=None, solo=None):
+        """
+        Borrar los XML y registros de intentos de una unidad.
+
+        Un trabajador caído (o que perdió su reclamo) deja XML a medias: si no
+        se borran, la repetición los duplica con sufijo ``_001``.
+
+        Args:
+            id_unidad (str): Unidad
+            conservar (str): Prefijo del intento en curso, que no se toca
+            solo (str): Borrar únicamente este intento
+
+        Returns:
+            int: XML borrados
+        """
+        registros = self.directorio / "registros"
+        previos = []
+        for registro in registros.iterdir():
+            if not registro.name.startswith(f"{id_unidad}."):
+                continue
+            sufijo = next((s for s in SUFIJOS_INTENTO if registro.name.endswith(s)), None)
+            intento = registro.name[:-len(sufijo)] if sufijo else None
+            if intento is None or intento == conservar or (solo is not None and intento != solo):
+                continue
+            previos.append(registro)
+        borrados = 0
+        for registro in previos:
+            if not registro.name.endswith(".salidas.txt"):
+                continue
+            with open(registro, encoding="utf-8") as f:
+                for linea in f:
+                    if not linea.strip():
+                        continue
+                    try:
+                        (self.salida / linea.strip()).unlink()
+                        borrados += 1
+                    except FileNotFoundError:
+                        pass
+        for registro in previos:
+            try:
+                registro.unlink()
+            except FileNotFoundError:
+                pass
+        if borrados:
+            print(f"🧹 {id_unidad}: {borrados:,} XML de otro intento borrados")
+        return borrados
+
+    @staticmethod
+    def _devolver_reclamo(vencido, ruta):
+        """Restaurar un reclamo vigente retirado por error, sin pisar uno creado mientras tanto."""
+        try:
+            os.link(vencido, ruta)
+        except FileExistsError:
+            pass
+        except OSError:
+            # Sistemas de archivos sin enlaces duros; en Windows rename tampoco sobrescribe
+            if not ruta.exists():
+                try:
+                    os.rename(vencido, ruta)
+                except OSError:
+                    pass
+        try:
+            os.remove(vencido)
+        except FileNotFoundError:
+            pass
+
+    def liberar(self, id_unidad):
+        self._reclamo_actual = None
+        ruta = self._ruta_reclamo(id_unidad)
+        # Si otro trabajador retomó la unidad, el reclamo es suyo y no se toca
+        if dueno_reclamo(ruta) != self.id:
+            return
+        try:
+            ruta.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _latir(self):
+        """Renovar la fecha del reclamo en curso para que nadie lo dé por abandonado."""
+        while not self._detener.wait(DIST_HEARTBEAT_SECONDS):
+            reclamo = self._reclamo_actual
+            if reclamo is None:
+                continue
+            dueno = dueno_reclamo(reclamo)
+            if dueno is None:
+                continue  # Ilegible o retirado un instante por otro trabajador: se renueva en el próximo latido
+            if dueno != self.id:
+                # Renovar un reclamo ajeno lo mantendría vivo aunque su dueño caiga
+                print(f"⚠️ El reclamo {reclamo.name} ya no es de {self.id}; se interrumpe la unidad", flush=True)
+                if self._reclamo_actual is reclamo:
+                    self._reclamo_perdido.set()
+                    self._reclamo_actual = None
+                continue
+            try:
+                os.utime(reclamo)
+            except OSError:
+                pass
+
+    def procesar_unidad(self, pst, unidad):
+        """Extraer una unidad y dejar su resumen en hechos/ (nada si se pierde el reclamo)."""
+        manifiesto = self.manifiesto
+        intento = prefijo_intento(unidad["id"], self.id)
+        self.limpiar_intentos(unidad["id"])
+        extractor = ExtractorXMLPSTGUI(
+            self.pst_file, self.salida,
+            filtro=FiltroExtraccion.desde_dict(manifiesto["filtro"]),
+            hilos_escritura=self.hilos_escritura, tamano_cola=self.tamano_cola,
+            disposicion=DisposicionSalida(manifiesto["disposicion"]["esquema"],
+                                          manifiesto["disposicion"]["niveles_hash"]),
+            compresion=manifiesto["compresion"], interactivo=False, lector="nativo",
+            orden_lectura=manifiesto["orden_lectura"], cache_pst_mb=self.cache_pst_mb,
+            reglas=ReglasAdjuntos(nombre=manifiesto.get("reglas")),
+        )
+        registros = self.directorio / "registros"
+        extractor.log_file = registros / f"{intento}.csv"
+        extractor.inicializar_log()
+        extractor.errors.abrir(registros / f"{intento}.errores.jsonl")
+        extractor.diario_salidas = open(registros / f"{intento}.salidas.txt", "w", encoding="utf-8")
+        extractor.cancelacion = self._reclamo_perdido
+
+        inicio = time.monotonic()
+        fallo = None
+        try:
+            extractor.extraer_tramo_nativo(pst, unidad["carpeta"], unidad["ruta"], unidad["desde"], unidad["hasta"])
+        except Exception as e:
+            # Un tramo ilegible se registra como fallo en lugar de reintentarse sin fin
+            fallo = str(e)
+            extractor.errors.registrar("unidad", f"Error procesando la unidad {unidad['id']} "
+                                                 f"({unidad['ruta']}): {e}", carpeta=unidad["ruta"])
+        finally:
+            extractor.cerrar_log()
+            extractor.errors.cerrar()
+            extractor.diario_salidas.close()
+
+        if self._reclamo_perdido.is_set() or dueno_reclamo(self._ruta_reclamo(unidad["id"])) not in (self.id, None):
+            # Otro trabajador retomó la unidad: este intento no cuenta y su salida sobra
+            self.limpiar_intentos(unidad["id"], solo=intento)
+            print(f"⏹️ [{self.id}] {unidad['id']} interrumpida: la unidad la procesa otro trabajador")
+            return
+        # Lo que un dueño anterior alcanzara a escribir después de la primera limpieza
+        self.limpiar_intentos(unidad["id"], conservar=intento)
+
+        hecho = {
+            "id": unidad["id"],
+            "trabajador": self.id,
+            "terminado": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "segundos": round(time.monotonic() - inicio, 3),
+            "correos": extractor.processed_emails,
+            "xml": extractor.extracted_xml_files,
+            "errores": len(extractor.errors),
+            "errores_por_categoria": dict(extractor.errors.por_categoria),
+            "lecturas": extractor.lecturas_pst[0] if extractor.lecturas_pst else 0,
+            "fallo": fallo,
+        }
+        escribir_json_atomico(self._ruta_hecho(unidad["id"]), hecho)
+
+        self.unidades_procesadas += 1
+        self.correos_procesados += extractor.processed_emails
+        self.xml_extraidos += extractor.extracted_xml_files
+        marca = "❌" if fallo else "✅"
+        print(f"{marca} [{self.id}] {unidad['id']} {unidad['ruta']} [{unidad['desde']}, {unidad['hasta']}): "
+              f"{extractor.processed_emails:,} correos, {extractor.extracted_xml_files:,} XML")
+
+    def pendientes(self):
+        return [u for u in self.manifiesto["unidades"] if not self._ruta_hecho(u["id"]).exists()]
+
+    def ejecutar(self, esperar=False):
+        """
+        Procesar unidades hasta que no quede ninguna por reclamar.
+
+        Args:
+            esperar (bool): Seguir sondeando mientras otros trabajadores tengan unidades
+                en curso, para retomarlas si sus reclamos vencen
+        """
+        self.comprobar_pst()
+        latido = threading.Thread(target=self._latir, name="latido-reclamo", daemon=True)
+        latido.start()
+        try:
+            with AlmacenPST(self.pst_file, cache_mb=self.cache_pst_mb) as pst:
+                while not self._detener.is_set():
+                    reclamadas = 0
+                    for unidad in self.pendientes():
+                        if self._detener.is_set():
+                            break
+                        if not self.reclamar(unidad["id"]):
+                            continue
+                        reclamadas += 1
+                        try:
+                            self.procesar_unidad(pst, unidad)
+                        finally:
+                            self.liberar(unidad["id"])
+                    if reclamadas:
+                        continue
+                    # Lo que queda está reclamado por otros: esperar a que terminen o venzan
+                    if not esperar or not self.pendientes():
+                        break
+                    self._detener.wait(min(DIST_HEARTBEAT_SECONDS, 5))
+        finally:
+            self._detener.set()
+            latido.join()
+
+    def detener(self, *_args):
+        self._detener.set()
+
+
+def estado(salida):
+    """Resumen del avance: unidades hechas, en curso y pendientes."""
+    manifiesto = cargar_manifiesto(salida)
+    directorio = directorio_distribucion(salida)
+    hechas, en_curso = 0, Counter()
+    for unidad in manifiesto["unidades"]:
+        if (directorio / "hechos" / f"{unidad['id']}.json").exists():
+            hechas += 1
+            continue
+        reclamo = directorio / "reclamos" / f"{unidad['id']}.json"
+        try:
+            with open(reclamo, encoding="utf-8") as f:
+                en_curso[json.load(f)["trabajador"]] += 1
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+    total = len(manifiesto["unidades"])
+    return {
+        "total": total,
+        "hechas": hechas,
+        "en_curso": dict(en_curso),
+        "pendientes": total - hechas - sum(en_curso.values()),
+    }
+
+
+def combinar(salida, forzar=False):
+    """
+    Unir registros y errores de todas las unidades y generar el reporte.
+
+    Args:
+        salida (str): Directorio de salida con el manifiesto
+        forzar (bool): Combinar aunque falten unidades (quedan listadas en el reporte)
+
+    Returns:
+        dict: Totales de la extracción
+    """
+    salida = Path(salida)
+    manifiesto = cargar_manifiesto(salida)
+    directorio = directorio_distribucion(salida)
+    registros = directorio / "registros"
+
+    hechos = {}
+    for unidad in manifiesto["unidades"]:
+        ruta = directorio / "hechos" / f"{unidad['id']}.json"
+        if ruta.exists():
+            with open(ruta, encoding="utf-8") as f:
+                hechos[unidad["id"]] = json.load(f)
+    faltan = [u["id"] for u in manifiesto["unidades"] if u["id"] not in hechos]
+    if faltan and not forzar:
+        raise RuntimeError(f"Faltan {len(faltan):,} de {len(manifiesto['unidades']):,} unidades "
+                           f"(primera: {faltan[0]}); espere a los trabajadores o use --force")
+
+    # Registros del intento que dejó cada resumen, en el orden del manifiesto; dentro de
+    # cada unidad, ordenados (los hilos de escritura terminan en cualquier orden)
+    intentos = {id_unidad: prefijo_intento(id_unidad, hecho["trabajador"]) for id_unidad, hecho in hechos.items()}
+    with open(salida / "remitentes_pst.csv", "w", encoding="utf-8") as log:
+        log.write(CABECERA_LOG)
+        for unidad in manifiesto["unidades"]:
+            ruta = registros / f"{intentos.get(unidad['id'])}.csv"
+            if unidad["id"] in hechos and ruta.exists():
+                with open(ruta, encoding="utf-8") as f:
+                    log.writelines(sorted(f.readlines()[1:]))
+
+    with open(salida / "reportes" / "errores.jsonl", "w", encoding="utf-8") as errores:
+        for unidad in manifiesto["unidades"]:
+            ruta = registros / f"{intentos.get(unidad['id'])}.errores.jsonl"
+            if unidad["id"] in hechos and ruta.exists():
+                with open(ruta, encoding="utf-8") as f:
+                    errores.writelines(sorted(f.readlines()))
+
+    totales = Counter()
+    por_categoria = Counter()
+    por_trabajador = {}
+    for id_unidad in sorted(hechos):
+        hecho = hechos[id_unidad]
+        for campo in ("correos", "xml", "errores", "lecturas"):
+            totales[campo] += hecho.get(campo, 0)
+        por_categoria.update(hecho.get("errores_por_categoria", {}))
+        trabajador = por_trabajador.setdefault(hecho["trabajador"], Counter())
+        trabajador.update(unidades=1, correos=hecho["correos"], xml=hecho["xml"])
+        trabajador["segundos"] += hecho["segundos"]
+    fallidas = [h for _id, h in sorted(hechos.items()) if h.get("fallo")]
+
+    reporte_path = salida / "reportes" / "reporte_extraccion.txt"
+    with open(reporte_path, "w", encoding="utf-8") as f:
+        f.write("REPORTE DE EXTRACCIÓN XML PST (DISTRIBUIDA)\n")
+        f.write("=" * 50 + "\n\n")
+        f.write(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        f.write(f"Archivo PST: {manifiesto['pst']}\n")
+        f.write(f"Directorio salida: {salida}\n")
+        f.write(f"Filtros: {FiltroExtraccion.desde_dict(manifiesto['filtro']).describir()}\n")
+        disposicion = DisposicionSalida(manifiesto["disposicion"]["esquema"], manifiesto["disposicion"]["niveles_hash"])
+        f.write(f"Disposición de salida: {disposicion.describir()}\n")
+        f.write(f"Compresión: {manifiesto['compresion']}\n")
+        f.write(f"Unidades: {len(manifiesto['unidades']):,} de hasta {manifiesto['mensajes_por_unidad']:,} correos "
+                f"(planificado {manifiesto['creado']})\n\n")
+        f.write("ESTADÍSTICAS:\n")
+        f.write(f"- Emails procesados: {totales['correos']:,}\n")
+        f.write(f"- Carpetas omitidas por filtro: {len(manifiesto['carpetas_omitidas']):,}\n")
+        f.write(f"- XMLs extraídos: {totales['xml']:,}\n")
+        f.write(f"- Lecturas físicas: {totales['lecturas']:,}\n")
+        f.write(f"- Errores: {totales['errores']:,}\n")
+        f.write(f"- Unidades sin terminar: {len(faltan):,}\n\n")
+
+        f.write("POR TRABAJADOR:\n")
+        for nombre in sorted(por_trabajador):
+            t = por_trabajador[nombre]
+            f.write(f"- {nombre}: {t['unidades']:,} unidades, {t['correos']:,} correos, "
+                    f"{t['xml']:,} XML en {t['segundos']:.1f} s\n")
+        f.write("\n")
+
+        if por_categoria:
+            f.write("ERRORES POR CATEGORÍA:\n")
+            for categoria, cantidad in sorted(por_categoria.items(), key=lambda c: (-c[1], c[0])):
+                f.write(f"- {categoria}: {cantidad:,}\n")
+            f.write(f"\nListado completo: {salida / 'reportes' / 'errores.jsonl'}\n\n")
+        if fallidas:
+            f.write("UNIDADES CON FALLO:\n")
+            for hecho in fallidas:
+                f.write(f"- {hecho['id']} ({hecho['trabajador']}): {hecho['fallo']}\n")
+            f.write("\n")
+        if faltan:
+            f.write("UNIDADES SIN TERMINAR:\n")
+            for id_unidad in faltan:
+                f.write(f"- {id_unidad}\n")
+
+    print(f"📋 Reporte generado: {reporte_path}")
+    return dict(totales, unidades=len(hechos), faltan=len(faltan), fallidas=len(fallidas))
+
+
+def main():
+    """Planificar, ejecutar trabajadores, consultar o combinar una extracción distribuida."""
+    parser = argparse.ArgumentParser(
+        description="Extraer un PST grande repartiendo el trabajo entre varios procesos o equipos",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Ejemplos de uso:
+  python extraccion_distribuida.py planificar -i "archivo.pst" -o "\\\\servidor\\facturas\\2025"
+  python extraccion_distribuida.py trabajar -o "\\\\servidor\\facturas\\2025"    # En cada equipo/proceso
+  python extraccion_distribuida.py estado -o "\\\\servidor\\facturas\\2025"
+  python extraccion_distribuida.py combinar -o "\\\\servidor\\facturas\\2025"
+        """
+    )
+    parser.add_argument("accion", choices=("planificar", "trabajar", "estado", "combinar"))
+    parser.add_argument("-o", "--output-dir", required=True, help="Directorio de salida compartido")
+    parser.add_argument("-i", "--input-pst",
+                        help="PST a planificar; en 'trabajar', su ruta en este equipo si difiere de la del manifiesto")
+    parser.add_argument("--unit-messages", type=int, default=DIST_UNIT_MESSAGES,
+                        help=f"Correos por unidad de trabajo (por defecto {DIST_UNIT_MESSAGES})")
+    parser.add_argument("--compress", choices=FORMATOS_COMPRESION, default="ninguna",
+                        help="Guardar cada XML comprimido (.xml.gz / .xml.zst)")
+    parser.add_argument("--read-order", choices=ORDENES_LECTURA, default="desplazamiento",
+                        help="Orden de lectura de los adjuntos en cada unidad")
+    parser.add_argument("--attachment-rules", choices=tuple(ATTACHMENT_RULE_SETS), default=ATTACHMENT_RULES_DEFAULT,
+                        help="Conjunto de reglas de adjuntos de config.py (qué se extrae y en qué subdirectorio)")
+    parser.add_argument("--worker-id", help="Nombre del trabajador (por defecto equipo-pid)")
+    parser.add_argument("--workers", type=int, default=PIPELINE_WRITER_THREADS,
+                        help=f"Hilos de escritura de cada trabajador (por defecto {PIPELINE_WRITER_THREADS})")
+    parser.add_argument("--pst-cache-mb", type=int, default=PST_CACHE_MB,
+                        help=f"Caché del lector nativo por trabajador (por defecto {PST_CACHE_MB} MB)")
+    parser.add_argument("--wait", action="store_true",
+                        help="Trabajar: seguir esperando a que terminen los demás para retomar reclamos vencidos")
+    parser.add_argument("--force", action="store_true", help="Combinar aunque falten unidades")
+    agregar_argumentos_disposicion(parser)
+    agregar_argumentos_filtro(parser)
+    agregar_argumentos_io(parser)
+    args = parser.parse_args()
+    configurar_limites_desde_argumentos(args, parser)
+
+    try:
+        if args.accion == "planificar":
+            if not args.input_pst:
+                parser.error("planificar requiere -i/--input-pst")
+            if args.compress == "zstd" and not ZSTD_AVAILABLE:
+                parser.error("--compress zstd requiere el paquete 'zstandard' (pip install zstandard)")
+            try:
+                filtro = filtro_desde_argumentos(args)
+            except ValueError as e:
+                parser.error(str(e))
+            planificar(args.input_pst, args.output_dir, filtro=filtro,
+                       disposicion=DisposicionSalida(args.layout, args.hash_levels),
+                       compresion=args.compress, orden_lectura=args.read_order,
+                       mensajes_por_unidad=args.unit_messages, reglas=args.attachment_rules)
+
+        elif args.accion == "trabajar":
+            trabajador = TrabajadorDistribuido(args.output_dir, id_trabajador=args.worker_id,
+                                               pst_file=args.input_pst, hilos_escritura=args.workers,
+                                               cache_pst_mb=args.pst_cache_mb)
+            print(f"👷 Trabajador {trabajador.id}: {len(trabajador.pendientes()):,} unidades pendientes")
+            try:
+                trabajador.ejecutar(esperar=args.wait)
+            except KeyboardInterrupt:
+                trabajador.detener()
+            print(f"⏹️ Trabajador {trabajador.id}: {trabajador.unidades_procesadas:,} unidades, "
+                  f"{trabajador.correos_procesados:,} correos, {trabajador.xml_extraidos:,} XML")
+
+        elif args.accion == "estado":
+            avance = estado(args.output_dir)
+            print(f"📊 {avance['hechas']:,} de {avance['total']:,} unidades hechas, "
+                  f"{avance['pendientes']:,} pendientes")
+            for nombre, cantidad in sorted(avance["en_curso"].items()):
+                print(f"   👷 {nombre}: {cantidad} en curso")
+
+        else:
+            totales = combinar(args.output_dir, forzar=args.force)
+            print(f"✅ {totales['unidades']:,} unidades combinadas: {totales.get('correos', 0):,} correos, "
+                  f"{totales.get('xml', 0):,} XML, {totales.get('errores', 0):,} errores")
+
+    except (FileNotFoundError, FileExistsError, ValueError, RuntimeError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -12,42 +12,58 @@ Este script combina:
 Dependencias:
     - tkinter: Para interfaz gráfica (incluida con Python)
     - win32com.client: Para Outlook COM (pywin32)
-    - tqdm: Para barras de progreso adicionales
-    - lxml: Para validación de XML (opcional)
+    - lxml: Para validación XSD y de firmas (opcional)
+
+tkinter, win32com y los módulos de validación/firmas se importan solo al
+usarse: ``--help`` y la clase ExtractorXMLPSTGUI con interactivo=False y el
+lector nativo (servicio, extracción distribuida) no cargan ninguno.
 
 Autor: Generado automáticamente
 Fecha: 2025-10-07
 """
 
 import os
-import re
 import sys
 import argparse
+import importlib.util
 from datetime import datetime
 from pathlib import Path
-import tkinter as tk
-from tkinter import filedialog, messagebox, ttk
 import threading
 import time
 
-# Importaciones opcionales
-try:
-    import win32com.client
-    WIN32COM_AVAILABLE = True
-except ImportError:
-    WIN32COM_AVAILABLE = False
-
-try:
-    from tqdm import tqdm
-    TQDM_AVAILABLE = True
-except ImportError:
-    TQDM_AVAILABLE = False
-
-try:
-    from lxml import etree
-    LXML_AVAILABLE = True
-except ImportError:
-    LXML_AVAILABLE = False
+# Importaciones opcionales: solo se comprueba que pywin32 está instalado; win32com.client
+# (lento de cargar) se importa al conectar con Outlook
+WIN32COM_AVAILABLE = importlib.util.find_spec("win32com") is not None
+
+from adjuntos_zip import ZIP_PATTERN, xml_en_zip
+from almacen_comprimido import FORMATOS_COMPRESION, ZSTD_AVAILABLE, CompresorXML, buscar_diccionario
+from archivo_empaquetado import EmpaquetadorXML
+from config import (
+    ATTACHMENT_RULE_SETS, ATTACHMENT_RULES_DEFAULT, EXPLORER_EVENTS_SECONDS, NESTED_MESSAGE_MAX_DEPTH,
+    PACK_SHARD_SIZE_MB, PIPELINE_QUEUE_SIZE, PIPELINE_WRITER_THREADS, PROGRESS_UPDATE_SECONDS, PST_CACHE_MB,
+    PST_READ_ORDER_MAX_ITEMS, PST_READ_ORDER_WINDOW_MB, STAGING_DURABILITY, VALIDATION_WORKERS,
+    ZIP_INSPECT_ATTACHMENTS,
+)
+from disposicion_salida import DisposicionSalida, agregar_argumentos_disposicion, sanitizar_componente
+from errores_com import (
+    TRANSITORIO, CircuitoAbierto, ColaReintentos, ErrorFatalCOM, PoliticaReintentos,
+    clasificar_error, describir_error,
+)
+from filtros_extraccion import (
+    FiltroExtraccion, agregar_argumentos_filtro, filtro_desde_argumentos, normalizar_fecha,
+)
+from lector_pst import (
+    ADJUNTO_EMBEBIDO, ADJUNTO_POR_VALOR, MSGFLAG_HASATTACH, PID_CLASE_MENSAJE, PID_FECHA_ENTREGA, PID_FLAGS_MENSAJE,
+    PID_ID_FILA, AlmacenPST, PlanLecturas,
+)
+from limitador_io import LIMITADOR, agregar_argumentos_io, configurar_limites_desde_argumentos
+from pipeline_extraccion import (
+    OL_ADJUNTO_EMBEBIDO, AdjuntoExtraido, EscritorXML, abrir_mensaje_embebido_com, leer_bytes_adjunto_com,
+    leer_mime_adjunto_com,
+)
+from preparacion_local import DURABILIDADES, AreaPreparacion
+from reglas_adjuntos import ReglasAdjuntos
+from registro_errores import RegistroErrores
 
 def seleccionar_archivo_pst():
     """
@@ -57,6 +73,8 @@ def seleccionar_archivo_pst():
         str: Ruta del archivo PST seleccionado, o None si se cancela
     """
     print("🔍 Abriendo selector de archivo PST...")
+    import tkinter as tk
+    from tkinter import filedialog
     
     # Crear ventana raíz (oculta)
     root = tk.Tk()
@@ -86,17 +104,21 @@ def seleccionar_archivo_pst():
 class VentanaProgreso:
     """Ventana de progreso para mostrar el estado de la extracción."""
     
-    def __init__(self, titulo="Procesando PST"):
+    def __init__(self, titulo="Procesando PST", al_ver_resultados=None):
         self.ventana = None
         self.barra_progreso = None
         self.etiqueta_estado = None
         self.etiqueta_porcentaje = None
         self.etiqueta_stats = None
         self.activa = False
+        self.al_ver_resultados = al_ver_resultados
         self.crear_ventana(titulo)
     
     def crear_ventana(self, titulo):
         """Crear la ventana de progreso."""
+        import tkinter as tk
+        from tkinter import ttk
+        
         self.ventana = tk.Tk()
         self.ventana.title(titulo)
         self.ventana.geometry("600x200")
@@ -135,10 +157,15 @@ class VentanaProgreso:
                                       font=("Arial", 9), fg="gray")
         self.etiqueta_stats.pack(pady=5)
         
-        # Botón cancelar (opcional)
-        self.boton_cancelar = tk.Button(self.ventana, text="Minimizar", 
+        # Botones: explorar los XML ya extraídos y minimizar
+        marco_botones = tk.Frame(self.ventana)
+        marco_botones.pack(pady=10)
+        if self.al_ver_resultados:
+            tk.Button(marco_botones, text="📋 Ver resultados",
+                      command=self.al_ver_resultados).pack(side="left", padx=5)
+        self.boton_cancelar = tk.Button(marco_botones, text="Minimizar", 
                                        command=self.minimizar)
-        self.boton_cancelar.pack(pady=10)
+        self.boton_cancelar.pack(side="left", padx=5)
         
         self.activa = True
         self.ventana.update()
@@ -195,6 +222,16 @@ class VentanaProgreso:
         except Exception as e:
             print(f"⚠️ Error finalizando ventana de progreso: {e}")
     
+    def atender_eventos(self):
+        """Procesar teclado, ratón y temporizadores pendientes sin tocar el progreso."""
+        if not self.activa or not self.ventana:
+            return
+        try:
+            self.ventana.update()
+        except Exception as e:
+            print(f"⚠️ Error actualizando ventana de progreso: {e}")
+            self.activa = False
+    
     def minimizar(self):
         """Minimizar la ventana."""
         try:
@@ -215,63 +252,213 @@ class VentanaProgreso:
         self.minimizar()  # Solo minimizar, no cerrar
 
 
+# Conexión a Outlook por hilo: COM es STA, cada hilo necesita su propio proxy.
+# Conservarla evita relanzar Outlook y reabrir el PST en cada extracción del servicio.
+_outlook_local = threading.local()
+
+
+def conectar_outlook(reconectar=False):
+    """Namespace MAPI de Outlook para el hilo actual (reutilizado entre extracciones)."""
+    namespace = getattr(_outlook_local, "namespace", None)
+    if namespace is None or reconectar:
+        import win32com.client
+        outlook = win32com.client.Dispatch("Outlook.Application")
+        namespace = outlook.GetNamespace("MAPI")
+        _outlook_local.namespace = namespace
+    return namespace
+
+
+def buscar_store(namespace, pst_file):
+    """Store de Outlook que corresponde al archivo PST, o None si no está abierto."""
+    ruta = str(pst_file).lower()
+    for store in namespace.Stores:
+        if ruta in (store.FilePath or "").lower():
+            return store
+    return None
+
+
+# Métodos de lectura del PST y orden de lectura del lector nativo
+LECTORES = ("auto", "outlook", "nativo")
+ORDENES_LECTURA = ("arbol", "desplazamiento")
+
+
 class ExtractorXMLPSTGUI:
     """Extractor de archivos XML con interfaz gráfica."""
     
-    def __init__(self, pst_file, output_dir):
+    def __init__(self, pst_file, output_dir, filtro=None,
+                 hilos_escritura=PIPELINE_WRITER_THREADS, tamano_cola=PIPELINE_QUEUE_SIZE,
+                 disposicion=None, modo_salida="archivos", tamano_paquete_mb=PACK_SHARD_SIZE_MB,
+                 compresion="ninguna", nivel_compresion=None, validar=False,
+                 procesos_validacion=VALIDATION_WORKERS, verificar_firmas=False, interactivo=True,
+                 lector="auto", orden_lectura="desplazamiento", cache_pst_mb=PST_CACHE_MB,
+                 profundidad_anidados=NESTED_MESSAGE_MAX_DEPTH, reglas=None,
+                 preparacion_local=None, durabilidad=STAGING_DURABILITY):
         """
         Inicializar el extractor.
         
         Args:
             pst_file (str): Archivo PST a procesar
             output_dir (str): Directorio donde guardar los XML extraídos
+            filtro (FiltroExtraccion): Filtros de carpeta/fecha/remitente (opcional)
+            hilos_escritura (int): Hilos consumidores que escriben los XML
+            tamano_cola (int): Adjuntos en memoria como máximo entre COM y escritura
+            disposicion (DisposicionSalida): Organización de xml_facturacion/ (por carpeta si se omite)
+            modo_salida (str): 'archivos' (un archivo por XML), 'zip' o 'tar' (paquetes con índice)
+            tamano_paquete_mb (int): Tamaño máximo de cada paquete en modo zip/tar
+            compresion (str): 'ninguna', 'gzip' o 'zstd' para guardar .xml.gz / .xml.zst
+            nivel_compresion (int): Nivel de compresión (None = el de config.py)
+            validar (bool): Validar los XML extraídos contra los XSD de Hacienda al terminar
+            procesos_validacion (int): Procesos usados por la validación XSD y la verificación de firmas
+            verificar_firmas (bool): Verificar las firmas XAdES de los XML extraídos al terminar
+            interactivo (bool): Mostrar ventana de progreso y diálogos (False para el servicio HTTP)
+            lector (str): 'outlook' (COM), 'nativo' (lector_pst.py) o 'auto' (Outlook si está disponible)
+            orden_lectura (str): Lector nativo: 'desplazamiento' lee los adjuntos ordenados por posición
+                en el archivo; 'arbol' los lee al recorrer las carpetas
+            cache_pst_mb (int): Lector nativo: memoria de la caché de B-trees, heaps y esquemas
+            profundidad_anidados (int): Niveles de correos adjuntos a otros correos que se recorren (0 = ninguno)
+            reglas (ReglasAdjuntos): Qué adjuntos se extraen y en qué categoría (cualquier .xml si se omite)
+            preparacion_local (str): Directorio local donde escribir antes de trasladar por lotes a
+                output_dir (útil si output_dir es un recurso de red); solo en modo 'archivos'
+            durabilidad (str): Con preparacion_local: 'ninguna', 'lote' o 'archivo' (fsync en el destino)
         """
         self.pst_file = Path(pst_file)
         self.output_dir = Path(output_dir)
         self.log_file = self.output_dir / "remitentes_pst.csv"
+        self.filtro = filtro or FiltroExtraccion()
+        self.disposicion = disposicion or DisposicionSalida()
         
-        # Patrón regex para aceptar cualquier archivo con extensión .xml (independientemente del nombre)
-        self.xml_pattern = re.compile(r".+\.xml$", re.IGNORECASE)
+        # Reglas de adjuntos (config.ATTACHMENT_RULE_SETS): por defecto cualquier .xml, sin categorías
+        self.reglas = reglas or ReglasAdjuntos()
+        # Adjuntos .zip: se abren en memoria y solo se extraen sus miembros .xml
+        self.zip_pattern = ZIP_PATTERN if ZIP_INSPECT_ATTACHMENTS else None
+        # Correos adjuntos a otros correos (reenvíos como adjunto): niveles que se recorren
+        self.profundidad_anidados = profundidad_anidados
         
         # Contadores
         self.total_emails = 0
         self.processed_emails = 0
         self.extracted_xml_files = 0
-        self.errors = []
+        self.carpetas_omitidas = 0
+        self.zips_inspeccionados = 0
+        self.mensajes_anidados = 0
+        self.zips_sin_xml = 0
+        self.xml_desde_zip = 0
+        # Errores: se vuelcan a reportes/errores.jsonl, en memoria solo contadores y muestra
+        self.errors = RegistroErrores()
+        # Si Outlook rechaza la restricción DASL se filtra en Python
+        self.restriccion_disponible = True
+        
+        # Reintentos de errores transitorios de Outlook y EntryID a revisitar al final
+        self.politica_reintentos = PoliticaReintentos()
+        self.cola_reintentos = ColaReintentos()
+        # Carpetas que Outlook dejó a medias: (EntryID, ruta del padre, índice del primer elemento, motivo)
+        self.carpetas_pendientes = []
+        self.carpetas_retomadas = 0
+        self.carpetas_perdidas = 0
+        self._pasada_final = False
+        self._namespace = None
+        self._store_id = None
+        
+        # Pipeline: el hilo COM produce, los hilos de escritura consumen
+        self.hilos_escritura = hilos_escritura
+        self.tamano_cola = tamano_cola
+        self.escritor = None
+        self.modo_salida = modo_salida
+        self.tamano_paquete_mb = tamano_paquete_mb
+        self.empaquetador = None
+        self.compresion = compresion
+        self.nivel_compresion = nivel_compresion
+        self.compresor = None
+        # Preparación local: escritura en disco local y traslado diferido al destino
+        if preparacion_local and modo_salida != "archivos":
+            raise ValueError("La preparación local solo aplica con modo_salida 'archivos'")
+        self.preparacion_local = preparacion_local
+        self.durabilidad = durabilidad
+        self.preparacion = None
+        self.resumen_preparacion = None
+        
+        # Validación XSD posterior a la extracción
+        self.validar = validar
+        self.procesos_validacion = procesos_validacion
+        self.resumen_validacion = None
+        self.verificar_firmas = verificar_firmas
+        self.resumen_firmas = None
+        
+        # Método de lectura del PST
+        if lector not in LECTORES:
+            raise ValueError(f"Lector desconocido '{lector}' (use {', '.join(LECTORES)})")
+        if orden_lectura not in ORDENES_LECTURA:
+            raise ValueError(f"Orden de lectura desconocido '{orden_lectura}' (use {', '.join(ORDENES_LECTURA)})")
+        self.lector = lector
+        self.orden_lectura = orden_lectura
+        self.metodo_usado = None
+        self.volcado_directo = False
+        self.lecturas_pst = None  # (lecturas físicas, bytes leídos) del lector nativo
+        if int(cache_pst_mb) < 0:
+            raise ValueError("cache_pst_mb no puede ser negativo")
+        self.cache_pst_mb = int(cache_pst_mb)
+        self.resumen_cache_pst = None
+        self._contador_lock = threading.Lock()
+        self._log_lock = threading.Lock()
+        self._log_handle = None
+        # Extracción distribuida: diario con cada archivo creado (relativo a la salida) y
+        # evento que interrumpe la extracción cuando el trabajador pierde su reclamo
+        self.diario_salidas = None
+        self.cancelacion = None
+        
+        # Estado consultable sin GUI: mensaje actual y segundos por etapa
+        self.estado = ""
+        self.etapa_actual = None
+        self.duracion_etapas = {}
+        self._inicio_etapa = 0.0
         
         # GUI
+        self.interactivo = interactivo
         self.ventana_progreso = None
+        self.explorador = None
+        self._ultima_actualizacion = 0.0
+        self._ultimos_eventos = 0.0
 
     def sanitize_path_component(self, name: str) -> str:
         """Sanear un nombre de carpeta para el sistema de archivos de Windows."""
-        if not name:
-            return "carpeta"
-        invalid = '<>:"/\\|?*'
-        sanitized = ''.join('_' if ch in invalid else ch for ch in str(name))
-        sanitized = sanitized.strip().strip('.')
-        return sanitized or "carpeta"
-
-    def get_output_subdir_for_ruta(self, ruta_actual: str) -> Path:
-        """Obtener el subdirectorio de salida basado solo en el nombre de la carpeta actual.
-        
-        Usa únicamente el último segmento de la ruta (nombre de carpeta directa)
-        para simplificar la organización y facilitar limpieza posterior.
-        """
-        parts = [p for p in str(ruta_actual).split('/') if p]
-        # Usar solo el último segmento (carpeta actual)
-        if parts:
-            folder_name = self.sanitize_path_component(parts[-1])
-        else:
-            folder_name = "sin_carpeta"
+        return sanitizar_componente(name)
+
+    @property
+    def disposicion_necesita_datos(self):
+        """True si el subdirectorio de un XML depende de su contenido (Clave o hash)."""
+        return self.disposicion.depende_de_clave or self.disposicion.niveles_hash > 0
+    
+    def get_output_subdir(self, adjunto) -> Path:
+        """Obtener el subdirectorio de salida de un adjunto según la disposición.
         
-        subdir = self.output_dir / "xml_facturacion" / folder_name
-        return subdir
+        Con la disposición por defecto ('carpeta') se usa únicamente el último
+        segmento de la ruta de Outlook; los demás esquemas reparten los XML
+        por fecha, emisor o hash para acotar el número de archivos por carpeta.
+        Si la regla que admitió el adjunto tiene categoría, todo cuelga de ella.
+        """
+        raiz = self.output_dir / "xml_facturacion"
+        if adjunto.categoria:
+            raiz = raiz / adjunto.categoria
+        return self.disposicion.subdirectorio(
+            raiz,
+            ruta_carpeta=adjunto.ruta_carpeta,
+            fecha=normalizar_fecha(adjunto.fecha),
+            datos=adjunto.datos,
+        )
     
     def setup_directories(self):
         """Crear directorios necesarios."""
         self.output_dir.mkdir(parents=True, exist_ok=True)
-        (self.output_dir / "xml_facturacion").mkdir(exist_ok=True)
+        xml_root = self.output_dir / "xml_facturacion"
+        xml_root.mkdir(exist_ok=True)
         (self.output_dir / "reportes").mkdir(exist_ok=True)
+        
+        # Guardar el esquema para que filtrar/renombrar sepan cómo está organizado
+        anterior = DisposicionSalida.cargar(xml_root)
+        if anterior and anterior.describir() != self.disposicion.describir():
+            print(f"⚠️ {xml_root} ya usaba la disposición '{anterior.describir()}'; "
+                  f"se cambia a '{self.disposicion.describir()}'")
+        self.disposicion.guardar(xml_root)
         print(f"📁 Directorio de salida: {self.output_dir}")
     
     def validate_pst_file(self):
@@ -292,9 +479,114 @@ class ExtractorXMLPSTGUI:
         return size_mb
     
     def inicializar_log(self):
-        """Crear archivo CSV de log."""
-        with open(self.log_file, "w", encoding="utf-8") as log:
-            log.write("archivo_xml,remitente,asunto,fecha_email,fecha_procesamiento,carpeta_origen,tamaño_bytes\n")
+        """Crear archivo CSV de log y mantenerlo abierto durante la extracción."""
+        self._log_handle = open(self.log_file, "w", encoding="utf-8")
+        self._log_handle.write("archivo_xml,remitente,asunto,fecha_email,fecha_procesamiento,carpeta_origen,tamaño_bytes\n")
+    
+    def vaciar_log(self):
+        """Volcar al disco las filas del log aún en el búfer (para el explorador de resultados)."""
+        with self._log_lock:
+            if self._log_handle:
+                self._log_handle.flush()
+    
+    def abrir_explorador(self):
+        """Abrir el explorador de resultados sobre el log (o traerlo al frente si ya está abierto)."""
+        if self.explorador is not None and self.explorador.activa:
+            self.explorador.ventana.deiconify()
+            self.explorador.ventana.lift()
+            return
+        from explorador_resultados import ExploradorResultados
+        maestro = None
+        if self.ventana_progreso and self.ventana_progreso.activa:
+            maestro = self.ventana_progreso.ventana
+        self.explorador = ExploradorResultados(self.log_file, maestro=maestro, vaciar_log=self.vaciar_log)
+    
+    def cerrar_log(self):
+        """Cerrar el archivo CSV de log."""
+        with self._log_lock:
+            if self._log_handle:
+                self._log_handle.close()
+                self._log_handle = None
+    
+    @property
+    def cancelada(self):
+        """Indicar si se pidió interrumpir la extracción en curso."""
+        return self.cancelacion is not None and self.cancelacion.is_set()
+    
+    def anotar_salida(self, ruta):
+        """Anotar en el diario de salidas un archivo recién creado (seguro entre hilos)."""
+        if self.diario_salidas is None:
+            return
+        with self._log_lock:
+            self.diario_salidas.write(Path(ruta).relative_to(self.output_dir).as_posix() + "\n")
+            self.diario_salidas.flush()
+    
+    def contar_xml_extraido(self):
+        """Incrementar el contador de XML extraídos (llamado desde los hilos de escritura)."""
+        with self._contador_lock:
+            self.extracted_xml_files += 1
+    
+    def iniciar_etapa(self, nombre):
+        """Cerrar la etapa en curso y empezar a cronometrar la siguiente."""
+        self.terminar_etapa()
+        self.etapa_actual = nombre
+        self._inicio_etapa = time.monotonic()
+    
+    def terminar_etapa(self):
+        """Acumular la duración de la etapa en curso en duracion_etapas."""
+        if self.etapa_actual is None:
+            return
+        duracion = time.monotonic() - self._inicio_etapa
+        self.duracion_etapas[self.etapa_actual] = self.duracion_etapas.get(self.etapa_actual, 0.0) + duracion
+        self.etapa_actual = None
+    
+    def actualizar_progreso(self, estado, forzar=False):
+        """Refrescar la ventana de progreso como máximo cada PROGRESS_UPDATE_SECONDS."""
+        self.estado = estado
+        if not self.ventana_progreso:
+            return
+        ahora = time.monotonic()
+        if not forzar and ahora - self._ultima_actualizacion < PROGRESS_UPDATE_SECONDS:
+            # Con el explorador abierto, teclado y ratón se atienden más a menudo que el progreso
+            if (self.explorador is not None and self.explorador.activa
+                    and ahora - self._ultimos_eventos >= EXPLORER_EVENTS_SECONDS):
+                self._ultimos_eventos = ahora
+                self.ventana_progreso.atender_eventos()
+            return
+        self._ultima_actualizacion = ahora
+        self.ventana_progreso.actualizar(
+            self.processed_emails,
+            0 if self.total_emails == 0 else self.total_emails,  # Usa indeterminado si no sabemos el total
+            estado,
+            self.processed_emails,
+            self.extracted_xml_files
+        )
+    
+    def preparar_salida(self):
+        """Abrir el empaquetador o el compresor según el modo de salida."""
+        if self.modo_salida != "archivos":
+            self.empaquetador = EmpaquetadorXML(
+                self.output_dir / "xml_facturacion", self.modo_salida, self.tamano_paquete_mb
+            )
+            self.empaquetador.abrir()
+        elif self.compresion != "ninguna":
+            # El diccionario zstd, si se entrenó, vive en xml_facturacion/.diccionario.zstd
+            diccionario = buscar_diccionario(self.output_dir / "xml_facturacion") if self.compresion == "zstd" else None
+            self.compresor = CompresorXML(self.compresion, self.nivel_compresion, diccionario)
+            print(f"🗜️ Compresión: {self.compresor.describir()}")
+        if self.preparacion_local:
+            self.preparacion = AreaPreparacion(self.preparacion_local, self.output_dir,
+                                               self.durabilidad, errores=self.errors)
+            self.preparacion.iniciar()
+            print(f"📦 Preparación local en {self.preparacion.raiz_local} (durabilidad: {self.durabilidad})")
+    
+    def cerrar_salida(self):
+        """Cerrar el paquete en curso o trasladar lo que quede en la preparación local."""
+        if self.empaquetador:
+            self.empaquetador.cerrar()
+        if self.preparacion:
+            self.actualizar_progreso("Trasladando los XML preparados al destino...", forzar=True)
+            self.resumen_preparacion = self.preparacion.finalizar()
     
     def extraer_con_outlook_com(self):
         """Extraer usando Outlook COM."""
@@ -304,28 +596,43 @@ class ExtractorXMLPSTGUI:
         print("🔄 Intentando extracción con Outlook COM...")
         
         try:
-            # Conectar con Outlook
-            outlook = win32com.client.Dispatch("Outlook.Application")
-            namespace = outlook.GetNamespace("MAPI")
-            
-            # Intentar añadir el PST
-            namespace.AddStore(str(self.pst_file))
+            # Conectar con Outlook (se reutiliza la conexión del hilo si sigue viva)
+            try:
+                namespace = conectar_outlook()
+                pst_store = buscar_store(namespace, self.pst_file)
+            except Exception:
+                namespace = conectar_outlook(reconectar=True)
+                pst_store = buscar_store(namespace, self.pst_file)
             
-            # Buscar el PST en las stores
-            pst_store = None
-            for store in namespace.Stores:
-                if str(self.pst_file).lower() in store.FilePath.lower():
-                    pst_store = store
-                    break
+            # Añadir el PST solo si no está ya abierto en el perfil
+            if not pst_store:
+                namespace.AddStore(str(self.pst_file))
+                pst_store = buscar_store(namespace, self.pst_file)
             
             if not pst_store:
                 raise Exception("PST no encontrado después de añadirlo")
             
             print(f"✅ PST encontrado: {pst_store.DisplayName}")
+            self._namespace = namespace
+            self._store_id = pst_store.StoreID
             
-            # Procesar el PST
-            root_folder = pst_store.GetRootFolder()
-            self.procesar_carpeta_outlook(root_folder)
+            # Procesar el PST: este hilo solo lee de COM, la escritura va en paralelo
+            self.preparar_salida()
+            self.escritor = EscritorXML(self, self.hilos_escritura, self.tamano_cola)
+            self.escritor.iniciar()
+            try:
+                self.iniciar_etapa("lectura_outlook")
+                root_folder = pst_store.GetRootFolder()
+                self.procesar_carpeta_outlook(root_folder)
+                self.iniciar_etapa("reintentos")
+                self.reintentar_pendientes()
+            finally:
+                self.iniciar_etapa("escritura_pendiente")
+                self.actualizar_progreso(
+                    f"Escribiendo {self.escritor.pendientes} XML pendientes...", forzar=True
+                )
+                self.escritor.finalizar()
+                self.cerrar_salida()
             
             return True
             
@@ -333,107 +640,537 @@ class ExtractorXMLPSTGUI:
             print(f"❌ Error con Outlook COM: {e}")
             return False
     
-    def procesar_carpeta_outlook(self, folder, ruta_carpeta=""):
-        """Procesar carpeta usando Outlook COM."""
+    def obtener_items_filtrados(self, folder):
+        """Obtener los elementos de la carpeta restringidos por el filtro (DASL).
+
+        La restricción se evalúa dentro de Outlook sobre la tabla de contenidos
+        de la carpeta, así los correos descartados nunca se materializan.
+        """
+        items = self.politica_reintentos.ejecutar(lambda: folder.Items)
+        restriccion = self.filtro.restriccion_dasl()
+        if not restriccion or not self.restriccion_disponible:
+            return items
+        
+        try:
+            return self.politica_reintentos.ejecutar(items.Restrict, restriccion)
+        except (ErrorFatalCOM, CircuitoAbierto):
+            raise
+        except Exception as e:
+            if clasificar_error(e) == TRANSITORIO:
+                # Outlook ocupado no significa que no admita DASL: la carpeta se retoma al final
+                raise
+            # Versiones antiguas de Outlook no aceptan DASL: filtrar en Python
+            self.restriccion_disponible = False
+            print(f"⚠️ Outlook no aceptó la restricción ({e}); se filtrará correo a correo")
+            return items
+    
+    def procesar_carpeta_outlook(self, folder, ruta_carpeta="", desde=1):
+        """Procesar carpeta usando Outlook COM.
+        
+        Los elementos se recorren por índice y cada acceso pasa por la política
+        de reintentos. Si Outlook sigue rechazando llamadas, la carpeta se anota
+        con el índice al que se llegó y se retoma, con sus subcarpetas, en la
+        pasada final (``desde`` es el primer elemento a procesar).
+        """
         if not folder:
             return
         
         nombre_carpeta = folder.Name
         ruta_actual = f"{ruta_carpeta}/{nombre_carpeta}" if ruta_carpeta else nombre_carpeta
         
-        if self.ventana_progreso:
-            self.ventana_progreso.actualizar(
-                self.processed_emails, 
-                0 if self.total_emails == 0 else self.total_emails,  # Usa indeterminado si no sabemos el total
-                f"Procesando: {nombre_carpeta}",
-                self.processed_emails,
-                self.extracted_xml_files
-            )
+        # Podar carpetas excluidas antes de abrir sus elementos o subcarpetas
+        if self.filtro.carpeta_descartable(ruta_actual):
+            self.carpetas_omitidas += 1
+            print(f"⏭️ Carpeta omitida por filtro: {ruta_actual}")
+            return
         
+        self.actualizar_progreso(f"Procesando: {nombre_carpeta}", forzar=True)
+        
+        indice = desde
         try:
-            # Procesar elementos en esta carpeta
-            items = folder.Items
+            # Procesar elementos en esta carpeta (solo si el filtro la incluye)
+            if self.filtro.carpeta_permitida(ruta_actual):
+                items = self.obtener_items_filtrados(folder)
+                total = self.politica_reintentos.ejecutar(lambda: items.Count)
+            else:
+                items, total = None, 0
             
-            for item in items:
+            while indice <= total:
                 try:
+                    item = self.politica_reintentos.ejecutar(items.Item, indice)
+                except (ErrorFatalCOM, CircuitoAbierto):
+                    raise
+                except Exception as e:
+                    if clasificar_error(e) == TRANSITORIO:
+                        # Sin EntryID no hay reintento por elemento: se retoma la carpeta desde aquí
+                        raise
+                    self.errors.registrar(
+                        "item", f"Error abriendo el elemento {indice} de {ruta_actual}: {describir_error(e)}",
+                        carpeta=ruta_actual, tipo=clasificar_error(e)
+                    )
+                    indice += 1
+                    continue
+                indice += 1
+                try:
+                    # Filtro en Python solo si la restricción de Outlook no está disponible
+                    if not self.restriccion_disponible and self.filtro.filtra_mensajes:
+                        if not self.filtro.coincide_mensaje(
+                            getattr(item, 'ReceivedTime', None),
+                            getattr(item, 'SenderEmailAddress', None),
+                            getattr(item, 'MessageClass', None),
+                        ):
+                            continue
+                    
                     self.processed_emails += 1
                     
-                    # Verificar si tiene adjuntos
-                    if hasattr(item, 'Attachments') and item.Attachments.Count > 0:
-                        for attachment in item.Attachments:
-                            filename = attachment.FileName
-                            
-                            if filename and self.xml_pattern.match(filename):
-                                # Determinar directorio de salida correspondiente a la carpeta de Outlook
-                                xml_dir = self.get_output_subdir_for_ruta(ruta_actual)
-                                xml_dir.mkdir(parents=True, exist_ok=True)
-                                # Extraer adjunto XML a ese directorio
-                                xml_path = xml_dir / filename
-                                
-                                # Si ya existe, agregar sufijo
-                                counter = 1
-                                while xml_path.exists():
-                                    name_parts = filename.rsplit('.', 1)
-                                    if len(name_parts) == 2:
-                                        new_name = f"{name_parts[0]}_{counter:03d}.{name_parts[1]}"
-                                    else:
-                                        new_name = f"{filename}_{counter:03d}"
-                                    xml_path = xml_dir / new_name
-                                    counter += 1
-                                
-                                # Guardar adjunto
-                                attachment.SaveAsFile(str(xml_path))
-                                self.extracted_xml_files += 1
-                                
-                                # Registrar en log
-                                self.registrar_en_log(
-                                    xml_path.name,
-                                    getattr(item, 'SenderName', 'desconocido'),
-                                    getattr(item, 'Subject', 'sin asunto'),
-                                    getattr(item, 'ReceivedTime', 'fecha desconocida'),
-                                    ruta_actual,
-                                    xml_path.stat().st_size if xml_path.exists() else 0
-                                )
-                                
-                                print(f"✅ XML extraído: {xml_path}")
+                    # Leer adjuntos (reintentando si Outlook está ocupado) y pasarlos a escritura
+                    adjuntos = self.politica_reintentos.ejecutar(self.leer_adjuntos_item, item, ruta_actual)
+                    for adjunto in adjuntos:
+                        self.escritor.encolar(adjunto)
                     
-                    # Actualizar progreso cada 50 emails
-                    if self.processed_emails % 50 == 0 and self.ventana_progreso:
-                        self.ventana_progreso.actualizar(
-                            self.processed_emails,
-                            max(self.total_emails, 1000),
-                            f"Procesados {self.processed_emails} emails en: {nombre_carpeta}",
-                            self.processed_emails,
-                            self.extracted_xml_files
-                        )
+                    self.actualizar_progreso(f"Procesados {self.processed_emails} emails en: {nombre_carpeta}")
                 
+                except ErrorFatalCOM:
+                    raise
                 except Exception as e:
-                    self.errors.append(f"Error procesando item en {ruta_actual}: {str(e)}")
+                    self.registrar_fallo_item(item, ruta_actual, e)
             
             # Procesar subcarpetas
             try:
-                for subfolder in folder.Folders:
-                    self.procesar_carpeta_outlook(subfolder, ruta_actual)
+                subcarpetas = self.politica_reintentos.ejecutar(lambda: list(folder.Folders))
+            except ErrorFatalCOM:
+                raise
             except Exception as e:
-                self.errors.append(f"Error accediendo subcarpetas de {ruta_actual}: {str(e)}")
+                if not self.anotar_carpeta_pendiente(folder, ruta_carpeta, ruta_actual, total + 1, e):
+                    self.errors.registrar(
+                        "subcarpetas", f"Error accediendo subcarpetas de {ruta_actual}: {describir_error(e)}",
+                        carpeta=ruta_actual, tipo=clasificar_error(e)
+                    )
+                subcarpetas = []
+            for subfolder in subcarpetas:
+                self.procesar_carpeta_outlook(subfolder, ruta_actual)
                 
+        except ErrorFatalCOM:
+            raise
         except Exception as e:
-            self.errors.append(f"Error procesando carpeta {ruta_actual}: {str(e)}")
+            if not self.anotar_carpeta_pendiente(folder, ruta_carpeta, ruta_actual, indice, e):
+                self.errors.registrar(
+                    "carpeta", f"Error procesando carpeta {ruta_actual}: {describir_error(e)}",
+                    carpeta=ruta_actual, tipo=clasificar_error(e)
+                )
     
-    def registrar_en_log(self, xml_file, remitente, asunto, fecha, carpeta, tamaño):
-        """Registrar extracción en el log CSV."""
+    def anotar_carpeta_pendiente(self, folder, ruta_carpeta, ruta_actual, desde, error):
+        """Anotar para la pasada final una carpeta que falló de forma transitoria; False si no procede."""
+        if self._pasada_final:
+            return False
+        if not isinstance(error, CircuitoAbierto) and clasificar_error(error) != TRANSITORIO:
+            return False
+        try:
+            entry_id = folder.EntryID
+        except Exception:
+            return False
+        self.carpetas_pendientes.append((entry_id, ruta_carpeta, desde, describir_error(error)))
+        print(f"🔁 Outlook rechazó {ruta_actual} (elemento {desde}); se retomará al final")
+        return True
+    
+    def leer_adjuntos_item(self, item, ruta_actual):
+        """Leer de COM los adjuntos XML de un correo.
+
+        No encola nada hasta haber leído todos los adjuntos, así un reintento
+        del correo completo nunca duplica archivos.
+        """
+        adjuntos, zips = [], []
+        anidados = self._leer_adjuntos_com(item, ruta_actual, adjuntos, zips)
+        
+        # Los .zip se abren y los contadores se suman cuando ya no quedan llamadas COM
+        # que puedan forzar un reintento
+        self.mensajes_anidados += anidados
+        for filename, datos, metadatos, email in zips:
+            adjuntos.extend(self.adjuntos_de_zip(filename, datos, metadatos, ruta_actual, email))
+        return adjuntos
+    
+    def _leer_adjuntos_com(self, item, ruta_actual, adjuntos, zips, padre=None, profundidad=0):
+        """Reunir los XML y .zip de un correo y de los correos adjuntos a él; devuelve cuántos de estos abrió."""
+        if not hasattr(item, 'Attachments') or item.Attachments.Count == 0:
+            return 0
+        
+        metadatos = None
+        email = False  # Dirección del remitente: solo se pide a COM si alguna regla la usa
+        anidados = 0
+        for attachment in item.Attachments:
+            if getattr(attachment, 'Type', None) == OL_ADJUNTO_EMBEBIDO:
+                if profundidad < self.profundidad_anidados:
+                    with abrir_mensaje_embebido_com(attachment, self._namespace) as embebido:
+                        anidados += 1 + self._leer_adjuntos_com(
+                            embebido, ruta_actual, adjuntos, zips,
+                            padre=metadatos or self.metadatos_com(item, padre), profundidad=profundidad + 1,
+                        )
+                continue
+            
+            filename = attachment.FileName
+            if not filename:
+                continue
+            if email is False:
+                email = getattr(item, 'SenderEmailAddress', None) if self.reglas.usa_remitente else None
+            # Las reglas deciden antes de leer: el tamaño y el MIME solo se piden a COM si el nombre coincide
+            categoria = self.reglas.clasificar(filename, tamano=lambda: attachment.Size,
+                                               mime=lambda: leer_mime_adjunto_com(attachment),
+                                               email_remitente=email)
+            if categoria is None and not (self.zip_pattern and self.zip_pattern.match(filename)):
+                continue
+            
+            if metadatos is None:
+                metadatos = self.metadatos_com(item, padre)
+            datos = leer_bytes_adjunto_com(attachment)
+            if categoria is not None:
+                adjuntos.append(AdjuntoExtraido(filename, datos, *metadatos, ruta_actual, categoria))
+            else:
+                zips.append((filename, datos, metadatos, email))
+        return anidados
+    
+    @staticmethod
+    def metadatos_com(item, padre=None):
+        """(remitente, asunto, fecha) de un correo; en los adjuntos a otro, lo que falte se toma del que los contiene."""
+        padre = padre or ('desconocido', 'sin asunto', 'fecha desconocida')
+        return (
+            getattr(item, 'SenderName', None) or padre[0],
+            getattr(item, 'Subject', None) or padre[1],
+            getattr(item, 'ReceivedTime', None) or padre[2],
+        )
+    
+    def adjuntos_de_zip(self, nombre_zip, origen, metadatos, ruta_actual, email=None):
+        """
+        XML contenidos en un adjunto .zip, leídos en memoria.
+        
+        Args:
+            nombre_zip (str): Nombre del adjunto
+            origen: bytes del adjunto o ``ContenidoAdjunto`` del lector nativo
+            metadatos (tuple): (remitente, asunto, fecha) del correo
+            ruta_actual (str): Carpeta del PST
+            email (str): Dirección del remitente, para las reglas que la usan
+        
+        Returns:
+            list: AdjuntoExtraido de cada miembro que admiten las reglas (vacía si no hay ninguno)
+        """
+        def seleccionar(nombre, tamano):
+            return self.reglas.clasificar(nombre, tamano=tamano, email_remitente=email)
+        
+        self.zips_inspeccionados += 1
+        try:
+            xml, omitidos = xml_en_zip(origen, seleccionar)
+        except Exception as e:
+            self.errors.registrar("zip", f"No se pudo abrir {nombre_zip} en {ruta_actual}: {describir_error(e)}",
+                                  carpeta=ruta_actual, archivo=nombre_zip)
+            return []
+        for nombre, motivo in omitidos:
+            self.errors.registrar("zip", f"{nombre} de {nombre_zip} omitido: {motivo}",
+                                  carpeta=ruta_actual, archivo=nombre_zip)
+        if not xml:
+            self.zips_sin_xml += 1
+        self.xml_desde_zip += len(xml)
+        return [AdjuntoExtraido(nombre, datos, *metadatos, ruta_actual, categoria)
+                for nombre, datos, categoria in xml]
+    
+    def registrar_fallo_item(self, item, ruta_actual, error):
+        """Enviar a la cola de reintentos los fallos transitorios; registrar el resto."""
+        if isinstance(error, CircuitoAbierto) or clasificar_error(error) == TRANSITORIO:
+            try:
+                entry_id = item.EntryID
+            except Exception:
+                entry_id = None
+            if entry_id and self.cola_reintentos.agregar(entry_id, ruta_actual, describir_error(error)):
+                return
+        self.errors.registrar(
+            "item", f"Error procesando item en {ruta_actual}: {describir_error(error)}",
+            carpeta=ruta_actual, tipo=clasificar_error(error)
+        )
+    
+    def reintentar_pendientes(self):
+        """Revisitar por EntryID las carpetas y los correos que fallaron de forma transitoria."""
+        self.retomar_carpetas()
+        pendientes = self.cola_reintentos.vaciar()
+        if not pendientes:
+            return
+        
+        print(f"🔁 Reintentando {len(pendientes):,} correos que Outlook rechazó durante el recorrido...")
+        self.actualizar_progreso(f"Reintentando {len(pendientes):,} correos...", forzar=True)
+        
+        # Pasada final con presupuesto propio, tras dar un respiro a Outlook
+        politica = PoliticaReintentos()
+        politica.dormir(politica.espera_maxima)
+        
+        for entry_id, ruta_carpeta, motivo in pendientes:
+            try:
+                item = politica.ejecutar(self._namespace.GetItemFromID, entry_id, self._store_id)
+                adjuntos = politica.ejecutar(self.leer_adjuntos_item, item, ruta_carpeta)
+                for adjunto in adjuntos:
+                    self.escritor.encolar(adjunto)
+                self.cola_reintentos.recuperados += 1
+            except ErrorFatalCOM:
+                raise
+            except Exception as e:
+                self.cola_reintentos.perdidos += 1
+                self.errors.registrar(
+                    "reintento", f"Error procesando item en {ruta_carpeta} tras reintentos: {describir_error(e)}",
+                    carpeta=ruta_carpeta, entry_id=entry_id, motivo_inicial=motivo
+                )
+            
+            self.actualizar_progreso(f"Reintentando correos: {self.cola_reintentos.recuperados:,} recuperados")
+        
+        self.politica_reintentos.reintentos += politica.reintentos
+        self.politica_reintentos.aperturas_circuito += politica.aperturas_circuito
+    
+    def retomar_carpetas(self):
+        """Retomar las carpetas anotadas desde el elemento al que se llegó, con sus subcarpetas."""
+        carpetas, self.carpetas_pendientes = self.carpetas_pendientes, []
+        if not carpetas:
+            return
+        
+        print(f"🔁 Retomando {len(carpetas):,} carpetas que Outlook rechazó durante el recorrido...")
+        self.actualizar_progreso(f"Retomando {len(carpetas):,} carpetas...", forzar=True)
+        
+        # Presupuesto propio tras un respiro; un nuevo rechazo ya no se vuelve a anotar
+        politica = PoliticaReintentos()
+        politica.dormir(politica.espera_maxima)
+        principal, self.politica_reintentos = self.politica_reintentos, politica
+        self._pasada_final = True
+        try:
+            for entry_id, ruta_padre, desde, motivo in carpetas:
+                try:
+                    carpeta = politica.ejecutar(self._namespace.GetFolderFromID, entry_id, self._store_id)
+                except ErrorFatalCOM:
+                    raise
+                except Exception as e:
+                    self.carpetas_perdidas += 1
+                    self.errors.registrar(
+                        "carpeta", f"Error abriendo una carpeta de {ruta_padre or 'la raíz'} tras reintentos: "
+                                   f"{describir_error(e)}",
+                        carpeta=ruta_padre, entry_id=entry_id, motivo_inicial=motivo
+                    )
+                    continue
+                self.carpetas_retomadas += 1
+                self.procesar_carpeta_outlook(carpeta, ruta_padre, desde)
+        finally:
+            self._pasada_final = False
+            self.politica_reintentos = principal
+            principal.reintentos += politica.reintentos
+            principal.aperturas_circuito += politica.aperturas_circuito
+    
+    def extraer_con_lector_nativo(self):
+        """Extraer leyendo el PST directamente (sin Outlook)."""
+        print(f"🔄 Extracción con el lector nativo de PST (orden: {self.orden_lectura})...")
+        
         try:
-            with open(self.log_file, "a", encoding="utf-8") as log:
-                # Limpiar datos para CSV
-                clean_remitente = str(remitente).replace(",", ";").replace("\n", " ").strip()[:100]
-                clean_asunto = str(asunto).replace(",", ";").replace("\n", " ").strip()[:150]
-                clean_fecha = str(fecha).replace(",", ";").replace("\n", " ").strip()
-                clean_carpeta = str(carpeta).replace(",", ";")
-                current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            with AlmacenPST(self.pst_file, cache_mb=self.cache_pst_mb) as pst:
+                nombre_raiz = pst.nombre_almacen() or self.pst_file.stem
+                print(f"✅ PST abierto: {nombre_raiz}")
+                nid_raiz = pst.nid_subarbol_ipm()
+                self.recorrer_nativo(pst, lambda plan: self.procesar_carpeta_nativa(pst, nid_raiz, nombre_raiz, plan))
+            
+            return True
+        
+        except Exception as e:
+            print(f"❌ Error con el lector nativo: {e}")
+            return False
+    
+    def recorrer_nativo(self, pst, recorrido):
+        """
+        Ejecutar un recorrido del lector nativo con la salida y el escritor preparados.
+        
+        Args:
+            pst (AlmacenPST): PST abierto
+            recorrido (callable): Recibe el PlanLecturas (o None) y encola los adjuntos
+        """
+        self.metodo_usado = "nativo"
+        self.preparar_salida()
+        # Con el PST proyectado y salida en archivos sueltos, los adjuntos se vuelcan
+        # del mapa al archivo final sin reunirlos en memoria
+        self.volcado_directo = pst.proyectado and self.modo_salida == "archivos" \
+            and self.compresion == "ninguna" and not self.disposicion_necesita_datos
+        if self.volcado_directo:
+            print("🧩 Volcado directo de adjuntos desde el PST proyectado en memoria")
+        self.escritor = EscritorXML(self, self.hilos_escritura, self.tamano_cola)
+        self.escritor.iniciar()
+        plan = None
+        if self.orden_lectura == "desplazamiento":
+            plan = PlanLecturas(pst, diferido=self.volcado_directo)
+        lecturas, leidos = pst.lecturas, pst.bytes_leidos
+        try:
+            self.iniciar_etapa("lectura_nativa")
+            recorrido(plan)
+            if plan is not None:
+                self.vaciar_plan(plan)
+        finally:
+            self.iniciar_etapa("escritura_pendiente")
+            self.actualizar_progreso(
+                f"Escribiendo {self.escritor.pendientes} XML pendientes...", forzar=True
+            )
+            self.escritor.finalizar()
+            self.cerrar_salida()
+            self.lecturas_pst = (pst.lecturas - lecturas, pst.bytes_leidos - leidos)
+            self.resumen_cache_pst = pst.cache.describir()
+    
+    def extraer_tramo_nativo(self, pst, nid_carpeta, ruta_carpeta, desde, hasta):
+        """Procesar las filas [desde, hasta) del contenido de una carpeta (extracción distribuida)."""
+        def recorrido(plan):
+            filas = pst.contenido(nid_carpeta, desde, hasta)
+            self.procesar_filas_nativas(pst, filas, ruta_carpeta, plan)
+        self.recorrer_nativo(pst, recorrido)
+    
+    def procesar_carpeta_nativa(self, pst, nid, ruta_actual, plan):
+        """Procesar una carpeta con el lector nativo (mismos filtros que con Outlook COM)."""
+        if self.filtro.carpeta_descartable(ruta_actual):
+            self.carpetas_omitidas += 1
+            print(f"⏭️ Carpeta omitida por filtro: {ruta_actual}")
+            return
+        
+        nombre_carpeta = ruta_actual.rsplit("/", 1)[-1]
+        self.actualizar_progreso(f"Procesando: {nombre_carpeta}", forzar=True)
+        
+        try:
+            if self.filtro.carpeta_permitida(ruta_actual):
+                self.procesar_filas_nativas(pst, pst.contenido(nid), ruta_actual, plan)
+            
+            for nid_sub, nombre in pst.subcarpetas(nid):
+                self.procesar_carpeta_nativa(pst, nid_sub, f"{ruta_actual}/{nombre}", plan)
+        
+        except Exception as e:
+            self.errors.registrar(
+                "carpeta", f"Error procesando carpeta {ruta_actual}: {describir_error(e)}",
+                carpeta=ruta_actual, tipo=clasificar_error(e)
+            )
+    
+    def procesar_filas_nativas(self, pst, filas, ruta_actual, plan):
+        """Procesar filas de una tabla de contenido: filtrar, abrir el correo y leer sus adjuntos."""
+        nombre_carpeta = ruta_actual.rsplit("/", 1)[-1]
+        for fila in filas:
+            if self.cancelada:
+                raise InterruptedError(f"Extracción interrumpida en {ruta_actual}")
+            # Descartar con las columnas de la tabla de contenido, sin abrir el correo
+            flags = fila.get(PID_FLAGS_MENSAJE)
+            if self.filtro.solo_con_adjuntos and flags is not None and not flags & MSGFLAG_HASATTACH:
+                continue
+            if not self.filtro.coincide_mensaje(fila.get(PID_FECHA_ENTREGA), None, fila.get(PID_CLASE_MENSAJE)):
+                continue
+            
+            try:
+                mensaje = pst.mensaje(fila[PID_ID_FILA] & 0xFFFFFFFF)
+                if self.filtro.filtra_mensajes and not self.filtro.coincide_mensaje(
+                    mensaje.fecha, mensaje.email_remitente, mensaje.clase
+                ):
+                    continue
                 
-                log.write(f"{xml_file},{clean_remitente},{clean_asunto},{clean_fecha},{current_time},{clean_carpeta},{tamaño}\n")
+                self.processed_emails += 1
+                self.leer_adjuntos_nativos(mensaje, ruta_actual, plan)
+            except Exception as e:
+                self.errors.registrar(
+                    "item", f"Error procesando item en {ruta_actual}: {describir_error(e)}",
+                    carpeta=ruta_actual, tipo=clasificar_error(e)
+                )
+            
+            if plan is not None and (plan.bytes_pendientes >= PST_READ_ORDER_WINDOW_MB * 1024 * 1024
+                                     or len(plan) >= PST_READ_ORDER_MAX_ITEMS):
+                self.vaciar_plan(plan)
+            self.actualizar_progreso(f"Procesados {self.processed_emails} emails en: {nombre_carpeta}")
+    
+    def leer_adjuntos_nativos(self, mensaje, ruta_actual, plan, padre=None, profundidad=0):
+        """Encolar los adjuntos XML de un correo, o anotarlos en el plan de lectura ordenada.
+        
+        Los correos adjuntos (reenvíos como adjunto) se recorren en memoria
+        hasta ``profundidad_anidados`` niveles: son subnodos del adjunto.
+        """
+        metadatos = None
+        email = mensaje.email_remitente if self.reglas.usa_remitente else None
+        for adjunto in mensaje.adjuntos():
+            if adjunto.metodo == ADJUNTO_EMBEBIDO:
+                if profundidad < self.profundidad_anidados:
+                    self.leer_mensaje_embebido_nativo(adjunto, mensaje, ruta_actual, plan, padre, profundidad)
+                continue
+            if adjunto.metodo != ADJUNTO_POR_VALOR:
+                continue
+            # Tamaño declarado y MIME salen del contexto del adjunto, sin leer su contenido
+            categoria = self.reglas.clasificar(adjunto.nombre, tamano=lambda: adjunto.tamano,
+                                               mime=lambda: adjunto.mime, email_remitente=email)
+            if categoria is None and not (self.zip_pattern and self.zip_pattern.match(adjunto.nombre)):
+                continue
+            if metadatos is None:
+                metadatos = self.metadatos_nativos(mensaje, padre)
+            if categoria is None:
+                # El .zip se abre sobre sus bloques del PST: solo se leen el directorio central y los XML
+                for xml in self.adjuntos_de_zip(adjunto.nombre, adjunto.contenido(), metadatos, ruta_actual,
+                                                email):
+                    self.escritor.encolar(xml)
+            elif plan is None:
+                datos = adjunto.contenido() if self.volcado_directo else adjunto.leer()
+                self.escritor.encolar(AdjuntoExtraido(adjunto.nombre, datos, *metadatos, ruta_actual, categoria))
+            else:
+                plan.agregar(adjunto.ubicacion(), (adjunto.nombre, metadatos, ruta_actual, categoria))
+    
+    def leer_mensaje_embebido_nativo(self, adjunto, mensaje, ruta_actual, plan, padre, profundidad):
+        """Recorrer un correo adjunto a otro; un correo embebido dañado no impide leer el resto."""
+        try:
+            embebido = adjunto.mensaje_embebido()
+            if embebido is None:
+                return
+            self.mensajes_anidados += 1
+            self.leer_adjuntos_nativos(embebido, ruta_actual, plan, self.metadatos_nativos(mensaje, padre),
+                                       profundidad + 1)
+        except Exception as e:
+            self.errors.registrar(
+                "anidado", f"Error leyendo el correo adjunto '{adjunto.nombre}' en {ruta_actual}: "
+                           f"{describir_error(e)}",
+                carpeta=ruta_actual, tipo=clasificar_error(e)
+            )
+    
+    @staticmethod
+    def metadatos_nativos(mensaje, padre=None):
+        """(remitente, asunto, fecha) de un correo; en los adjuntos a otro, lo que falte se toma del que los contiene."""
+        padre = padre or ('desconocido', 'sin asunto', 'fecha desconocida')
+        return (
+            mensaje.remitente or padre[0],
+            mensaje.asunto or padre[1],
+            mensaje.fecha or padre[2],
+        )
+    
+    def vaciar_plan(self, plan):
+        """Leer en orden de desplazamiento los adjuntos anotados y pasarlos a escritura."""
+        if not len(plan):
+            return
+        self.actualizar_progreso(f"Leyendo {len(plan):,} adjuntos en orden de disco...", forzar=True)
+        
+        def al_fallar(contexto, error):
+            # Un bloque dañado solo descarta su adjunto; el resto de la ventana se sigue leyendo
+            nombre, _metadatos, ruta_carpeta, _categoria = contexto
+            self.errors.registrar("lectura", f"Error leyendo el adjunto '{nombre}' en {ruta_carpeta}: "
+                                             f"{describir_error(error)}",
+                                  carpeta=ruta_carpeta, archivo=nombre, tipo=clasificar_error(error))
+        
+        try:
+            for (nombre, metadatos, ruta_carpeta, categoria), datos in plan.ejecutar(al_fallar):
+                self.escritor.encolar(AdjuntoExtraido(nombre, datos, *metadatos, ruta_carpeta, categoria))
+        except Exception as e:
+            self.errors.registrar("lectura", f"Error leyendo adjuntos del PST: {describir_error(e)}",
+                                  tipo=clasificar_error(e))
+    
+    def registrar_en_log(self, xml_file, remitente, asunto, fecha, carpeta, tamaño):
+        """Registrar extracción en el log CSV (seguro entre hilos)."""
+        try:
+            # Limpiar datos para CSV
+            clean_remitente = str(remitente).replace(",", ";").replace("\n", " ").strip()[:100]
+            clean_asunto = str(asunto).replace(",", ";").replace("\n", " ").strip()[:150]
+            clean_fecha = str(fecha).replace(",", ";").replace("\n", " ").strip()
+            clean_carpeta = str(carpeta).replace(",", ";")
+            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            linea = f"{xml_file},{clean_remitente},{clean_asunto},{clean_fecha},{current_time},{clean_carpeta},{tamaño}\n"
+            
+            with self._log_lock:
+                if self._log_handle:
+                    self._log_handle.write(linea)
+                else:
+                    with open(self.log_file, "a", encoding="utf-8") as log:
+                        log.write(linea)
         except Exception as e:
-            self.errors.append(f"Error escribiendo log: {str(e)}")
+            self.errors.registrar("log", f"Error escribiendo log: {str(e)}", archivo=xml_file)
     
     def generar_reporte_final(self):
         """Generar reporte final de la extracción."""
@@ -444,28 +1181,105 @@ class ExtractorXMLPSTGUI:
             f.write("=" * 50 + "\n\n")
             f.write(f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
             f.write(f"Archivo PST: {self.pst_file}\n")
-            f.write(f"Directorio salida: {self.output_dir}\n\n")
+            f.write(f"Directorio salida: {self.output_dir}\n")
+            f.write(f"Filtros: {self.filtro.describir()}\n")
+            f.write(f"Reglas de adjuntos: {self.reglas.describir()}\n")
+            f.write(f"Lector: {self.describir_lector()}\n")
+            if self.resumen_cache_pst:
+                f.write(f"Caché PST: {self.resumen_cache_pst}\n")
+            f.write(f"Disposición de salida: {self.disposicion.describir()}\n")
+            f.write(f"Modo de salida: {self.modo_salida}\n")
+            f.write(f"Compresión: {self.compresor.describir() if self.compresor else 'sin compresión'}\n")
+            f.write(f"Preparación local: {self.preparacion.describir() if self.preparacion else 'no'}\n")
+            f.write(f"Límites de E/S: {LIMITADOR.describir()}\n\n")
             f.write("ESTADÍSTICAS:\n")
             f.write(f"- Emails procesados: {self.processed_emails:,}\n")
+            f.write(f"- Carpetas omitidas por filtro: {self.carpetas_omitidas:,}\n")
+            f.write(f"- Reintentos COM: {self.politica_reintentos.reintentos:,}\n")
+            f.write(f"- Pausas por saturación de Outlook: {self.politica_reintentos.aperturas_circuito:,}\n")
+            if self.carpetas_retomadas or self.carpetas_perdidas:
+                f.write(f"- Carpetas retomadas en la pasada final: {self.carpetas_retomadas:,} "
+                        f"({self.carpetas_perdidas:,} no se pudieron abrir)\n")
+            f.write(f"- Correos recuperados en la pasada final: {self.cola_reintentos.recuperados:,}\n")
+            f.write(f"- Correos perdidos tras reintentos: {self.cola_reintentos.perdidos:,}\n")
             f.write(f"- XMLs extraídos: {self.extracted_xml_files:,}\n")
+            f.write(f"- Adjuntos descartados por tamaño, MIME o remitente: {self.reglas.descartados:,}\n")
+            f.write(f"- Correos adjuntos recorridos: {self.mensajes_anidados:,}\n")
+            if self.zips_inspeccionados:
+                f.write(f"- Adjuntos .zip inspeccionados: {self.zips_inspeccionados:,} "
+                        f"({self.xml_desde_zip:,} XML extraídos, {self.zips_sin_xml:,} sin XML)\n")
             f.write(f"- Errores: {len(self.errors):,}\n\n")
             
-            if self.errors:
-                f.write("ERRORES ENCONTRADOS:\n")
-                for i, error in enumerate(self.errors[:20], 1):
-                    f.write(f"{i}. {error}\n")
-                if len(self.errors) > 20:
-                    f.write(f"... y {len(self.errors)-20} errores más.\n")
+            if self.resumen_validacion:
+                self.resumen_validacion.escribir_resumen(f)
+            if self.resumen_firmas:
+                self.resumen_firmas.escribir_resumen(f)
+            
+            self.errors.escribir_resumen(f)
         
         print(f"📋 Reporte generado: {reporte_path}")
     
+    def describir_lector(self):
+        """Método de lectura usado, con las lecturas físicas del lector nativo."""
+        if self.metodo_usado != "nativo":
+            return "Outlook COM"
+        texto = f"nativo (orden: {self.orden_lectura}"
+        texto += ", volcado directo desde mmap)" if self.volcado_directo else ")"
+        if self.lecturas_pst:
+            lecturas, leidos = self.lecturas_pst
+            texto += f", {lecturas:,} lecturas físicas ({leidos / 1024 / 1024:.1f} MB)"
+        return texto
+    
+    def validar_documentos(self):
+        """Validar los XML extraídos contra los XSD de Hacienda (pool de procesos)."""
+        from validacion_xsd import ARCHIVO_RESULTADOS, validar_directorio
+        
+        print(f"🔍 Validando XML contra los esquemas XSD ({self.procesos_validacion} procesos)...")
+        
+        def progreso(validados, total):
+            self.actualizar_progreso(f"Validando XML: {validados:,} de {total:,}")
+        
+        try:
+            self.resumen_validacion = validar_directorio(
+                self.output_dir / "xml_facturacion",
+                self.output_dir / "reportes" / ARCHIVO_RESULTADOS,
+                procesos=self.procesos_validacion,
+                progreso=progreso,
+            )
+            print(f"✅ Validación XSD: {self.resumen_validacion.describir()}")
+        except ValueError as e:
+            # Sin lxml o sin esquemas locales: la extracción sigue siendo válida
+            print(f"⚠️ Validación XSD omitida: {e}")
+    
+    def verificar_firmas_documentos(self):
+        """Verificar las firmas XAdES de los XML extraídos (resultados junto al log CSV)."""
+        from verificacion_firmas import ARCHIVO_RESULTADOS as ARCHIVO_FIRMAS, verificar_directorio
+        
+        print(f"🔏 Verificando firmas XAdES ({self.procesos_validacion} procesos)...")
+        
+        def progreso(verificados, total):
+            self.actualizar_progreso(f"Verificando firmas: {verificados:,} de {total:,}")
+        
+        try:
+            self.resumen_firmas = verificar_directorio(
+                self.output_dir / "xml_facturacion",
+                self.output_dir / ARCHIVO_FIRMAS,
+                procesos=self.procesos_validacion,
+                progreso=progreso,
+            )
+            print(f"✅ Firmas: {self.resumen_firmas.describir()}")
+        except ValueError as e:
+            print(f"⚠️ Verificación de firmas omitida: {e}")
+    
     def extraer_xml_files(self):
         """Ejecutar el proceso completo de extracción."""
         print("🚀 Iniciando extracción de archivos XML desde PST...")
         
         try:
             # Configurar directorios
+            self.iniciar_etapa("preparacion")
             self.setup_directories()
+            self.errors.abrir(self.output_dir / "reportes" / "errores.jsonl")
             
             # Validar archivo PST
             size_mb = self.validate_pst_file()
@@ -474,22 +1288,40 @@ class ExtractorXMLPSTGUI:
             self.inicializar_log()
             
             # Crear ventana de progreso
-            self.ventana_progreso = VentanaProgreso("Extrayendo XML de PST")
+            if self.interactivo:
+                self.ventana_progreso = VentanaProgreso("Extrayendo XML de PST",
+                                                        al_ver_resultados=self.abrir_explorador)
             
-            # Intentar extracción
+            # Intentar extracción: Outlook COM si está disponible, si no el lector nativo
             exito = False
+            usar_outlook = self.lector == "outlook" or (self.lector == "auto" and WIN32COM_AVAILABLE)
+            self.metodo_usado = "outlook" if usar_outlook else "nativo"
             
-            if WIN32COM_AVAILABLE:
+            if usar_outlook:
                 try:
                     exito = self.extraer_con_outlook_com()
                 except Exception as e:
                     print(f"❌ Error con Outlook COM: {e}")
+            else:
+                exito = self.extraer_con_lector_nativo()
             
             if not exito:
                 raise Exception("No se pudo extraer el PST con ningún método disponible")
             
+            self.cerrar_log()
+            self.errors.cerrar()
+            
+            if self.validar:
+                self.iniciar_etapa("validacion_xsd")
+                self.validar_documentos()
+            if self.verificar_firmas:
+                self.iniciar_etapa("verificacion_firmas")
+                self.verificar_firmas_documentos()
+            
             # Generar reporte
+            self.iniciar_etapa("reporte")
             self.generar_reporte_final()
+            self.terminar_etapa()
             
             # Finalizar ventana de progreso
             if self.ventana_progreso:
@@ -516,22 +1348,38 @@ class ExtractorXMLPSTGUI:
             print(f"❌ Errores: {len(self.errors):,}")
             print(f"📁 XMLs guardados en: {self.output_dir / 'xml_facturacion'}")
             
-            # Mostrar mensaje de éxito
-            messagebox.showinfo("Extracción Completada", mensaje_resultado)
+            # Mostrar mensaje de éxito y ofrecer el explorador de resultados
+            if self.interactivo:
+                from tkinter import messagebox
+                if self.explorador is not None and self.explorador.activa:
+                    messagebox.showinfo("Extracción Completada", mensaje_resultado)
+                elif messagebox.askyesno("Extracción Completada",
+                                         mensaje_resultado + "\n\n¿Explorar los resultados ahora?"):
+                    self.abrir_explorador()
+                if self.explorador is not None and self.explorador.activa:
+                    # La ventana de progreso se cierra al salir: esperar a que el usuario cierre el explorador
+                    self.explorador.ventana.wait_window()
             
             return True
             
         except Exception as e:
             error_msg = f"❌ Error durante la extracción: {str(e)}"
             print(error_msg)
+            self.estado = error_msg
             
             if self.ventana_progreso:
                 self.ventana_progreso.finalizar("Error en la extracción", exito=False)
             
-            messagebox.showerror("Error de Extracción", error_msg)
+            if self.interactivo:
+                from tkinter import messagebox
+                messagebox.showerror("Error de Extracción", error_msg)
             return False
         
         finally:
+            self.terminar_etapa()
+            self.cerrar_log()
+            self.errors.cerrar()
+            
             # Asegurar que la ventana se cierre
             if self.ventana_progreso:
                 # Mantener abierta 3 segundos más para que el usuario vea el resultado
@@ -548,6 +1396,8 @@ Ejemplos de uso:
   python extractor_xml_pst_gui.py                          # Usar GUI para todo
   python extractor_xml_pst_gui.py -i "archivo.pst"        # Especificar PST
   python extractor_xml_pst_gui.py -o "directorio_salida"  # Especificar salida
+  python extractor_xml_pst_gui.py -i "archivo.pst" --since 2025-01-01 --skip-system-folders
+  python extractor_xml_pst_gui.py -i "archivo.pst" --reader nativo   # Sin Outlook
 
 Características:
   🖱️  Interfaz gráfica fácil de usar
@@ -571,7 +1421,114 @@ correos del archivo PST seleccionado, sin importar el nombre del archivo.
         help="Directorio de salida (se creará automáticamente si no se especifica)"
     )
     
+    parser.add_argument(
+        "--workers", type=int, default=PIPELINE_WRITER_THREADS,
+        help=f"Hilos que escriben los XML en disco (por defecto {PIPELINE_WRITER_THREADS})"
+    )
+    
+    parser.add_argument(
+        "--queue-size", type=int, default=PIPELINE_QUEUE_SIZE,
+        help=f"Adjuntos en memoria como máximo antes de pausar la lectura de Outlook (por defecto {PIPELINE_QUEUE_SIZE})"
+    )
+    
+    parser.add_argument(
+        "--output-mode", choices=("archivos", "zip", "tar"), default="archivos",
+        help="'archivos': un archivo por XML; 'zip'/'tar': paquetes con índice indice_paquetes.jsonl"
+    )
+    
+    parser.add_argument(
+        "--shard-size-mb", type=int, default=PACK_SHARD_SIZE_MB,
+        help=f"Tamaño máximo de cada paquete en modo zip/tar (por defecto {PACK_SHARD_SIZE_MB} MB)"
+    )
+    
+    parser.add_argument(
+        "--compress", choices=FORMATOS_COMPRESION, default="ninguna",
+        help="Guardar cada XML comprimido (.xml.gz / .xml.zst); las demás herramientas los leen igual"
+    )
+    
+    parser.add_argument(
+        "--compression-level", type=int, default=None,
+        help="Nivel de compresión (por defecto el de config.py)"
+    )
+    
+    parser.add_argument(
+        "--validate", action="store_true",
+        help="Validar los XML extraídos contra los XSD de Hacienda (src/esquemas_xsd/)"
+    )
+    
+    parser.add_argument(
+        "--validation-processes", type=int, default=VALIDATION_WORKERS,
+        help=f"Procesos para la validación XSD y la verificación de firmas (por defecto {VALIDATION_WORKERS})"
+    )
+    
+    parser.add_argument(
+        "--verify-signatures", action="store_true",
+        help="Verificar las firmas XAdES de los XML extraídos contra src/anclas_confianza/ (sin conexión)"
+    )
+    
+    parser.add_argument(
+        "--reader", choices=LECTORES, default="auto",
+        help="'outlook': Outlook COM; 'nativo': leer el PST directamente (sin Outlook); "
+             "'auto': Outlook si está disponible (por defecto)"
+    )
+    
+    parser.add_argument(
+        "--read-order", choices=ORDENES_LECTURA, default="desplazamiento",
+        help="Lector nativo: 'desplazamiento' lee los adjuntos en el orden en que están en el archivo "
+             "(menos saltos en discos y recursos de red); 'arbol' los lee al recorrer las carpetas"
+    )
+    
+    parser.add_argument(
+        "--attachment-rules", choices=tuple(ATTACHMENT_RULE_SETS), default=ATTACHMENT_RULES_DEFAULT,
+        help="Conjunto de reglas de config.ATTACHMENT_RULE_SETS: qué adjuntos se extraen y en qué "
+             f"subdirectorio (por defecto '{ATTACHMENT_RULES_DEFAULT}')"
+    )
+    
+    parser.add_argument(
+        "--nested-depth", type=int, default=NESTED_MESSAGE_MAX_DEPTH,
+        help=f"Niveles de correos adjuntos a otros correos en los que buscar XML (por defecto "
+             f"{NESTED_MESSAGE_MAX_DEPTH}; 0 los ignora)"
+    )
+    
+    parser.add_argument(
+        "--pst-cache-mb", type=int, default=PST_CACHE_MB,
+        help=f"Lector nativo: memoria para la caché de B-trees, heaps y esquemas (por defecto {PST_CACHE_MB}; 0 la desactiva)"
+    )
+    
+    parser.add_argument(
+        "--staging-dir", metavar="DIR",
+        help="Escribir los XML en este directorio local y trasladarlos por lotes al directorio de "
+             "salida (para salidas en recursos de red)"
+    )
+    
+    parser.add_argument(
+        "--durability", choices=DURABILIDADES, default=STAGING_DURABILITY,
+        help="Con --staging-dir: fsync en el destino por 'archivo', al cerrar cada 'lote' o 'ninguna' "
+             f"(por defecto '{STAGING_DURABILITY}')"
+    )
+    
+    agregar_argumentos_disposicion(parser)
+    agregar_argumentos_filtro(parser)
+    agregar_argumentos_io(parser)
+    
     args = parser.parse_args()
+    configurar_limites_desde_argumentos(args, parser)
+    
+    if args.compress != "ninguna" and args.output_mode != "archivos":
+        parser.error("--compress solo aplica con --output-mode archivos (los paquetes ya se comprimen)")
+    if args.staging_dir and args.output_mode != "archivos":
+        parser.error("--staging-dir solo aplica con --output-mode archivos")
+    if args.compress == "zstd" and not ZSTD_AVAILABLE:
+        parser.error("--compress zstd requiere el paquete 'zstandard' (pip install zstandard)")
+    
+    try:
+        filtro = filtro_desde_argumentos(args)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    # La GUI se carga después de validar los argumentos (--help no la necesita)
+    import tkinter as tk
+    from tkinter import filedialog, messagebox
     
     try:
         # Mostrar información inicial
@@ -580,13 +1537,14 @@ correos del archivo PST seleccionado, sin importar el nombre del archivo.
         print("Busca y extrae archivos con extensión .xml en archivos PST (cualquier nombre)")
         print()
         
-        # Verificar dependencias críticas
-        if not WIN32COM_AVAILABLE:
+        # Verificar dependencias críticas (el lector nativo no necesita Outlook)
+        if args.reader == "outlook" and not WIN32COM_AVAILABLE:
             error_msg = (
                 "❌ ERROR: win32com.client no disponible\n\n"
                 "Para instalar:\n"
                 "pip install pywin32\n\n"
-                "Esta dependencia es necesaria para acceder a archivos PST en Windows."
+                "Esta dependencia es necesaria para acceder a archivos PST con Outlook.\n"
+                "Use --reader nativo para leer el PST sin Outlook."
             )
             print(error_msg)
             messagebox.showerror("Dependencia Faltante", error_msg)
@@ -680,7 +1638,19 @@ correos del archivo PST seleccionado, sin importar el nombre del archivo.
                 sys.exit(1)
         
         # Crear y ejecutar extractor
-        extractor = ExtractorXMLPSTGUI(pst_file, output_dir)
+        print(f"🔎 Filtros: {filtro.describir()}")
+        extractor = ExtractorXMLPSTGUI(pst_file, output_dir, filtro=filtro,
+                                       hilos_escritura=args.workers, tamano_cola=args.queue_size,
+                                       disposicion=DisposicionSalida(args.layout, args.hash_levels),
+                                       modo_salida=args.output_mode, tamano_paquete_mb=args.shard_size_mb,
+                                       compresion=args.compress, nivel_compresion=args.compression_level,
+                                       validar=args.validate, procesos_validacion=args.validation_processes,
+                                       verificar_firmas=args.verify_signatures,
+                                       lector=args.reader, orden_lectura=args.read_order,
+                                       cache_pst_mb=args.pst_cache_mb,
+                                       profundidad_anidados=args.nested_depth,
+                                       reglas=ReglasAdjuntos(nombre=args.attachment_rules),
+                                       preparacion_local=args.staging_dir, durabilidad=args.durability)
         exito = extractor.extraer_xml_files()
         
         if exito:
@@ -1,16 +1,32 @@
+import io
 import os
-import errno
-from pathlib import Path
-import shutil
+import zlib
+from pathlib import Path, PurePosixPath
 import argparse
 import xml.etree.ElementTree as ET
-import tkinter as tk
-from tkinter import filedialog, messagebox
 
-def obtener_tag_raiz(xml_path: Path) -> str:
-    """Obtener el nombre del tag raíz del XML (sin namespace)."""
+from almacen_comprimido import abrir_xml, buscar_xml, nombre_sin_compresion, sufijo_compresion
+from archivo_empaquetado import IndicePaquetes, buscar_indice
+from config import MOVE_THREADS
+from disposicion_salida import buscar_disposicion
+from limitador_io import agregar_argumentos_io, configurar_limites_desde_argumentos
+from movimiento_masivo import MotorMovimientos
+from plan_movimientos import PlanMovimientos, agregar_argumentos_plan, ejecutar_plan_desde_argumentos
+
+def obtener_tag_raiz(xml_path) -> str:
+    """Obtener el nombre del tag raíz del XML (sin namespace).
+
+    Acepta una ruta (.xml, .xml.gz o .xml.zst) o un objeto archivo; solo se
+    lee (y descomprime) el inicio del documento.
+    """
+    if hasattr(xml_path, "read"):
+        return _tag_raiz_de_archivo(xml_path)
+    with abrir_xml(xml_path) as f:
+        return _tag_raiz_de_archivo(f)
+
+def _tag_raiz_de_archivo(f) -> str:
     try:
-        for _event, elem in ET.iterparse(xml_path, events=("start",)):
+        for _event, elem in ET.iterparse(f, events=("start",)):
             tag = elem.tag
             if "}" in tag:
                 tag = tag.split("}", 1)[1]
@@ -32,53 +48,35 @@ def tiene_tag_raiz(xml_path: Path, tag_buscado: str) -> bool:
         print(f"No se pudo leer {xml_path}: {e}", flush=True)
         return False
 
-def obtener_destino_unico(destino_dir: Path, nombre_archivo: str) -> Path:
-    """Generar un nombre único en el directorio destino evitando sobrescrituras."""
-    destino_dir.mkdir(parents=True, exist_ok=True)
+def obtener_destino_unico(destino_dir: Path, nombre_archivo: str, ocupado=Path.exists) -> Path:
+    """Generar un nombre único en el directorio destino evitando sobrescrituras.
+
+    ``ocupado`` decide si un nombre ya está tomado (con un plan, también los
+    destinos ya planificados).
+    """
     destino = destino_dir / nombre_archivo
-    if not destino.exists():
+    if not ocupado(destino):
         return destino
 
-    base, ext = os.path.splitext(nombre_archivo)
+    sufijo = sufijo_compresion(nombre_archivo)
+    base, ext = os.path.splitext(nombre_sin_compresion(nombre_archivo))
     contador = 1
     while True:
-        candidato = destino_dir / f"{base}_{contador:03d}{ext}"
-        if not candidato.exists():
+        candidato = destino_dir / f"{base}_{contador:03d}{ext}{sufijo}"
+        if not ocupado(candidato):
             return candidato
         contador += 1
 
 def mover_archivo(xml_file: Path, destino_dir: Path) -> bool:
-    """Mover un archivo manejando bloqueos; retorna True si se movió."""
-    destino_dir.mkdir(parents=True, exist_ok=True)
+    """Mover un solo archivo con el motor de movimientos; retorna True si se movió.
 
-    def copiar_y_eliminar() -> bool:
-        destino = obtener_destino_unico(destino_dir, xml_file.name)
-        try:
-            shutil.copy2(str(xml_file), str(destino))
-            try:
-                os.remove(xml_file)
-            except PermissionError as delete_err:
-                print(f"No se pudo eliminar el original {xml_file} tras copiarlo ({delete_err}).")
-                return False
-            return True
-        except Exception as copy_err:
-            print(f"No se pudo mover {xml_file} (copia fallida). Error: {copy_err}")
-            return False
-
-    destino = obtener_destino_unico(destino_dir, xml_file.name)
-    try:
-        shutil.move(str(xml_file), str(destino))
-        return True
-    except PermissionError as err:
-        print(f"Archivo en uso {xml_file} ({err}). Intentando copiar y eliminar...")
-        return copiar_y_eliminar()
-    except OSError as err:
-        win_err = getattr(err, "winerror", None)
-        if err.errno in (errno.EACCES, errno.EPERM) or win_err in (32,):
-            print(f"No se pudo mover {xml_file} directamente ({err}). Intentando copiar...")
-            return copiar_y_eliminar()
-        print(f"No se pudo mover {xml_file}. Error: {err}")
-        return False
+    Para muchos archivos es mejor acumularlos en un ``MotorMovimientos`` (ver
+    ``procesar_xmls``): directorios creados y listados una vez y movimientos
+    en paralelo.
+    """
+    motor = MotorMovimientos(hilos=1)
+    motor.agregar(xml_file, destino_dir)
+    return motor.ejecutar()["movidos"] == 1
 
 def esta_en_directorio(path: Path, directorio: Path) -> bool:
     """Verificar si path está dentro del directorio proporcionado."""
@@ -89,6 +87,10 @@ def esta_en_directorio(path: Path, directorio: Path) -> bool:
         return False
 
 def seleccionar_carpeta(titulo):
+    # tkinter solo se carga si hace falta el diálogo (no al usar --dir)
+    import tkinter as tk
+    from tkinter import filedialog
+    
     root = tk.Tk()
     root.withdraw()
     try:
@@ -100,19 +102,89 @@ def seleccionar_carpeta(titulo):
     root.destroy()
     return carpeta
 
-def procesar_xmls(input_dir, output_dir=None):
+def procesar_paquetes(raiz_paquetes: Path):
+    """Clasificar MensajeHacienda dentro de paquetes reescribiendo solo el índice."""
+    _raiz, disposicion = buscar_disposicion(raiz_paquetes)
+    fragmentada = disposicion is not None and disposicion.fragmentada
+
+    indice = IndicePaquetes(raiz_paquetes)
+    print(f"Salida empaquetada detectada: {len(indice)} documentos en {raiz_paquetes}", flush=True)
+
+    movidos = 0
+    procesados = 0
+    try:
+        for entrada in indice:
+            nombre = PurePosixPath(entrada["nombre"])
+            if any(part.lower() == "haciendaresponse" for part in nombre.parts):
+                continue
+
+            procesados += 1
+            try:
+                tag = obtener_tag_raiz(io.BytesIO(indice.leer(entrada)))
+            except (ET.ParseError, OSError, zlib.error) as e:
+                print(f"No se pudo leer {nombre} ({entrada['paquete']}): {e}", flush=True)
+                continue
+
+            if tag == "MensajeHacienda":
+                if fragmentada:
+                    destino = PurePosixPath("HaciendaResponse") / nombre
+                else:
+                    destino = nombre.parent / "HaciendaResponse" / nombre.name
+                destino = indice.nombre_unico(str(destino))
+                indice.renombrar(entrada, destino)
+                movidos += 1
+                print(f"Movido: {nombre} -> {destino}", flush=True)
+
+            if procesados % 100 == 0:
+                print(f"Procesados {procesados} documentos...", flush=True)
+
+        indice.guardar()
+    finally:
+        indice.cerrar()
+
+    print(f"Procesamiento terminado. Documentos procesados: {procesados}, movidos: {movidos}", flush=True)
+
+def procesar_xmls(input_dir, output_dir=None, ruta_plan=None, hilos=MOVE_THREADS):
+    """Mover los MensajeHacienda a HaciendaResponse/ (o solo planificarlo si se indica ``ruta_plan``)."""
     base_dir = Path(input_dir)
+
+    # Salida empaquetada: se trabaja sobre el índice, no sobre archivos sueltos
+    raiz_paquetes = buscar_indice(base_dir)
+    if raiz_paquetes is not None:
+        if ruta_plan:
+            print("Con salida empaquetada solo se reescribe el índice; --plan no aplica.")
+            return
+        if output_dir:
+            print("Con salida empaquetada los MensajeHacienda se reubican dentro del índice; se ignora --output-dir.")
+        procesar_paquetes(raiz_paquetes)
+        return
+
     base_dir.mkdir(exist_ok=True)
 
     output_base = Path(output_dir).resolve() if output_dir else None
 
-    xml_files = [xml for xml in base_dir.rglob("*.xml")]
+    # Con una disposición fragmentada (fecha/emisor/hash) los MensajeHacienda van a un único
+    # HaciendaResponse en la raíz que replica las cubetas, en lugar de uno por cubeta
+    raiz_disposicion, disposicion = buscar_disposicion(base_dir)
+    if disposicion is not None and disposicion.fragmentada:
+        print(f"Disposición detectada en {raiz_disposicion}: {disposicion.describir()}", flush=True)
+    else:
+        raiz_disposicion = None
+
+    xml_files = list(buscar_xml(base_dir))
 
     if not xml_files:
         print("No se encontraron archivos XML en la carpeta de entrada.")
         return
 
-    movidos = 0
+    plan = PlanMovimientos(ruta_plan, "filtrar", base_dir) if ruta_plan else None
+    if plan is not None:
+        print(f"Modo plan: los movimientos se escribirán en {ruta_plan}; no se moverá nada.", flush=True)
+
+    # Los movimientos se acumulan y se hacen todos juntos al terminar el análisis
+    motor = MotorMovimientos(
+        hilos, al_mover=lambda origen, destino: print(f"Movido: {origen} -> {destino}", flush=True)
+    )
     procesados = 0
     for xml_file in xml_files:
         procesados += 1
@@ -136,12 +208,18 @@ def procesar_xmls(input_dir, output_dir=None):
                     except ValueError:
                         relative_parent = Path()
                     destino_dir = output_base / relative_parent / "HaciendaResponse"
+                elif raiz_disposicion is not None:
+                    relative_parent = xml_file.resolve().parent.relative_to(raiz_disposicion)
+                    destino_dir = raiz_disposicion / "HaciendaResponse" / relative_parent
                 else:
                     destino_dir = xml_file.parent / "HaciendaResponse"
 
-                if mover_archivo(xml_file, destino_dir):
-                    movidos += 1
-                    print(f"Movido: {xml_file} -> {destino_dir}", flush=True)
+                if plan is not None:
+                    destino = obtener_destino_unico(destino_dir, xml_file.name, plan.ocupado)
+                    plan.agregar(xml_file, destino, "MensajeHacienda")
+                    print(f"Al plan: {xml_file} -> {destino}", flush=True)
+                else:
+                    motor.agregar(xml_file, destino_dir)
         except ValueError as e:
             print(f"Ruta fuera del directorio base, se omite {xml_file}: {e}", flush=True)
         except Exception as e:
@@ -150,11 +228,23 @@ def procesar_xmls(input_dir, output_dir=None):
         if procesados % 100 == 0:
             print(f"Procesados {procesados} archivos...", flush=True)
 
-    print(f"Procesamiento terminado. Archivos procesados: {procesados}, movidos: {movidos}", flush=True)
+    if plan is not None:
+        plan.cerrar()
+        print(f"Plan terminado. Archivos procesados: {procesados}, movimientos en el plan: {len(plan)} "
+              f"({ruta_plan}; aplíquelo con --apply)", flush=True)
+        return
+
+    if len(motor):
+        print(f"Moviendo {len(motor)} MensajeHacienda con {hilos} hilos...", flush=True)
+    resumen = motor.ejecutar()
+    print(f"Procesamiento terminado. Archivos procesados: {procesados}, movidos: {resumen['movidos']} "
+          f"({resumen['mismo_volumen']} en el mismo volumen, {resumen['entre_volumenes']} entre volúmenes, "
+          f"{resumen['reintentados']} tras reintentar), en uso: {len(resumen['bloqueados'])}, "
+          f"errores: {len(resumen['errores'])}", flush=True)
 
     # Listar facturas restantes
     print(f"Archivos en {base_dir} (que empiezan con <FacturaElectronica):")
-    for xml_file in base_dir.rglob("*.xml"):
+    for xml_file in buscar_xml(base_dir):
         try:
             if tiene_tag_raiz(xml_file, "FacturaElectronica"):
                 print(f"  - {xml_file.relative_to(base_dir)}")
@@ -164,7 +254,7 @@ def procesar_xmls(input_dir, output_dir=None):
     # Listar mensajes movidos
     if output_base:
         print(f"Archivos en {output_base} (que empiezan con <MensajeHacienda):")
-        for xml_file in output_base.rglob("*.xml"):
+        for xml_file in buscar_xml(output_base):
             try:
                 if tiene_tag_raiz(xml_file, "MensajeHacienda"):
                     print(f"  - {xml_file.relative_to(output_base)}")
@@ -173,14 +263,24 @@ def procesar_xmls(input_dir, output_dir=None):
     else:
         print("Archivos movidos a subcarpetas HaciendaResponse (por carpeta original):")
         for hacienda_dir in base_dir.rglob("HaciendaResponse"):
-            for xml_file in hacienda_dir.glob("*.xml"):
+            for xml_file in buscar_xml(hacienda_dir, recursivo=False):
                 print(f"  - {xml_file.relative_to(base_dir)}")
 
-if __name__ == "__main__":
+def main():
+    """Función principal del script."""
     parser = argparse.ArgumentParser(description="Filtra y mueve XMLs de Hacienda")
     parser.add_argument('--input-dir', default=None, help='Carpeta de entrada de XMLs')
     parser.add_argument('--output-dir', default=None, help='Carpeta destino para MensajeHacienda')
+    parser.add_argument('--move-threads', type=int, default=MOVE_THREADS,
+                        help=f'Movimientos simultáneos (por defecto {MOVE_THREADS})')
+    agregar_argumentos_plan(parser)
+    agregar_argumentos_io(parser)
     args = parser.parse_args()
+    configurar_limites_desde_argumentos(args, parser)
+
+    # Aplicar o deshacer un plan no necesita leer ningún XML
+    if ejecutar_plan_desde_argumentos(args):
+        return
 
     input_dir = args.input_dir or seleccionar_carpeta("Selecciona la carpeta de entrada de XMLs")
     if not input_dir:
@@ -194,4 +294,7 @@ if __name__ == "__main__":
     else:
         output_dir = None
 
-    procesar_xmls(input_dir, output_dir)
+    procesar_xmls(input_dir, output_dir, ruta_plan=args.plan, hilos=args.move_threads)
+
+if __name__ == "__main__":
+    main()
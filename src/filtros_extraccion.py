@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Filtros de extracción aplicados antes de materializar los correos.
+
+Permite descartar carpetas completas (globs de inclusión/exclusión),
+correos fuera de una ventana de fechas de recepción, remitentes fuera
+de una lista de dominios permitidos y clases de mensaje no deseadas.
+
+Cada backend aplica el filtro lo más temprano posible:
+- Outlook COM: la carpeta se poda antes de tocar ``folder.Items`` y el
+  resto de condiciones se traduce a una restricción DASL para
+  ``Items.Restrict``, de modo que Outlook solo devuelve los correos que
+  interesan.
+- Backends nativos: ``carpeta_permitida`` / ``carpeta_descartable`` se
+  evalúan sobre la jerarquía de nodos y ``coincide_mensaje`` sobre las
+  propiedades del índice antes de leer adjuntos.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import fnmatch
+from datetime import datetime, timedelta, timezone
+
+# Propiedades DASL usadas en la restricción de Outlook
+DASL_FECHA_RECEPCION = '"urn:schemas:httpmail:datereceived"'
+DASL_EMAIL_REMITENTE = '"urn:schemas:httpmail:fromemail"'
+DASL_TIENE_ADJUNTOS = '"urn:schemas:httpmail:hasattachment"'
+DASL_CLASE_MENSAJE = '"http://schemas.microsoft.com/mapi/proptag/0x001a001f"'
+
+# Carpetas de sistema que casi nunca contienen facturas (nombres en inglés y español)
+CARPETAS_SISTEMA = [
+    "*/Deleted Items", "*/Elementos eliminados",
+    "*/Junk E-mail", "*/Junk Email", "*/Correo no deseado",
+    "*/Calendar", "*/Calendario",
+    "*/Contacts", "*/Contactos",
+    "*/Tasks", "*/Tareas",
+    "*/Notes", "*/Notas",
+    "*/Journal", "*/Diario",
+    "*/Sync Issues*", "*/Problemas de sincronización*",
+]
+
+
+def parsear_fecha(texto, fin_de_dia=False):
+    """
+    Convertir 'YYYY-MM-DD' (o 'YYYY-MM-DD HH:MM') en datetime.
+
+    Args:
+        texto (str): Fecha en formato ISO
+        fin_de_dia (bool): Si solo se da el día, devolver el inicio del día siguiente
+
+    Returns:
+        datetime: Fecha local sin zona horaria, o None si texto está vacío
+    """
+    if not texto:
+        return None
+
+    texto = texto.strip()
+    for formato in ("%Y-%m-%d %H:%M", "%Y-%m-%dT%H:%M", "%Y-%m-%d"):
+        try:
+            fecha = datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+        if formato == "%Y-%m-%d" and fin_de_dia:
+            fecha += timedelta(days=1)
+        return fecha
+
+    raise ValueError(f"Fecha inválida '{texto}' (use YYYY-MM-DD o 'YYYY-MM-DD HH:MM')")
+
+
+def normalizar_fecha(fecha):
+    """Quitar la zona horaria de una fecha (COM devuelve hora local marcada como UTC)."""
+    if fecha is None or not hasattr(fecha, "year"):
+        return None
+    return datetime(fecha.year, fecha.month, fecha.day,
+                    getattr(fecha, "hour", 0), getattr(fecha, "minute", 0),
+                    getattr(fecha, "second", 0))
+
+
+class FiltroExtraccion:
+    """Conjunto de condiciones que decide qué carpetas y correos se procesan."""
+
+    def __init__(self, incluir_carpetas=None, excluir_carpetas=None, desde=None, hasta=None,
+                 dominios_remitente=None, clases_mensaje=None, solo_con_adjuntos=True):
+        """
+        Inicializar el filtro.
+
+        Args:
+            incluir_carpetas (list): Globs de rutas de carpeta cuyos correos se procesan
+            excluir_carpetas (list): Globs de rutas de carpeta que se omiten con sus subcarpetas
+            desde (datetime): Fecha de recepción mínima (inclusive)
+            hasta (datetime): Fecha de recepción máxima (exclusiva)
+            dominios_remitente (list): Dominios de remitente permitidos (ej. 'proveedor.com')
+            clases_mensaje (list): Prefijos de clase de mensaje permitidos (ej. 'IPM.Note')
+            solo_con_adjuntos (bool): Pedir al backend solo correos con adjuntos
+        """
+        self.incluir_carpetas = [p.lower() for p in (incluir_carpetas or [])]
+        self.excluir_carpetas = [p.lower() for p in (excluir_carpetas or [])]
+        self.desde = desde
+        self.hasta = hasta
+        self.dominios_remitente = [d.lower().lstrip("@").strip() for d in (dominios_remitente or []) if d.strip()]
+        self.clases_mensaje = [c.strip() for c in (clases_mensaje or []) if c.strip()]
+        self.solo_con_adjuntos = solo_con_adjuntos
+
+        if self.desde and self.hasta and self.desde >= self.hasta:
+            raise ValueError("La fecha 'desde' debe ser anterior a 'hasta'")
+
+    @staticmethod
+    def _coincide_glob(ruta, patrones):
+        """Comparar la ruta completa y el nombre de la carpeta con una lista de globs."""
+        ruta = str(ruta).strip("/").lower()
+        nombre = ruta.rsplit("/", 1)[-1]
+        for patron in patrones:
+            if fnmatch.fnmatchcase(ruta, patron) or fnmatch.fnmatchcase(nombre, patron):
+                return True
+        return False
+
+    def carpeta_descartable(self, ruta):
+        """True si la carpeta (y todo su subárbol) debe omitirse sin abrirla."""
+        return bool(self.excluir_carpetas) and self._coincide_glob(ruta, self.excluir_carpetas)
+
+    def carpeta_permitida(self, ruta):
+        """True si los correos de esta carpeta deben procesarse."""
+        if self.carpeta_descartable(ruta):
+            return False
+        if not self.incluir_carpetas:
+            return True
+        return self._coincide_glob(ruta, self.incluir_carpetas)
+
+    @property
+    def filtra_mensajes(self):
+        """True si hay condiciones a nivel de correo (fecha, remitente o clase)."""
+        return bool(self.desde or self.hasta or self.dominios_remitente or self.clases_mensaje)
+
+    def coincide_mensaje(self, fecha=None, email_remitente=None, clase_mensaje=None):
+        """
+        Evaluar las condiciones de correo con valores ya leídos del índice.
+
+        Los valores desconocidos (None) no descartan el correo para no perder
+        facturas por metadatos incompletos.
+        """
+        fecha = normalizar_fecha(fecha)
+        if fecha is not None:
+            if self.desde and fecha < self.desde:
+                return False
+            if self.hasta and fecha >= self.hasta:
+                return False
+
+        if self.dominios_remitente and email_remitente:
+            dominio = str(email_remitente).lower().rsplit("@", 1)[-1].strip(" >")
+            if dominio not in self.dominios_remitente:
+                return False
+
+        if self.clases_mensaje and clase_mensaje:
+            clase = str(clase_mensaje).lower()
+            if not any(clase.startswith(c.lower()) for c in self.clases_mensaje):
+                return False
+
+        return True
+
+    @staticmethod
+    def _fecha_dasl(fecha):
+        """Formatear una fecha local como UTC en el formato que acepta DASL."""
+        utc = fecha.astimezone(timezone.utc)
+        return utc.strftime("%m/%d/%Y %I:%M %p")
+
+    def restriccion_dasl(self):
+        """
+        Construir la cadena para ``Items.Restrict`` (sintaxis DASL, prefijo @SQL=).
+
+        Returns:
+            str: Restricción DASL, o cadena vacía si no hay nada que restringir
+        """
+        condiciones = []
+
+        if self.solo_con_adjuntos:
+            condiciones.append(f"{DASL_TIENE_ADJUNTOS} = 1")
+        if self.desde:
+            condiciones.append(f"{DASL_FECHA_RECEPCION} >= '{self._fecha_dasl(self.desde)}'")
+        if self.hasta:
+            condiciones.append(f"{DASL_FECHA_RECEPCION} < '{self._fecha_dasl(self.hasta)}'")
+        if self.dominios_remitente:
+            dominios = " OR ".join(
+                f"{DASL_EMAIL_REMITENTE} LIKE '%@{d.replace(chr(39), chr(39) * 2)}'"
+                for d in self.dominios_remitente
+            )
+            condiciones.append(f"({dominios})")
+        if self.clases_mensaje:
+            clases = " OR ".join(
+                f"{DASL_CLASE_MENSAJE} LIKE '{c.replace(chr(39), chr(39) * 2)}%'"
+                for c in self.clases_mensaje
+            )
+            condiciones.append(f"({clases})")
+
+        if not condiciones:
+            return ""
+        return "@SQL=" + " AND ".join(condiciones)
+
+    def como_dict(self):
+        """Filtro serializable en JSON (manifiestos compartidos entre procesos)."""
+        return {
+            "incluir_carpetas": self.incluir_carpetas,
+            "excluir_carpetas": self.excluir_carpetas,
+            "desde": self.desde.isoformat() if self.desde else None,
+            "hasta": self.hasta.isoformat() if self.hasta else None,
+            "dominios_remitente": self.dominios_remitente,
+            "clases_mensaje": self.clases_mensaje,
+            "solo_con_adjuntos": self.solo_con_adjuntos,
+        }
+
+    @classmethod
+    def desde_dict(cls, datos):
+        """Reconstruir un filtro guardado con ``como_dict``."""
+        return cls(
+            incluir_carpetas=datos.get("incluir_carpetas"),
+            excluir_carpetas=datos.get("excluir_carpetas"),
+            desde=datetime.fromisoformat(datos["desde"]) if datos.get("desde") else None,
+            hasta=datetime.fromisoformat(datos["hasta"]) if datos.get("hasta") else None,
+            dominios_remitente=datos.get("dominios_remitente"),
+            clases_mensaje=datos.get("clases_mensaje"),
+            solo_con_adjuntos=datos.get("solo_con_adjuntos", True),
+        )
+
+    def describir(self):
+        """Resumen legible del filtro para consola y reporte."""
+        partes = []
+        if self.incluir_carpetas:
+            partes.append(f"carpetas incluidas: {', '.join(self.incluir_carpetas)}")
+        if self.excluir_carpetas:
+            partes.append(f"carpetas excluidas: {len(self.excluir_carpetas)} patrones")
+        if self.desde:
+            partes.append(f"desde: {self.desde:%Y-%m-%d %H:%M}")
+        if self.hasta:
+            partes.append(f"hasta: {self.hasta:%Y-%m-%d %H:%M}")
+        if self.dominios_remitente:
+            partes.append(f"dominios: {', '.join(self.dominios_remitente)}")
+        if self.clases_mensaje:
+            partes.append(f"clases: {', '.join(self.clases_mensaje)}")
+        return "; ".join(partes) if partes else "sin filtros"
+
+
+def agregar_argumentos_filtro(parser):
+    """Registrar en un ArgumentParser las opciones de filtrado."""
+    grupo = parser.add_argument_group("filtros (se aplican antes de leer cada correo)")
+    grupo.add_argument("--include-folder", action="append", default=[], metavar="GLOB",
+                       help="Procesar solo carpetas que coincidan (ruta o nombre; repetible)")
+    grupo.add_argument("--exclude-folder", action="append", default=[], metavar="GLOB",
+                       help="Omitir carpetas que coincidan y sus subcarpetas (repetible)")
+    grupo.add_argument("--skip-system-folders", action="store_true",
+                       help="Omitir Elementos eliminados, Correo no deseado, Calendario, Contactos, etc.")
+    grupo.add_argument("--since", metavar="YYYY-MM-DD",
+                       help="Solo correos recibidos desde esta fecha (inclusive)")
+    grupo.add_argument("--until", metavar="YYYY-MM-DD",
+                       help="Solo correos recibidos hasta esta fecha (inclusive)")
+    grupo.add_argument("--sender-domain", action="append", default=[], metavar="DOMINIO",
+                       help="Solo remitentes de este dominio (repetible)")
+    grupo.add_argument("--message-class", action="append", default=[], metavar="CLASE",
+                       help="Solo clases de mensaje con este prefijo, ej. IPM.Note (repetible)")
+    return grupo
+
+
+def filtro_desde_argumentos(args):
+    """Construir un FiltroExtraccion a partir de los argumentos parseados."""
+    excluir = list(args.exclude_folder)
+    if args.skip_system_folders:
+        excluir.extend(CARPETAS_SISTEMA)
+
+    return FiltroExtraccion(
+        incluir_carpetas=args.include_folder,
+        excluir_carpetas=excluir,
+        desde=parsear_fecha(args.since),
+        hasta=parsear_fecha(args.until, fin_de_dia=True),
+        dominios_remitente=args.sender_domain,
+        clases_mensaje=args.message_class,
+    )
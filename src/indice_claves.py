@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Índice compacto de Claves para detectar duplicados.
+
+Una Clave de Hacienda son 50 dígitos: como entero cabe en 21 bytes
+(10^50 < 2^168). El índice guarda cada Clave como un registro de ancho
+fijo en un único bloque ordenado (``bytearray`` o, si se abrió desde
+disco, un ``mmap`` de solo lectura) y la busca por bisección. Frente a un
+diccionario de tuplas ``(Path, str)`` (cientos de bytes por entrada) son
+21 bytes por Clave con alcance global o 29 con alcance por carpeta, donde
+cada registro lleva delante un hash de 8 bytes del directorio.
+
+Las Claves nuevas se acumulan en un conjunto de como mucho
+``CLAVE_INDEX_MERGE_ENTRIES`` entradas; al llenarse pasa a un segundo
+bloque ordenado, también de 21/29 bytes por Clave, que se fusiona con el
+principal cuando llega a la cuarta parte de este (inserción por tramos,
+sin reordenar todo). Así el costo total de fusionar es lineal y las
+Claves pendientes nunca ocupan memoria de objetos Python por encima de
+ese tope.
+Las Claves que no son de 50 dígitos (documentos fuera de norma) van en un
+conjunto aparte.
+
+Formato en disco (``guardar``/``abrir``)::
+
+    cabecera  '<8sHHQQ': b'IDXCLAVE', versión, ancho, registros, bytes de texto
+    registros ordenados de ``ancho`` bytes
+    texto UTF-8: una línea "<grupo hex>\\t<clave>" por Clave fuera de norma
+
+Abierto con ``IndiceClaves.abrir`` el archivo se proyecta en memoria de
+solo lectura: varios procesos lo comparten a través de la caché de páginas
+del sistema sin copiarlo cada uno.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import argparse
+import hashlib
+import mmap
+import os
+import struct
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+from config import CLAVE_INDEX_MERGE_ENTRIES
+
+MAGIA = b"IDXCLAVE"
+VERSION = 1
+CABECERA = struct.Struct("<8sHHQQ")
+ALCANCES = ("carpeta", "global")
+DIGITOS_CLAVE = 50
+BYTES_CLAVE = 21  # 10^50 < 2^168
+BYTES_GRUPO = 8
+GRUPO_GLOBAL = b""
+PASO_CERCA = 64  # Un registro de cada PASO_CERCA se copia a una lista para bisecar en C
+
+
+class _Registros:
+    """Secuencia de registros de ancho fijo sobre un bloque de bytes (para bisect)."""
+
+    def __init__(self, datos, ancho, cantidad, desplazamiento=0):
+        self.datos = datos
+        self.ancho = ancho
+        self.cantidad = cantidad
+        self.desplazamiento = desplazamiento
+        self._cercas = None
+
+    def __len__(self):
+        return self.cantidad
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.cantidad:
+            raise IndexError(i)
+        inicio = self.desplazamiento + i * self.ancho
+        return self.datos[inicio:inicio + self.ancho]
+
+    def _tramo_candidato(self, registro):
+        """Primer registro del único tramo de PASO_CERCA registros donde puede estar ``registro``."""
+        if self._cercas is None:
+            self._cercas = [self[i] for i in range(0, self.cantidad, PASO_CERCA)]
+        j = bisect_right(self._cercas, registro)
+        return None if j == 0 else (j - 1) * PASO_CERCA
+
+    def posicion(self, registro):
+        """Punto de inserción de ``registro`` (bisect_left en dos niveles: cercas y tramo)."""
+        inicio = self._tramo_candidato(registro)
+        if inicio is None:
+            return 0
+        return bisect_left(self, registro, inicio, min(inicio + PASO_CERCA, self.cantidad))
+
+    def contiene(self, registro):
+        """Búsqueda exacta: bisección sobre las cercas y ``find`` dentro del tramo."""
+        inicio = self._tramo_candidato(registro)
+        if inicio is None:
+            return False
+        tramo = self.tramo(inicio, min(inicio + PASO_CERCA, self.cantidad))
+        i = tramo.find(registro)
+        while i > 0 and i % self.ancho:
+            i = tramo.find(registro, i + 1)
+        return i != -1
+
+    def tramo(self, desde, hasta=None):
+        """Bytes de los registros [desde, hasta)."""
+        hasta = self.cantidad if hasta is None else hasta
+        return self.datos[self.desplazamiento + desde * self.ancho:self.desplazamiento + hasta * self.ancho]
+
+
+class IndiceClaves:
+    """Conjunto compacto de Claves (opcionalmente agrupadas por directorio)."""
+
+    def __init__(self, alcance="carpeta", umbral_fusion=CLAVE_INDEX_MERGE_ENTRIES):
+        """
+        Inicializar un índice vacío en memoria.
+
+        Args:
+            alcance (str): 'carpeta' (una Clave puede repetirse en directorios distintos)
+                o 'global' (una sola vez en todo el árbol)
+            umbral_fusion (int): Claves nuevas que se acumulan antes de fusionarlas
+                con el bloque ordenado
+        """
+        if alcance not in ALCANCES:
+            raise ValueError(f"Alcance desconocido '{alcance}' (use {', '.join(ALCANCES)})")
+        self.alcance = alcance
+        self.ancho = BYTES_CLAVE + (BYTES_GRUPO if alcance == "carpeta" else 0)
+        self.umbral_fusion = umbral_fusion
+        self._registros = _Registros(bytearray(), self.ancho, 0)
+        self._pendientes = set()
+        self._intermedio = _Registros(bytearray(), self.ancho, 0)  # Pendientes ya empaquetados y ordenados
+        self._fuera_de_norma = set()
+        self._mapa = None
+        self._archivo = None
+
+    @classmethod
+    def abrir(cls, ruta):
+        """
+        Abrir un índice guardado, proyectado en memoria de solo lectura.
+
+        Se puede seguir agregando Claves: la primera fusión copia el bloque a memoria.
+        """
+        archivo = open(ruta, "rb")
+        try:
+            mapa = mmap.mmap(archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            archivo.close()
+            raise ValueError(f"{ruta} está vacío; no es un índice de Claves")
+        if len(mapa) < CABECERA.size:
+            mapa.close()
+            archivo.close()
+            raise ValueError(f"{ruta} no es un índice de Claves")
+        magia, version, ancho, cantidad, bytes_texto = CABECERA.unpack_from(mapa, 0)
+        fin_registros = CABECERA.size + cantidad * ancho
+        if magia != MAGIA or version != VERSION or ancho not in (BYTES_CLAVE, BYTES_CLAVE + BYTES_GRUPO) \
+                or len(mapa) != fin_registros + bytes_texto:
+            mapa.close()
+            archivo.close()
+            raise ValueError(f"{ruta} no es un índice de Claves válido (versión {VERSION})")
+
+        indice = cls("global" if ancho == BYTES_CLAVE else "carpeta")
+        indice._mapa, indice._archivo = mapa, archivo
+        indice._registros = _Registros(mapa, ancho, cantidad, CABECERA.size)
+        for linea in mapa[fin_registros:].decode("utf-8").splitlines():
+            grupo, clave = linea.split("\t", 1)
+            indice._fuera_de_norma.add((bytes.fromhex(grupo), clave))
+        return indice
+
+    def __len__(self):
+        return len(self._registros) + len(self._intermedio) + len(self._pendientes) + len(self._fuera_de_norma)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def _grupo(self, grupo):
+        if self.alcance == "global":
+            return GRUPO_GLOBAL
+        return hashlib.blake2b(str(grupo).encode("utf-8"), digest_size=BYTES_GRUPO).digest()
+
+    def _registro(self, clave, grupo):
+        """Registro binario de la Clave, o None si no es de 50 dígitos."""
+        if len(clave) != DIGITOS_CLAVE or not clave.isdigit() or not clave.isascii():
+            return None
+        return self._grupo(grupo) + int(clave).to_bytes(BYTES_CLAVE, "big")
+
+    def contiene(self, clave, grupo=None):
+        """Indicar si la Clave ya está (en el directorio ``grupo`` si el alcance es por carpeta)."""
+        registro = self._registro(clave, grupo)
+        if registro is None:
+            return (self._grupo(grupo), clave) in self._fuera_de_norma
+        return self._contiene_registro(registro)
+
+    def _contiene_registro(self, registro):
+        return (registro in self._pendientes or self._intermedio.contiene(registro)
+                or self._registros.contiene(registro))
+
+    def agregar(self, clave, grupo=None):
+        """
+        Agregar una Clave.
+
+        Returns:
+            bool: True si no estaba (como ``set.add`` pero informando si era nueva)
+        """
+        registro = self._registro(clave, grupo)
+        if registro is None:
+            entrada = (self._grupo(grupo), clave)
+            if entrada in self._fuera_de_norma:
+                return False
+            self._fuera_de_norma.add(entrada)
+            return True
+        if self._contiene_registro(registro):
+            return False
+        self._pendientes.add(registro)
+        if len(self._pendientes) >= self.umbral_fusion:
+            self._empaquetar_pendientes()
+            # El bloque intermedio crece con el índice para que el costo total de fusionar sea lineal
+            if len(self._intermedio) >= max(self.umbral_fusion, len(self._registros) // 4):
+                self._fusionar_pendientes()
+        return True
+
+    @staticmethod
+    def _insertar(registros, nuevos):
+        """Bloque con ``registros`` y los ``nuevos`` (ordenados, ausentes de ``registros``) intercalados."""
+        resultado = bytearray()
+        anterior = 0
+        for registro in nuevos:
+            posicion = registros.posicion(registro)
+            resultado += registros.tramo(anterior, posicion)
+            resultado += registro
+            anterior = posicion
+        resultado += registros.tramo(anterior)
+        return resultado
+
+    def _empaquetar_pendientes(self):
+        """Pasar el conjunto de pendientes al bloque intermedio ordenado."""
+        if not self._pendientes:
+            return
+        bloque = self._insertar(self._intermedio, sorted(self._pendientes))
+        self._intermedio = _Registros(bloque, self.ancho, len(bloque) // self.ancho)
+        self._pendientes.clear()
+
+    def _fusionar_pendientes(self):
+        """Insertar todas las Claves pendientes en el bloque principal, copiando tramos enteros."""
+        self._empaquetar_pendientes()
+        if not len(self._intermedio):
+            return
+        self._reemplazar_bloque(self._insertar(self._registros, self._intermedio))
+        self._intermedio = _Registros(bytearray(), self.ancho, 0)
+
+    def fusionar(self, otro):
+        """Agregar todas las Claves de otro índice con el mismo alcance."""
+        if otro.alcance != self.alcance:
+            raise ValueError(f"No se puede fusionar un índice '{otro.alcance}' en uno '{self.alcance}'")
+        self._fusionar_pendientes()
+        otro._fusionar_pendientes()
+        registros = self._registros
+        resultado = bytearray()
+        anterior = 0
+        for registro in otro._registros:
+            posicion = registros.posicion(registro)
+            resultado += registros.tramo(anterior, posicion)
+            if posicion >= len(registros) or registros[posicion] != registro:
+                resultado += registro
+            anterior = posicion
+        resultado += registros.tramo(anterior)
+        self._reemplazar_bloque(resultado)
+        self._fuera_de_norma |= otro._fuera_de_norma
+
+    def guardar(self, ruta):
+        """Escribir el índice completo (reemplazo atómico del archivo)."""
+        self._fusionar_pendientes()
+        ruta = Path(ruta)
+        texto = "".join(f"{grupo.hex()}\t{clave}\n" for grupo, clave in sorted(self._fuera_de_norma)).encode("utf-8")
+        temporal = ruta.with_name(ruta.name + ".tmp")
+        with open(temporal, "wb") as f:
+            f.write(CABECERA.pack(MAGIA, VERSION, self.ancho, len(self._registros), len(texto)))
+            f.write(self._registros.tramo(0))
+            f.write(texto)
+        os.replace(temporal, ruta)
+
+    def memoria(self):
+        """Bytes aproximados que ocupa el índice en memoria de este proceso."""
+        en_memoria = 0 if self._mapa is not None else len(self._registros.datos)
+        en_memoria += len(self._intermedio.datos)
+        # ~60 bytes por objeto bytes (cercas) y ~100 en un set; las fuera de norma son tuplas de str
+        cercas = (len(self._registros) + len(self._intermedio)) // PASO_CERCA + 2
+        return en_memoria + 60 * cercas + 100 * len(self._pendientes) + 200 * len(self._fuera_de_norma)
+
+    def describir(self):
+        origen = "proyectado" if self._mapa is not None else f"{self.memoria() / (1024 * 1024):.1f} MB en memoria"
+        return f"{len(self):,} Claves, alcance {self.alcance}, {self.ancho} bytes por Clave ({origen})"
+
+    def _reemplazar_bloque(self, bloque):
+        self._liberar_mapa()
+        self._registros = _Registros(bloque, self.ancho, len(bloque) // self.ancho)
+
+    def _liberar_mapa(self):
+        if self._mapa is not None:
+            self._mapa.close()
+            self._archivo.close()
+            self._mapa = self._archivo = None
+
+    def cerrar(self):
+        """Cerrar el archivo proyectado (si lo hay)."""
+        self._registros = _Registros(bytearray(), self.ancho, 0)
+        self._intermedio = _Registros(bytearray(), self.ancho, 0)
+        self._pendientes.clear()
+        self._liberar_mapa()
+
+
+def main():
+    """Consultar un índice de Claves guardado."""
+    parser = argparse.ArgumentParser(description="Consultar un índice de Claves (.idx) de rename_xml_por_clave.py")
+    parser.add_argument("indice", help="Archivo de índice")
+    parser.add_argument("--contains", metavar="CLAVE", action="append", default=[],
+                        help="Indicar si la Clave está en el índice (alcance global)")
+    args = parser.parse_args()
+
+    try:
+        with IndiceClaves.abrir(args.indice) as indice:
+            print(f"🗃️ {args.indice}: {indice.describir()}")
+            for clave in args.contains:
+                if indice.alcance != "global":
+                    print("⚠️ --contains solo aplica a índices de alcance global")
+                    break
+                print(f"{'✅' if indice.contiene(clave) else '❌'} {clave}")
+    except (OSError, ValueError) as e:
+        print(f"❌ {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1191 @@
+#!/usr/bin/env python3
+"""
+Lector nativo de archivos PST, sin Outlook.
+
+Implementa lo necesario del formato [MS-PST] para recorrer carpetas,
+correos y adjuntos leyendo el archivo directamente:
+
+- NDB: cabecera, B-trees de nodos (NBT) y de bloques (BBT), bloques de
+  datos (con XBLOCK/XXBLOCK), árboles de subnodos y el cifrado
+  NDB_CRYPT_PERMUTE / NDB_CRYPT_CYCLIC.
+- LTP: heap-on-node, BTH, contextos de propiedades y de tabla.
+- Mensajería: carpetas, tablas de contenido y de adjuntos, y correos
+  adjuntos a otros correos (subnodos del adjunto).
+
+Recorrer un PST en el orden lógico de carpetas produce lecturas
+aleatorias por todo el archivo, muy lentas en discos mecánicos y
+recursos de red. Por eso los adjuntos no se leen al encontrarlos:
+``PlanLecturas`` reúne los bloques de datos de muchos adjuntos (sus
+desplazamientos salen del BBT, sin leerlos) y los lee ordenados por
+posición en el archivo, fusionando los bloques cercanos en una sola
+lectura.
+
+Con ``PST_USE_MMAP`` el archivo se proyecta en memoria y los adjuntos
+se vuelcan a disco bloque a bloque (``ContenidoAdjunto.volcar``): las
+vistas del mapa se escriben con escrituras vectoriales y los bloques
+cifrados se descifran en un búfer reutilizado, así la memoria por
+adjunto no depende de su tamaño.
+
+Cada correo vuelve a bajar por los mismos B-trees y abre heaps y
+esquemas de tabla ya vistos; ``CacheLRU`` guarda ya decodificadas las
+páginas de B-tree, los bloques de los heaps y los esquemas de PC/TC
+dentro de un presupuesto de memoria (``PST_CACHE_MB``).
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import io
+import mmap
+import os
+import struct
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from config import (
+    PST_CACHE_MB, PST_COALESCE_GAP_KB, PST_MAX_READ_MB, PST_STREAM_BUFFER_KB, PST_USE_MMAP,
+)
+from limitador_io import limitar
+
+# Cabecera
+MAGIA = b"!BDN"
+MAGIA_CLIENTE = b"SM"
+VERSIONES_ANSI = (14, 15)
+VERSION_UNICODE_MINIMA = 23
+VERSION_PAGINAS_4K = 36
+
+# Tipos de NID (5 bits bajos)
+NID_TIPO_CARPETA = 0x02
+NID_TIPO_MENSAJE = 0x04
+NID_TIPO_ADJUNTO = 0x05
+NID_TIPO_JERARQUIA = 0x0D
+NID_TIPO_CONTENIDO = 0x0E
+
+# NIDs especiales
+NID_ALMACEN = 0x21
+NID_CARPETA_RAIZ = 0x122
+NID_TABLA_ADJUNTOS = 0x671
+
+# Firmas del heap-on-node
+FIRMA_HN = 0xEC
+FIRMA_BTH = 0xB5
+FIRMA_PC = 0xBC
+FIRMA_TC = 0x7C
+
+# Tipos de propiedad
+PT_SHORT = 0x0002
+PT_LONG = 0x0003
+PT_DOUBLE = 0x0005
+PT_CURRENCY = 0x0006
+PT_APPTIME = 0x0007
+PT_ERROR = 0x000A
+PT_BOOLEAN = 0x000B
+PT_OBJECT = 0x000D
+PT_I8 = 0x0014
+PT_STRING8 = 0x001E
+PT_UNICODE = 0x001F
+PT_SYSTIME = 0x0040
+PT_BINARY = 0x0102
+
+# Tamaño de los valores que se guardan dentro del propio registro o celda
+TAMANOS_FIJOS = {
+    PT_SHORT: 2, PT_LONG: 4, PT_ERROR: 4, PT_BOOLEAN: 1,
+    PT_DOUBLE: 8, PT_CURRENCY: 8, PT_APPTIME: 8, PT_I8: 8, PT_SYSTIME: 8,
+}
+
+# Propiedades usadas (identificador sin tipo)
+PID_CLASE_MENSAJE = 0x001A
+PID_ASUNTO = 0x0037
+PID_NOMBRE_REMITENTE = 0x0C1A
+PID_EMAIL_REMITENTE = 0x0C1F
+PID_FECHA_ENTREGA = 0x0E06
+PID_FLAGS_MENSAJE = 0x0E07
+PID_TAMANO_ADJUNTO = 0x0E20
+PID_NOMBRE = 0x3001
+PID_DATOS_ADJUNTO = 0x3701
+PID_NOMBRE_CORTO_ADJUNTO = 0x3704
+PID_METODO_ADJUNTO = 0x3705
+PID_NOMBRE_LARGO_ADJUNTO = 0x3707
+PID_MIME_ADJUNTO = 0x370E
+PID_SUBARBOL_IPM = 0x35E0
+PID_ID_FILA = 0x67F2
+
+MSGFLAG_HASATTACH = 0x10
+ADJUNTO_POR_VALOR = 1
+ADJUNTO_EMBEBIDO = 5  # Correo adjunto (.msg reenviado como adjunto): PT_OBJECT apunta a un subnodo
+
+CIFRADO_NINGUNO = 0
+CIFRADO_PERMUTACION = 1
+CIFRADO_CICLICO = 2
+
+# Tablas de NDB_CRYPT_PERMUTE / NDB_CRYPT_CYCLIC ([MS-PST] 5.1)
+_MPBB_R = bytes.fromhex(
+    "41361362a8216ebbf416cc047f64e85d1ef2cb2a74c55e35d295479e962d9a88"
+    "4c7d843fdbac31b6485ff6c4d8398be7233b388ec8c1df25b120a546604e9cfb"
+    "aad35651457c550007c92b9d859b09a08fadb30f63ab894bd7a7155a716642bf"
+    "264a6b98faea7753b270052cfd593a867ece06eb827857c78d43afb41cd45bcd"
+    "e2e9274fc3087280cfb0eff5286dbe304d3492d50e3c2232e5e4f99fc2d10a81"
+    "12e1ee918376e397e6618a1779a4b7dc907a5c8c02a6ca69de501a1193b95287"
+    "58fced1d37491b6ae0293399bd6cd994f340546ff0c673b8d63e6518441fdd67"
+    "10f10c19ecae03a1147ba90bfff8a3c0a201f72ebc2468750dfeba2fb5d0da3d"
+)
+_MPBB_S = bytes.fromhex(
+    "14530f56b3c87a9ceb65481716159f02cc547c83000d0c0ba262a876dbd9edc7"
+    "c5a4dcac8574d6d0a79bae9a967166c36399b8dd73928e847da55ed15d93b157"
+    "5150808952944f4e0a6bbc8d7f6e47464140440111cb033ff7f4e1a98f3c3af9"
+    "fbf0193082092ec99da08649ee6f4d6dc42d813425871b88aafc06a11238fd4c"
+    "4272641337246a757743ffe6b44b365ce4d8353d45b92cecb7312b290768a30e"
+    "697b189e2139be281a5b78f523ca2ab0af3efe048ce7e5983295d3f64ae8a6ea"
+    "e9f3d52f7020f21f0567ad5510cecde3273bdabad7c226d4911dd21c2233f8fa"
+    "f15aefcf90b68bb5bdc0bf08971e6ce261e0c6c159abbb58de5fdf60797eb28a"
+)
+_MPBB_I = bytes.fromhex(
+    "47f1b4e60b6a7248854e9eebe2f89453e0bba002e85a09abdbe3bac67cc310dd"
+    "39059630f53760828cc9134a6b1df3fb8f2697ca911701c4322d6e3195ffd923"
+    "d1005e79dc443b1a28c5615720903d83b943be67d2464276c06d5b7eb20f1629"
+    "3ca903540dda5ddff6b7c762cd8d06d3695c86d614f7a56675acb1e94521700c"
+    "879f74a4224c6fbf1f56aa2eb3783350b0a392bccf191ca763cb1e4d3e4b1b9b"
+    "4fe7f0eead3ab55904ea40552551e57a893868527bfc27aed7bdfa07f4cc8e5f"
+    "ef359c842b15d5773449b6120a7f7188fd9d18417d93d8582ccefe24afdeb836"
+    "c8a180a69998a82f0e816573e4c2a28ad4e111d0088b2af2ed9a643fc16cf9ec"
+)
+
+_EPOCA_FILETIME = datetime(1601, 1, 1, tzinfo=timezone.utc)
+
+# os.writev no existe en Windows: allí cada vista se escribe por separado
+_WRITEV = getattr(os, "writev", None)
+try:
+    _IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    _IOV_MAX = 1024
+
+
+class ErrorPST(Exception):
+    """El archivo no es un PST válido o una estructura interna está dañada."""
+
+
+def descifrar_ciclico(datos, clave):
+    """Deshacer NDB_CRYPT_CYCLIC (la clave son los 32 bits bajos del BID)."""
+    w = (clave ^ (clave >> 16)) & 0xFFFF
+    salida = bytearray(datos)
+    for i, b in enumerate(salida):
+        bajo = w & 0xFF
+        alto = w >> 8
+        b = _MPBB_R[(b + bajo) & 0xFF]
+        b = _MPBB_S[(b + alto) & 0xFF]
+        b = _MPBB_I[(b - alto) & 0xFF]
+        salida[i] = (b - bajo) & 0xFF
+        w = (w + 1) & 0xFFFF
+    return bytes(salida)
+
+
+def fecha_filetime(valor):
+    """FILETIME (UTC) -> datetime en hora local, como devuelve Outlook."""
+    if not valor:
+        return None
+    try:
+        return (_EPOCA_FILETIME + timedelta(microseconds=valor // 10)).astimezone()
+    except (OverflowError, OSError, ValueError):
+        return None
+
+
+def decodificar_valor(tipo, datos):
+    """Convertir los bytes de una propiedad en un valor de Python."""
+    if datos is None:
+        return None
+    if tipo == PT_UNICODE:
+        return bytes(datos).decode("utf-16-le", errors="replace").rstrip("\x00")
+    if tipo == PT_STRING8:
+        return bytes(datos).decode("cp1252", errors="replace").rstrip("\x00")
+    if tipo in (PT_LONG, PT_ERROR):
+        return struct.unpack_from("<i", datos)[0]
+    if tipo == PT_SHORT:
+        return struct.unpack_from("<h", datos)[0]
+    if tipo == PT_BOOLEAN:
+        return bool(datos[0])
+    if tipo == PT_I8:
+        return struct.unpack_from("<q", datos)[0]
+    if tipo == PT_SYSTIME:
+        return fecha_filetime(struct.unpack_from("<Q", datos)[0])
+    if tipo in (PT_DOUBLE, PT_APPTIME):
+        return struct.unpack_from("<d", datos)[0]
+    return bytes(datos)
+
+
+def escribir_vectorial(archivo, vistas):
+    """Escribir varias vistas seguidas con el menor número de llamadas posible."""
+    if _WRITEV is None:
+        for vista in vistas:
+            archivo.write(vista)
+        return
+    archivo.flush()
+    descriptor = archivo.fileno()
+    pendientes = [memoryview(v) for v in vistas]
+    while pendientes:
+        escritos = _WRITEV(descriptor, pendientes[:_IOV_MAX])
+        # Una escritura parcial deja la primera vista pendiente a medias
+        completas = 0
+        while completas < len(pendientes) and escritos >= len(pendientes[completas]):
+            escritos -= len(pendientes[completas])
+            completas += 1
+        del pendientes[:completas]
+        if escritos:
+            pendientes[0] = pendientes[0][escritos:]
+
+
+class CacheLRU:
+    """
+    Caché LRU acotada por un presupuesto de bytes, con aciertos y fallos por tipo.
+
+    El tamaño de cada entrada lo estima quien la calcula; con presupuesto 0
+    la caché no guarda nada pero sigue contando los fallos.
+    """
+
+    def __init__(self, presupuesto):
+        self.presupuesto = max(0, int(presupuesto))
+        self.usado = 0
+        self.expulsiones = 0
+        self.estadisticas = {}  # tipo -> [aciertos, fallos]
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, tipo, clave, calcular):
+        """
+        Valor en caché o, si falta, el calculado y guardado.
+
+        Args:
+            tipo (str): Categoría para las estadísticas ('pagina_bt', 'heap'...)
+            clave: Identificador único dentro del tipo
+            calcular (callable): Devuelve (valor, tamaño estimado en bytes)
+        """
+        llave = (tipo, clave)
+        with self._lock:
+            contadores = self.estadisticas.setdefault(tipo, [0, 0])
+            entrada = self._entradas.get(llave)
+            if entrada is not None:
+                self._entradas.move_to_end(llave)
+                contadores[0] += 1
+                return entrada[0]
+            contadores[1] += 1
+
+        valor, tamano = calcular()
+        if tamano <= self.presupuesto:
+            with self._lock:
+                if llave not in self._entradas:
+                    self._entradas[llave] = (valor, tamano)
+                    self.usado += tamano
+                    while self.usado > self.presupuesto:
+                        _llave, (_valor, tamano_viejo) = self._entradas.popitem(last=False)
+                        self.usado -= tamano_viejo
+                        self.expulsiones += 1
+        return valor
+
+    @property
+    def aciertos(self):
+        return sum(a for a, _f in self.estadisticas.values())
+
+    @property
+    def fallos(self):
+        return sum(f for _a, f in self.estadisticas.values())
+
+    def describir(self):
+        """Resumen de una línea para el reporte."""
+        total = self.aciertos + self.fallos
+        tasa = 100 * self.aciertos / total if total else 0
+        detalle = ", ".join(f"{tipo} {a:,}/{a + f:,}" for tipo, (a, f) in sorted(self.estadisticas.items()))
+        return (f"{tasa:.1f}% de aciertos ({self.aciertos:,} de {total:,}; {detalle}), "
+                f"{self.expulsiones:,} expulsiones, {self.usado / 1024 / 1024:.1f} de "
+                f"{self.presupuesto / 1024 / 1024:.0f} MB")
+
+
+class SegmentoDatos:
+    """Un bloque de datos de un nodo: dónde está en el archivo y cuánto ocupa."""
+
+    __slots__ = ("bid", "ib", "cb")
+
+    def __init__(self, bid, ib, cb):
+        self.bid = bid
+        self.ib = ib
+        self.cb = cb
+
+
+class ArchivoPST:
+    """Acceso de bajo nivel (NDB) a un PST Unicode o ANSI."""
+
+    def __init__(self, ruta, usar_mmap=PST_USE_MMAP, cache_mb=PST_CACHE_MB):
+        self.ruta = ruta
+        self._f = open(ruta, "rb")
+        self._mapa = None
+        self.cache = CacheLRU(cache_mb * 1024 * 1024)
+        # Lecturas físicas: las usa el reporte para medir el efecto del orden de lectura
+        self.lecturas = 0
+        self.bytes_leidos = 0
+        try:
+            if usar_mmap:
+                try:
+                    self._mapa = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+                except (OSError, ValueError, OverflowError):
+                    # Archivo vacío o mayor que el espacio de direcciones (Python de 32 bits)
+                    self._mapa = None
+            self._leer_cabecera()
+        except Exception:
+            self.cerrar()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        if self._mapa is not None:
+            try:
+                self._mapa.close()
+            except BufferError:
+                pass  # Aún hay vistas exportadas; el mapa se libera con ellas
+            self._mapa = None
+        self._f.close()
+
+    @property
+    def proyectado(self):
+        """True si el archivo está proyectado en memoria (mmap)."""
+        return self._mapa is not None
+
+    def leer(self, ib, cb):
+        """Lectura física en una posición absoluta del archivo."""
+        limitar(cb)
+        if self._mapa is not None:
+            datos = self._mapa[ib:ib + cb]
+        else:
+            self._f.seek(ib)
+            datos = self._f.read(cb)
+        self.lecturas += 1
+        self.bytes_leidos += len(datos)
+        if len(datos) < cb:
+            raise ErrorPST(f"Lectura truncada en {ib:#x} ({len(datos)} de {cb} bytes)")
+        return datos
+
+    def vista(self, ib, cb):
+        """Como ``leer`` pero sin copiar: una vista del mapa (o de lo leído si no hay mmap)."""
+        if self._mapa is None:
+            return memoryview(self.leer(ib, cb))
+        if ib + cb > len(self._mapa):
+            raise ErrorPST(f"Lectura truncada en {ib:#x} ({max(0, len(self._mapa) - ib)} de {cb} bytes)")
+        # Con mmap la lectura ocurre al tocar la vista; se cuenta aquí igualmente
+        limitar(cb)
+        self.lecturas += 1
+        self.bytes_leidos += cb
+        return memoryview(self._mapa)[ib:ib + cb]
+
+    # --- Cabecera ---
+
+    def _leer_cabecera(self):
+        cabecera = self.leer(0, 564)
+        if cabecera[0:4] != MAGIA or cabecera[8:10] != MAGIA_CLIENTE:
+            raise ErrorPST("No es un archivo PST/OST (firma '!BDN' ausente)")
+        version = struct.unpack_from("<H", cabecera, 10)[0]
+
+        if version in VERSIONES_ANSI:
+            self.unicode = False
+            self.raiz_nbt = struct.unpack_from("<II", cabecera, 184)
+            self.raiz_bbt = struct.unpack_from("<II", cabecera, 192)
+            self.cifrado = cabecera[461]
+            self._fmt_bid = "<I"
+            self._tam_bid = 4
+            self._tam_trailer_bloque = 12
+            self._fmt_entrada_nbt = "<IIII"
+            self._fmt_entrada_bbt = "<IIH"
+            self._fmt_entrada_interna = "<III"
+            self._fmt_sl = "<III"
+            self._fmt_si = "<II"
+            self._cabecera_sl = 4
+            self._meta_pagina = 496
+        elif VERSION_UNICODE_MINIMA <= version < VERSION_PAGINAS_4K:
+            self.unicode = True
+            self.raiz_nbt = struct.unpack_from("<QQ", cabecera, 216)
+            self.raiz_bbt = struct.unpack_from("<QQ", cabecera, 232)
+            self.cifrado = cabecera[513]
+            self._fmt_bid = "<Q"
+            self._tam_bid = 8
+            self._tam_trailer_bloque = 16
+            self._fmt_entrada_nbt = "<QQQI"
+            self._fmt_entrada_bbt = "<QQH"
+            self._fmt_entrada_interna = "<QQQ"
+            self._fmt_sl = "<QQQ"
+            self._fmt_si = "<QQ"
+            self._cabecera_sl = 8
+            self._meta_pagina = 488
+        else:
+            raise ErrorPST(f"Versión de PST no soportada ({version})")
+
+        if self.cifrado not in (CIFRADO_NINGUNO, CIFRADO_PERMUTACION, CIFRADO_CICLICO):
+            raise ErrorPST(f"Método de cifrado desconocido ({self.cifrado})")
+
+    # --- B-trees ---
+
+    def _pagina(self, ib):
+        pagina = self.leer(ib, 512)
+        c_ent, _c_ent_max, cb_ent, nivel = struct.unpack_from("<BBBB", pagina, self._meta_pagina)
+        return pagina, c_ent, cb_ent, nivel
+
+    def _pagina_decodificada(self, ib, fmt_hoja, mascara):
+        """(nivel, claves, entradas) de una página de B-tree, a través de la caché."""
+        def decodificar():
+            pagina, c_ent, cb_ent, nivel = self._pagina(ib)
+            fmt = fmt_hoja if nivel == 0 else self._fmt_entrada_interna
+            entradas = [struct.unpack_from(fmt, pagina, i * cb_ent) for i in range(c_ent)]
+            # Las hojas se comparan con la clave enmascarada; las intermedias, tal cual
+            claves = [e[0] & mascara if nivel == 0 else e[0] for e in entradas]
+            return (nivel, claves, entradas), 512 + 120 * c_ent
+        return self.cache.obtener("pagina_bt", ib, decodificar)
+
+    def _buscar_bt(self, raiz, clave, fmt_hoja, mascara):
+        """Descender desde la raíz de un B-tree hasta la entrada hoja con esa clave."""
+        ib = raiz[1]
+        while True:
+            nivel, claves, entradas = self._pagina_decodificada(ib, fmt_hoja, mascara)
+            if nivel == 0:
+                i = bisect_left(claves, clave)
+                return entradas[i] if i < len(claves) and claves[i] == clave else None
+            # Hijo con la mayor clave <= la buscada
+            i = bisect_right(claves, clave) - 1
+            if i < 0:
+                return None
+            ib = entradas[i][2]
+
+    def entrada_bloque(self, bid):
+        """(ib, cb) de un bloque según el BBT."""
+        bid &= ~1  # El bit 0 está reservado y no forma parte de la clave
+        entrada = self._buscar_bt(self.raiz_bbt, bid, self._fmt_entrada_bbt, ~1)
+        if entrada is None:
+            raise ErrorPST(f"Bloque {bid:#x} ausente del BBT")
+        return entrada[1], entrada[2]
+
+    def entrada_nodo(self, nid):
+        """(bid_datos, bid_subnodos, nid_padre) de un nodo según el NBT."""
+        # En Unicode el NID ocupa 8 bytes, pero solo los 4 bajos son significativos
+        entrada = self._buscar_bt(self.raiz_nbt, nid, self._fmt_entrada_nbt, 0xFFFFFFFF)
+        if entrada is None:
+            raise ErrorPST(f"Nodo {nid:#x} ausente del NBT")
+        return entrada[1], entrada[2], entrada[3]
+
+    # --- Bloques ---
+
+    @staticmethod
+    def es_interno(bid):
+        return bool(bid & 0x2)
+
+    def descifrar(self, datos, bid):
+        """Descifrar los datos de un bloque externo."""
+        if self.cifrado == CIFRADO_PERMUTACION:
+            return bytes(datos).translate(_MPBB_I)
+        if self.cifrado == CIFRADO_CICLICO:
+            return descifrar_ciclico(datos, bid & 0xFFFFFFFF)
+        return datos
+
+    def leer_bloque(self, bid):
+        """Contenido de un bloque (descifrado si es de datos)."""
+        ib, cb = self.entrada_bloque(bid)
+        datos = self.leer(ib, cb)
+        return datos if self.es_interno(bid) else self.descifrar(datos, bid)
+
+    def segmentos(self, bid):
+        """
+        Bloques hoja de un árbol de datos, en orden, sin leer su contenido.
+
+        Solo se leen los XBLOCK/XXBLOCK intermedios; la posición de cada
+        bloque hoja sale del BBT.
+        """
+        if not bid:
+            return []
+        if not self.es_interno(bid):
+            ib, cb = self.entrada_bloque(bid)
+            return [SegmentoDatos(bid, ib, cb)]
+        bloque = self.leer_bloque(bid)
+        tipo, nivel, c_ent = struct.unpack_from("<BBH", bloque, 0)
+        if tipo != 0x01:
+            raise ErrorPST(f"Bloque {bid:#x} no es un XBLOCK (tipo {tipo:#x})")
+        hijos = struct.unpack_from(f"<{c_ent}{self._fmt_bid[1]}", bloque, 8)
+        resultado = []
+        for hijo in hijos:
+            if nivel == 1:
+                ib, cb = self.entrada_bloque(hijo)
+                resultado.append(SegmentoDatos(hijo, ib, cb))
+            else:
+                resultado.extend(self.segmentos(hijo))
+        return resultado
+
+    def leer_segmentos(self, bid):
+        """Contenido de cada bloque hoja de un árbol de datos."""
+        return [self.descifrar(self.leer(s.ib, s.cb), s.bid) for s in self.segmentos(bid)]
+
+    def leer_datos(self, bid):
+        """Contenido completo de un árbol de datos."""
+        return b"".join(self.leer_segmentos(bid))
+
+    def subnodos(self, bid):
+        """Árbol de subnodos (SLBLOCK/SIBLOCK): nid -> (bid_datos, bid_subnodos)."""
+        resultado = {}
+        if not bid:
+            return resultado
+        bloque = self.leer_bloque(bid)
+        tipo, nivel, c_ent = struct.unpack_from("<BBH", bloque, 0)
+        if tipo != 0x02:
+            raise ErrorPST(f"Bloque {bid:#x} no es un SLBLOCK/SIBLOCK (tipo {tipo:#x})")
+        if nivel == 0:
+            tam = struct.calcsize(self._fmt_sl)
+            for i in range(c_ent):
+                nid, bid_datos, bid_sub = struct.unpack_from(self._fmt_sl, bloque, self._cabecera_sl + i * tam)
+                resultado[nid & 0xFFFFFFFF] = (bid_datos, bid_sub)
+        else:
+            tam = struct.calcsize(self._fmt_si)
+            for i in range(c_ent):
+                _nid, bid_hijo = struct.unpack_from(self._fmt_si, bloque, self._cabecera_sl + i * tam)
+                resultado.update(self.subnodos(bid_hijo))
+        return resultado
+
+
+class Nodo:
+    """Un nodo (o subnodo) con sus datos y su árbol de subnodos."""
+
+    def __init__(self, pst, bid_datos, bid_subnodos):
+        self.pst = pst
+        self.bid_datos = bid_datos
+        self.bid_subnodos = bid_subnodos
+        self._bloques = None
+        self._subnodos = None
+
+    @classmethod
+    def desde_nid(cls, pst, nid):
+        bid_datos, bid_subnodos, _padre = pst.entrada_nodo(nid)
+        return cls(pst, bid_datos, bid_subnodos)
+
+    @property
+    def bloques(self):
+        if self._bloques is None:
+            self._bloques = self.pst.leer_segmentos(self.bid_datos)
+        return self._bloques
+
+    @property
+    def subnodos(self):
+        if self._subnodos is None:
+            self._subnodos = self.pst.subnodos(self.bid_subnodos)
+        return self._subnodos
+
+    def subnodo(self, nid):
+        """Nodo hijo guardado en el árbol de subnodos."""
+        try:
+            bid_datos, bid_subnodos = self.subnodos[nid]
+        except KeyError:
+            raise ErrorPST(f"Subnodo {nid:#x} ausente")
+        return Nodo(self.pst, bid_datos, bid_subnodos)
+
+
+class Heap:
+    """Heap-on-node: asignaciones identificadas por HID dentro de los bloques de un nodo."""
+
+    def __init__(self, nodo):
+        self.nodo = nodo
+        self.bloques = nodo.pst.cache.obtener("heap", nodo.bid_datos, self._leer_bloques)
+        if not self.bloques:
+            raise ErrorPST("Heap vacío")
+        primero = self.bloques[0]
+        _ib_mapa, firma, self.firma_cliente, self.hid_raiz = struct.unpack_from("<HBBI", primero, 0)
+        if firma != FIRMA_HN:
+            raise ErrorPST(f"Firma de heap inválida ({firma:#x})")
+
+    def _leer_bloques(self):
+        bloques = self.nodo.bloques
+        return bloques, sum(len(b) for b in bloques) + 64
+
+    def item(self, hid):
+        """Bytes de una asignación."""
+        indice = (hid >> 5) & 0x7FF
+        bloque = self.bloques[hid >> 16]
+        ib_mapa = struct.unpack_from("<H", bloque, 0)[0]
+        c_alloc = struct.unpack_from("<H", bloque, ib_mapa)[0]
+        if not 1 <= indice <= c_alloc:
+            raise ErrorPST(f"HID {hid:#x} fuera del heap")
+        inicio, fin = struct.unpack_from("<HH", bloque, ib_mapa + 4 + (indice - 1) * 2)
+        return bloque[inicio:fin]
+
+    def valor(self, hnid):
+        """Contenido de un HNID: una asignación del heap o un subnodo completo."""
+        if hnid == 0:
+            return b""
+        if hnid & 0x1F == 0:
+            return self.item(hnid)
+        return self.nodo.pst.leer_datos(self.nodo.subnodo(hnid).bid_datos)
+
+    def segmentos_valor(self, hnid):
+        """
+        Ubicación de un HNID sin leerlo.
+
+        Returns:
+            tuple: (bytes, None) si el valor está en el heap, o
+            (None, [SegmentoDatos...]) si está en un subnodo
+        """
+        if hnid == 0:
+            return b"", None
+        if hnid & 0x1F == 0:
+            return self.item(hnid), None
+        return None, self.nodo.pst.segmentos(self.nodo.subnodo(hnid).bid_datos)
+
+    def registros_bth(self, hid_cabecera):
+        """Registros (clave, datos) de un BTH, en orden de clave."""
+        cabecera = self.item(hid_cabecera)
+        tipo, cb_clave, cb_ent, niveles, hid_raiz = struct.unpack_from("<BBBBI", cabecera, 0)
+        if tipo != FIRMA_BTH:
+            raise ErrorPST(f"Firma de BTH inválida ({tipo:#x})")
+        if hid_raiz == 0:
+            return []
+        return list(self._registros(hid_raiz, niveles, cb_clave, cb_ent))
+
+    def _registros(self, hid, nivel, cb_clave, cb_ent):
+        datos = self.item(hid)
+        if nivel == 0:
+            tam = cb_clave + cb_ent
+            for i in range(0, len(datos) - tam + 1, tam):
+                yield datos[i:i + cb_clave], datos[i + cb_clave:i + tam]
+        else:
+            tam = cb_clave + 4
+            for i in range(0, len(datos) - tam + 1, tam):
+                hid_hijo = struct.unpack_from("<I", datos, i + cb_clave)[0]
+                yield from self._registros(hid_hijo, nivel - 1, cb_clave, cb_ent)
+
+
+class ContextoPropiedades:
+    """Propiedades de un objeto (carpeta, correo, adjunto) guardadas en un PC."""
+
+    def __init__(self, nodo):
+        self.heap = Heap(nodo)
+        if self.heap.firma_cliente != FIRMA_PC:
+            raise ErrorPST(f"El nodo no es un contexto de propiedades ({self.heap.firma_cliente:#x})")
+        self._propiedades = nodo.pst.cache.obtener("esquema_pc", nodo.bid_datos, self._leer_esquema)
+
+    def _leer_esquema(self):
+        """pid -> (tipo, valor o HNID), del BTH del contexto."""
+        propiedades = {}
+        for clave, datos in self.heap.registros_bth(self.heap.hid_raiz):
+            pid = struct.unpack_from("<H", clave)[0]
+            tipo, valor = struct.unpack_from("<HI", datos)
+            propiedades[pid] = (tipo, valor)
+        return propiedades, 100 * len(propiedades) + 64
+
+    def __contains__(self, pid):
+        return pid in self._propiedades
+
+    def tipo(self, pid):
+        return self._propiedades[pid][0]
+    def crudo(self, pid):
+        """Bytes de una propiedad (None si no existe)."""
+        if pid not in self._propiedades:
+            return None
+        tipo, valor = self._propiedades[pid]
+        if tipo in (PT_SHORT, PT_LONG, PT_ERROR, PT_BOOLEAN):
+            return struct.pack("<I", valor)
+        return self.heap.valor(valor)
+
+    def ubicacion(self, pid):
+        """(bytes, None) o (None, segmentos) de una propiedad variable, sin leer subnodos."""
+        if pid not in self._propiedades:
+            return None, None
+        return self.heap.segmentos_valor(self._propiedades[pid][1])
+
+    def hnid(self, pid):
+        return self._propiedades[pid][1] if pid in self._propiedades else None
+
+    def get(self, pid, defecto=None):
+        if pid not in self._propiedades:
+            return defecto
+        try:
+            return decodificar_valor(self.tipo(pid), self.crudo(pid))
+        except (ErrorPST, struct.error):
+            return defecto
+
+
+class ContextoTabla:
+    """Tabla (jerarquía de carpetas, contenido, adjuntos) guardada en un TC."""
+
+    def __init__(self, nodo):
+        self.heap = Heap(nodo)
+        if self.heap.firma_cliente != FIRMA_TC:
+            raise ErrorPST(f"El nodo no es un contexto de tabla ({self.heap.firma_cliente:#x})")
+        self.ib_existencia, self.tam_fila, self.hnid_filas, self.columnas = nodo.pst.cache.obtener(
+            "esquema_tc", nodo.bid_datos, self._leer_esquema
+        )
+
+    def _leer_esquema(self):
+        """TCINFO: posición del CEB, tamaño de fila, HNID de las filas y columnas."""
+        info = self.heap.item(self.heap.hid_raiz)
+        tipo, c_cols = struct.unpack_from("<BB", info, 0)
+        if tipo != FIRMA_TC:
+            raise ErrorPST(f"Firma de TCINFO inválida ({tipo:#x})")
+        # rgib: fin de los valores de 8/4 bytes, de 2 bytes, de 1 byte y del CEB (= tamaño de fila)
+        _fin_4b, _fin_2b, ib_existencia, tam_fila = struct.unpack_from("<4H", info, 2)
+        _hid_indice, hnid_filas = struct.unpack_from("<II", info, 10)
+        columnas = {}
+        for i in range(c_cols):
+            etiqueta, ib, cb, ibit = struct.unpack_from("<IHBB", info, 22 + i * 8)
+            columnas[etiqueta >> 16] = (etiqueta & 0xFFFF, ib, cb, ibit)
+        return (ib_existencia, tam_fila, hnid_filas, columnas), 100 * c_cols + 64
+
+    def _tramos_filas(self):
+        """(filas, bytes en el heap o SegmentoDatos) de cada bloque de la matriz de filas, sin leerlos."""
+        if self.hnid_filas == 0 or self.tam_fila == 0:
+            return []
+        if self.hnid_filas & 0x1F == 0:
+            item = self.heap.item(self.hnid_filas)
+            return [(len(item) // self.tam_fila, item)]
+        # Matriz de filas en un subnodo: ninguna fila cruza de un bloque a otro
+        pst = self.heap.nodo.pst
+        return [(s.cb // self.tam_fila, s) for s in pst.segmentos(self.heap.nodo.subnodo(self.hnid_filas).bid_datos)]
+
+    def num_filas(self):
+        """Número de filas, calculado con los tamaños de bloque del BBT."""
+        return sum(n for n, _tramo in self._tramos_filas())
+
+    def filas(self, pids=None, desde=0, hasta=None):
+        """
+        Recorrer las filas como diccionarios pid -> valor.
+
+        Args:
+            pids (iterable): Columnas a decodificar (todas si se omite)
+            desde (int): Índice de la primera fila
+            hasta (int): Índice de la fila donde parar (exclusivo; None = hasta el final)
+
+        Solo se leen los bloques de la matriz que contienen filas del tramo.
+        """
+        columnas = self.columnas
+        if pids is not None:
+            columnas = {pid: columnas[pid] for pid in pids if pid in columnas}
+        pst = self.heap.nodo.pst
+        primera = 0
+        for n, tramo in self._tramos_filas():
+            if hasta is not None and primera >= hasta:
+                return
+            if primera + n <= desde:
+                primera += n
+                continue
+            bloque = tramo if not isinstance(tramo, SegmentoDatos) else pst.descifrar(pst.leer(tramo.ib, tramo.cb), tramo.bid)
+            for k in range(max(0, desde - primera), n):
+                if hasta is not None and primera + k >= hasta:
+                    return
+                fila = bloque[k * self.tam_fila:(k + 1) * self.tam_fila]
+                yield {pid: self._celda(fila, *desc) for pid, desc in columnas.items()
+                       if fila[self.ib_existencia + desc[3] // 8] & (0x80 >> (desc[3] % 8))}
+            primera += n
+
+    def _celda(self, fila, tipo, ib, cb, _ibit):
+        datos = fila[ib:ib + cb]
+        if tipo in TAMANOS_FIJOS:
+            return decodificar_valor(tipo, datos)
+        try:
+            return decodificar_valor(tipo, self.heap.valor(struct.unpack_from("<I", datos)[0]))
+        except ErrorPST:
+            return None
+
+
+class ContenidoAdjunto:
+    """
+    Contenido de un adjunto que sigue en el PST.
+
+    Se entrega a los hilos de escritura en lugar de los bytes: ``volcar``
+    lo copia al archivo de salida bloque a bloque y ``leer`` lo reúne en
+    memoria solo cuando hace falta (paquetes, compresión, Clave).
+    """
+
+    __slots__ = ("pst", "segmentos", "tamano")
+
+    def __init__(self, pst, segmentos):
+        self.pst = pst
+        self.segmentos = segmentos
+        self.tamano = sum(s.cb for s in segmentos)
+
+    def __len__(self):
+        return self.tamano
+
+    def leer(self):
+        return b"".join(self.pst.descifrar(self.pst.leer(s.ib, s.cb), s.bid) for s in self.segmentos)
+
+    def volcar(self, archivo, tamano_bufer=PST_STREAM_BUFFER_KB * 1024):
+        """Escribir el contenido en ``archivo`` sin tenerlo nunca completo en memoria."""
+        pst = self.pst
+        cifrado = pst.cifrado != CIFRADO_NINGUNO
+        bufer = bytearray(tamano_bufer) if cifrado else None
+        vistas = []
+        acumulado = 0
+
+        def vaciar():
+            escribir_vectorial(archivo, vistas)
+            # Soltar las vistas para poder reutilizar el búfer y cerrar el mapa
+            for vista_escrita in vistas:
+                vista_escrita.release()
+            vistas.clear()
+
+        for segmento in self.segmentos:
+            if acumulado + segmento.cb > tamano_bufer and vistas:
+                vaciar()
+                acumulado = 0
+            vista = pst.vista(segmento.ib, segmento.cb)
+            if cifrado:
+                # Los bloques de datos miden como mucho 8 KB: se descifran uno a uno en el búfer
+                fin = acumulado + segmento.cb
+                if fin > len(bufer):
+                    bufer.extend(bytes(fin - len(bufer)))
+                bufer[acumulado:fin] = pst.descifrar(vista, segmento.bid)
+                vista.release()
+                vista = memoryview(bufer)[acumulado:fin]
+            vistas.append(vista)
+            acumulado += segmento.cb
+        if vistas:
+            vaciar()
+        return self.tamano
+
+    def abrir(self):
+        """Archivo de solo lectura sobre el contenido, sin reunirlo en memoria."""
+        return LectorContenido(self)
+
+
+class LectorContenido(io.RawIOBase):
+    """
+    Archivo de solo lectura, con ``seek``, sobre el contenido de un adjunto.
+
+    Lee y descifra solo los bloques que tocan las posiciones pedidas: un
+    ``zipfile.ZipFile`` abierto sobre él lee el directorio central del
+    final del archivo y los miembros que se descompriman, no el resto.
+    """
+
+    def __init__(self, contenido):
+        super().__init__()
+        self.pst = contenido.pst
+        self.segmentos = contenido.segmentos
+        self.tamano = contenido.tamano
+        self._inicios = []
+        inicio = 0
+        for segmento in self.segmentos:
+            self._inicios.append(inicio)
+            inicio += segmento.cb
+        self._posicion = 0
+        self._bloque = (-1, b"")  # Último bloque descifrado (índice, datos)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._posicion
+
+    def seek(self, desplazamiento, desde=io.SEEK_SET):
+        if desde == io.SEEK_CUR:
+            desplazamiento += self._posicion
+        elif desde == io.SEEK_END:
+            desplazamiento += self.tamano
+        if desplazamiento < 0:
+            raise ValueError(f"Posición negativa: {desplazamiento}")
+        self._posicion = desplazamiento
+        return self._posicion
+
+    def _datos_bloque(self, i):
+        if self._bloque[0] != i:
+            segmento = self.segmentos[i]
+            self._bloque = (i, self.pst.descifrar(self.pst.leer(segmento.ib, segmento.cb), segmento.bid))
+        return self._bloque[1]
+
+    def readinto(self, destino):
+        destino = memoryview(destino).cast("B")
+        copiados = 0
+        while copiados < len(destino) and self._posicion < self.tamano:
+            i = bisect_right(self._inicios, self._posicion) - 1
+            datos = self._datos_bloque(i)
+            desde = self._posicion - self._inicios[i]
+            n = min(len(datos) - desde, len(destino) - copiados)
+            destino[copiados:copiados + n] = datos[desde:desde + n]
+            copiados += n
+            self._posicion += n
+        return copiados
+
+
+class AdjuntoPST:
+    """Adjunto de un correo: nombre y ubicación de su contenido, leído bajo demanda."""
+
+    def __init__(self, pst, contexto):
+        self.pst = pst
+        self.contexto = contexto
+        self.nombre = (contexto.get(PID_NOMBRE_LARGO_ADJUNTO) or contexto.get(PID_NOMBRE_CORTO_ADJUNTO)
+                       or contexto.get(PID_NOMBRE) or "")
+        self.metodo = contexto.get(PID_METODO_ADJUNTO, ADJUNTO_POR_VALOR)
+
+    @property
+    def tamano(self):
+        """Tamaño declarado (PR_ATTACH_SIZE: contenido más unos bytes de propiedades), sin leer el contenido."""
+        return self.contexto.get(PID_TAMANO_ADJUNTO)
+
+    @property
+    def mime(self):
+        return self.contexto.get(PID_MIME_ADJUNTO)
+
+    def ubicacion(self):
+        """(bytes, None) si el contenido ya está en memoria, o (None, segmentos) en el archivo."""
+        return self.contexto.ubicacion(PID_DATOS_ADJUNTO)
+
+    def leer(self):
+        datos, segmentos = self.ubicacion()
+        if datos is not None:
+            return bytes(datos)
+        return ContenidoAdjunto(self.pst, segmentos or []).leer()
+
+    def contenido(self):
+        """Bytes si el adjunto es pequeño (vive en el heap), o un ``ContenidoAdjunto`` para volcarlo."""
+        datos, segmentos = self.ubicacion()
+        if datos is not None or not segmentos:
+            return bytes(datos or b"")
+        return ContenidoAdjunto(self.pst, segmentos)
+
+    def mensaje_embebido(self):
+        """
+        Correo adjunto a este adjunto (método ``ADJUNTO_EMBEBIDO``), o None.
+
+        PR_ATTACH_DATA_OBJ es un PT_OBJECT: su valor en el heap es el NID de
+        un subnodo del adjunto (y un tamaño) que guarda el correo completo
+        con su propio contexto de propiedades y tabla de adjuntos.
+        """
+        contexto = self.contexto
+        if (self.metodo != ADJUNTO_EMBEBIDO or PID_DATOS_ADJUNTO not in contexto
+                or contexto.tipo(PID_DATOS_ADJUNTO) != PT_OBJECT):
+            return None
+        valor = contexto.crudo(PID_DATOS_ADJUNTO)
+        if not valor or len(valor) < 4:
+            return None
+        nid = struct.unpack_from("<I", valor)[0]
+        return MensajePST(self.pst, nid, nodo=contexto.heap.nodo.subnodo(nid))
+
+
+class MensajePST:
+    """Correo del PST (o adjunto a otro correo) con sus metadatos y adjuntos."""
+
+    def __init__(self, pst, nid, nodo=None):
+        self.pst = pst
+        self.nid = nid
+        # Los correos embebidos son subnodos de su adjunto, no están en el NBT
+        self.nodo = nodo if nodo is not None else Nodo.desde_nid(pst, nid)
+        self.propiedades = ContextoPropiedades(self.nodo)
+
+    @property
+    def asunto(self):
+        asunto = self.propiedades.get(PID_ASUNTO) or ""
+        # El asunto puede empezar con un marcador 0x01 + longitud del prefijo (RE:, RV:)
+        if asunto.startswith("\x01") and len(asunto) >= 2:
+            asunto = asunto[2:]
+        return asunto
+
+    @property
+    def remitente(self):
+        return self.propiedades.get(PID_NOMBRE_REMITENTE) or ""
+
+    @property
+    def email_remitente(self):
+        return self.propiedades.get(PID_EMAIL_REMITENTE)
+
+    @property
+    def fecha(self):
+        return self.propiedades.get(PID_FECHA_ENTREGA)
+
+    @property
+    def clase(self):
+        return self.propiedades.get(PID_CLASE_MENSAJE)
+
+    def adjuntos(self):
+        """Adjuntos del correo (tabla de adjuntos en el subnodo 0x671)."""
+        if NID_TABLA_ADJUNTOS not in self.nodo.subnodos:
+            return
+        tabla = ContextoTabla(self.nodo.subnodo(NID_TABLA_ADJUNTOS))
+        for fila in tabla.filas((PID_ID_FILA,)):
+            nid = fila.get(PID_ID_FILA)
+            if nid is None:
+                continue
+            nid &= 0xFFFFFFFF
+            yield AdjuntoPST(self.pst, ContextoPropiedades(self.nodo.subnodo(nid)))
+
+
+class AlmacenPST(ArchivoPST):
+    """PST con la capa de mensajería: carpetas, correos y adjuntos."""
+
+    def nombre_almacen(self):
+        try:
+            return ContextoPropiedades(Nodo.desde_nid(self, NID_ALMACEN)).get(PID_NOMBRE) or ""
+        except ErrorPST:
+            return ""
+
+    def nid_subarbol_ipm(self):
+        """NID de la carpeta superior visible (la que Outlook muestra como raíz)."""
+        try:
+            entry_id = ContextoPropiedades(Nodo.desde_nid(self, NID_ALMACEN)).crudo(PID_SUBARBOL_IPM)
+        except ErrorPST:
+            entry_id = None
+        if entry_id and len(entry_id) >= 24:
+            return struct.unpack_from("<I", entry_id, 20)[0]
+        return NID_CARPETA_RAIZ
+
+    def propiedades_carpeta(self, nid):
+        return ContextoPropiedades(Nodo.desde_nid(self, nid))
+
+    def subcarpetas(self, nid):
+        """(nid, nombre) de las subcarpetas directas, según la tabla de jerarquía."""
+        try:
+            tabla = ContextoTabla(Nodo.desde_nid(self, (nid & ~0x1F) | NID_TIPO_JERARQUIA))
+        except ErrorPST:
+            return []
+        resultado = []
+        for fila in tabla.filas((PID_ID_FILA, PID_NOMBRE)):
+            if PID_ID_FILA in fila:
+                resultado.append((fila[PID_ID_FILA] & 0xFFFFFFFF, fila.get(PID_NOMBRE) or ""))
+        return resultado
+
+    def _tabla_contenido(self, nid):
+        try:
+            return ContextoTabla(Nodo.desde_nid(self, (nid & ~0x1F) | NID_TIPO_CONTENIDO))
+        except ErrorPST:
+            return None
+
+    def contenido(self, nid, desde=0, hasta=None):
+        """
+        Filas de la tabla de contenido de una carpeta (todas o el tramo [desde, hasta)).
+
+        Cada fila incluye el NID del correo y, si la tabla las tiene, la fecha
+        de entrega, los flags y la clase, suficientes para filtrar sin abrirlo.
+        """
+        tabla = self._tabla_contenido(nid)
+        if tabla is None:
+            return []
+        return list(tabla.filas((PID_ID_FILA, PID_FECHA_ENTREGA, PID_FLAGS_MENSAJE, PID_CLASE_MENSAJE),
+                                desde, hasta))
+
+    def num_mensajes(self, nid):
+        """Filas de la tabla de contenido de una carpeta, sin decodificarlas."""
+        tabla = self._tabla_contenido(nid)
+        return tabla.num_filas() if tabla is not None else 0
+
+    def mensaje(self, nid):
+        return MensajePST(self, nid)
+
+
+class PlanLecturas:
+    """
+    Lectura de adjuntos ordenada por desplazamiento en el archivo.
+
+    Se agregan adjuntos con su ubicación (``AdjuntoPST.ubicacion``) y un
+    contexto cualquiera; ``ejecutar`` lee todos sus bloques en orden de
+    posición, fusionando en una sola lectura los bloques separados por
+    menos de ``hueco_max`` bytes, y devuelve (contexto, datos) a medida
+    que cada adjunto queda completo.
+
+    Con ``diferido`` no se lee nada: ``ejecutar`` devuelve los adjuntos
+    ordenados por la posición de su primer bloque como ``ContenidoAdjunto``
+    para que los hilos de escritura los vuelquen desde el mapa (la
+    fusión de lecturas queda a cargo de la lectura anticipada del sistema).
+    """
+
+    def __init__(self, pst, hueco_max=PST_COALESCE_GAP_KB * 1024, lectura_max=PST_MAX_READ_MB * 1024 * 1024,
+                 diferido=False):
+        self.pst = pst
+        self.diferido = diferido
+        self.hueco_max = hueco_max
+        self.lectura_max = lectura_max
+        self._en_memoria = []
+        self._pendientes = []
+        self.bytes_pendientes = 0
+
+    def __len__(self):
+        return len(self._en_memoria) + len(self._pendientes)
+
+    def agregar(self, ubicacion, contexto):
+        datos, segmentos = ubicacion
+        if datos is not None or not segmentos:
+            datos = bytes(datos or b"")
+            self._en_memoria.append((contexto, datos))
+            # Los adjuntos pequeños viven en el heap: también ocupan la ventana
+            self.bytes_pendientes += len(datos)
+            return
+        self._pendientes.append((contexto, segmentos))
+        self.bytes_pendientes += sum(s.cb for s in segmentos)
+
+    def _tramos(self, piezas):
+        """Agrupar piezas (ordenadas por ib) en lecturas contiguas."""
+        tramo = []
+        inicio = fin = 0
+        for pieza in piezas:
+            segmento = pieza[0]
+            if tramo and (segmento.ib - fin > self.hueco_max
+                          or segmento.ib + segmento.cb - inicio > self.lectura_max):
+                yield inicio, fin, tramo
+                tramo = []
+            if not tramo:
+                inicio = segmento.ib
+                fin = segmento.ib
+            tramo.append(pieza)
+            fin = max(fin, segmento.ib + segmento.cb)
+        if tramo:
+            yield inicio, fin, tramo
+
+    def ejecutar(self, al_fallar=None):
+        """
+        Leer todo lo agregado; devuelve un iterador de (contexto, datos).
+
+        Args:
+            al_fallar: ``f(contexto, error)`` para cada adjunto que no se pudo
+                leer; los demás siguen. Sin ella, el primer error se propaga.
+        """
+        en_memoria, pendientes = self._en_memoria, self._pendientes
+        self._en_memoria, self._pendientes = [], []
+        self.bytes_pendientes = 0
+
+        yield from en_memoria
+
+        if self.diferido:
+            pendientes.sort(key=lambda p: p[1][0].ib)
+            for contexto, segmentos in pendientes:
+                yield contexto, ContenidoAdjunto(self.pst, segmentos)
+            return
+
+        partes = [[None] * len(segmentos) for _contexto, segmentos in pendientes]
+        faltan = [len(segmentos) for _contexto, segmentos in pendientes]
+        piezas = [
+            (segmento, i, j)
+            for i, (_contexto, segmentos) in enumerate(pendientes)
+            for j, segmento in enumerate(segmentos)
+        ]
+        piezas.sort(key=lambda p: p[0].ib)
+
+        for inicio, fin, tramo in self._tramos(piezas):
+            try:
+                datos = self.pst.leer(inicio, fin - inicio)
+            except (ErrorPST, OSError, ValueError):
+                if al_fallar is None:
+                    raise
+                datos = None  # Se lee cada bloque por separado: solo se pierden los adjuntos dañados
+            for segmento, i, j in tramo:
+                if partes[i] is None:
+                    continue  # Adjunto ya descartado por un bloque anterior
+                try:
+                    if datos is None:
+                        bloque = self.pst.leer(segmento.ib, segmento.cb)
+                    else:
+                        desde = segmento.ib - inicio
+                        bloque = datos[desde:desde + segmento.cb]
+                    partes[i][j] = self.pst.descifrar(bloque, segmento.bid)
+                except (ErrorPST, OSError, ValueError) as e:
+                    if al_fallar is None:
+                        raise
+                    partes[i] = None
+                    al_fallar(pendientes[i][0], e)
+                    continue
+                faltan[i] -= 1
+                if faltan[i] == 0:
+                    yield pendientes[i][0], b"".join(partes[i])
+                    partes[i] = None
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Límite de ancho de banda y de operaciones de E/S (cubo de fichas).
+
+Las extracciones grandes y el posprocesamiento saturan el almacenamiento
+compartido que usa el resto de la oficina. ``LIMITADOR`` es un único
+planificador compartido por todas las rutas de lectura y escritura del
+proceso: lecturas del PST (lector nativo y Outlook), escritura de los XML,
+traslados de la preparación local, lecturas de XML al filtrar y renombrar,
+y movimientos y renombrados. Cada ruta llama a ``limitar(bytes, ops)``
+antes de tocar el disco.
+
+Hay dos cubos independientes, uno de MB/s y otro de operaciones/s; cada
+uno admite una ráfaga de ``IO_BURST_SECONDS`` segundos de su tasa. Una
+operación más grande que lo disponible no espera a que el cubo se llene:
+deja el cubo en negativo y el llamador espera a que se salde su parte de
+la deuda, así que los archivos grandes pasan y la tasa media se respeta.
+La espera se recalcula cuando cambian los límites: subirlos (o quitarlos)
+despierta también a los hilos que ya estaban esperando. Con los dos
+límites en 0 (por defecto) ``limitar`` no hace nada.
+
+Los límites se cambian en caliente con ``LIMITADOR.configurar()`` (el
+servicio HTTP expone ``PUT /io``) o editando el archivo JSON indicado con
+``--io-limits-file``, que se relee cuando cambia::
+
+    {"mb_s": 20, "ops_s": 200}
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import json
+import os
+import threading
+import time
+
+from config import IO_BURST_SECONDS, IO_LIMIT_MB_S, IO_LIMIT_OPS_S, IO_LIMITS_POLL_SECONDS
+
+
+class CuboFichas:
+    """Cubo de fichas con deuda: ``tasa`` fichas por segundo, 0 = sin límite."""
+
+    def __init__(self, tasa=0, rafaga_segundos=IO_BURST_SECONDS):
+        self.rafaga_segundos = rafaga_segundos
+        self.tasa = 0.0
+        self.capacidad = 0.0
+        self.disponibles = 0.0
+        # Fichas generadas desde el inicio (sin tope): marca con la que cada llamador sabe cuándo saldó su deuda
+        self.acumulado = 0.0
+        self._ultimo = time.monotonic()
+        self.ajustar(tasa)
+
+    def ajustar(self, tasa):
+        """Cambiar la tasa; las fichas acumuladas no superan la nueva capacidad."""
+        self._rellenar()
+        self.tasa = max(0.0, float(tasa or 0))
+        self.capacidad = self.tasa * self.rafaga_segundos
+        self.disponibles = min(self.disponibles, self.capacidad) if self.tasa else 0.0
+
+    def _rellenar(self):
+        ahora = time.monotonic()
+        if self.tasa:
+            generadas = (ahora - self._ultimo) * self.tasa
+            self.acumulado += generadas
+            self.disponibles = min(self.capacidad, self.disponibles + generadas)
+        self._ultimo = ahora
+
+    def tomar(self, cantidad):
+        """
+        Descontar ``cantidad`` fichas.
+
+        Returns:
+            float: Valor de ``acumulado`` que hay que alcanzar antes de seguir, o None si alcanzan
+        """
+        if not self.tasa or cantidad <= 0:
+            return None
+        self._rellenar()
+        self.disponibles -= cantidad
+        return self.acumulado - self.disponibles if self.disponibles < 0 else None
+
+    def restante(self, meta):
+        """Segundos que faltan para alcanzar ``meta`` a la tasa actual (0 si ya no hay límite)."""
+        if meta is None or not self.tasa:
+            return 0.0
+        self._rellenar()
+        return max(0.0, (meta - self.acumulado) / self.tasa)
+
+
+class LimitadorIO:
+    """Planificador de E/S compartido: un cubo de bytes/s y otro de operaciones/s."""
+
+    def __init__(self, mb_s=IO_LIMIT_MB_S, ops_s=IO_LIMIT_OPS_S):
+        self._lock = threading.Lock()
+        # configurar() la notifica para que los hilos en espera recalculen con los límites nuevos
+        self._cambio = threading.Condition(self._lock)
+        self._bytes = CuboFichas()
+        self._ops = CuboFichas()
+        self._activo = False
+        self._archivo_control = None
+        self._mtime_control = None
+        self._proxima_revision = 0.0
+        # Contadores para reportes
+        self.bytes = 0
+        self.operaciones = 0
+        self.espera_total = 0.0
+        self.configurar(mb_s, ops_s)
+
+    def configurar(self, mb_s=None, ops_s=None):
+        """
+        Cambiar los límites en caliente (None deja el valor actual, 0 quita el límite).
+
+        Raises:
+            ValueError: Si algún límite es negativo
+        """
+        for valor in (mb_s, ops_s):
+            if valor is not None and float(valor) < 0:
+                raise ValueError("Los límites de E/S no pueden ser negativos")
+        with self._lock:
+            if mb_s is not None:
+                self._bytes.ajustar(float(mb_s) * 1024 * 1024)
+            if ops_s is not None:
+                self._ops.ajustar(ops_s)
+            self._activo = bool(self._bytes.tasa or self._ops.tasa)
+            self._cambio.notify_all()
+
+    def vigilar_archivo(self, ruta):
+        """Releer los límites de un archivo JSON cada vez que cambie (None deja de vigilarlo)."""
+        with self._lock:
+            self._archivo_control = ruta
+            self._mtime_control = None
+            self._proxima_revision = 0.0
+        if ruta:
+            self._revisar_archivo()
+
+    def _revisar_archivo(self):
+        ahora = time.monotonic()
+        with self._lock:
+            if ahora < self._proxima_revision:
+                return
+            self._proxima_revision = ahora + IO_LIMITS_POLL_SECONDS
+            ruta = self._archivo_control
+        try:
+            mtime = os.stat(ruta).st_mtime_ns
+            if mtime == self._mtime_control:
+                return
+            with open(ruta, encoding="utf-8") as f:
+                limites = json.load(f)
+            self.configurar(limites.get("mb_s"), limites.get("ops_s"))
+        except (OSError, ValueError, AttributeError, TypeError) as e:
+            # Un archivo a medio guardar no debe detener el trabajo: se reintenta en la próxima revisión
+            print(f"⚠️ No se pudieron leer los límites de E/S de {ruta}: {e}", flush=True)
+            return
+        self._mtime_control = mtime
+        print(f"🚦 Límites de E/S: {self.describir()}", flush=True)
+
+    @property
+    def limites(self):
+        return {"mb_s": self._bytes.tasa / 1024 / 1024, "ops_s": self._ops.tasa}
+
+    def limitar(self, num_bytes=0, ops=1):
+        """Esperar lo necesario para respetar los límites antes de una operación de E/S."""
+        if self._archivo_control is not None:
+            self._revisar_archivo()
+        if not self._activo:
+            return
+        with self._lock:
+            metas = (self._bytes.tomar(num_bytes), self._ops.tomar(ops))
+            self.bytes += num_bytes
+            self.operaciones += ops
+        if metas == (None, None):
+            return
+        inicio = time.monotonic()
+        while True:
+            with self._cambio:
+                espera = max(self._bytes.restante(metas[0]), self._ops.restante(metas[1]))
+                if espera <= 0:
+                    self.espera_total += time.monotonic() - inicio
+                    return
+                # Con archivo de límites, despertar a tiempo de releerlo aunque ningún otro hilo lo haga
+                if self._archivo_control is not None:
+                    espera = min(espera, IO_LIMITS_POLL_SECONDS)
+                self._cambio.wait(espera)
+            if self._archivo_control is not None:
+                self._revisar_archivo()
+
+    def describir(self):
+        limites = self.limites
+        if not self._activo:
+            return "sin límite"
+        partes = []
+        if limites["mb_s"]:
+            partes.append(f"{limites['mb_s']:g} MB/s")
+        if limites["ops_s"]:
+            partes.append(f"{limites['ops_s']:g} operaciones/s")
+        texto = ", ".join(partes)
+        if self.espera_total:
+            texto += f" ({self.espera_total:.1f} s de espera sumando todos los hilos)"
+        return texto
+
+
+# Único limitador del proceso: todas las rutas de E/S comparten sus cubos
+LIMITADOR = LimitadorIO()
+
+
+def limitar(num_bytes=0, ops=1):
+    """Atajo a ``LIMITADOR.limitar``."""
+    LIMITADOR.limitar(num_bytes, ops)
+
+
+def agregar_argumentos_io(parser):
+    """Agregar --io-limit-mb, --io-limit-ops e --io-limits-file a un parser."""
+    grupo = parser.add_argument_group("límites de E/S")
+    grupo.add_argument("--io-limit-mb", type=float, default=IO_LIMIT_MB_S,
+                       help="MB/s máximos de lectura y escritura en disco (0 = sin límite)")
+    grupo.add_argument("--io-limit-ops", type=float, default=IO_LIMIT_OPS_S,
+                       help="Operaciones de E/S por segundo como máximo (0 = sin límite)")
+    grupo.add_argument("--io-limits-file", metavar="LIMITES.json",
+                       help='Archivo {"mb_s": ..., "ops_s": ...} que se relee al cambiar '
+                            "para ajustar los límites sin detener el trabajo")
+
+
+def configurar_limites_desde_argumentos(args, parser=None):
+    """Aplicar al limitador compartido los límites de la línea de comandos."""
+    try:
+        LIMITADOR.configurar(args.io_limit_mb, args.io_limit_ops)
+    except ValueError as e:
+        if parser is None:
+            raise
+        parser.error(str(e))
+    if args.io_limits_file:
+        LIMITADOR.vigilar_archivo(args.io_limits_file)
+    if LIMITADOR.limites["mb_s"] or LIMITADOR.limites["ops_s"]:
+        print(f"🚦 Límites de E/S: {LIMITADOR.describir()}")
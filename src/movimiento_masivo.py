@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+"""
+Motor de movimientos masivos de archivos.
+
+``filtrar_xml_hacienda.py`` movía cada MensajeHacienda por separado:
+``mkdir`` y sondeos ``exists()`` para elegir el nombre, ``shutil.move`` y,
+si el archivo estaba bloqueado, copia y borrado en el acto. Con decenas de
+miles de archivos en un recurso de red cada una de esas llamadas es un
+viaje de ida y vuelta. ``MotorMovimientos`` acumula los movimientos y los
+hace de una vez:
+
+1. Crea cada directorio destino una sola vez y lo lista una sola vez; los
+   nombres libres (nombre, nombre_001...) se reservan en memoria sin
+   distinguir mayúsculas, como NTFS y SMB.
+2. Agrupa los movimientos por volumen de origen y destino. En el mismo
+   volumen el movimiento es un enlace duro y el borrado del origen
+   (``os.rename`` en Windows, que no sobrescribe); entre volúmenes, o si el
+   sistema de archivos no admite enlaces, se copia en el núcleo
+   (``copy_file_range`` o ``sendfile`` si el sistema los tiene) a un destino
+   abierto en modo exclusivo, se copian fecha y permisos y se borra el
+   origen. Nunca se sobrescribe: si el nombre reservado apareció en disco
+   después del listado, se pasa al siguiente libre.
+3. Mueve con varios hilos (``MOVE_THREADS``).
+4. Un archivo bloqueado por otro proceso (Outlook, antivirus, un visor) no
+   detiene a los demás: pasa a una cola de reintentos que se recorre al
+   final, con esperas crecientes, hasta ``MOVE_RETRY_ATTEMPTS`` veces.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import errno
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from config import MOVE_COPY_CHUNK_MB, MOVE_RETRY_ATTEMPTS, MOVE_RETRY_DELAY_SECONDS, MOVE_THREADS
+from limitador_io import limitar
+from pipeline_extraccion import nombres_candidatos
+
+# Errores de archivo en uso: Windows ERROR_SHARING_VIOLATION (32) y ERROR_LOCK_VIOLATION (33)
+_WINERROR_BLOQUEO = (32, 33)
+_ERRNO_BLOQUEO = (errno.EACCES, errno.EPERM, errno.EBUSY)
+# copy_file_range no disponible entre estos sistemas de archivos: se recurre a sendfile
+_ERRNO_SIN_COPIA_NUCLEO = (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF)
+# Enlaces duros no admitidos (FAT, algunos recursos SMB, protected_hardlinks): se copia
+_ERRNO_SIN_ENLACE = {errno.EPERM, errno.EOPNOTSUPP, getattr(errno, "ENOTSUP", errno.EOPNOTSUPP),
+                     errno.EMLINK, errno.EXDEV, errno.ENOSYS}
+
+_BLOQUEADO = "bloqueado"
+
+
+def archivo_bloqueado(error):
+    """Indicar si un OSError se debe a que otro proceso tiene el archivo abierto o bloqueado."""
+    return getattr(error, "winerror", None) in _WINERROR_BLOQUEO or error.errno in _ERRNO_BLOQUEO
+
+
+def copiar_en_nucleo(origen, destino, tamano):
+    """Copiar ``tamano`` bytes entre dos archivos abiertos sin pasar los datos por Python si se puede."""
+    bloque = MOVE_COPY_CHUNK_MB * 1024 * 1024
+    copiados = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copiados < tamano:
+                n = os.copy_file_range(origen.fileno(), destino.fileno(), min(bloque, tamano - copiados))
+                if n == 0:
+                    break
+                copiados += n
+            if copiados >= tamano:
+                return
+        except OSError as e:
+            if copiados or e.errno not in _ERRNO_SIN_COPIA_NUCLEO:
+                raise
+    if hasattr(os, "sendfile") and copiados == 0:
+        try:
+            while copiados < tamano:
+                n = os.sendfile(destino.fileno(), origen.fileno(), copiados, min(bloque, tamano - copiados))
+                if n == 0:
+                    break
+                copiados += n
+            if copiados >= tamano:
+                return
+        except OSError as e:
+            if copiados or e.errno not in _ERRNO_SIN_COPIA_NUCLEO:
+                raise
+    # Windows o sistemas de archivos sin copia en el núcleo (o un archivo que creció): copia por bloques
+    origen.seek(copiados)
+    destino.seek(copiados)
+    shutil.copyfileobj(origen, destino, bloque)
+
+
+def mover_sin_sobrescribir(origen, destino):
+    """
+    Mover un archivo sin sobrescribir nunca el destino.
+
+    En el mismo volumen es un enlace duro y el borrado del origen (``os.rename``
+    en Windows, que no sobrescribe); entre volúmenes, o si el sistema de
+    archivos no admite enlaces, una copia a un destino abierto en modo
+    exclusivo y el borrado del origen.
+
+    Raises:
+        FileExistsError: Si el destino ya existe
+        OSError: Cualquier otro error (el origen queda intacto)
+    """
+    if os.name == "nt":
+        try:
+            os.rename(origen, destino)
+            return
+        except FileExistsError:
+            raise
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+    else:
+        try:
+            os.link(origen, destino)
+        except FileExistsError:
+            raise
+        except OSError as e:
+            if e.errno not in _ERRNO_SIN_ENLACE:
+                raise
+        else:
+            try:
+                os.remove(origen)
+            except OSError:
+                # El origen sigue: se quita el enlace para no dejar el archivo en dos sitios
+                os.remove(destino)
+                raise
+            return
+    copiar_sin_sobrescribir(origen, destino)
+
+
+def copiar_sin_sobrescribir(origen, destino):
+    """Copiar a un destino abierto en modo exclusivo, con fecha y permisos, y borrar el origen."""
+    with open(origen, "rb") as f_origen:
+        tamano = os.fstat(f_origen.fileno()).st_size
+        limitar(tamano, ops=2)
+        with open(destino, "xb") as f_destino:
+            try:
+                copiar_en_nucleo(f_origen, f_destino, tamano)
+            except BaseException:
+                f_destino.close()
+                os.remove(destino)
+                raise
+    try:
+        shutil.copystat(origen, destino)
+        os.remove(origen)
+    except OSError:
+        # Origen bloqueado: se descarta la copia y el movimiento vuelve a intentarse entero
+        os.remove(destino)
+        raise
+
+
+class MotorMovimientos:
+    """Acumula movimientos origen -> directorio y los ejecuta en bloque."""
+
+    def __init__(self, hilos=MOVE_THREADS, intentos=MOVE_RETRY_ATTEMPTS, espera=MOVE_RETRY_DELAY_SECONDS,
+                 al_mover=None):
+        """
+        Args:
+            hilos (int): Movimientos simultáneos
+            intentos (int): Pasadas de la cola de reintentos de archivos bloqueados
+            espera (float): Segundos antes de la primera pasada (se duplica en cada una)
+            al_mover: ``f(origen, destino)`` llamada tras cada movimiento hecho (en el hilo que ejecuta)
+        """
+        self.hilos = max(1, int(hilos))
+        self.intentos = max(0, int(intentos))
+        self.espera = espera
+        self.al_mover = al_mover
+        self._pendientes = []
+        # Nombres ocupados por directorio destino (en minúsculas plegadas) durante ``ejecutar``
+        self._ocupados = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._pendientes)
+
+    def agregar(self, origen, directorio_destino):
+        """Anotar un movimiento; el nombre final se decide al ejecutar."""
+        self._pendientes.append((Path(origen), Path(directorio_destino)))
+
+    def ejecutar(self):
+        """
+        Hacer todos los movimientos anotados.
+
+        Returns:
+            dict: movidos, mismo_volumen, entre_volumenes, reintentados,
+                bloqueados (lista de rutas) y errores (lista de (ruta, motivo))
+        """
+        pendientes, self._pendientes = self._pendientes, []
+        resumen = {"movidos": 0, "mismo_volumen": 0, "entre_volumenes": 0, "reintentados": 0,
+                   "bloqueados": [], "errores": []}
+        if not pendientes:
+            return resumen
+
+        # Cada directorio destino se crea y se lista una sola vez
+        ocupados, volumen_destino = {}, {}
+        for directorio in sorted({d for _, d in pendientes}):
+            try:
+                directorio.mkdir(parents=True, exist_ok=True)
+                ocupados[directorio] = {n.casefold() for n in os.listdir(directorio)}
+                volumen_destino[directorio] = os.stat(directorio).st_dev
+            except OSError as e:
+                print(f"❌ No se pudo preparar {directorio}: {e}", flush=True)
+
+        # Reservar nombres y agrupar por (volumen origen, volumen destino)
+        grupos = {}
+        volumen_origen = {}
+        for origen, directorio in pendientes:
+            if directorio not in ocupados:
+                resumen["errores"].append((origen, f"directorio destino no disponible: {directorio}"))
+                continue
+            try:
+                # Un stat por directorio de origen, no por archivo
+                carpeta = origen.parent
+                if carpeta not in volumen_origen:
+                    volumen_origen[carpeta] = os.stat(carpeta).st_dev
+            except OSError as e:
+                resumen["errores"].append((origen, str(e)))
+                continue
+            nombres = ocupados[directorio]
+            nombre = next(n for n in nombres_candidatos(origen.name) if n.casefold() not in nombres)
+            nombres.add(nombre.casefold())
+            clave = (volumen_origen[carpeta], volumen_destino[directorio])
+            grupos.setdefault(clave, []).append((origen, directorio / nombre, clave[0] == clave[1]))
+
+        movimientos = [m for clave in sorted(grupos) for m in grupos[clave]]
+        self._ocupados = ocupados
+        intento = 0
+        with ThreadPoolExecutor(max_workers=self.hilos) as pool:
+            while movimientos:
+                bloqueados = []
+                for movimiento, (resultado, destino) in zip(movimientos, pool.map(self._mover, movimientos)):
+                    origen, _, mismo_volumen = movimiento
+                    if resultado is None:
+                        if self.al_mover is not None:
+                            self.al_mover(origen, destino)
+                        resumen["movidos"] += 1
+                        resumen["mismo_volumen" if mismo_volumen else "entre_volumenes"] += 1
+                        if intento:
+                            resumen["reintentados"] += 1
+                    elif resultado is _BLOQUEADO:
+                        bloqueados.append(movimiento)
+                    else:
+                        resumen["errores"].append((origen, resultado))
+                if not bloqueados:
+                    break
+                if intento >= self.intentos:
+                    resumen["bloqueados"] = [origen for origen, _, _ in bloqueados]
+                    break
+                # Los bloqueados esperan al final; el resto ya se movió sin esperarlos
+                pausa = self.espera * 2 ** intento
+                print(f"⏳ {len(bloqueados):,} archivos en uso; reintento {intento + 1}/{self.intentos} "
+                      f"en {pausa:.1f} s", flush=True)
+                time.sleep(pausa)
+                movimientos = bloqueados
+                intento += 1
+
+        for origen in resumen["bloqueados"]:
+            print(f"🔒 {origen} sigue en uso tras {self.intentos} reintentos; no se movió", flush=True)
+        for origen, motivo in resumen["errores"]:
+            print(f"❌ No se pudo mover {origen}: {motivo}", flush=True)
+        return resumen
+
+    def _mover(self, movimiento):
+        """Mover un archivo; (None si se movió, _BLOQUEADO o el motivo del error; destino final)."""
+        origen, destino, mismo_volumen = movimiento
+        try:
+            if mismo_volumen:
+                limitar()
+            mover = mover_sin_sobrescribir if mismo_volumen else copiar_sin_sobrescribir
+            destino = self._sin_sobrescribir(destino, lambda candidato: mover(origen, candidato))
+        except OSError as e:
+            return (_BLOQUEADO if archivo_bloqueado(e) else (str(e) or type(e).__name__)), destino
+        return None, destino
+
+    def _sin_sobrescribir(self, destino, mover):
+        """
+        Llamar ``mover(candidato)`` con el nombre reservado y, mientras ya exista en
+        disco (creado tras el listado o durante los reintentos), con el siguiente libre.
+
+        Returns:
+            Path: Destino final
+        """
+        candidato = destino
+        while True:
+            try:
+                mover(candidato)
+                return candidato
+            except FileExistsError:
+                with self._lock:
+                    nombres = self._ocupados[destino.parent]
+                    nombre = next(n for n in nombres_candidatos(destino.name) if n.casefold() not in nombres)
+                    nombres.add(nombre.casefold())
+                candidato = destino.with_name(nombre)
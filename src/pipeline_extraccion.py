@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Pipeline productor/consumidor para la extracción de adjuntos XML.
+
+Outlook COM es STA: todas las llamadas deben hacerse desde el hilo que
+creó el objeto y no se pueden paralelizar. Por eso ese hilo queda como
+productor puro: lee los bytes del adjunto y sus metadatos y los deja en
+una cola acotada. Los hilos consumidores hacen todo lo demás (nombre
+único, creación de directorios, escritura a disco y registro en el CSV).
+
+La cola acotada aplica contrapresión: si el disco va más lento que
+Outlook, el productor se bloquea en ``encolar`` y la memoria usada queda
+limitada a ``tamano_cola`` adjuntos.
+
+El lector nativo puede encolar, en lugar de bytes, un contenido que sigue
+en el PST (cualquier objeto con ``volcar(archivo)``, ``leer()`` y
+``len()``): el consumidor lo copia directamente al archivo final.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import os
+import queue
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from almacen_comprimido import nombre_sin_compresion, sufijo_compresion
+from config import PIPELINE_QUEUE_SIZE, PIPELINE_WRITER_THREADS
+from disposicion_salida import sanitizar_componente
+from limitador_io import limitar
+
+# Propiedad MAPI con el contenido binario del adjunto (PR_ATTACH_DATA_BIN)
+PR_ATTACH_DATA_BIN = "http://schemas.microsoft.com/mapi/proptag/0x37010102"
+# Tipo MIME declarado del adjunto (PR_ATTACH_MIME_TAG)
+PR_ATTACH_MIME_TAG = "http://schemas.microsoft.com/mapi/proptag/0x370E001F"
+# Attachment.Type de un correo adjunto a otro (OlAttachmentType.olEmbeddeditem)
+OL_ADJUNTO_EMBEBIDO = 5
+# Item.Close sin guardar cambios (OlInspectorClose.olDiscard)
+OL_DESCARTAR = 1
+
+_FIN = object()
+
+
+class AdjuntoExtraido:
+    """Bytes de un adjunto (o su contenido por volcar) y los metadatos del correo que lo contenía."""
+
+    __slots__ = ("nombre", "datos", "remitente", "asunto", "fecha", "ruta_carpeta", "categoria")
+
+    def __init__(self, nombre, datos, remitente, asunto, fecha, ruta_carpeta, categoria=""):
+        self.nombre = nombre
+        self.datos = datos
+        self.remitente = remitente
+        self.asunto = asunto
+        self.fecha = fecha
+        self.ruta_carpeta = ruta_carpeta
+        # Subdirectorio de xml_facturacion/ elegido por las reglas de adjuntos ("" = la raíz)
+        self.categoria = categoria
+
+
+def nombre_seguro(nombre):
+    """
+    Nombre de archivo utilizable para un adjunto.
+
+    El nombre viene del correo (PR_ATTACH_LONG_FILENAME, miembro de un .zip):
+    puede traer rutas ('..\\..\\x.xml', 'C:\\...\\x.xml'). Se conserva solo el
+    último segmento y se quitan los caracteres no válidos en Windows.
+    """
+    base = str(nombre).replace("\\", "/").rsplit("/", 1)[-1]
+    return sanitizar_componente(base, por_defecto="adjunto.xml")
+
+
+def leer_bytes_adjunto_com(attachment, directorio_temporal=None):
+    """
+    Leer el contenido de un adjunto de Outlook sin escribirlo en la salida final.
+
+    Usa PropertyAccessor (sin tocar disco); si Outlook no entrega la propiedad
+    (adjuntos grandes o almacenes que no la exponen) recurre a SaveAsFile en un
+    archivo temporal que se elimina inmediatamente.
+
+    Args:
+        attachment: Objeto Attachment de Outlook
+        directorio_temporal (str): Directorio para el archivo temporal de respaldo
+
+    Returns:
+        bytes: Contenido del adjunto
+    """
+    try:
+        datos = attachment.PropertyAccessor.GetProperty(PR_ATTACH_DATA_BIN)
+        if datos is not None:
+            # Outlook lee el adjunto del PST: cuenta como lectura del almacenamiento
+            limitar(len(datos))
+            return bytes(datos)
+    except Exception:
+        pass
+
+    fd, ruta_tmp = tempfile.mkstemp(suffix=".xml", dir=directorio_temporal)
+    os.close(fd)
+    try:
+        attachment.SaveAsFile(ruta_tmp)
+        with open(ruta_tmp, "rb") as f:
+            datos = f.read()
+        limitar(len(datos))
+        return datos
+    finally:
+        try:
+            os.remove(ruta_tmp)
+        except OSError:
+            pass
+
+
+def leer_mime_adjunto_com(attachment):
+    """Tipo MIME de un adjunto de Outlook, o None si no lo tiene."""
+    try:
+        return attachment.PropertyAccessor.GetProperty(PR_ATTACH_MIME_TAG) or None
+    except Exception:
+        return None
+
+
+def nombres_candidatos(filename):
+    """Nombres a probar para un archivo: nombre, nombre_001, nombre_002..."""
+    # El sufijo de compresión queda al final: FE-1_001.xml.zst
+    sufijo = sufijo_compresion(filename)
+    base = nombre_sin_compresion(filename)
+    name_parts = base.rsplit('.', 1)
+    yield filename
+    counter = 1
+    while True:
+        if len(name_parts) == 2:
+            yield f"{name_parts[0]}_{counter:03d}.{name_parts[1]}{sufijo}"
+        else:
+            yield f"{base}_{counter:03d}{sufijo}"
+        counter += 1
+
+
+@contextmanager
+def abrir_mensaje_embebido_com(attachment, namespace, directorio_temporal=None):
+    """
+    Abrir como item de Outlook un correo adjunto a otro.
+
+    El modelo de objetos de Outlook no da acceso al objeto embebido
+    (PR_ATTACH_DATA_OBJ no se puede leer con PropertyAccessor): se guarda
+    como .msg temporal, se abre con ``OpenSharedItem`` y se elimina al salir.
+    El lector nativo no necesita este paso: recorre el subnodo del adjunto.
+
+    Args:
+        attachment: Objeto Attachment de Outlook de tipo ``OL_ADJUNTO_EMBEBIDO``
+        namespace: Namespace MAPI
+        directorio_temporal (str): Directorio para el .msg temporal
+
+    Yields:
+        Item de Outlook del correo adjunto
+    """
+    fd, ruta_tmp = tempfile.mkstemp(suffix=".msg", dir=directorio_temporal)
+    os.close(fd)
+    item = None
+    try:
+        attachment.SaveAsFile(ruta_tmp)
+        item = namespace.OpenSharedItem(ruta_tmp)
+        yield item
+    finally:
+        if item is not None:
+            try:
+                item.Close(OL_DESCARTAR)
+            except Exception:
+                pass
+            del item
+        try:
+            os.remove(ruta_tmp)
+        except OSError:
+            pass
+
+
+class EscritorXML:
+    """Consumidores que escriben en disco los adjuntos producidos por el hilo COM."""
+
+    def __init__(self, extractor, num_hilos=PIPELINE_WRITER_THREADS,
+                 tamano_cola=PIPELINE_QUEUE_SIZE):
+        """
+        Inicializar el escritor.
+
+        Args:
+            extractor (ExtractorXMLPSTGUI): Extractor dueño de contadores, log y errores
+            num_hilos (int): Número de hilos consumidores
+            tamano_cola (int): Máximo de adjuntos en memoria esperando escritura
+        """
+        self.extractor = extractor
+        self.num_hilos = max(1, int(num_hilos))
+        self.cola = queue.Queue(maxsize=max(1, int(tamano_cola)))
+        self.hilos = []
+        self._lock = threading.Lock()
+        self._directorios_creados = set()
+
+    def iniciar(self):
+        """Arrancar los hilos consumidores."""
+        for i in range(self.num_hilos):
+            hilo = threading.Thread(target=self._consumir, name=f"escritor-xml-{i}", daemon=True)
+            hilo.start()
+            self.hilos.append(hilo)
+
+    def encolar(self, adjunto):
+        """Encolar un adjunto; bloquea si la cola está llena (contrapresión)."""
+        self.cola.put(adjunto)
+
+    def finalizar(self):
+        """Esperar a que se escriban todos los adjuntos pendientes y detener los hilos."""
+        for _ in self.hilos:
+            self.cola.put(_FIN)
+        for hilo in self.hilos:
+            hilo.join()
+        self.hilos = []
+
+    @property
+    def pendientes(self):
+        """Número aproximado de adjuntos esperando en la cola."""
+        return self.cola.qsize()
+
+    def _consumir(self):
+        while True:
+            adjunto = self.cola.get()
+            try:
+                if adjunto is _FIN:
+                    return
+                self._escribir(adjunto)
+            except Exception as e:
+                self.extractor.errors.registrar(
+                    "escritura", f"Error guardando {adjunto.nombre} de {adjunto.ruta_carpeta}: {str(e)}",
+                    carpeta=adjunto.ruta_carpeta, archivo=adjunto.nombre
+                )
+            finally:
+                self.cola.task_done()
+
+    def _asegurar_directorio(self, directorio):
+        """Crear cada directorio de salida una sola vez por ejecución."""
+        if directorio in self._directorios_creados:
+            return
+        with self._lock:
+            if directorio not in self._directorios_creados:
+                directorio.mkdir(parents=True, exist_ok=True)
+                self._directorios_creados.add(directorio)
+
+    @staticmethod
+    def _crear_archivo_unico(directorio, filename):
+        """Abrir en modo exclusivo el primer nombre libre (nombre, nombre_001, ...).
+
+        La creación exclusiva ('xb') resuelve la colisión en una sola llamada
+        al sistema y es segura entre hilos, sin sondear exists() antes.
+        """
+        for nombre in nombres_candidatos(filename):
+            ruta = directorio / nombre
+            try:
+                return ruta, open(ruta, "xb")
+            except FileExistsError:
+                continue
+
+    def _escribir(self, adjunto):
+        if self.extractor.cancelada:
+            return  # Lo que quedaba en la cola se descarta
+        empaquetador = self.extractor.empaquetador
+        compresor = self.extractor.compresor
+        volcable = hasattr(adjunto.datos, "volcar")
+        if volcable and (empaquetador is not None or compresor is not None
+                         or self.extractor.disposicion_necesita_datos):
+            # Paquetes, compresión y disposiciones por Clave necesitan los bytes
+            adjunto.datos = adjunto.datos.leer()
+            volcable = False
+        xml_dir = self.extractor.get_output_subdir(adjunto)
+        nombre_archivo = nombre_seguro(adjunto.nombre)
+
+        if empaquetador is not None:
+            # Modo empaquetado: solo se añade al paquete en curso y al índice
+            relativo = xml_dir.relative_to(empaquetador.raiz).as_posix()
+            nombre = f"{relativo}/{nombre_archivo}" if relativo != "." else nombre_archivo
+            limitar(len(adjunto.datos))
+            nombre_final = empaquetador.agregar(nombre, adjunto.datos)
+            xml_path = empaquetador.raiz / nombre_final
+        else:
+            preparacion = self.extractor.preparacion
+            nombre = nombre_archivo + compresor.extension if compresor is not None else nombre_archivo
+            datos = compresor.comprimir(adjunto.datos) if compresor is not None else adjunto.datos
+            if preparacion is not None:
+                # Escritura local; el traslado al destino (recurso de red) va por lotes en segundo plano
+                xml_path, ruta_local, f = preparacion.crear(xml_dir, nombre)
+            else:
+                # Con preparación local el límite de E/S se aplica al trasladar, no al disco local
+                limitar(len(datos))
+                self._asegurar_directorio(xml_dir)
+                xml_path, f = self._crear_archivo_unico(xml_dir, nombre)
+            # Anotado antes de escribir: quien retome la unidad sabe qué borrar
+            self.extractor.anotar_salida(xml_path)
+            with f:
+                if volcable:
+                    datos.volcar(f)
+                else:
+                    f.write(datos)
+            if preparacion is not None:
+                preparacion.entregar(ruta_local, xml_path)
+
+        self.extractor.contar_xml_extraido()
+        self.extractor.registrar_en_log(
+            xml_path.name,
+            adjunto.remitente,
+            adjunto.asunto,
+            adjunto.fecha,
+            adjunto.ruta_carpeta,
+            len(adjunto.datos),
+        )
+        print(f"✅ XML extraído: {xml_path}")
@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Planes de movimientos revisables para renombrar y filtrar.
+
+Con ``--plan cambios.jsonl`` ``rename_xml_por_clave.py`` y
+``filtrar_xml_hacienda.py`` analizan los XML (la parte lenta) pero no tocan
+nada: escriben una línea por movimiento con origen, destino, motivo y la
+huella del archivo (tamaño y fecha de modificación en ns)::
+
+    {"plan": 1, "herramienta": "renombrar", "raiz": "...", "creado": "..."}
+    {"origen": ".../a.xml", "destino": ".../5060....xml", "motivo": "renombrar",
+     "tamano": 10132, "mtime_ns": 1729...}
+
+Tras revisarlo, ``--apply cambios.jsonl`` solo comprueba las huellas (un
+``stat`` por archivo, sin volver a leer ningún XML), crea de una vez los
+directorios destino y mueve los archivos con varios hilos. Cada movimiento
+hecho se anota en ``cambios.diario.jsonl``; ``--rollback cambios.jsonl``
+los deshace en orden inverso. Ni aplicar ni deshacer sobrescriben: un
+destino que aparece entre la verificación y el movimiento se omite.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from config import PLAN_APPLY_THREADS
+from limitador_io import limitar
+from movimiento_masivo import mover_sin_sobrescribir
+
+VERSION_PLAN = 1
+
+
+def ruta_diario(ruta_plan):
+    ruta_plan = Path(ruta_plan)
+    return ruta_plan.with_name(f"{ruta_plan.stem}.diario.jsonl")
+
+
+class PlanMovimientos:
+    """Escritor de un plan: registra movimientos y reserva sus destinos."""
+
+    def __init__(self, ruta, herramienta, raiz):
+        """
+        Crear el plan (se sobrescribe si existe).
+
+        Args:
+            ruta (Path): Archivo JSONL del plan
+            herramienta (str): 'renombrar' o 'filtrar' (informativo)
+            raiz (Path): Directorio analizado
+        """
+        self.ruta = Path(ruta)
+        # Sin distinguir mayúsculas, como NTFS/SMB: X.xml y x.xml serían el mismo destino
+        self._destinos = set()
+        self._archivo = open(self.ruta, "w", encoding="utf-8")
+        cabecera = {
+            "plan": VERSION_PLAN,
+            "herramienta": herramienta,
+            "raiz": str(Path(raiz).resolve()),
+            "creado": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        self._archivo.write(json.dumps(cabecera, ensure_ascii=False) + "\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def __len__(self):
+        return len(self._destinos)
+
+    def ocupado(self, ruta):
+        """Indicar si ``ruta`` existe o ya es destino de otro movimiento del plan."""
+        return str(ruta).casefold() in self._destinos or Path(ruta).exists()
+
+    def agregar(self, origen, destino, motivo):
+        """Registrar un movimiento con la huella actual del origen."""
+        estado = os.stat(origen)
+        self._destinos.add(str(destino).casefold())
+        linea = {
+            "origen": str(origen),
+            "destino": str(destino),
+            "motivo": motivo,
+            "tamano": estado.st_size,
+            "mtime_ns": estado.st_mtime_ns,
+        }
+        self._archivo.write(json.dumps(linea, ensure_ascii=False) + "\n")
+
+    def cerrar(self):
+        if self._archivo:
+            self._archivo.close()
+            self._archivo = None
+
+
+def leer_plan(ruta):
+    """
+    Leer un plan.
+
+    Returns:
+        tuple: (cabecera, lista de movimientos)
+    """
+    with open(ruta, encoding="utf-8") as f:
+        lineas = [json.loads(linea) for linea in f if linea.strip()]
+    if not lineas or lineas[0].get("plan") != VERSION_PLAN:
+        raise ValueError(f"{ruta} no es un plan de movimientos (versión {VERSION_PLAN})")
+    return lineas[0], lineas[1:]
+
+
+def _verificar(movimiento):
+    """Motivo por el que no se puede aplicar el movimiento, o None si sigue vigente."""
+    try:
+        estado = os.stat(movimiento["origen"])
+    except FileNotFoundError:
+        return "origen inexistente"
+    if estado.st_size != movimiento["tamano"] or estado.st_mtime_ns != movimiento["mtime_ns"]:
+        return "el origen cambió desde el plan"
+    if os.path.lexists(movimiento["destino"]):
+        return "destino ocupado"
+    return None
+
+
+def aplicar_plan(ruta_plan, hilos=PLAN_APPLY_THREADS):
+    """
+    Aplicar un plan: verificar huellas, crear directorios y mover en paralelo.
+
+    Args:
+        ruta_plan (Path): Plan escrito con --plan
+        hilos (int): Hilos para verificar y mover (útil en recursos de red)
+
+    Returns:
+        dict: Contadores (aplicados, omitidos por motivo, errores)
+    """
+    cabecera, movimientos = leer_plan(ruta_plan)
+    print(f"📝 Plan de '{cabecera['herramienta']}' sobre {cabecera['raiz']} ({cabecera['creado']}): "
+          f"{len(movimientos):,} movimientos")
+
+    resumen = {"aplicados": 0, "errores": 0, "omitidos": {}}
+    hilos = max(1, hilos)
+    with ThreadPoolExecutor(max_workers=hilos) as pool:
+        motivos = list(pool.map(_verificar, movimientos))
+    vigentes = []
+    for movimiento, motivo in zip(movimientos, motivos):
+        if motivo is None:
+            vigentes.append(movimiento)
+        else:
+            resumen["omitidos"][motivo] = resumen["omitidos"].get(motivo, 0) + 1
+            print(f"⏭️ {movimiento['origen']}: {motivo}", flush=True)
+
+    # Todos los directorios de una vez, en lugar de un mkdir por archivo
+    for directorio in sorted({os.path.dirname(m["destino"]) for m in vigentes}):
+        os.makedirs(directorio, exist_ok=True)
+
+    lock = threading.Lock()
+    with open(ruta_diario(ruta_plan), "a", encoding="utf-8") as diario:
+        def mover(movimiento):
+            try:
+                limitar()
+                mover_sin_sobrescribir(movimiento["origen"], movimiento["destino"])
+            except FileExistsError:
+                # Apareció después de la verificación: no se sobrescribe
+                print(f"⏭️ {movimiento['origen']}: destino ocupado", flush=True)
+                with lock:
+                    resumen["omitidos"]["destino ocupado"] = resumen["omitidos"].get("destino ocupado", 0) + 1
+                return
+            except OSError as e:
+                print(f"❌ No se pudo mover {movimiento['origen']}: {e}", flush=True)
+                with lock:
+                    resumen["errores"] += 1
+                return
+            with lock:
+                diario.write(json.dumps({"origen": movimiento["origen"], "destino": movimiento["destino"]},
+                                        ensure_ascii=False) + "\n")
+                diario.flush()
+                resumen["aplicados"] += 1
+
+        with ThreadPoolExecutor(max_workers=hilos) as pool:
+            list(pool.map(mover, vigentes))
+        diario.flush()
+        os.fsync(diario.fileno())
+
+    omitidos = sum(resumen["omitidos"].values())
+    print(f"✅ Plan aplicado: {resumen['aplicados']:,} movidos, {omitidos:,} omitidos, "
+          f"{resumen['errores']:,} errores (diario: {ruta_diario(ruta_plan)})")
+    return resumen
+
+
+def deshacer_plan(ruta_plan):
+    """
+    Deshacer los movimientos anotados en el diario de un plan, en orden inverso.
+
+    Returns:
+        dict: Contadores (deshechos, omitidos, errores)
+    """
+    diario = ruta_diario(ruta_plan)
+    if not diario.exists():
+        raise FileNotFoundError(f"No hay diario de movimientos en {diario}")
+    with open(diario, encoding="utf-8") as f:
+        hechos = [json.loads(linea) for linea in f if linea.strip()]
+
+    resumen = {"deshechos": 0, "omitidos": 0, "errores": 0}
+    fallidos = []
+    for movimiento in reversed(hechos):
+        origen, destino = movimiento["origen"], movimiento["destino"]
+        if not os.path.exists(destino) or os.path.lexists(origen):
+            resumen["omitidos"] += 1
+            print(f"⏭️ No se puede devolver {destino} a {origen}", flush=True)
+            continue
+        try:
+            os.makedirs(os.path.dirname(origen), exist_ok=True)
+            limitar()
+            mover_sin_sobrescribir(destino, origen)
+        except FileExistsError:
+            resumen["omitidos"] += 1
+            print(f"⏭️ No se puede devolver {destino} a {origen}: el origen ya existe", flush=True)
+            continue
+        except OSError as e:
+            # Un archivo que falla no detiene el resto de la reversión
+            resumen["errores"] += 1
+            fallidos.append(movimiento)
+            print(f"❌ No se pudo devolver {destino} a {origen}: {e}", flush=True)
+            continue
+        resumen["deshechos"] += 1
+
+    # Quitar los directorios que creó el plan y quedaron vacíos (Copias/, HaciendaResponse/...)
+    for directorio in sorted({os.path.dirname(m["destino"]) for m in hechos}, key=len, reverse=True):
+        try:
+            os.rmdir(directorio)
+        except OSError:
+            pass
+
+    diario.replace(diario.with_name(f"{diario.stem}.deshecho.jsonl"))
+    if fallidos:
+        # Los que fallaron quedan en un diario nuevo: otro --rollback los reintenta
+        with open(diario, "w", encoding="utf-8") as f:
+            for movimiento in reversed(fallidos):
+                f.write(json.dumps(movimiento, ensure_ascii=False) + "\n")
+        print(f"⚠️ {len(fallidos):,} movimientos siguen en {diario}: repita --rollback para reintentarlos")
+    print(f"↩️ Plan deshecho: {resumen['deshechos']:,} archivos devueltos, {resumen['omitidos']:,} omitidos, "
+          f"{resumen['errores']:,} errores")
+    return resumen
+
+
+def agregar_argumentos_plan(parser):
+    """Agregar --plan, --apply, --rollback y --apply-threads a un parser."""
+    grupo = parser.add_argument_group("plan de movimientos")
+    grupo.add_argument("--plan", metavar="PLAN.jsonl",
+                       help="Analizar y escribir los movimientos en un plan revisable, sin mover nada")
+    grupo.add_argument("--apply", metavar="PLAN.jsonl",
+                       help="Aplicar un plan ya revisado (solo verifica huellas; no vuelve a leer los XML)")
+    grupo.add_argument("--rollback", metavar="PLAN.jsonl",
+                       help="Deshacer los movimientos aplicados de un plan")
+    grupo.add_argument("--apply-threads", type=int, default=PLAN_APPLY_THREADS,
+                       help=f"Hilos para verificar y mover en --apply (por defecto {PLAN_APPLY_THREADS})")
+
+
+def ejecutar_plan_desde_argumentos(args):
+    """
+    Atender --apply / --rollback.
+
+    Returns:
+        bool: True si se atendió alguna de las dos (el script no debe seguir)
+    """
+    if args.apply:
+        aplicar_plan(args.apply, args.apply_threads)
+        return True
+    if args.rollback:
+        deshacer_plan(args.rollback)
+        return True
+    return False
@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+"""
+Preparación local con escritura diferida hacia destinos lentos.
+
+Con ``--staging-dir`` los hilos de escritura no tocan el destino final
+(normalmente un recurso de red, donde cada ``open``/``close`` cuesta un
+viaje de ida y vuelta): escriben en un directorio local rápido que replica
+la estructura de ``xml_facturacion/`` y entregan cada archivo terminado a
+``AreaPreparacion``. Un hilo trasladador lo junta en lotes
+(``STAGING_BATCH_FILES`` archivos o ``STAGING_BATCH_SECONDS`` segundos),
+crea una sola vez los directorios de cada lote y copia los archivos con
+varios hilos; si el área y el destino están en el mismo volumen, el
+traslado es un enlace duro sin copiar datos.
+
+Los nombres finales se reservan al escribir: cada directorio destino se
+lista una vez y los nombres repetidos reciben el sufijo _001, _002...
+igual que sin preparación, así que el log y el reporte muestran la ruta
+definitiva. El destino se abre en modo exclusivo; si otro proceso ocupó
+el nombre entretanto, el archivo recibe el siguiente sufijo libre y se
+registra el cambio.
+
+Durabilidad (``--durability``):
+
+- ``ninguna``: sin fsync; el sistema operativo decide cuándo escribir
+- ``lote``: un fsync de cada archivo y directorio al cerrar el lote
+- ``archivo``: fsync de cada archivo antes de seguir con el siguiente
+
+La copia local se borra solo después del fsync correspondiente. Al
+terminar se comprueba que cada archivo trasladado exista en el destino
+con su tamaño; lo que no se pudo trasladar se queda en el área local y se
+informa.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from config import (
+    STAGING_BATCH_FILES, STAGING_BATCH_SECONDS, STAGING_DURABILITY, STAGING_MAX_PENDING_MB,
+    STAGING_MOVER_THREADS,
+)
+from limitador_io import limitar
+from pipeline_extraccion import nombres_candidatos
+
+DURABILIDADES = ("ninguna", "lote", "archivo")
+
+_BUFFER_COPIA = 1024 * 1024
+
+
+def _sincronizar_directorio(directorio):
+    """fsync de un directorio para que las entradas nuevas sobrevivan a un corte (no existe en Windows)."""
+    try:
+        fd = os.open(directorio, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class AreaPreparacion:
+    """Directorio local donde se escriben los XML antes de trasladarlos por lotes al destino."""
+
+    def __init__(self, directorio_local, raiz_destino, durabilidad=STAGING_DURABILITY,
+                 hilos=STAGING_MOVER_THREADS, lote=STAGING_BATCH_FILES, espera=STAGING_BATCH_SECONDS,
+                 max_pendiente_mb=STAGING_MAX_PENDING_MB, errores=None):
+        """
+        Crear el área de esta ejecución dentro de ``directorio_local``.
+
+        Args:
+            directorio_local (Path): Directorio en un disco local rápido
+            raiz_destino (Path): Directorio de salida final; las rutas entregadas cuelgan de él
+            durabilidad (str): 'ninguna', 'lote' o 'archivo' (ver el docstring del módulo)
+            hilos (int): Copias simultáneas hacia el destino
+            lote (int): Archivos por lote de traslado
+            espera (float): Segundos máximos de espera para completar un lote
+            max_pendiente_mb (int): Datos sin trasladar a partir de los que se frena la escritura
+            errores (RegistroErrores): Registro donde anotar los fallos (categoría 'preparacion')
+        """
+        if durabilidad not in DURABILIDADES:
+            raise ValueError(f"Durabilidad desconocida '{durabilidad}' (use {', '.join(DURABILIDADES)})")
+        self.raiz_destino = Path(raiz_destino)
+        self.raiz_local = Path(directorio_local) / \
+            f"pstextractor-{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        self.raiz_local.mkdir(parents=True)
+        self.durabilidad = durabilidad
+        self.hilos = max(1, int(hilos))
+        self.lote = max(1, int(lote))
+        self.espera = espera
+        self.max_pendiente = max_pendiente_mb * 1024 * 1024
+        self.errores = errores
+        # Mismo volumen: el traslado es un enlace duro, sin copiar datos
+        self.mismo_volumen = os.stat(self.raiz_local).st_dev == os.stat(self.raiz_destino).st_dev
+
+        self._lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._nombres = {}  # directorio destino -> nombres ocupados o reservados
+        self._locales_creados = set()
+        self._destinos_creados = set()
+        self._cola = []
+        self._pendiente = 0
+        self._fin = False
+        self._hilo = None
+        self._pool = None
+        self._entregados = {}  # ruta destino -> tamaño
+
+        # Contadores
+        self.trasladados = 0
+        self.bytes_trasladados = 0
+        self.lotes = 0
+        self.renombrados = 0
+        self.fallidos = 0
+        self.inconsistentes = 0
+        self.en_espera = 0
+
+    def iniciar(self):
+        """Arrancar el hilo trasladador."""
+        self._pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="traslado-xml")
+        self._hilo = threading.Thread(target=self._trasladar, name="preparacion-local", daemon=True)
+        self._hilo.start()
+
+    def crear(self, directorio, filename):
+        """
+        Reservar el nombre final y abrir su copia local.
+
+        Args:
+            directorio (Path): Directorio destino (dentro de ``raiz_destino``)
+            filename (str): Nombre deseado; si está ocupado se usa nombre_001, nombre_002...
+
+        Returns:
+            tuple: (ruta destino, ruta local, archivo local abierto en 'xb')
+        """
+        relativo = directorio.relative_to(self.raiz_destino)
+        with self._lock:
+            ocupados = self._nombres.get(directorio)
+            if ocupados is None:
+                # Un solo listado por directorio destino en toda la ejecución; sin distinguir
+                # mayúsculas, como NTFS/SMB (FE.xml y fe.xml son el mismo archivo)
+                try:
+                    ocupados = {n.casefold() for n in os.listdir(directorio)}
+                except FileNotFoundError:
+                    ocupados = set()
+                self._nombres[directorio] = ocupados
+            directorio_local = self.raiz_local / relativo
+            if directorio_local not in self._locales_creados:
+                directorio_local.mkdir(parents=True, exist_ok=True)
+                self._locales_creados.add(directorio_local)
+            for nombre in nombres_candidatos(filename):
+                if nombre.casefold() in ocupados:
+                    continue
+                ocupados.add(nombre.casefold())
+                ruta_local = directorio_local / nombre
+                try:
+                    return directorio / nombre, ruta_local, open(ruta_local, "xb")
+                except FileExistsError:
+                    # Restos de una ejecución anterior en el área local: siguiente candidato
+                    continue
+
+    def entregar(self, ruta_local, destino):
+        """Encolar un archivo local ya cerrado; bloquea si hay demasiados datos sin trasladar."""
+        tamano = os.path.getsize(ruta_local)
+        with self._cond:
+            while self._pendiente > self.max_pendiente and self._hilo.is_alive():
+                self._cond.wait(0.5)
+            self._cola.append((ruta_local, destino, tamano))
+            self._pendiente += tamano
+            if len(self._cola) >= self.lote:
+                self._cond.notify_all()
+
+    def _trasladar(self):
+        while True:
+            with self._cond:
+                limite = time.monotonic() + self.espera
+                while len(self._cola) < self.lote and not self._fin:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        break
+                    self._cond.wait(restante)
+                if not self._cola:
+                    if self._fin:
+                        return
+                    continue
+                lote, self._cola = self._cola[:self.lote], self._cola[self.lote:]
+            try:
+                self._trasladar_lote(lote)
+            except Exception as e:
+                # Un fallo inesperado no detiene el traslado: los archivos siguen en el área local
+                self.fallidos += len(lote)
+                self._registrar(f"Error trasladando un lote de {len(lote)} archivos: {e}")
+            with self._cond:
+                self._pendiente -= sum(tamano for _, _, tamano in lote)
+                self._cond.notify_all()
+
+    def _trasladar_lote(self, lote):
+        # Directorios del lote, una sola vez por ejecución
+        directorios = {destino.parent for _, destino, _ in lote}
+        for directorio in directorios - self._destinos_creados:
+            directorio.mkdir(parents=True, exist_ok=True)
+            self._destinos_creados.add(directorio)
+
+        resultados = list(self._pool.map(self._trasladar_archivo, lote))
+
+        hechos = [resultado for resultado in resultados if resultado is not None]
+        if self.durabilidad == "lote":
+            for _, _, _, archivo in hechos:
+                os.fsync(archivo.fileno())
+            for directorio in directorios:
+                _sincronizar_directorio(directorio)
+        for ruta_local, destino, tamano, archivo in hechos:
+            if archivo is not None:
+                archivo.close()
+            os.remove(ruta_local)
+            self._entregados[destino] = tamano
+            self.trasladados += 1
+            self.bytes_trasladados += tamano
+        self.lotes += 1
+
+    def _trasladar_archivo(self, elemento):
+        """
+        Trasladar un archivo al destino.
+
+        Returns:
+            tuple: (ruta local, destino final, tamaño, archivo destino abierto o None), o None si falló
+        """
+        ruta_local, destino, tamano = elemento
+        try:
+            # El destino es el almacenamiento compartido: aquí se aplica el límite de E/S
+            limitar(0 if self.mismo_volumen else tamano)
+            if self.mismo_volumen:
+                enlazado = self._enlazar(ruta_local, destino)
+                if enlazado is not None:
+                    return ruta_local, enlazado, tamano, self._sincronizar(enlazado)
+            with open(ruta_local, "rb") as origen:
+                destino, archivo = self._abrir_destino(destino)
+                try:
+                    shutil.copyfileobj(origen, archivo, _BUFFER_COPIA)
+                    archivo.flush()
+                    if self.durabilidad == "archivo":
+                        os.fsync(archivo.fileno())
+                except BaseException:
+                    # Sin copias a medias en el destino: el original sigue en el área local
+                    archivo.close()
+                    os.remove(destino)
+                    raise
+            if self.durabilidad != "lote":
+                archivo.close()
+                archivo = None
+            return ruta_local, destino, tamano, archivo
+        except OSError as e:
+            with self._lock:
+                self.fallidos += 1
+            self._registrar(f"No se pudo trasladar {ruta_local} a {destino}: {e}", archivo=str(destino))
+            return None
+
+    def _enlazar(self, ruta_local, destino):
+        """Enlace duro en el destino (sin sobrescribir); None si el sistema de archivos no lo admite."""
+        for nombre in nombres_candidatos(destino.name):
+            candidato = destino.with_name(nombre)
+            try:
+                os.link(ruta_local, candidato)
+            except FileExistsError:
+                continue
+            except OSError:
+                return None
+            self._anotar_renombrado(destino, candidato)
+            return candidato
+
+    def _abrir_destino(self, destino):
+        """Abrir el destino en modo exclusivo con el primer nombre libre."""
+        for nombre in nombres_candidatos(destino.name):
+            candidato = destino.with_name(nombre)
+            try:
+                archivo = open(candidato, "xb")
+            except FileExistsError:
+                continue
+            self._anotar_renombrado(destino, candidato)
+            return candidato, archivo
+
+    def _sincronizar(self, destino):
+        """Archivo enlazado según la durabilidad: fsync ya, abierto para el fsync del lote, o nada."""
+        if self.durabilidad == "ninguna":
+            return None
+        archivo = open(destino, "rb")
+        if self.durabilidad == "archivo":
+            try:
+                os.fsync(archivo.fileno())
+            finally:
+                archivo.close()
+            return None
+        return archivo
+
+    def _anotar_renombrado(self, reservado, final):
+        if final == reservado:
+            return
+        with self._lock:
+            self.renombrados += 1
+        self._registrar(f"{reservado.name} apareció en el destino durante la extracción; "
+                        f"guardado como {final.name}", archivo=str(final))
+
+    def _registrar(self, mensaje, **contexto):
+        if self.errores is not None:
+            self.errores.registrar("preparacion", mensaje, **contexto)
+        else:
+            print(f"❌ {mensaje}", flush=True)
+
+    def finalizar(self):
+        """
+        Trasladar lo pendiente, comprobar el destino y limpiar el área local.
+
+        Returns:
+            dict: Contadores (trasladados, bytes, lotes, renombrados, fallidos, inconsistentes, en_espera)
+        """
+        with self._cond:
+            self._fin = True
+            self._cond.notify_all()
+        if self._hilo is not None:
+            self._hilo.join()
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="traslado-xml")
+
+        # Comprobación final: cada archivo trasladado existe en el destino con su tamaño
+        def comprobar(elemento):
+            destino, tamano = elemento
+            try:
+                real = os.stat(destino).st_size
+            except OSError:
+                return destino, "no existe en el destino"
+            return destino, None if real == tamano else f"tamaño {real:,} en lugar de {tamano:,} bytes"
+
+        for destino, problema in self._pool.map(comprobar, self._entregados.items()):
+            if problema:
+                self.inconsistentes += 1
+                self._registrar(f"Comprobación final: {destino} {problema}", archivo=str(destino))
+        self._pool.shutdown()
+
+        # Lo que no se trasladó se queda en el área local; los directorios vacíos se quitan
+        for raiz, _, archivos in os.walk(self.raiz_local, topdown=False):
+            self.en_espera += len(archivos)
+            try:
+                os.rmdir(raiz)
+            except OSError:
+                pass
+        if self.en_espera:
+            print(f"⚠️ {self.en_espera:,} XML sin trasladar siguen en {self.raiz_local}")
+        print(f"📦 Preparación local: {self.describir()}")
+        return {
+            "trasladados": self.trasladados,
+            "bytes": self.bytes_trasladados,
+            "lotes": self.lotes,
+            "renombrados": self.renombrados,
+            "fallidos": self.fallidos,
+            "inconsistentes": self.inconsistentes,
+            "en_espera": self.en_espera,
+        }
+
+    def describir(self):
+        texto = (f"{self.trasladados:,} XML trasladados ({self.bytes_trasladados / 1024 / 1024:.1f} MB) "
+                 f"en {self.lotes:,} lotes, durabilidad '{self.durabilidad}'")
+        if self.mismo_volumen:
+            texto += ", mismo volumen (enlaces duros)"
+        problemas = [f"{n:,} {etiqueta}" for n, etiqueta in (
+            (self.renombrados, "renombrados"), (self.fallidos, "fallidos"),
+            (self.inconsistentes, "inconsistentes"), (self.en_espera, "sin trasladar"),
+        ) if n]
+        return texto + (f"; {', '.join(problemas)}" if problemas else "")
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Procesamiento por lotes de documentos extraídos en un pool de procesos.
+
+La validación XSD y la verificación de firmas son CPU intensivas y cada
+proceso necesita un estado caro de construir (esquemas compilados,
+certificados ya analizados). Este módulo reparte los documentos en lotes,
+inicializa ese estado una vez por proceso y entrega los resultados al
+proceso principal, que es el único que escribe en disco.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+def dividir_en_lotes(documentos, tamano):
+    """Partir una lista de documentos en lotes de ``tamano`` elementos."""
+    return [documentos[i:i + tamano] for i in range(0, len(documentos), tamano)]
+
+
+def ejecutar_por_lotes(documentos, procesar_lote, inicializar, argumentos_inicio,
+                       procesos, tamano_lote, al_terminar_lote, finalizar=None):
+    """
+    Procesar documentos en lotes, en paralelo si hay más de un proceso.
+
+    Args:
+        documentos (list): Rutas o entradas del índice (deben poder serializarse con pickle)
+        procesar_lote (callable): Función de módulo lote -> lista de resultados
+        inicializar (callable): Función de módulo que prepara el estado de cada proceso
+        argumentos_inicio (tuple): Argumentos de ``inicializar``
+        procesos (int): Procesos del pool (1 = en el proceso actual, sin pool)
+        tamano_lote (int): Documentos por tarea
+        al_terminar_lote (callable): Recibe los resultados de cada lote en el proceso principal
+        finalizar (callable): Libera el estado cuando se procesó en el proceso actual
+    """
+    lotes = dividir_en_lotes(documentos, tamano_lote)
+
+    if procesos <= 1 or len(lotes) <= 1:
+        inicializar(*argumentos_inicio)
+        try:
+            for lote in lotes:
+                al_terminar_lote(procesar_lote(lote))
+        finally:
+            if finalizar:
+                finalizar()
+        return
+
+    with ProcessPoolExecutor(max_workers=procesos, initializer=inicializar,
+                             initargs=argumentos_inicio) as pool:
+        futuros = [pool.submit(procesar_lote, lote) for lote in lotes]
+        for futuro in as_completed(futuros):
+            al_terminar_lote(futuro.result())
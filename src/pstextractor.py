@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Punto de entrada único de las herramientas de extracción.
+
+    python pstextractor.py <comando> [opciones del comando]
+    python pstextractor.py extract -i archivo.pst --reader nativo
+    python pstextractor.py rename-by-clave --dir salida/xml_facturacion --help
+
+Cada comando es el ``main()`` de un script existente, que se importa solo
+al elegir ese comando: listar los comandos o pedir la ayuda de uno no
+carga tkinter, Outlook, lxml ni cryptography. Los scripts siguen
+funcionando por separado igual que antes.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import importlib
+import sys
+
+# Comando -> (módulo, descripción). Las descripciones viven aquí para no importar nada al listar.
+COMANDOS = {
+    "extract": ("extractor_xml_pst_gui", "Extraer los XML adjuntos de un PST (Outlook o lector nativo)"),
+    "filter-hacienda": ("filtrar_xml_hacienda", "Mover las respuestas MensajeHacienda a HaciendaResponse/"),
+    "rename-by-clave": ("rename_xml_por_clave", "Renombrar cada XML por su <Clave> y apartar duplicados"),
+    "validate": ("validacion_xsd", "Validar XML extraídos contra los XSD de Hacienda"),
+    "verify-signatures": ("verificacion_firmas", "Verificar las firmas XAdES de XML extraídos"),
+    "packages": ("archivo_empaquetado", "Consultar o desempaquetar una salida zip/tar"),
+    "compress": ("almacen_comprimido", "Entrenar el diccionario zstd o recomprimir una salida"),
+    "key-index": ("indice_claves", "Consultar un índice de Claves guardado"),
+    "results": ("explorador_resultados", "Explorar el log de una extracción con filtros (en vivo si sigue en curso)"),
+    "watch": ("vigilante_correo", "Vigilar una carpeta de .eml/.msg e ingerir sus XML"),
+    "serve": ("servicio_trabajos", "Servicio HTTP local para encolar extracciones"),
+    "distributed": ("extraccion_distribuida", "Repartir la extracción de un PST entre varios procesos"),
+}
+
+
+def uso():
+    ancho = max(len(comando) for comando in COMANDOS)
+    lineas = ["uso: pstextractor <comando> [opciones]", "", "Comandos:"]
+    for comando, (_modulo, descripcion) in COMANDOS.items():
+        lineas.append(f"  {comando.ljust(ancho)}  {descripcion}")
+    lineas += ["", "Ayuda de un comando: pstextractor <comando> --help"]
+    return "\n".join(lineas)
+
+
+def main(argv=None):
+    """Despachar al main() del comando elegido."""
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(uso())
+        return 0 if argv else 2
+    comando, *resto = argv
+    if comando not in COMANDOS:
+        print(f"pstextractor: comando desconocido '{comando}'\n\n{uso()}", file=sys.stderr)
+        return 2
+
+    modulo = importlib.import_module(COMANDOS[comando][0])
+    # argparse del comando toma el nombre del programa de sys.argv[0]
+    sys.argv = [f"pstextractor {comando}", *resto]
+    return modulo.main()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
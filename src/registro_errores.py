@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Registro de errores con memoria acotada.
+
+Cada error se escribe al momento como una línea JSON en un archivo
+``errores.jsonl``; en memoria solo se guardan los contadores por
+categoría y una muestra aleatoria de tamaño fijo (muestreo por
+reservorio) para el reporte final. Así la memoria no crece aunque un
+PST dañado produzca cientos de miles de errores.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import json
+import random
+import threading
+from collections import Counter
+from datetime import datetime
+
+from config import ERROR_SAMPLE_SIZE
+
+
+class RegistroErrores:
+    """Errores en JSONL + contadores por categoría + muestra de tamaño fijo."""
+
+    def __init__(self, ruta_jsonl=None, tamano_muestra=ERROR_SAMPLE_SIZE):
+        """
+        Inicializar el registro.
+
+        Args:
+            ruta_jsonl (Path): Archivo JSONL de errores (None = solo contadores y muestra)
+            tamano_muestra (int): Errores que se conservan en memoria para el reporte
+        """
+        self.ruta_jsonl = ruta_jsonl
+        self.tamano_muestra = tamano_muestra
+        self.total = 0
+        self.por_categoria = Counter()
+        self.muestra = []
+        self._aleatorio = random.Random()
+        self._lock = threading.Lock()
+        self._archivo = None
+
+    def abrir(self, ruta_jsonl=None):
+        """Abrir (truncar) el archivo JSONL donde se vuelcan los errores."""
+        if ruta_jsonl is not None:
+            self.ruta_jsonl = ruta_jsonl
+        if self.ruta_jsonl is not None:
+            self._archivo = open(self.ruta_jsonl, "w", encoding="utf-8")
+
+    def cerrar(self):
+        """Cerrar el archivo JSONL."""
+        with self._lock:
+            if self._archivo:
+                self._archivo.close()
+                self._archivo = None
+
+    def registrar(self, categoria, mensaje, **contexto):
+        """
+        Registrar un error (seguro entre hilos).
+
+        Args:
+            categoria (str): Categoría del error (ej. 'item', 'carpeta', 'escritura')
+            mensaje (str): Descripción legible
+            **contexto: Campos adicionales para el JSONL (carpeta, archivo, hresult...)
+        """
+        registro = {
+            "fecha": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "categoria": categoria,
+            "mensaje": mensaje,
+        }
+        registro.update({k: str(v) for k, v in contexto.items() if v is not None})
+
+        with self._lock:
+            self.total += 1
+            self.por_categoria[categoria] += 1
+
+            # Muestreo por reservorio (algoritmo R): cada error tiene la misma probabilidad
+            if len(self.muestra) < self.tamano_muestra:
+                self.muestra.append(registro)
+            else:
+                j = self._aleatorio.randrange(self.total)
+                if j < self.tamano_muestra:
+                    self.muestra[j] = registro
+
+            if self._archivo:
+                try:
+                    self._archivo.write(json.dumps(registro, ensure_ascii=False) + "\n")
+                except (OSError, ValueError):
+                    # Sin disco para el log de errores: seguir contando en memoria
+                    pass
+
+    def __len__(self):
+        return self.total
+
+    def __bool__(self):
+        return self.total > 0
+
+    def escribir_resumen(self, f):
+        """Escribir en el reporte los contadores y la muestra de errores."""
+        if not self.total:
+            return
+        f.write("ERRORES POR CATEGORÍA:\n")
+        for categoria, cantidad in self.por_categoria.most_common():
+            f.write(f"- {categoria}: {cantidad:,}\n")
+        f.write("\n")
+
+        if self.total > len(self.muestra):
+            f.write(f"MUESTRA DE ERRORES ({len(self.muestra)} de {self.total:,}, al azar):\n")
+        else:
+            f.write("ERRORES ENCONTRADOS:\n")
+        for i, registro in enumerate(self.muestra, 1):
+            f.write(f"{i}. [{registro['categoria']}] {registro['mensaje']}\n")
+        if self.ruta_jsonl:
+            f.write(f"\nListado completo: {self.ruta_jsonl}\n")
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Reglas que deciden qué adjuntos se extraen y a qué categoría van.
+
+Cada conjunto de ``ATTACHMENT_RULE_SETS`` (config.py) es una lista de
+reglas evaluadas en orden; gana la primera que se cumple. Una regla mira
+solo lo que se sabe de un adjunto antes de leer sus bytes:
+
+- ``nombre``: expresión regular del nombre de archivo (texto o ``re.Pattern``)
+- ``mime``: prefijos de tipo MIME admitidos (``application/xml``, ``text/``)
+- ``min_kb`` / ``max_mb``: tamaño declarado (sin ``max_mb`` no hay tope, como
+  antes de existir las reglas)
+- ``dominios``: dominios del remitente admitidos
+
+y envía lo que la cumple a ``categoria``, un subdirectorio de
+``xml_facturacion/`` ("" = la raíz, como siempre).
+
+Los patrones de nombre de todas las reglas se compilan en una única
+expresión regular con un grupo por regla. Un adjunto que no interesa a
+ninguna (PDF, imágenes, firmas de correo) se descarta con una sola
+búsqueda, sin importar cuántas reglas haya. El resto de condiciones solo
+se comprueban en las reglas cuyo nombre coincide: el tamaño se pide al
+origen (una llamada COM más) solo para esos adjuntos, y el tipo MIME solo
+si alguna de esas reglas lo usa.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import re
+
+from config import ATTACHMENT_RULE_SETS, ATTACHMENT_RULES_DEFAULT
+
+
+def categorias_conocidas():
+    """Categorías de todos los conjuntos de ``ATTACHMENT_RULE_SETS`` (subdirectorios que puede crear la extracción)."""
+    return frozenset(
+        definicion["categoria"]
+        for definiciones in ATTACHMENT_RULE_SETS.values()
+        for definicion in definiciones
+        if definicion.get("categoria")
+    )
+
+
+def _patron(nombre):
+    """Texto de un patrón con sus banderas de mayúsculas en línea, para combinarlo con otros."""
+    if isinstance(nombre, re.Pattern):
+        ignorar = bool(nombre.flags & re.IGNORECASE)
+        nombre = nombre.pattern
+    else:
+        ignorar = True  # Los nombres de adjunto llegan con cualquier combinación de mayúsculas
+    return f"(?i:{nombre})" if ignorar else f"(?:{nombre})"
+
+
+class ReglaAdjunto:
+    """Una regla: condiciones sobre un adjunto y la categoría a la que lo envía."""
+
+    __slots__ = ("indice", "nombre", "categoria", "mime", "min_bytes", "max_bytes", "dominios")
+
+    def __init__(self, indice, definicion):
+        self.indice = indice
+        self.nombre = re.compile(_patron(definicion["nombre"]))
+        self.categoria = definicion.get("categoria", "")
+        self.mime = tuple(m.lower() for m in definicion.get("mime", ()))
+        self.min_bytes = int(definicion.get("min_kb", 0) * 1024)
+        max_mb = definicion.get("max_mb")
+        self.max_bytes = None if max_mb is None else int(max_mb * 1024 * 1024)
+        self.dominios = tuple(d.lower().lstrip("@").strip() for d in definicion.get("dominios", ()))
+
+    def admite(self, tamano, mime, email_remitente):
+        """Comprobar las condiciones distintas del nombre (None = desconocido, no descarta)."""
+        if tamano is not None:
+            if tamano < self.min_bytes or (self.max_bytes is not None and tamano > self.max_bytes):
+                return False
+        if self.mime and mime and not str(mime).lower().startswith(self.mime):
+            return False
+        if self.dominios and email_remitente:
+            dominio = str(email_remitente).lower().rsplit("@", 1)[-1].strip(" >")
+            if dominio not in self.dominios:
+                return False
+        return True
+
+
+class ReglasAdjuntos:
+    """Conjunto de reglas compilado en un único comparador de nombres."""
+
+    def __init__(self, definiciones=None, nombre=None):
+        """
+        Compilar un conjunto de reglas.
+
+        Args:
+            definiciones (list): Reglas como diccionarios (ver el docstring del módulo)
+            nombre (str): Conjunto de ``ATTACHMENT_RULE_SETS`` si no se dan ``definiciones``
+        """
+        if definiciones is None:
+            nombre = nombre or ATTACHMENT_RULES_DEFAULT
+            if nombre not in ATTACHMENT_RULE_SETS:
+                raise ValueError(f"Conjunto de reglas desconocido: '{nombre}' "
+                                 f"(disponibles: {', '.join(ATTACHMENT_RULE_SETS)})")
+            definiciones = ATTACHMENT_RULE_SETS[nombre]
+        if not definiciones:
+            raise ValueError("El conjunto de reglas está vacío")
+        self.nombre = nombre or "personalizadas"
+        self.reglas = [ReglaAdjunto(i, definicion) for i, definicion in enumerate(definiciones)]
+        self._combinada = re.compile(
+            "|".join(f"(?P<r{regla.indice}>{regla.nombre.pattern})" for regla in self.reglas)
+        )
+        self.descartados = 0
+
+    @property
+    def usa_remitente(self):
+        """True si alguna regla mira el remitente (si no, no hace falta pedir su dirección)."""
+        return any(regla.dominios for regla in self.reglas)
+
+    @property
+    def categorias(self):
+        return sorted({regla.categoria for regla in self.reglas if regla.categoria})
+
+    def clasificar(self, nombre, tamano=None, mime=None, email_remitente=None):
+        """
+        Categoría de un adjunto, o None si ninguna regla lo admite.
+
+        Args:
+            nombre (str): Nombre del adjunto
+            tamano: Tamaño en bytes, o invocable que lo devuelve (solo se llama si hace falta)
+            mime: Tipo MIME, o invocable que lo devuelve
+            email_remitente (str): Dirección del remitente del correo
+
+        Returns:
+            str: Categoría ("" = raíz de xml_facturacion/) o None
+        """
+        if not nombre:
+            return None
+        coincidencia = self._combinada.match(nombre)
+        if coincidencia is None:
+            return None
+        # La alternancia prueba las reglas en orden: el grupo es la primera cuyo nombre coincide
+        primera = int(coincidencia.lastgroup[1:])
+        for regla in self.reglas[primera:]:
+            if regla.indice != primera and not regla.nombre.match(nombre):
+                continue
+            if regla.mime and callable(mime):
+                mime = mime()
+            if callable(tamano) and (regla.min_bytes or regla.max_bytes is not None):
+                tamano = tamano()
+            if regla.admite(None if callable(tamano) else tamano, mime if regla.mime else None, email_remitente):
+                return regla.categoria
+        self.descartados += 1
+        return None
+
+    def describir(self):
+        categorias = self.categorias
+        texto = f"'{self.nombre}' ({len(self.reglas)} reglas"
+        return texto + (f"; categorías: {', '.join(categorias)})" if categorias else ")")
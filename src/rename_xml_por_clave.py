@@ -14,15 +14,27 @@ Autor: Generado automáticamente
 Fecha: 2025-10-13
 """
 
+import io
 import os
-from pathlib import Path
+import shutil
+from pathlib import Path, PurePosixPath
 import xml.etree.ElementTree as ET
 import argparse
-import tkinter as tk
-from tkinter import filedialog
+
+from almacen_comprimido import abrir_xml, buscar_xml, sufijo_compresion
+from archivo_empaquetado import IndicePaquetes, buscar_indice
+from disposicion_salida import buscar_disposicion
+from indice_claves import ALCANCES, IndiceClaves
+from reglas_adjuntos import categorias_conocidas
+from limitador_io import agregar_argumentos_io, configurar_limites_desde_argumentos, limitar
+from plan_movimientos import PlanMovimientos, agregar_argumentos_plan, ejecutar_plan_desde_argumentos
 
 def seleccionar_carpeta(titulo):
     """Abrir diálogo para seleccionar carpeta."""
+    # tkinter solo se carga si hace falta el diálogo (no al usar --dir)
+    import tkinter as tk
+    from tkinter import filedialog
+    
     root = tk.Tk()
     root.withdraw()
     try:
@@ -39,31 +51,42 @@ def extraer_clave_xml(xml_path: Path) -> str:
     Extraer el valor del tag <Clave> de un archivo XML.
     
     Args:
-        xml_path: Ruta al archivo XML
+        xml_path: Ruta al archivo XML (.xml, .xml.gz o .xml.zst)
         
     Returns:
         Contenido del tag <Clave> o cadena vacía si no se encuentra
     """
     try:
-        tree = ET.parse(xml_path)
-        root = tree.getroot()
-        
-        # Buscar el tag Clave con o sin namespace
-        clave = root.find('.//{*}Clave')
-        if clave is not None and clave.text:
-            return clave.text.strip()
+        with abrir_xml(xml_path) as f:
+            return extraer_clave_de_fuente(f, xml_path.name)
+    except Exception as e:
+        print(f"Error leyendo {xml_path.name}: {e}", flush=True)
+        return ""
+
+def extraer_clave_de_fuente(fuente, nombre: str) -> str:
+    """
+    Extraer el valor del tag <Clave> de una ruta o de un objeto archivo.
+    
+    Args:
+        fuente: Ruta o objeto archivo (p. ej. io.BytesIO con un documento empaquetado)
+        nombre: Nombre a mostrar en los mensajes de error
         
-        # Intentar sin namespace
-        clave = root.find('.//Clave')
-        if clave is not None and clave.text:
-            return clave.text.strip()
+    Returns:
+        Contenido del tag <Clave> o cadena vacía si no se encuentra
+    """
+    try:
+        # La Clave está al inicio del documento: se deja de leer (y descomprimir) al encontrarla
+        for _event, elem in ET.iterparse(fuente, events=("end",)):
+            tag = elem.tag.split("}", 1)[1] if "}" in elem.tag else elem.tag
+            if tag == "Clave" and elem.text and elem.text.strip():
+                return elem.text.strip()
             
         return ""
     except ET.ParseError as e:
-        print(f"Error parseando XML {xml_path.name}: {e}", flush=True)
+        print(f"Error parseando XML {nombre}: {e}", flush=True)
         return ""
     except Exception as e:
-        print(f"Error leyendo {xml_path.name}: {e}", flush=True)
+        print(f"Error leyendo {nombre}: {e}", flush=True)
         return ""
 
 def sanitizar_nombre_archivo(nombre: str) -> str:
@@ -82,7 +105,198 @@ def sanitizar_nombre_archivo(nombre: str) -> str:
         nombre = nombre.replace(char, '_')
     return nombre.strip()
 
-def renombrar_xml_por_clave(input_dir: str, dry_run: bool = False):
+def en_ubicacion_especial(partes) -> bool:
+    """Copias/ y HaciendaResponse/ guardan duplicados y respuestas: no compiten con los originales."""
+    return any(p.lower() in ("copias", "haciendaresponse") for p in partes)
+
+def prefijo_categoria(partes) -> tuple:
+    """Primer segmento si es una categoría de las reglas de adjuntos (FE/, otros/...); la cubeta cuelga de él."""
+    return tuple(partes[:1]) if partes and partes[0] in categorias_conocidas() else ()
+
+def directorio_destino(xml_file: Path, clave: str, raiz: Path, disposicion) -> Path:
+    """
+    Directorio donde debe quedar el XML renombrado.
+    
+    Si la salida usa una disposición basada en la Clave (emisor/hash), el XML
+    se ubica en su cubeta canónica (p. ej. los que quedaron en sin_clave/ al
+    extraer), dentro de su categoría si la tiene; en cualquier otro caso se
+    queda en su carpeta actual.
+    """
+    if disposicion is None or not disposicion.depende_de_clave:
+        return xml_file.parent
+    try:
+        relativa = xml_file.resolve().parent.relative_to(raiz)
+    except ValueError:
+        return xml_file.parent
+    if en_ubicacion_especial(relativa.parts):
+        return xml_file.parent
+    canonico = disposicion.subdirectorio(raiz.joinpath(*prefijo_categoria(relativa.parts)), clave=clave)
+    return xml_file.parent if canonico == xml_file.resolve().parent else canonico
+
+def abrir_indice_claves(ruta_indice, alcance):
+    """
+    Abrir el índice de Claves guardado por una ejecución anterior.
+    
+    Returns:
+        IndiceClaves proyectado de solo lectura, o None si no se indicó o aún no existe
+    """
+    if not ruta_indice or not Path(ruta_indice).exists():
+        return None
+    previo = IndiceClaves.abrir(ruta_indice)
+    if previo.alcance != alcance:
+        previo.cerrar()
+        raise ValueError(f"El índice {ruta_indice} es de alcance '{previo.alcance}'; use --duplicates {previo.alcance}")
+    print(f"🗃️  Índice de Claves previo: {previo.describir()}")
+    return previo
+
+def guardar_indice_claves(claves, previo, ruta_indice, dry_run):
+    """Unir las Claves de esta ejecución con las del índice previo y guardarlo."""
+    if previo is not None:
+        claves.fusionar(previo)
+        previo.cerrar()
+    if ruta_indice and not dry_run:
+        claves.guardar(ruta_indice)
+        print(f"🗃️  Índice de Claves guardado en {ruta_indice}")
+
+def clave_registrada(claves, previo, clave, grupo):
+    """Indicar si la Clave ya tiene original en esta ejecución o en el índice previo."""
+    return claves.contiene(clave, grupo) or (previo is not None and previo.contiene(clave, grupo))
+
+def mover_a_copias(xml_file: Path, destino_dir: Path, base_nombre: str, extension: str, dry_run: bool,
+                   plan=None) -> bool:
+    """
+    Mover un duplicado a Copias/ del directorio destino con su Clave como nombre.
+    
+    Returns:
+        True si se movió (False en modo prueba o si solo se anotó en el plan)
+    """
+    carpeta_copias = destino_dir / "Copias"
+    ocupado = plan.ocupado if plan is not None else Path.exists
+    
+    if not dry_run:
+        carpeta_copias.mkdir(parents=True, exist_ok=True)
+    
+    ruta_copia = carpeta_copias / f"{base_nombre}{extension}"
+    
+    # Si ya existe en Copias, agregar sufijo
+    contador = 1
+    while ocupado(ruta_copia):
+        ruta_copia = carpeta_copias / f"{base_nombre}_copia_{contador:03d}{extension}"
+        contador += 1
+    
+    if plan is not None:
+        plan.agregar(xml_file, ruta_copia, "duplicado")
+        print(f"   📝 Al plan: Copias/{ruta_copia.name}", flush=True)
+        return False
+    if dry_run:
+        print(f"   📦 Movería a: Copias/{ruta_copia.name}", flush=True)
+        return False
+    limitar()
+    shutil.move(str(xml_file), str(ruta_copia))
+    print(f"   📦 Movido a: Copias/{ruta_copia.name}", flush=True)
+    return True
+
+def renombrar_paquetes(raiz_paquetes: Path, dry_run: bool = False, alcance: str = "carpeta", ruta_indice=None):
+    """
+    Renombrar por <Clave> documentos guardados en paquetes, reescribiendo solo el índice.
+    
+    Args:
+        raiz_paquetes: Directorio con indice_paquetes.jsonl
+        dry_run: Si es True, solo muestra lo que haría sin reescribir el índice
+        alcance: 'carpeta' (duplicados dentro de cada carpeta) o 'global' (en todo el árbol)
+        ruta_indice: Índice de Claves que se carga al inicio y se actualiza al final
+    """
+    raiz_disposicion, disposicion = buscar_disposicion(raiz_paquetes)
+    por_clave = disposicion is not None and disposicion.depende_de_clave
+    
+    indice = IndicePaquetes(raiz_paquetes)
+    print(f"📦 Salida empaquetada: {len(indice)} documentos en {raiz_paquetes}")
+    if dry_run:
+        print("⚠️  MODO PRUEBA - No se modificará el índice")
+    print()
+    
+    renombrados = 0
+    sin_clave = 0
+    movidos_a_copias = 0
+    claves = IndiceClaves(alcance)
+    previo = abrir_indice_claves(ruta_indice, alcance)
+    # En alcance global, Copias/ y HaciendaResponse/ siguen comparándose solo dentro de su carpeta
+    claves_especiales = claves if alcance == "carpeta" else IndiceClaves("carpeta")
+    
+    try:
+        for entrada in indice:
+            nombre = PurePosixPath(entrada["nombre"])
+            try:
+                datos = indice.leer(entrada)
+            except Exception as e:
+                print(f"❌ Error leyendo {nombre} ({entrada['paquete']}): {e}", flush=True)
+                continue
+            
+            clave = extraer_clave_de_fuente(io.BytesIO(datos), nombre.name)
+            if not clave:
+                sin_clave += 1
+                print(f"⚠️  Sin clave: {nombre}", flush=True)
+                continue
+            
+            nuevo_nombre = sanitizar_nombre_archivo(clave) + ".xml"
+            destino_dir = nombre.parent
+            ubicacion_especial = en_ubicacion_especial(nombre.parts)
+            if por_clave and not ubicacion_especial:
+                destino_dir = PurePosixPath(*prefijo_categoria(nombre.parent.parts), *disposicion.partes(clave=clave))
+            grupo = str(destino_dir).lower()
+            nueva_ruta = destino_dir / nuevo_nombre
+            if ubicacion_especial:
+                indice_claves, indice_previo = claves_especiales, previo if alcance == "carpeta" else None
+            else:
+                indice_claves, indice_previo = claves, previo
+            
+            if nombre == nueva_ruta:
+                # Ya nombrado: es el original salvo que la Clave ya apareciera en otra carpeta
+                if indice_claves.agregar(clave, grupo) or indice_claves.alcance == "carpeta":
+                    continue
+                duplicado = True
+            else:
+                duplicado = clave_registrada(indice_claves, indice_previo, clave, grupo) or indice.existe(str(nueva_ruta))
+            
+            if duplicado:
+                destino = destino_dir / "Copias" / nuevo_nombre
+                contador = 1
+                while indice.existe(str(destino)):
+                    destino = destino_dir / "Copias" / f"{Path(nuevo_nombre).stem}_copia_{contador:03d}.xml"
+                    contador += 1
+                destino = str(destino)
+                print(f"🔄 Duplicado detectado: {nombre} -> {destino}", flush=True)
+                movidos_a_copias += 1
+            else:
+                destino = str(nueva_ruta)
+                indice_claves.agregar(clave, grupo)
+                renombrados += 1
+                print(f"{'🔄' if dry_run else '✅'} {nombre} -> {destino}", flush=True)
+            
+            if not dry_run:
+                indice.renombrar(entrada, destino)
+        
+        if not dry_run:
+            indice.guardar()
+        guardar_indice_claves(claves, previo, ruta_indice, dry_run)
+    finally:
+        indice.cerrar()
+        if previo is not None:
+            previo.cerrar()
+    
+    print()
+    print("=" * 60)
+    print("📊 RESUMEN")
+    print("=" * 60)
+    print(f"Documentos procesados: {len(indice)}")
+    print(f"Renombrados: {renombrados}")
+    print(f"Duplicados movidos a Copias/: {movidos_a_copias}")
+    print(f"Sin tag <Clave>: {sin_clave}")
+    print(f"Índice de Claves: {claves.describir()}")
+    print("=" * 60)
+
+def renombrar_xml_por_clave(input_dir: str, dry_run: bool = False, alcance: str = "carpeta", ruta_indice=None,
+                            ruta_plan=None):
     """
     Renombrar todos los archivos XML en el directorio según su tag <Clave>.
     Los duplicados se mueven a una carpeta 'Copias' dentro de cada subdirectorio.
@@ -90,6 +304,12 @@ def renombrar_xml_por_clave(input_dir: str, dry_run: bool = False):
     Args:
         input_dir: Directorio con los archivos XML
         dry_run: Si es True, solo muestra lo que haría sin renombrar
+        alcance: 'carpeta' (duplicado = misma Clave en el mismo directorio) o
+            'global' (misma Clave en cualquier parte del árbol)
+        ruta_indice: Índice de Claves de ejecuciones anteriores; se carga al inicio
+            (las Claves que contiene cuentan como ya vistas) y se actualiza al final
+        ruta_plan: Si se indica, no se mueve nada: los movimientos se escriben en este
+            plan para revisarlos y aplicarlos después con --apply
     """
     base_dir = Path(input_dir)
     
@@ -97,15 +317,34 @@ def renombrar_xml_por_clave(input_dir: str, dry_run: bool = False):
         print(f"❌ El directorio {input_dir} no existe.")
         return
     
+    # Salida empaquetada: se renombra dentro del índice, sin tocar los paquetes
+    raiz_paquetes = buscar_indice(base_dir)
+    if raiz_paquetes is not None:
+        if ruta_plan:
+            print("❌ La salida empaquetada se renombra solo en su índice; --plan no aplica (use --dry-run).")
+            return
+        renombrar_paquetes(raiz_paquetes, dry_run, alcance, ruta_indice)
+        return
+    
     # Buscar todos los archivos XML recursivamente
-    xml_files = list(base_dir.rglob("*.xml")) + list(base_dir.rglob("*.XML"))
+    xml_files = list(buscar_xml(base_dir))
     
     if not xml_files:
         print("❌ No se encontraron archivos XML en el directorio.")
         return
     
     print(f"📁 Procesando {len(xml_files)} archivos XML...")
-    if dry_run:
+    raiz_disposicion, disposicion = buscar_disposicion(base_dir)
+    if disposicion is not None and disposicion.depende_de_clave:
+        print(f"🗂️  Disposición por Clave detectada ({disposicion.describir()}): se reubicarán los XML en su cubeta")
+    if alcance == "global":
+        print("🌐 Duplicados globales: una Clave repetida en cualquier carpeta va a Copias/")
+    plan = None
+    if ruta_plan:
+        plan = PlanMovimientos(ruta_plan, "renombrar", base_dir)
+        dry_run = True
+        print(f"📝 MODO PLAN - Los movimientos se escribirán en {ruta_plan}")
+    elif dry_run:
         print("⚠️  MODO PRUEBA - No se renombrará ni moverá ningún archivo")
     print()
     
@@ -115,8 +354,11 @@ def renombrar_xml_por_clave(input_dir: str, dry_run: bool = False):
     duplicados = 0
     movidos_a_copias = 0
     
-    # Diccionario para rastrear archivos ya procesados por clave
-    archivos_por_clave = {}
+    # Claves ya procesadas (por directorio destino o globales), en formato compacto
+    claves = IndiceClaves(alcance)
+    previo = abrir_indice_claves(ruta_indice, alcance)
+    # En alcance global, Copias/ y HaciendaResponse/ siguen comparándose solo dentro de su carpeta
+    claves_especiales = claves if alcance == "carpeta" else IndiceClaves("carpeta")
     
     for xml_file in xml_files:
         try:
@@ -129,102 +371,81 @@ def renombrar_xml_por_clave(input_dir: str, dry_run: bool = False):
                 continue            
             
             # Sanitizar el nombre
-            nuevo_nombre = sanitizar_nombre_archivo(clave)
+            base_nombre = sanitizar_nombre_archivo(clave)
+            if base_nombre.lower().endswith('.xml'):
+                base_nombre = base_nombre[:-4]
             
-            # Agregar extensión .xml (en minúsculas)
-            if not nuevo_nombre.lower().endswith('.xml'):
-                nuevo_nombre += '.xml'
+            # Agregar extensión .xml (en minúsculas), conservando la compresión (.xml.gz / .xml.zst)
+            extension = '.xml' + sufijo_compresion(xml_file.name)
+            nuevo_nombre = base_nombre + extension
             
-            # Si el nombre ya es correcto, omitir
-            if xml_file.name.lower() == nuevo_nombre.lower():
-                print(f"✓ Ya tiene nombre correcto: {xml_file.name}", flush=True)
-                # Registrar este archivo como el original
-                clave_dir = (xml_file.parent, clave)
-                if clave_dir not in archivos_por_clave:
-                    archivos_por_clave[clave_dir] = xml_file
+            destino_dir = directorio_destino(xml_file, clave, raiz_disposicion, disposicion)
+            grupo = str(destino_dir)
+            if en_ubicacion_especial(xml_file.parent.relative_to(base_dir).parts):
+                indice_claves, indice_previo = claves_especiales, previo if alcance == "carpeta" else None
+            else:
+                indice_claves, indice_previo = claves, previo
+            
+            # Si el nombre (y la ubicación) ya es correcto, omitir
+            if xml_file.name.lower() == nuevo_nombre.lower() and destino_dir == xml_file.parent:
+                # Registrar este archivo como el original (en alcance global, si no apareció ya en otra carpeta)
+                if indice_claves.agregar(clave, grupo) or indice_claves.alcance == "carpeta":
+                    print(f"✓ Ya tiene nombre correcto: {xml_file.name}", flush=True)
+                    continue
+                duplicados += 1
+                print(f"🔄 Duplicado detectado: {xml_file.name} (la Clave ya está en otra carpeta)", flush=True)
+                if mover_a_copias(xml_file, destino_dir, base_nombre, extension, dry_run, plan):
+                    movidos_a_copias += 1
                 continue
             
             # Construir la nueva ruta
-            nueva_ruta = xml_file.parent / nuevo_nombre
-            clave_dir = (xml_file.parent, clave)
+            nueva_ruta = destino_dir / nuevo_nombre
             
             # Verificar si ya existe un archivo con ese nombre en la misma carpeta
-            if nueva_ruta.exists() and nueva_ruta != xml_file:
+            if (plan.ocupado(nueva_ruta) if plan else nueva_ruta.exists()) and nueva_ruta != xml_file:
                 duplicados += 1
                 print(f"🔄 Duplicado detectado: {xml_file.name} -> {nuevo_nombre}", flush=True)
-                
-                # Crear carpeta Copias en el directorio actual
-                carpeta_copias = xml_file.parent / "Copias"
-                
-                if not dry_run:
-                    carpeta_copias.mkdir(exist_ok=True)
-                
-                # Mover el archivo duplicado a Copias con su clave como nombre
-                ruta_copia = carpeta_copias / nuevo_nombre
-                
-                # Si ya existe en Copias, agregar sufijo
-                contador = 1
-                while ruta_copia.exists():
-                    base_nombre = nuevo_nombre.rsplit('.', 1)[0]
-                    ruta_copia = carpeta_copias / f"{base_nombre}_copia_{contador:03d}.xml"
-                    contador += 1
-                
-                if dry_run:
-                    print(f"   📦 Movería a: Copias/{ruta_copia.name}", flush=True)
-                else:
-                    import shutil
-                    shutil.move(str(xml_file), str(ruta_copia))
+                if mover_a_copias(xml_file, destino_dir, base_nombre, extension, dry_run, plan):
                     movidos_a_copias += 1
-                    print(f"   📦 Movido a: Copias/{ruta_copia.name}", flush=True)
-                
                 continue
             
-            # Verificar si ya procesamos un archivo con esta clave en este directorio
-            if clave_dir in archivos_por_clave:
+            # Verificar si ya procesamos un archivo con esta clave (en este directorio o, en alcance global, en cualquiera)
+            if clave_registrada(indice_claves, indice_previo, clave, grupo):
                 duplicados += 1
-                print(f"🔄 Duplicado detectado: {xml_file.name} (ya existe {archivos_por_clave[clave_dir].name})", flush=True)
-                
-                # Crear carpeta Copias
-                carpeta_copias = xml_file.parent / "Copias"
-                
-                if not dry_run:
-                    carpeta_copias.mkdir(exist_ok=True)
-                
-                # Mover el duplicado a Copias con nombre basado en clave
-                ruta_copia = carpeta_copias / nuevo_nombre
-                
-                # Si ya existe en Copias, agregar sufijo
-                contador = 1
-                while ruta_copia.exists():
-                    base_nombre = nuevo_nombre.rsplit('.', 1)[0]
-                    ruta_copia = carpeta_copias / f"{base_nombre}_copia_{contador:03d}.xml"
-                    contador += 1
-                
-                if dry_run:
-                    print(f"   📦 Movería a: Copias/{ruta_copia.name}", flush=True)
-                else:
-                    import shutil
-                    shutil.move(str(xml_file), str(ruta_copia))
+                print(f"🔄 Duplicado detectado: {xml_file.name} (la Clave ya está registrada)", flush=True)
+                if mover_a_copias(xml_file, destino_dir, base_nombre, extension, dry_run, plan):
                     movidos_a_copias += 1
-                    print(f"   📦 Movido a: Copias/{ruta_copia.name}", flush=True)
-                
                 continue
             
             # Renombrar el archivo (primer archivo con esta clave)
-            if dry_run:
+            if plan is not None:
+                plan.agregar(xml_file, nueva_ruta, "renombrar" if destino_dir == xml_file.parent else "reubicar")
+                print(f"📝 {xml_file.name} -> {nuevo_nombre}", flush=True)
+            elif dry_run:
                 print(f"🔄 {xml_file.name} -> {nuevo_nombre}", flush=True)
             else:
+                if destino_dir != xml_file.parent:
+                    destino_dir.mkdir(parents=True, exist_ok=True)
+                limitar()
                 xml_file.rename(nueva_ruta)
                 renombrados += 1
                 print(f"✅ {xml_file.name} -> {nuevo_nombre}", flush=True)
             
             # Registrar este archivo como el original para esta clave
-            archivos_por_clave[clave_dir] = nueva_ruta
+            indice_claves.agregar(clave, grupo)
         
         except Exception as e:
             errores += 1
             print(f"❌ Error con {xml_file.name}: {e}", flush=True)
     
+    try:
+        guardar_indice_claves(claves, previo, ruta_indice, dry_run)
+    finally:
+        if previo is not None:
+            previo.cerrar()
+        if plan is not None:
+            plan.cerrar()
+    
     # Resumen final
     print()
     print("=" * 60)
@@ -235,6 +456,9 @@ def renombrar_xml_por_clave(input_dir: str, dry_run: bool = False):
     print(f"Duplicados movidos a Copias/: {movidos_a_copias}")
     print(f"Sin tag <Clave>: {sin_clave}")
     print(f"Errores: {errores}")
+    print(f"Índice de Claves: {claves.describir()}")
+    if plan is not None:
+        print(f"Movimientos en el plan: {len(plan)} ({ruta_plan}; aplíquelo con --apply)")
     print("=" * 60)
 
 def main():
@@ -247,6 +471,9 @@ Ejemplos de uso:
   python rename_xml_por_clave.py                    # Usar GUI para seleccionar carpeta
   python rename_xml_por_clave.py --dir "C:\\XMLs"   # Especificar directorio
   python rename_xml_por_clave.py --dir "C:\\XMLs" --dry-run  # Modo prueba
+  python rename_xml_por_clave.py --dir "C:\\XMLs" --duplicates global --key-index claves.idx
+  python rename_xml_por_clave.py --dir "C:\\XMLs" --plan cambios.jsonl   # Revisar y luego:
+  python rename_xml_por_clave.py --apply cambios.jsonl              # (--rollback para deshacer)
   
 El script busca recursivamente en todas las subcarpetas y renombra
 cada archivo XML usando el contenido del tag <Clave>.
@@ -266,13 +493,36 @@ cada archivo XML usando el contenido del tag <Clave>.
         help='Modo prueba: muestra qué haría sin renombrar archivos'
     )
     
+    parser.add_argument(
+        '--duplicates',
+        dest='alcance',
+        choices=ALCANCES,
+        default='carpeta',
+        help='Detectar duplicados dentro de cada carpeta (por defecto) o en todo el árbol (global)'
+    )
+    
+    parser.add_argument(
+        '--key-index',
+        dest='ruta_indice',
+        default=None,
+        help='Índice de Claves (.idx) que se carga al inicio y se actualiza al terminar'
+    )
+    
+    agregar_argumentos_plan(parser)
+    agregar_argumentos_io(parser)
+    
     args = parser.parse_args()
+    configurar_limites_desde_argumentos(args, parser)
     
     try:
         print("🏷️  RENOMBRADOR DE XML POR CLAVE")
         print("=" * 60)
         print()
         
+        # Aplicar o deshacer un plan no necesita leer ningún XML
+        if ejecutar_plan_desde_argumentos(args):
+            return
+        
         # Seleccionar directorio
         input_dir = args.input_dir
         if not input_dir:
@@ -285,7 +535,8 @@ cada archivo XML usando el contenido del tag <Clave>.
         print()
         
         # Procesar archivos
-        renombrar_xml_por_clave(input_dir, dry_run=args.dry_run)
+        renombrar_xml_por_clave(input_dir, dry_run=args.dry_run, alcance=args.alcance, ruta_indice=args.ruta_indice,
+                                ruta_plan=args.plan)
         
         print()
         print("✅ Proceso completado.")
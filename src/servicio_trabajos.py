@@ -0,0 +1,623 @@
+#!/usr/bin/env python3
+"""
+Servicio HTTP local para lanzar extracciones y consultar su progreso.
+
+Otros sistemas envían trabajos de extracción (PST, salida y filtros) como
+JSON; el servicio los encola en un pool acotado de hilos trabajadores y
+expone el progreso, la duración de cada etapa y el resultado, también en
+JSON. Todos los llamadores comparten un único proceso ya iniciado: las
+importaciones, la conexión con Outlook y los PST abiertos en el perfil se
+reutilizan entre trabajos en lugar de pagarse en cada ejecución.
+
+Rutas:
+
+- ``POST /trabajos``: encolar una extracción (202; 503 si la cola está llena)
+- ``GET /trabajos``: listar los trabajos en cola, en curso y recientes
+- ``GET /trabajos/<id>``: estado, progreso, etapas y resultado de un trabajo
+- ``DELETE /trabajos/<id>``: cancelar un trabajo que sigue en cola
+- ``GET /estado``: ocupación del servicio
+- ``GET /io`` / ``PUT /io``: consultar o cambiar en caliente los límites de E/S
+  compartidos por todos los trabajos (``{"mb_s": 20, "ops_s": 200}``; 0 = sin límite)
+
+Cuerpo de ``POST /trabajos`` (solo ``pst`` y ``salida`` son obligatorios)::
+
+    {"pst": "C:/correo/2025.pst", "salida": "C:/facturas/2025",
+     "filtros": {"desde": "2025-01-01", "hasta": "2025-03-31",
+                 "excluir_carpetas": ["*/Borradores"], "omitir_carpetas_sistema": true,
+                 "dominios_remitente": ["proveedor.com"]},
+     "disposicion": {"esquema": "fecha", "niveles_hash": 0},
+     "modo_salida": "archivos", "compresion": "zstd",
+     "validar": true, "verificar_firmas": false,
+     "lector": "auto", "orden_lectura": "desplazamiento", "reglas": "todos"}
+
+Por defecto solo escucha en 127.0.0.1; con ``--token`` exige la cabecera
+``Authorization: Bearer <token>``. Sin token, una página web abierta en el
+mismo equipo no debe poder encolar trabajos: los cuerpos deben declararse
+``Content-Type: application/json`` (un formulario o una petición "simple"
+no puede hacerlo sin la comprobación CORS previa, que el servicio no
+contesta) y la cabecera ``Host`` debe ser local (contra DNS rebinding).
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import argparse
+import hmac
+import itertools
+import json
+import queue
+import signal
+import sys
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from almacen_comprimido import FORMATOS_COMPRESION, ZSTD_AVAILABLE, validar_nivel_compresion
+from config import (
+    API_HISTORY_SIZE,
+    API_HOST,
+    API_MAX_BODY_KB,
+    API_PORT,
+    API_QUEUE_SIZE,
+    API_WORKERS,
+    PACK_SHARD_SIZE_MB,
+    PIPELINE_QUEUE_SIZE,
+    PIPELINE_WRITER_THREADS,
+    PST_CACHE_MB,
+    VALIDATION_WORKERS,
+)
+from disposicion_salida import DisposicionSalida
+from extractor_xml_pst_gui import WIN32COM_AVAILABLE, ExtractorXMLPSTGUI
+from filtros_extraccion import CARPETAS_SISTEMA, FiltroExtraccion, parsear_fecha
+from limitador_io import LIMITADOR, agregar_argumentos_io, configurar_limites_desde_argumentos
+from reglas_adjuntos import ReglasAdjuntos
+
+try:
+    import pythoncom
+    PYTHONCOM_AVAILABLE = True
+except ImportError:
+    PYTHONCOM_AVAILABLE = False
+
+# Estados de un trabajo
+EN_COLA = "en_cola"
+EJECUTANDO = "ejecutando"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+CANCELADO = "cancelado"
+
+MODOS_SALIDA = ("archivos", "zip", "tar")
+
+# Valores de la cabecera Host (sin puerto) aceptados cuando no hay --token
+HOSTS_LOCALES = ("127.0.0.1", "localhost", "[::1]")
+
+
+class ColaLlena(Exception):
+    """No caben más trabajos en espera."""
+
+
+class TipoNoAdmitido(ValueError):
+    """El cuerpo de la petición no se declaró como application/json."""
+
+
+class ConflictoTrabajo(Exception):
+    """El trabajo choca con otro (misma salida) o ya no admite la operación."""
+
+
+def _lista(valor, campo):
+    if valor is None:
+        return []
+    if isinstance(valor, str):
+        return [valor]
+    if not isinstance(valor, list) or not all(isinstance(v, str) for v in valor):
+        raise ValueError(f"'{campo}' debe ser una lista de textos")
+    return valor
+
+
+def filtro_desde_json(datos):
+    """Construir un FiltroExtraccion a partir del objeto 'filtros' de la petición."""
+    datos = datos or {}
+    if not isinstance(datos, dict):
+        raise ValueError("'filtros' debe ser un objeto")
+    excluir = _lista(datos.get("excluir_carpetas"), "excluir_carpetas")
+    if datos.get("omitir_carpetas_sistema"):
+        excluir = excluir + CARPETAS_SISTEMA
+    return FiltroExtraccion(
+        incluir_carpetas=_lista(datos.get("incluir_carpetas"), "incluir_carpetas"),
+        excluir_carpetas=excluir,
+        desde=parsear_fecha(datos.get("desde")),
+        hasta=parsear_fecha(datos.get("hasta"), fin_de_dia=True),
+        dominios_remitente=_lista(datos.get("dominios_remitente"), "dominios_remitente"),
+        clases_mensaje=_lista(datos.get("clases_mensaje"), "clases_mensaje"),
+    )
+
+
+def crear_extractor(parametros):
+    """
+    Validar los parámetros de un trabajo y crear su extractor (sin GUI).
+
+    Raises:
+        ValueError: Si falta un campo obligatorio o algún valor no es válido
+    """
+    if not isinstance(parametros, dict):
+        raise ValueError("El cuerpo debe ser un objeto JSON")
+    for campo in ("pst", "salida"):
+        if not isinstance(parametros.get(campo), str) or not parametros[campo].strip():
+            raise ValueError(f"Falta el campo obligatorio '{campo}'")
+
+    modo_salida = parametros.get("modo_salida", "archivos")
+    if modo_salida not in MODOS_SALIDA:
+        raise ValueError(f"modo_salida desconocido '{modo_salida}' (use {', '.join(MODOS_SALIDA)})")
+    compresion = parametros.get("compresion", "ninguna")
+    if compresion not in FORMATOS_COMPRESION:
+        raise ValueError(f"Compresión desconocida '{compresion}' (use {', '.join(FORMATOS_COMPRESION)})")
+    if compresion != "ninguna" and modo_salida != "archivos":
+        raise ValueError("La compresión solo aplica con modo_salida 'archivos' (los paquetes ya se comprimen)")
+    if compresion == "zstd" and not ZSTD_AVAILABLE:
+        raise ValueError("La compresión zstd requiere el paquete 'zstandard' en el servidor")
+    nivel_compresion = validar_nivel_compresion(compresion, parametros.get("nivel_compresion"))
+
+    disposicion = parametros.get("disposicion") or {}
+    if not isinstance(disposicion, dict):
+        raise ValueError("'disposicion' debe ser un objeto")
+
+    try:
+        return ExtractorXMLPSTGUI(
+            parametros["pst"], parametros["salida"],
+            filtro=filtro_desde_json(parametros.get("filtros")),
+            hilos_escritura=int(parametros.get("hilos_escritura", PIPELINE_WRITER_THREADS)),
+            tamano_cola=int(parametros.get("tamano_cola", PIPELINE_QUEUE_SIZE)),
+            disposicion=DisposicionSalida(disposicion.get("esquema", "carpeta"),
+                                          disposicion.get("niveles_hash", 0)),
+            modo_salida=modo_salida,
+            tamano_paquete_mb=int(parametros.get("tamano_paquete_mb", PACK_SHARD_SIZE_MB)),
+            compresion=compresion,
+            nivel_compresion=nivel_compresion,
+            validar=bool(parametros.get("validar", False)),
+            procesos_validacion=int(parametros.get("procesos_validacion", VALIDATION_WORKERS)),
+            verificar_firmas=bool(parametros.get("verificar_firmas", False)),
+            interactivo=False,
+            lector=parametros.get("lector", "auto"),
+            orden_lectura=parametros.get("orden_lectura", "desplazamiento"),
+            cache_pst_mb=int(parametros.get("cache_pst_mb", PST_CACHE_MB)),
+            reglas=ReglasAdjuntos(nombre=parametros.get("reglas")),
+        )
+    except (TypeError, ValueError) as e:
+        raise ValueError(str(e))
+
+
+class Trabajo:
+    """Una extracción enviada al servicio."""
+
+    def __init__(self, id_trabajo, parametros, extractor):
+        self.id = id_trabajo
+        self.parametros = parametros
+        self.extractor = extractor
+        self.estado = EN_COLA
+        self.error = None
+        self.creado = datetime.now()
+        self.inicio = None
+        self.fin = None
+
+    @property
+    def activo(self):
+        return self.estado in (EN_COLA, EJECUTANDO)
+
+    def _segundos(self):
+        if self.inicio is None:
+            return 0.0
+        return round(((self.fin or datetime.now()) - self.inicio).total_seconds(), 3)
+
+    def resumen(self):
+        """Datos básicos para el listado."""
+        extractor = self.extractor
+        return {
+            "id": self.id,
+            "estado": self.estado,
+            "pst": str(extractor.pst_file),
+            "salida": str(extractor.output_dir),
+            "creado": self.creado.isoformat(timespec="seconds"),
+            "segundos": self._segundos(),
+            "emails_procesados": extractor.processed_emails,
+            "xml_extraidos": extractor.extracted_xml_files,
+        }
+
+    def detalle(self):
+        """Estado completo: progreso, duración por etapa y resultado."""
+        extractor = self.extractor
+        datos = self.resumen()
+        datos.update({
+            "inicio": self.inicio.isoformat(timespec="seconds") if self.inicio else None,
+            "fin": self.fin.isoformat(timespec="seconds") if self.fin else None,
+            "error": self.error,
+            "parametros": self.parametros,
+            "filtros": extractor.filtro.describir(),
+            "progreso": {
+                "mensaje": extractor.estado,
+                "etapa": extractor.etapa_actual,
+                "emails_procesados": extractor.processed_emails,
+                "xml_extraidos": extractor.extracted_xml_files,
+                "carpetas_omitidas": extractor.carpetas_omitidas,
+                "pendientes_escritura": extractor.escritor.pendientes if extractor.escritor else 0,
+                "errores": len(extractor.errors),
+                "reintentos_com": extractor.politica_reintentos.reintentos,
+            },
+            "etapas": {nombre: round(segundos, 3) for nombre, segundos in extractor.duracion_etapas.items()},
+        })
+        if self.estado in (COMPLETADO, FALLIDO):
+            datos["resultado"] = self._resultado()
+        return datos
+
+    def _resultado(self):
+        extractor = self.extractor
+        reportes = extractor.output_dir / "reportes"
+        resultado = {
+            "xml_facturacion": str(extractor.output_dir / "xml_facturacion"),
+            "reporte": str(reportes / "reporte_extraccion.txt"),
+            "log_csv": str(extractor.log_file),
+            "errores_jsonl": str(reportes / "errores.jsonl"),
+            "errores_por_categoria": dict(extractor.errors.por_categoria),
+        }
+        if extractor.resumen_validacion:
+            resultado["validacion_xsd"] = {
+                "total": extractor.resumen_validacion.total,
+                "por_estado": dict(extractor.resumen_validacion.por_estado),
+                "detalle": str(extractor.resumen_validacion.ruta_resultados),
+            }
+        if extractor.resumen_firmas:
+            resultado["firmas"] = {
+                "total": extractor.resumen_firmas.total,
+                "por_estado": dict(extractor.resumen_firmas.por_estado),
+                "detalle": str(extractor.resumen_firmas.ruta_resultados),
+            }
+        return resultado
+
+
+class ServicioTrabajos:
+    """Cola acotada de extracciones atendida por un pool fijo de hilos."""
+
+    def __init__(self, trabajadores=API_WORKERS, tamano_cola=API_QUEUE_SIZE, historial=API_HISTORY_SIZE):
+        """
+        Inicializar el servicio.
+
+        Args:
+            trabajadores (int): Extracciones que se ejecutan a la vez
+            tamano_cola (int): Trabajos en espera como máximo
+            historial (int): Trabajos terminados que se conservan para consulta
+        """
+        self.num_trabajadores = max(1, int(trabajadores))
+        # La cola no tiene maxsize para que detener() nunca se bloquee; el límite se aplica en enviar()
+        self.cola = queue.Queue()
+        self.capacidad = max(1, int(tamano_cola))
+        self.historial = max(1, int(historial))
+        self.trabajos = OrderedDict()
+        self.hilos = []
+        self.iniciado = datetime.now()
+        self._contador = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def iniciar(self):
+        for i in range(self.num_trabajadores):
+            hilo = threading.Thread(target=self._trabajar, name=f"trabajador-{i + 1}", daemon=True)
+            hilo.start()
+            self.hilos.append(hilo)
+
+    def detener(self):
+        """Cancelar los trabajos en espera; los hilos terminan tras el trabajo en curso."""
+        with self._lock:
+            for trabajo in self.trabajos.values():
+                if trabajo.estado == EN_COLA:
+                    trabajo.estado = CANCELADO
+                    trabajo.fin = datetime.now()
+        for _ in self.hilos:
+            self.cola.put(None)
+
+    def enviar(self, parametros):
+        """
+        Encolar una extracción.
+
+        Raises:
+            ValueError: Parámetros inválidos
+            ConflictoTrabajo: Otro trabajo activo escribe en la misma salida
+            ColaLlena: No caben más trabajos en espera
+        """
+        extractor = crear_extractor(parametros)
+        salida = extractor.output_dir.resolve()
+        with self._lock:
+            for otro in self.trabajos.values():
+                if otro.activo and otro.extractor.output_dir.resolve() == salida:
+                    raise ConflictoTrabajo(f"El trabajo {otro.id} ya escribe en {salida}")
+            id_trabajo = f"{datetime.now():%Y%m%d%H%M%S}-{next(self._contador):04d}"
+            en_espera = sum(1 for t in self.trabajos.values() if t.estado == EN_COLA)
+            if en_espera >= self.capacidad:
+                raise ColaLlena(f"Hay {en_espera} trabajos en espera; reintente más tarde")
+            trabajo = Trabajo(id_trabajo, parametros, extractor)
+            self.trabajos[id_trabajo] = trabajo
+            self._podar_historial()
+            print(f"📥 Trabajo {id_trabajo}: {extractor.pst_file} -> {extractor.output_dir}", flush=True)
+            self.cola.put(trabajo)
+        return trabajo
+
+    def _podar_historial(self):
+        terminados = [t.id for t in self.trabajos.values() if not t.activo]
+        for id_trabajo in terminados[:max(0, len(terminados) - self.historial)]:
+            del self.trabajos[id_trabajo]
+
+    def obtener(self, id_trabajo):
+        with self._lock:
+            return self.trabajos.get(id_trabajo)
+
+    def listar(self):
+        with self._lock:
+            return list(self.trabajos.values())
+
+    def cancelar(self, id_trabajo):
+        """
+        Cancelar un trabajo en cola (el trabajador lo descarta al sacarlo).
+
+        Raises:
+            ConflictoTrabajo: Si el trabajo ya empezó o terminó
+        """
+        with self._lock:
+            trabajo = self.trabajos.get(id_trabajo)
+            if trabajo is None:
+                return None
+            if trabajo.estado != EN_COLA:
+                raise ConflictoTrabajo(f"El trabajo {id_trabajo} está {trabajo.estado}; solo se cancelan trabajos en cola")
+            trabajo.estado = CANCELADO
+            trabajo.fin = datetime.now()
+        return trabajo
+
+    def estado(self):
+        with self._lock:
+            por_estado = {}
+            for trabajo in self.trabajos.values():
+                por_estado[trabajo.estado] = por_estado.get(trabajo.estado, 0) + 1
+        return {
+            "iniciado": self.iniciado.isoformat(timespec="seconds"),
+            "trabajadores": self.num_trabajadores,
+            "en_espera": por_estado.get(EN_COLA, 0),
+            "capacidad_cola": self.capacidad,
+            "trabajos": por_estado,
+            "outlook_disponible": WIN32COM_AVAILABLE,
+            "limites_io": LIMITADOR.limites,
+        }
+
+    def _trabajar(self):
+        # Outlook COM es STA: cada hilo trabajador inicializa COM una vez y conserva su conexión
+        if PYTHONCOM_AVAILABLE:
+            pythoncom.CoInitialize()
+        try:
+            while True:
+                trabajo = self.cola.get()
+                if trabajo is None:
+                    break
+                self._ejecutar(trabajo)
+        finally:
+            if PYTHONCOM_AVAILABLE:
+                pythoncom.CoUninitialize()
+
+    def _ejecutar(self, trabajo):
+        with self._lock:
+            if trabajo.estado == CANCELADO:
+                return
+            trabajo.estado = EJECUTANDO
+            trabajo.inicio = datetime.now()
+
+        print(f"🚀 Trabajo {trabajo.id} en ejecución", flush=True)
+        try:
+            exito = trabajo.extractor.extraer_xml_files()
+            error = None if exito else (trabajo.extractor.estado or "La extracción falló")
+        except Exception as e:
+            exito = False
+            error = f"Error inesperado: {e}"
+
+        with self._lock:
+            trabajo.estado = COMPLETADO if exito else FALLIDO
+            trabajo.error = error
+            trabajo.fin = datetime.now()
+            self._podar_historial()
+        print(f"{'✅' if exito else '❌'} Trabajo {trabajo.id} {trabajo.estado} "
+              f"({trabajo.extractor.extracted_xml_files:,} XML)", flush=True)
+
+
+class ManejadorTrabajos(BaseHTTPRequestHandler):
+    """Traduce las peticiones HTTP a operaciones del servicio (respuestas en JSON)."""
+
+    servicio = None
+    token = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        # Un trabajo consultado cada segundo llenaría la consola
+        pass
+
+    def _responder(self, estado, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False, indent=2).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def _error(self, estado, mensaje):
+        self._responder(estado, {"error": mensaje})
+
+    def _autorizado(self):
+        if not self.token:
+            if self._host_local():
+                return True
+            self._error(HTTPStatus.FORBIDDEN, "Cabecera Host no local; use --token para acceder desde otro nombre")
+            return False
+        esperado = f"Bearer {self.token}"
+        if hmac.compare_digest(self.headers.get("Authorization", ""), esperado):
+            return True
+        self._error(HTTPStatus.UNAUTHORIZED, "Token ausente o incorrecto")
+        return False
+
+    def _host_local(self):
+        host = self.headers.get("Host", "").strip().lower()
+        if host.startswith("["):
+            host = host[:host.find("]") + 1]
+        elif ":" in host:
+            host = host.rsplit(":", 1)[0]
+        return host in HOSTS_LOCALES
+
+    def _ruta(self):
+        return [parte for parte in self.path.split("?", 1)[0].split("/") if parte]
+
+    def _leer_json(self):
+        tipo = self.headers.get("Content-Type", "").split(";", 1)[0].strip().lower()
+        if tipo != "application/json":
+            raise TipoNoAdmitido("El cuerpo debe enviarse con 'Content-Type: application/json'")
+        try:
+            longitud = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            raise ValueError("Content-Length inválido")
+        if longitud < 0:
+            # rfile.read(-1) bloquearía el hilo hasta que el cliente cierre la conexión
+            raise ValueError("Content-Length no puede ser negativo")
+        if longitud > API_MAX_BODY_KB * 1024:
+            raise ValueError(f"El cuerpo supera {API_MAX_BODY_KB} KB")
+        try:
+            return json.loads(self.rfile.read(longitud) or b"{}")
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            raise ValueError(f"JSON inválido: {e}")
+
+    def do_GET(self):
+        if not self._autorizado():
+            return
+        ruta = self._ruta()
+        if ruta == ["estado"]:
+            self._responder(HTTPStatus.OK, self.servicio.estado())
+        elif ruta == ["io"]:
+            self._responder(HTTPStatus.OK, self._estado_io())
+        elif ruta == ["trabajos"]:
+            self._responder(HTTPStatus.OK, {"trabajos": [t.resumen() for t in self.servicio.listar()]})
+        elif len(ruta) == 2 and ruta[0] == "trabajos":
+            trabajo = self.servicio.obtener(ruta[1])
+            if trabajo is None:
+                self._error(HTTPStatus.NOT_FOUND, f"No existe el trabajo {ruta[1]}")
+            else:
+                self._responder(HTTPStatus.OK, trabajo.detalle())
+        else:
+            self._error(HTTPStatus.NOT_FOUND, f"Ruta desconocida: {self.path}")
+
+    def do_POST(self):
+        if not self._autorizado():
+            return
+        if self._ruta() != ["trabajos"]:
+            self._error(HTTPStatus.NOT_FOUND, f"Ruta desconocida: {self.path}")
+            return
+        try:
+            trabajo = self.servicio.enviar(self._leer_json())
+        except TipoNoAdmitido as e:
+            self._error(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, str(e))
+        except ValueError as e:
+            self._error(HTTPStatus.BAD_REQUEST, str(e))
+        except ConflictoTrabajo as e:
+            self._error(HTTPStatus.CONFLICT, str(e))
+        except ColaLlena as e:
+            self._error(HTTPStatus.SERVICE_UNAVAILABLE, str(e))
+        else:
+            self._responder(HTTPStatus.ACCEPTED, trabajo.resumen())
+
+    def do_PUT(self):
+        if not self._autorizado():
+            return
+        if self._ruta() != ["io"]:
+            self._error(HTTPStatus.NOT_FOUND, f"Ruta desconocida: {self.path}")
+            return
+        try:
+            datos = self._leer_json()
+            if not isinstance(datos, dict):
+                raise ValueError("Se esperaba un objeto JSON")
+            LIMITADOR.configurar(datos.get("mb_s"), datos.get("ops_s"))
+        except TipoNoAdmitido as e:
+            self._error(HTTPStatus.UNSUPPORTED_MEDIA_TYPE, str(e))
+            return
+        except (ValueError, TypeError) as e:
+            self._error(HTTPStatus.BAD_REQUEST, str(e))
+            return
+        print(f"🚦 Límites de E/S: {LIMITADOR.describir()}", flush=True)
+        self._responder(HTTPStatus.OK, self._estado_io())
+
+    @staticmethod
+    def _estado_io():
+        return {**LIMITADOR.limites, "bytes": LIMITADOR.bytes, "operaciones": LIMITADOR.operaciones,
+                "espera_segundos": round(LIMITADOR.espera_total, 1)}
+
+    def do_DELETE(self):
+        if not self._autorizado():
+            return
+        ruta = self._ruta()
+        if len(ruta) != 2 or ruta[0] != "trabajos":
+            self._error(HTTPStatus.NOT_FOUND, f"Ruta desconocida: {self.path}")
+            return
+        try:
+            trabajo = self.servicio.cancelar(ruta[1])
+        except ConflictoTrabajo as e:
+            self._error(HTTPStatus.CONFLICT, str(e))
+            return
+        if trabajo is None:
+            self._error(HTTPStatus.NOT_FOUND, f"No existe el trabajo {ruta[1]}")
+        else:
+            self._responder(HTTPStatus.OK, trabajo.resumen())
+
+
+def main():
+    """Iniciar el servicio HTTP de trabajos de extracción."""
+    parser = argparse.ArgumentParser(description="Servicio HTTP local para encolar extracciones de PST")
+    parser.add_argument("--host", default=API_HOST, help=f"Dirección de escucha (por defecto {API_HOST})")
+    parser.add_argument("--port", type=int, default=API_PORT, help=f"Puerto (por defecto {API_PORT})")
+    parser.add_argument("--workers", type=int, default=API_WORKERS,
+                        help=f"Extracciones simultáneas (por defecto {API_WORKERS})")
+    parser.add_argument("--queue-size", type=int, default=API_QUEUE_SIZE,
+                        help=f"Trabajos en espera como máximo (por defecto {API_QUEUE_SIZE})")
+    parser.add_argument("--token", default=None,
+                        help="Exigir 'Authorization: Bearer <token>' en todas las peticiones")
+    agregar_argumentos_io(parser)
+    args = parser.parse_args()
+    configurar_limites_desde_argumentos(args, parser)
+
+    if args.host not in ("127.0.0.1", "localhost", "::1") and not args.token:
+        parser.error("Para escuchar fuera de localhost hay que indicar --token")
+    if not WIN32COM_AVAILABLE:
+        print("⚠️ win32com.client no disponible: los trabajos fallarán hasta instalar pywin32")
+
+    servicio = ServicioTrabajos(args.workers, args.queue_size)
+    ManejadorTrabajos.servicio = servicio
+    ManejadorTrabajos.token = args.token
+    servidor = ThreadingHTTPServer((args.host, args.port), ManejadorTrabajos)
+    servidor.daemon_threads = True
+
+    def detener(*_):
+        # shutdown() espera al bucle de serve_forever: se llama desde otro hilo
+        threading.Thread(target=servidor.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGINT, detener)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, detener)
+
+    servicio.iniciar()
+    print(f"🌐 Servicio de trabajos en http://{args.host}:{args.port} "
+          f"({servicio.num_trabajadores} trabajadores, cola de {args.queue_size})")
+    try:
+        servidor.serve_forever()
+    except Exception as e:
+        print(f"❌ Error en el servicio: {e}")
+        sys.exit(1)
+    finally:
+        servidor.server_close()
+        servicio.detener()
+        en_curso = [t.id for t in servicio.listar() if t.estado == EJECUTANDO]
+        if en_curso:
+            print(f"⏳ Esperando a los trabajos en curso: {', '.join(en_curso)}")
+            for hilo in servicio.hilos:
+                hilo.join()
+        print("⏹️ Servicio detenido")
+
+
+if __name__ == "__main__":
+    main()
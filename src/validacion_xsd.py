@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Validación XSD de los comprobantes extraídos.
+
+Cada documento se valida contra el esquema oficial de Hacienda que
+corresponde a su namespace (v4.3 o v4.4). Los XSD se copian en
+``src/esquemas_xsd/`` y se indexan por ``targetNamespace``, así no hace
+falta mantener una tabla de nombres de archivo.
+
+Compilar un XSD de Hacienda cuesta mucho más que validar un documento,
+por eso cada proceso compila cada esquema una sola vez y lo conserva en
+caché; los documentos se reparten por lotes en un pool de procesos.
+
+El resultado de cada documento se escribe en ``reportes/validacion_xsd.jsonl``
+y el resumen se añade al reporte de extracción.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import argparse
+import json
+import re
+import xml.etree.ElementTree as ET
+from collections import Counter
+from pathlib import Path
+
+from archivo_empaquetado import LectorPaquetes, leer_documento, listar_documentos
+from config import (
+    VALIDATION_BATCH_SIZE,
+    VALIDATION_MAX_ERRORS_PER_DOC,
+    VALIDATION_WORKERS,
+    XSD_DIR,
+)
+from procesamiento_lotes import ejecutar_por_lotes
+
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+# Estados de validación
+VALIDO = "valido"
+INVALIDO = "invalido"
+SIN_ESQUEMA = "sin_esquema"  # Namespace sin XSD local (p. ej. un XML que no es de Hacienda)
+ILEGIBLE = "ilegible"  # No es XML bien formado o no se pudo leer
+
+VERSION_REGEX = re.compile(r"/v(\d+\.\d+)/")
+
+ARCHIVO_RESULTADOS = "validacion_xsd.jsonl"
+
+
+def indexar_esquemas(dir_xsd):
+    """
+    Mapear targetNamespace -> archivo XSD para los esquemas de un directorio.
+
+    Solo se lee la etiqueta raíz de cada XSD; la compilación se hace bajo demanda.
+    """
+    indice = {}
+    for ruta in sorted(Path(dir_xsd).glob("*.xsd")):
+        try:
+            for _event, elem in ET.iterparse(ruta, events=("start",)):
+                namespace = elem.get("targetNamespace")
+                if namespace:
+                    indice.setdefault(namespace, ruta)
+                break
+        except (ET.ParseError, OSError) as e:
+            print(f"⚠️ No se pudo leer el esquema {ruta.name}: {e}")
+    return indice
+
+
+class EsquemasHacienda:
+    """Esquemas indexados por namespace, compilados una vez y conservados en caché."""
+
+    def __init__(self, dir_xsd=XSD_DIR):
+        self.dir_xsd = Path(dir_xsd)
+        self.indice = indexar_esquemas(self.dir_xsd)
+        self._compilados = {}
+        # Sin red ni entidades externas: los comprobantes llegan por correo
+        self._parser = etree.XMLParser(resolve_entities=False, no_network=True)
+
+    def __len__(self):
+        return len(self.indice)
+
+    def esquema(self, namespace):
+        """XMLSchema compilado para un namespace (None si no hay XSD local)."""
+        if namespace in self._compilados:
+            return self._compilados[namespace]
+        ruta = self.indice.get(namespace)
+        esquema = None
+        if ruta is not None:
+            # lxml resuelve los xs:import (p. ej. xmldsig) relativos al propio XSD
+            esquema = etree.XMLSchema(etree.parse(str(ruta)))
+        self._compilados[namespace] = esquema
+        return esquema
+
+    def validar(self, nombre, datos):
+        """
+        Validar un documento.
+
+        Returns:
+            dict: documento, tipo, version, estado y errores
+        """
+        resultado = {"documento": nombre, "tipo": "", "version": "", "estado": VALIDO, "errores": []}
+        try:
+            arbol = etree.fromstring(datos, parser=self._parser)
+        except etree.XMLSyntaxError as e:
+            resultado["estado"] = ILEGIBLE
+            resultado["errores"] = [str(e)]
+            return resultado
+
+        qname = etree.QName(arbol)
+        namespace = qname.namespace or ""
+        resultado["tipo"] = qname.localname
+        coincidencia = VERSION_REGEX.search(namespace)
+        resultado["version"] = coincidencia.group(1) if coincidencia else ""
+
+        try:
+            esquema = self.esquema(namespace)
+        except (etree.XMLSchemaParseError, etree.XMLSyntaxError, OSError) as e:
+            resultado["estado"] = SIN_ESQUEMA
+            resultado["errores"] = [f"No se pudo compilar el esquema: {e}"]
+            return resultado
+        if esquema is None:
+            resultado["estado"] = SIN_ESQUEMA
+            return resultado
+
+        if not esquema.validate(arbol):
+            resultado["estado"] = INVALIDO
+            resultado["errores"] = [
+                f"línea {error.line}: {error.message}"
+                for error in list(esquema.error_log)[:VALIDATION_MAX_ERRORS_PER_DOC]
+            ]
+        return resultado
+
+
+# Estado por proceso del pool (se inicializa una vez por trabajador)
+_esquemas = None
+_lector = None
+
+
+def _inicializar_trabajador(dir_xsd, raiz_paquetes):
+    global _esquemas, _lector
+    _esquemas = EsquemasHacienda(dir_xsd)
+    _lector = LectorPaquetes(raiz_paquetes) if raiz_paquetes is not None else None
+
+
+def _finalizar_trabajador():
+    if _lector is not None:
+        _lector.cerrar()
+
+
+def _validar_lote(lote):
+    resultados = []
+    for documento in lote:
+        try:
+            nombre, datos = leer_documento(documento, _lector)
+        except Exception as e:
+            nombre = documento["nombre"] if isinstance(documento, dict) else str(documento)
+            resultados.append({"documento": nombre, "tipo": "", "version": "", "estado": ILEGIBLE,
+                               "errores": [f"No se pudo leer: {e}"]})
+            continue
+        resultados.append(_esquemas.validar(nombre, datos))
+    return resultados
+
+
+class ResumenValidacion:
+    """Contadores de la validación para el reporte."""
+
+    def __init__(self):
+        self.total = 0
+        self.por_estado = Counter()
+        self.por_tipo = Counter()
+        self.ruta_resultados = None
+
+    def agregar(self, resultado):
+        self.total += 1
+        self.por_estado[resultado["estado"]] += 1
+        if resultado["tipo"]:
+            version = f" v{resultado['version']}" if resultado["version"] else ""
+            self.por_tipo[f"{resultado['tipo']}{version}"] += 1
+
+    def describir(self):
+        return (f"{self.por_estado[VALIDO]:,} válidos, {self.por_estado[INVALIDO]:,} inválidos, "
+                f"{self.por_estado[SIN_ESQUEMA]:,} sin esquema, {self.por_estado[ILEGIBLE]:,} ilegibles")
+
+    def escribir_resumen(self, f):
+        """Escribir la sección de validación en el reporte de extracción."""
+        f.write("VALIDACIÓN XSD:\n")
+        f.write(f"- Documentos validados: {self.total:,}\n")
+        for estado in (VALIDO, INVALIDO, SIN_ESQUEMA, ILEGIBLE):
+            f.write(f"- {estado}: {self.por_estado[estado]:,}\n")
+        for tipo, cantidad in self.por_tipo.most_common():
+            f.write(f"  · {tipo}: {cantidad:,}\n")
+        if self.ruta_resultados:
+            f.write(f"Detalle por documento: {self.ruta_resultados}\n")
+        f.write("\n")
+
+
+def validar_directorio(directorio, ruta_resultados, dir_xsd=XSD_DIR, procesos=VALIDATION_WORKERS,
+                       tamano_lote=VALIDATION_BATCH_SIZE, progreso=None):
+    """
+    Validar todos los documentos de un directorio de salida (sueltos, comprimidos o empaquetados).
+
+    Args:
+        directorio (Path): Directorio con los XML (o salida con xml_facturacion/)
+        ruta_resultados (Path): Archivo JSONL con el resultado de cada documento
+        dir_xsd (Path): Directorio con los XSD de Hacienda
+        procesos (int): Procesos del pool (1 = validar en el proceso actual)
+        tamano_lote (int): Documentos por tarea
+        progreso (callable): progreso(validados, total), opcional
+
+    Returns:
+        ResumenValidacion
+
+    Raises:
+        ValueError: Si lxml no está instalado o no hay esquemas en dir_xsd
+    """
+    if not LXML_AVAILABLE:
+        raise ValueError("La validación XSD requiere lxml (pip install lxml)")
+    if not indexar_esquemas(dir_xsd):
+        raise ValueError(f"No hay esquemas XSD en {dir_xsd}; copie allí los XSD oficiales de Hacienda")
+
+    directorio = Path(directorio)
+    if (directorio / "xml_facturacion").is_dir():
+        directorio = directorio / "xml_facturacion"
+    raiz_paquetes, documentos = listar_documentos(directorio)
+
+    resumen = ResumenValidacion()
+    resumen.ruta_resultados = ruta_resultados
+
+    with open(ruta_resultados, "w", encoding="utf-8") as salida:
+        def guardar(resultados):
+            for resultado in resultados:
+                resumen.agregar(resultado)
+                salida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            if progreso:
+                progreso(resumen.total, len(documentos))
+
+        ejecutar_por_lotes(documentos, _validar_lote, _inicializar_trabajador, (dir_xsd, raiz_paquetes),
+                           procesos, tamano_lote, guardar, finalizar=_finalizar_trabajador)
+
+    return resumen
+
+
+def main():
+    """Validar una carpeta de XML extraídos contra los XSD de Hacienda."""
+    parser = argparse.ArgumentParser(description="Validar XML extraídos contra los XSD de Hacienda v4.3/v4.4")
+    parser.add_argument("--dir", required=True, help="Directorio de salida o carpeta con XML")
+    parser.add_argument("--xsd-dir", default=str(XSD_DIR), help=f"Directorio con los XSD (por defecto {XSD_DIR})")
+    parser.add_argument("--processes", type=int, default=VALIDATION_WORKERS,
+                        help=f"Procesos de validación (por defecto {VALIDATION_WORKERS})")
+    parser.add_argument("--output", default=None,
+                        help=f"Archivo JSONL de resultados (por defecto <dir>/{ARCHIVO_RESULTADOS})")
+    args = parser.parse_args()
+
+    directorio = Path(args.dir)
+    salida = Path(args.output) if args.output else directorio / ARCHIVO_RESULTADOS
+
+    ultimo = [0]
+
+    def progreso(validados, total):
+        if validados - ultimo[0] >= 1000 or validados == total:
+            ultimo[0] = validados
+            print(f"🔍 Validados {validados:,} de {total:,}", flush=True)
+
+    try:
+        resumen = validar_directorio(directorio, salida, args.xsd_dir, args.processes, progreso=progreso)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+
+    print(f"✅ {resumen.total:,} documentos: {resumen.describir()}")
+    print(f"📋 Detalle: {salida}")
+
+
+if __name__ == "__main__":
+    main()
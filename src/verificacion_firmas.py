@@ -0,0 +1,650 @@
+#!/usr/bin/env python3
+"""
+Verificación por lotes de firmas XAdES-EPES de comprobantes de Hacienda.
+
+Para cada documento firmado se comprueba, sin conexión:
+- el digest de cada ds:Reference (documento con la transformación
+  enveloped-signature, KeyInfo, xades:SignedProperties...),
+- el valor de la firma sobre ds:SignedInfo canonicalizado,
+- que xades:SigningCertificate corresponda al certificado incluido,
+- que alguna ds:Reference cubra el documento completo (URI="" o el Id
+  de la raíz),
+- la cadena del certificado hasta un ancla de confianza local
+  (``src/anclas_confianza/``): cada emisor debe ser una CA
+  (BasicConstraints ca=True, keyCertSign) y respetar su pathLen,
+- la vigencia de la cadena en la fecha de firma.
+
+No se consulta revocación (CRL/OCSP): la verificación es totalmente local.
+Sin anclas de confianza una firma correcta queda como ``integra`` y nunca
+como ``valida``: un certificado autofirmado también pasaría esa comprobación.
+
+Los emisores repiten el mismo certificado miles de veces, por eso cada
+proceso guarda en caché el certificado ya analizado y su cadena por huella
+SHA-256 del firmante y de los intermedios que lo acompañan. Los documentos se reparten en un pool de procesos y el resultado
+de cada uno se escribe en ``verificacion_firmas.jsonl`` junto al log de
+la extracción.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+from archivo_empaquetado import LectorPaquetes, leer_documento, listar_documentos
+from config import (
+    SIGNATURE_BATCH_SIZE,
+    SIGNATURE_MAX_CHAIN_LENGTH,
+    TRUST_ANCHORS_DIR,
+    VALIDATION_WORKERS,
+)
+from procesamiento_lotes import ejecutar_por_lotes
+
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+try:
+    from cryptography import x509
+    from cryptography.exceptions import InvalidSignature
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.asymmetric import ec, padding, rsa
+    from cryptography.hazmat.primitives.asymmetric.utils import encode_dss_signature
+    CRYPTOGRAPHY_AVAILABLE = True
+except ImportError:
+    CRYPTOGRAPHY_AVAILABLE = False
+
+NS = {
+    "ds": "http://www.w3.org/2000/09/xmldsig#",
+    "xades": "http://uri.etsi.org/01903/v1.3.2#",
+    "ec": "http://www.w3.org/2001/10/xml-exc-c14n#",
+}
+
+# Estados de verificación
+VALIDA = "valida"
+INVALIDA = "invalida"  # Digest, firma o certificado firmante no coinciden
+NO_CONFIABLE = "no_confiable"  # Firma correcta pero la cadena no llega a un ancla o no estaba vigente
+INTEGRA = "integra"  # Firma correcta, cadena sin verificar porque no hay anclas de confianza
+SIN_FIRMA = "sin_firma"
+NO_SOPORTADA = "no_soportada"  # Algoritmo o referencia que no se sabe verificar
+ILEGIBLE = "ilegible"
+
+ESTADOS = (VALIDA, INTEGRA, INVALIDA, NO_CONFIABLE, SIN_FIRMA, NO_SOPORTADA, ILEGIBLE)
+
+ENVELOPED = "http://www.w3.org/2000/09/xmldsig#enveloped-signature"
+C14N_POR_DEFECTO = "http://www.w3.org/TR/2001/REC-xml-c14n-20010315"
+
+# Algoritmo -> (exclusiva, con_comentarios). C14N 1.1 se trata como 1.0: solo
+# difieren en la herencia de xml:id/xml:base, que los comprobantes no usan.
+C14N_ALGORITMOS = {
+    "http://www.w3.org/TR/2001/REC-xml-c14n-20010315": (False, False),
+    "http://www.w3.org/TR/2001/REC-xml-c14n-20010315#WithComments": (False, True),
+    "http://www.w3.org/2001/10/xml-exc-c14n#": (True, False),
+    "http://www.w3.org/2001/10/xml-exc-c14n#WithComments": (True, True),
+    "http://www.w3.org/2006/12/xml-c14n11": (False, False),
+    "http://www.w3.org/2006/12/xml-c14n11#WithComments": (False, True),
+}
+
+DIGESTS = {
+    "http://www.w3.org/2000/09/xmldsig#sha1": "sha1",
+    "http://www.w3.org/2001/04/xmlenc#sha256": "sha256",
+    "http://www.w3.org/2001/04/xmldsig-more#sha384": "sha384",
+    "http://www.w3.org/2001/04/xmlenc#sha512": "sha512",
+}
+
+# Algoritmo de firma -> (tipo de clave, nombre del hash)
+FIRMAS = {
+    "http://www.w3.org/2000/09/xmldsig#rsa-sha1": ("rsa", "SHA1"),
+    "http://www.w3.org/2001/04/xmldsig-more#rsa-sha256": ("rsa", "SHA256"),
+    "http://www.w3.org/2001/04/xmldsig-more#rsa-sha384": ("rsa", "SHA384"),
+    "http://www.w3.org/2001/04/xmldsig-more#rsa-sha512": ("rsa", "SHA512"),
+    "http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha256": ("ecdsa", "SHA256"),
+    "http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha384": ("ecdsa", "SHA384"),
+    "http://www.w3.org/2001/04/xmldsig-more#ecdsa-sha512": ("ecdsa", "SHA512"),
+}
+
+ARCHIVO_RESULTADOS = "verificacion_firmas.jsonl"
+
+
+class FirmaInvalida(Exception):
+    """La firma no corresponde al contenido."""
+
+
+class FirmaNoSoportada(Exception):
+    """La firma usa un algoritmo o una referencia que no se sabe verificar."""
+
+
+def _texto(elemento, ruta):
+    nodo = elemento.find(ruta, NS)
+    return "".join(nodo.text.split()) if nodo is not None and nodo.text else ""
+
+
+def canonicalizar(nodo, algoritmo, prefijos=None):
+    """Serializar un nodo con el algoritmo C14N indicado."""
+    if algoritmo not in C14N_ALGORITMOS:
+        raise FirmaNoSoportada(f"Canonicalización no soportada: {algoritmo}")
+    exclusiva, comentarios = C14N_ALGORITMOS[algoritmo]
+    return etree.tostring(nodo, method="c14n", exclusive=exclusiva, with_comments=comentarios,
+                          inclusive_ns_prefixes=prefijos if exclusiva else None)
+
+
+def _prefijos_inclusivos(metodo):
+    nodo = metodo.find("ec:InclusiveNamespaces", NS)
+    if nodo is None or not nodo.get("PrefixList"):
+        return None
+    return nodo.get("PrefixList").split()
+
+
+def _digest(algoritmo, datos):
+    nombre = DIGESTS.get(algoritmo)
+    if nombre is None:
+        raise FirmaNoSoportada(f"Digest no soportado: {algoritmo}")
+    return hashlib.new(nombre, datos).digest()
+
+
+def _sin_firma(objetivo, firma, funcion):
+    """
+    Ejecutar ``funcion`` con la firma retirada temporalmente del árbol
+    (transformación enveloped-signature), restaurándolo después.
+    """
+    padre = firma.getparent()
+    indice = padre.index(firma)
+    previo = firma.getprevious()
+    cola = firma.tail
+    texto_padre = padre.text
+    cola_previo = previo.tail if previo is not None else None
+
+    padre.remove(firma)
+    # El texto que seguía a la firma sigue formando parte del documento
+    if cola:
+        if previo is not None:
+            previo.tail = (cola_previo or "") + cola
+        else:
+            padre.text = (texto_padre or "") + cola
+    try:
+        return funcion(objetivo)
+    finally:
+        if previo is not None:
+            previo.tail = cola_previo
+        else:
+            padre.text = texto_padre
+        padre.insert(indice, firma)
+        firma.tail = cola
+
+
+def _buscar_por_id(raiz, identificador):
+    encontrados = raiz.xpath("//*[@Id=$v or @ID=$v or @id=$v]", v=identificador)
+    if not encontrados:
+        raise FirmaInvalida(f"No existe el elemento referenciado #{identificador}")
+    if len(encontrados) > 1:
+        # Un Id repetido permite firmar un elemento y mostrar otro
+        raise FirmaInvalida(f"El Id #{identificador} aparece en {len(encontrados)} elementos")
+    return encontrados[0]
+
+
+def cubre_documento(referencia, raiz):
+    """True si la ds:Reference firma el documento completo (URI="" o el Id de la raíz)."""
+    uri = referencia.get("URI", "")
+    if uri == "":
+        return True
+    return (uri.startswith("#") and not uri.startswith("#xpointer(")
+            and _buscar_por_id(raiz, uri[1:]) is raiz)
+
+
+def verificar_referencia(referencia, raiz, firma):
+    """Comprobar el DigestValue de una ds:Reference."""
+    uri = referencia.get("URI", "")
+    if uri == "":
+        objetivo = raiz
+    elif uri.startswith("#") and not uri.startswith("#xpointer("):
+        objetivo = _buscar_por_id(raiz, uri[1:])
+    else:
+        raise FirmaNoSoportada(f"Referencia no soportada: {uri}")
+
+    algoritmo_c14n = C14N_POR_DEFECTO
+    prefijos = None
+    envuelta = False
+    for transformacion in referencia.findall("ds:Transforms/ds:Transform", NS):
+        algoritmo = transformacion.get("Algorithm")
+        if algoritmo == ENVELOPED:
+            envuelta = True
+        elif algoritmo in C14N_ALGORITMOS:
+            algoritmo_c14n = algoritmo
+            prefijos = _prefijos_inclusivos(transformacion)
+        else:
+            raise FirmaNoSoportada(f"Transformación no soportada: {algoritmo}")
+
+    if uri == "" and C14N_ALGORITMOS[algoritmo_c14n][1]:
+        # URI="" excluye siempre los comentarios (XML-DSig 4.4.3.3)
+        algoritmo_c14n = algoritmo_c14n.replace("#WithComments", "")
+
+    def serializar(nodo):
+        return canonicalizar(nodo, algoritmo_c14n, prefijos)
+
+    if envuelta and (firma is objetivo or objetivo in firma.iterancestors()):
+        datos = _sin_firma(objetivo, firma, serializar)
+    else:
+        datos = serializar(objetivo)
+
+    metodo = referencia.find("ds:DigestMethod", NS)
+    calculado = _digest(metodo.get("Algorithm") if metodo is not None else "", datos)
+    esperado = base64.b64decode(_texto(referencia, "ds:DigestValue"))
+    if calculado != esperado:
+        raise FirmaInvalida(f"Digest no coincide en la referencia '{uri or '(documento)'}'")
+
+
+def _hash_firma(nombre):
+    return getattr(hashes, nombre)()
+
+
+def verificar_valor_firma(firma, certificado):
+    """Comprobar ds:SignatureValue sobre ds:SignedInfo canonicalizado."""
+    signed_info = firma.find("ds:SignedInfo", NS)
+    metodo_c14n = signed_info.find("ds:CanonicalizationMethod", NS)
+    datos = canonicalizar(signed_info, metodo_c14n.get("Algorithm"), _prefijos_inclusivos(metodo_c14n))
+
+    algoritmo = signed_info.find("ds:SignatureMethod", NS).get("Algorithm")
+    if algoritmo not in FIRMAS:
+        raise FirmaNoSoportada(f"Algoritmo de firma no soportado: {algoritmo}")
+    tipo, nombre_hash = FIRMAS[algoritmo]
+    valor = base64.b64decode(_texto(firma, "ds:SignatureValue"))
+    clave = certificado.public_key()
+
+    try:
+        if tipo == "rsa" and isinstance(clave, rsa.RSAPublicKey):
+            clave.verify(valor, datos, padding.PKCS1v15(), _hash_firma(nombre_hash))
+        elif tipo == "ecdsa" and isinstance(clave, ec.EllipticCurvePublicKey):
+            # XML-DSig usa r||s en crudo; cryptography espera DER
+            mitad = len(valor) // 2
+            der = encode_dss_signature(int.from_bytes(valor[:mitad], "big"), int.from_bytes(valor[mitad:], "big"))
+            clave.verify(der, datos, ec.ECDSA(_hash_firma(nombre_hash)))
+        else:
+            raise FirmaInvalida("El tipo de clave del certificado no corresponde al algoritmo de firma")
+    except InvalidSignature:
+        raise FirmaInvalida("El valor de la firma no corresponde a SignedInfo")
+
+
+def _vigencia(certificado):
+    # cryptography >= 42 expone las fechas con zona horaria
+    inicio = getattr(certificado, "not_valid_before_utc", None)
+    fin = getattr(certificado, "not_valid_after_utc", None)
+    if inicio is None:
+        inicio = certificado.not_valid_before.replace(tzinfo=timezone.utc)
+        fin = certificado.not_valid_after.replace(tzinfo=timezone.utc)
+    return inicio, fin
+
+
+def _nombre_comun(nombre):
+    atributos = nombre.get_attributes_for_oid(x509.NameOID.COMMON_NAME)
+    return atributos[0].value if atributos else nombre.rfc4514_string()
+
+
+def _puede_emitir(emisor, intermedios_debajo):
+    """
+    True si el certificado puede emitir otros: BasicConstraints ca=True,
+    keyCertSign si declara KeyUsage y un pathLen que admita las CA que
+    tiene debajo en la cadena (sin contar el certificado firmante).
+    """
+    try:
+        restricciones = emisor.extensions.get_extension_for_class(x509.BasicConstraints).value
+    except x509.ExtensionNotFound:
+        return False
+    if not restricciones.ca:
+        return False
+    if restricciones.path_length is not None and intermedios_debajo > restricciones.path_length:
+        return False
+    try:
+        uso = emisor.extensions.get_extension_for_class(x509.KeyUsage).value
+    except x509.ExtensionNotFound:
+        return True
+    return uso.key_cert_sign
+
+
+def _emitido_por(certificado, emisor):
+    if certificado.issuer != emisor.subject:
+        return False
+    try:
+        certificado.verify_directly_issued_by(emisor)
+        return True
+    except (ValueError, TypeError, InvalidSignature):
+        return False
+
+
+class AnclasConfianza:
+    """Certificados de confianza locales (PEM, DER o CER) indexados por sujeto."""
+
+    def __init__(self, directorio=TRUST_ANCHORS_DIR):
+        self.directorio = Path(directorio)
+        self.huellas = set()
+        self.por_sujeto = {}
+        if self.directorio.is_dir():
+            for ruta in sorted(self.directorio.iterdir()):
+                if ruta.suffix.lower() in (".pem", ".crt", ".cer", ".der"):
+                    for certificado in self._cargar(ruta):
+                        self.huellas.add(certificado.fingerprint(hashes.SHA256()))
+                        self.por_sujeto.setdefault(certificado.subject, []).append(certificado)
+
+    @staticmethod
+    def _cargar(ruta):
+        datos = ruta.read_bytes()
+        try:
+            if b"-----BEGIN CERTIFICATE-----" in datos:
+                return x509.load_pem_x509_certificates(datos)
+            return [x509.load_der_x509_certificate(datos)]
+        except ValueError as e:
+            print(f"⚠️ No se pudo leer el certificado {ruta.name}: {e}")
+            return []
+
+    def __len__(self):
+        return len(self.huellas)
+
+    def construir_cadena(self, certificado, intermedios=()):
+        """
+        Cadena desde el certificado hasta un ancla (None si no se llega).
+
+        Los intermedios incluidos en el documento pueden completar la
+        cadena, pero solo un certificado del directorio da confianza. Todo
+        certificado que emite a otro de la cadena (anclas incluidas) debe
+        ser una CA autorizada a firmar certificados.
+        """
+        cadena = [certificado]
+        actual = certificado
+        for _ in range(SIGNATURE_MAX_CHAIN_LENGTH):
+            if actual.fingerprint(hashes.SHA256()) in self.huellas:
+                return cadena
+            candidatos = self.por_sujeto.get(actual.issuer, []) + [c for c in intermedios if c.subject == actual.issuer]
+            siguiente = next((c for c in candidatos if c is not actual and _puede_emitir(c, len(cadena) - 1)
+                              and _emitido_por(actual, c)), None)
+            if siguiente is None:
+                return None
+            cadena.append(siguiente)
+            actual = siguiente
+        return None
+
+
+class InfoCertificado:
+    """Certificado firmante ya analizado, con su cadena (se guarda en caché por huella)."""
+
+    __slots__ = ("certificado", "huella", "sujeto", "emisor", "cadena")
+
+    def __init__(self, certificado, cadena):
+        self.certificado = certificado
+        self.huella = certificado.fingerprint(hashes.SHA256()).hex()
+        self.sujeto = _nombre_comun(certificado.subject)
+        self.emisor = _nombre_comun(certificado.issuer)
+        self.cadena = cadena
+
+
+class VerificadorFirmas:
+    """Verifica firmas XAdES de documentos, con caché de certificados por huella."""
+
+    def __init__(self, dir_anclas=TRUST_ANCHORS_DIR):
+        self.anclas = AnclasConfianza(dir_anclas)
+        self._certificados = {}
+        self._parser = etree.XMLParser(resolve_entities=False, no_network=True, remove_blank_text=False)
+
+    def certificado(self, der, intermedios_der=()):
+        """InfoCertificado para un certificado DER (analizado una sola vez por proceso)."""
+        # La cadena depende de los intermedios que trae cada documento, no solo del firmante
+        huella = (hashlib.sha256(der).digest(),
+                  tuple(sorted(hashlib.sha256(d).digest() for d in intermedios_der)))
+        info = self._certificados.get(huella)
+        if info is None:
+            certificado = x509.load_der_x509_certificate(der)
+            intermedios = [x509.load_der_x509_certificate(d) for d in intermedios_der]
+            cadena = self.anclas.construir_cadena(certificado, intermedios) if len(self.anclas) else None
+            info = InfoCertificado(certificado, cadena)
+            self._certificados[huella] = info
+        return info
+
+    def _certificado_firmante(self, firma):
+        ders = [base64.b64decode("".join(nodo.text.split()))
+                for nodo in firma.findall("ds:KeyInfo/ds:X509Data/ds:X509Certificate", NS) if nodo.text]
+        if not ders:
+            raise FirmaNoSoportada("La firma no incluye el certificado (ds:X509Certificate)")
+
+        # xades:SigningCertificate identifica cuál de los certificados es el firmante
+        firmante = ders[0]
+        cert_xades = firma.find(".//xades:SigningCertificate/xades:Cert/xades:CertDigest", NS)
+        if cert_xades is None:
+            cert_xades = firma.find(".//xades:SigningCertificateV2/xades:Cert/xades:CertDigest", NS)
+        if cert_xades is not None:
+            metodo = cert_xades.find("ds:DigestMethod", NS).get("Algorithm")
+            esperado = base64.b64decode(_texto(cert_xades, "ds:DigestValue"))
+            coincidentes = [der for der in ders if _digest(metodo, der) == esperado]
+            if not coincidentes:
+                raise FirmaInvalida("xades:SigningCertificate no corresponde al certificado incluido")
+            firmante = coincidentes[0]
+
+        return self.certificado(firmante, [der for der in ders if der is not firmante])
+
+    def verificar(self, nombre, datos):
+        """
+        Verificar la firma de un documento.
+
+        Returns:
+            dict: documento, tipo, estado, motivo, firmante, emisor_certificado,
+            huella, fecha_firma y politica
+        """
+        resultado = {"documento": nombre, "tipo": "", "estado": VALIDA, "motivo": "",
+                     "firmante": "", "emisor_certificado": "", "huella": "", "fecha_firma": "", "politica": ""}
+        try:
+            raiz = etree.fromstring(datos, parser=self._parser)
+        except etree.XMLSyntaxError as e:
+            resultado.update(estado=ILEGIBLE, motivo=str(e))
+            return resultado
+        resultado["tipo"] = etree.QName(raiz).localname
+
+        firma = raiz.find("ds:Signature", NS)
+        if firma is None:
+            firma = raiz.find(".//ds:Signature", NS)
+        if firma is None:
+            resultado["estado"] = SIN_FIRMA
+            return resultado
+
+        resultado["fecha_firma"] = _texto(firma, ".//xades:SigningTime")
+        resultado["politica"] = _texto(firma, ".//xades:SignaturePolicyId/xades:SigPolicyId/xades:Identifier")
+
+        try:
+            info = self._certificado_firmante(firma)
+            resultado.update(firmante=info.sujeto, emisor_certificado=info.emisor, huella=info.huella)
+
+            referencias = firma.findall("ds:SignedInfo/ds:Reference", NS)
+            if not any(cubre_documento(referencia, raiz) for referencia in referencias):
+                raise FirmaInvalida("Ninguna ds:Reference firma el documento completo")
+            for referencia in referencias:
+                verificar_referencia(referencia, raiz, firma)
+            verificar_valor_firma(firma, info.certificado)
+        except FirmaInvalida as e:
+            resultado.update(estado=INVALIDA, motivo=str(e))
+            return resultado
+        except FirmaNoSoportada as e:
+            resultado.update(estado=NO_SOPORTADA, motivo=str(e))
+            return resultado
+        except (ValueError, TypeError, AttributeError, etree.C14NError) as e:
+            resultado.update(estado=INVALIDA, motivo=f"Firma mal formada: {e}")
+            return resultado
+
+        if not len(self.anclas):
+            resultado.update(estado=INTEGRA, motivo="Cadena no verificada: no hay anclas de confianza")
+        elif info.cadena is None:
+            resultado.update(estado=NO_CONFIABLE, motivo=f"La cadena de '{info.emisor}' no llega a un ancla de confianza")
+        else:
+            momento = _fecha_firma(resultado["fecha_firma"])
+            for certificado in info.cadena:
+                inicio, fin = _vigencia(certificado)
+                if not inicio <= momento <= fin:
+                    resultado.update(estado=NO_CONFIABLE,
+                                     motivo=f"'{_nombre_comun(certificado.subject)}' no estaba vigente al firmar")
+                    break
+        return resultado
+
+
+def _fecha_firma(texto):
+    """Fecha de xades:SigningTime (ahora si falta o no se entiende)."""
+    try:
+        fecha = datetime.fromisoformat(texto.replace("Z", "+00:00"))
+        return fecha if fecha.tzinfo else fecha.replace(tzinfo=timezone.utc)
+    except (ValueError, AttributeError):
+        return datetime.now(timezone.utc)
+
+
+# Estado por proceso del pool (se inicializa una vez por trabajador)
+_verificador = None
+_lector = None
+
+
+def _inicializar_trabajador(dir_anclas, raiz_paquetes):
+    global _verificador, _lector
+    _verificador = VerificadorFirmas(dir_anclas)
+    _lector = LectorPaquetes(raiz_paquetes) if raiz_paquetes is not None else None
+
+
+def _finalizar_trabajador():
+    if _lector is not None:
+        _lector.cerrar()
+
+
+def _verificar_lote(lote):
+    resultados = []
+    for documento in lote:
+        try:
+            nombre, datos = leer_documento(documento, _lector)
+        except Exception as e:
+            nombre = documento["nombre"] if isinstance(documento, dict) else str(documento)
+            resultados.append({"documento": nombre, "tipo": "", "estado": ILEGIBLE, "motivo": f"No se pudo leer: {e}",
+                               "firmante": "", "emisor_certificado": "", "huella": "", "fecha_firma": "",
+                               "politica": ""})
+            continue
+        resultados.append(_verificador.verificar(nombre, datos))
+    return resultados
+
+
+class ResumenFirmas:
+    """Contadores de la verificación para el reporte."""
+
+    def __init__(self):
+        self.total = 0
+        self.por_estado = Counter()
+        self.por_emisor = Counter()
+        self.huellas = set()
+        self.anclas = 0
+        self.ruta_resultados = None
+
+    def agregar(self, resultado):
+        self.total += 1
+        self.por_estado[resultado["estado"]] += 1
+        if resultado["huella"]:
+            self.huellas.add(resultado["huella"])
+            self.por_emisor[resultado["emisor_certificado"]] += 1
+
+    def describir(self):
+        return ", ".join(f"{self.por_estado[estado]:,} {estado}" for estado in ESTADOS if self.por_estado[estado])
+
+    def escribir_resumen(self, f):
+        """Escribir la sección de firmas en el reporte de extracción."""
+        f.write("VERIFICACIÓN DE FIRMAS XAdES:\n")
+        f.write(f"- Documentos verificados: {self.total:,}\n")
+        for estado in ESTADOS:
+            f.write(f"- {estado}: {self.por_estado[estado]:,}\n")
+        f.write(f"- Certificados firmantes distintos: {len(self.huellas):,}\n")
+        if not self.anclas:
+            f.write("- Sin anclas de confianza: no se verificaron las cadenas de certificados "
+                    f"(las firmas correctas cuentan como '{INTEGRA}', no como '{VALIDA}')\n")
+        for emisor, cantidad in self.por_emisor.most_common(10):
+            f.write(f"  · {emisor}: {cantidad:,}\n")
+        if self.ruta_resultados:
+            f.write(f"Detalle por documento: {self.ruta_resultados}\n")
+        f.write("\n")
+
+
+def verificar_directorio(directorio, ruta_resultados, dir_anclas=TRUST_ANCHORS_DIR, procesos=VALIDATION_WORKERS,
+                         tamano_lote=SIGNATURE_BATCH_SIZE, progreso=None):
+    """
+    Verificar las firmas de todos los documentos de un directorio de salida.
+
+    Args:
+        directorio (Path): Directorio con los XML (o salida con xml_facturacion/)
+        ruta_resultados (Path): Archivo JSONL con el resultado de cada documento
+        dir_anclas (Path): Certificados de confianza
+        procesos (int): Procesos del pool (1 = verificar en el proceso actual)
+        tamano_lote (int): Documentos por tarea
+        progreso (callable): progreso(verificados, total), opcional
+
+    Returns:
+        ResumenFirmas
+
+    Raises:
+        ValueError: Si faltan lxml o cryptography
+    """
+    if not LXML_AVAILABLE:
+        raise ValueError("La verificación de firmas requiere lxml (pip install lxml)")
+    if not CRYPTOGRAPHY_AVAILABLE:
+        raise ValueError("La verificación de firmas requiere cryptography (pip install cryptography)")
+
+    directorio = Path(directorio)
+    if (directorio / "xml_facturacion").is_dir():
+        directorio = directorio / "xml_facturacion"
+    raiz_paquetes, documentos = listar_documentos(directorio)
+
+    resumen = ResumenFirmas()
+    resumen.ruta_resultados = ruta_resultados
+    resumen.anclas = len(AnclasConfianza(dir_anclas))
+
+    with open(ruta_resultados, "w", encoding="utf-8") as salida:
+        def guardar(resultados):
+            for resultado in resultados:
+                resumen.agregar(resultado)
+                salida.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            if progreso:
+                progreso(resumen.total, len(documentos))
+
+        ejecutar_por_lotes(documentos, _verificar_lote, _inicializar_trabajador, (dir_anclas, raiz_paquetes),
+                           procesos, tamano_lote, guardar, finalizar=_finalizar_trabajador)
+
+    return resumen
+
+
+def main():
+    """Verificar las firmas XAdES de una carpeta de XML extraídos."""
+    parser = argparse.ArgumentParser(description="Verificar firmas XAdES de XML extraídos (sin conexión)")
+    parser.add_argument("--dir", required=True, help="Directorio de salida o carpeta con XML")
+    parser.add_argument("--anchors-dir", default=str(TRUST_ANCHORS_DIR),
+                        help=f"Certificados de confianza (por defecto {TRUST_ANCHORS_DIR})")
+    parser.add_argument("--processes", type=int, default=VALIDATION_WORKERS,
+                        help=f"Procesos de verificación (por defecto {VALIDATION_WORKERS})")
+    parser.add_argument("--output", default=None,
+                        help=f"Archivo JSONL de resultados (por defecto <dir>/{ARCHIVO_RESULTADOS})")
+    args = parser.parse_args()
+
+    directorio = Path(args.dir)
+    salida = Path(args.output) if args.output else directorio / ARCHIVO_RESULTADOS
+    ultimo = [0]
+
+    def progreso(verificados, total):
+        if verificados - ultimo[0] >= 1000 or verificados == total:
+            ultimo[0] = verificados
+            print(f"🔏 Verificados {verificados:,} de {total:,}", flush=True)
+
+    try:
+        resumen = verificar_directorio(directorio, salida, args.anchors_dir, args.processes, progreso=progreso)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+
+    print(f"✅ {resumen.total:,} documentos: {resumen.describir()}")
+    if not resumen.anclas:
+        print(f"⚠️ No hay anclas de confianza en {args.anchors_dir}: solo se verificó la integridad de las firmas "
+              f"(estado '{INTEGRA}')")
+    print(f"📋 Detalle: {salida}")
+
+
+if __name__ == "__main__":
+    main()
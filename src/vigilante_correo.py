@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Vigilante de carpeta para la ingesta continua de correos exportados.
+
+La pasarela de correo deja exportaciones .eml/.msg en una carpeta durante
+todo el día. Este proceso se queda escuchando esa carpeta y, por cada
+correo nuevo, hace de forma incremental lo mismo que la cadena manual:
+
+1. extrae los adjuntos .xml,
+2. separa los ``MensajeHacienda`` en ``HaciendaResponse/`` (como
+   ``filtrar_xml_hacienda.py``),
+3. nombra cada XML por su Clave, con los duplicados en ``Copias/`` (como
+   ``rename_xml_por_clave.py``).
+
+En Linux se usan eventos inotify (paquete opcional ``inotify_simple``); si
+no están disponibles se sondea la carpeta de entrada. Con inotify también
+se sondea cada ``WATCH_RESCAN_SECONDS`` y tras un desbordamiento de la cola
+de eventos, para no dejar correos olvidados. En ambos casos solo
+se mira la carpeta de entrada, nunca el árbol de salida: cada correo
+procesado se mueve a ``procesados/AAAA-MM-DD/`` (o a ``errores/``), así la
+carpeta de entrada contiene únicamente trabajo pendiente.
+
+Un archivo se procesa cuando lleva ``WATCH_DEBOUNCE_SECONDS`` sin cambios;
+los que quedan listos a la vez se procesan en un mismo lote.
+
+Autor: Generado automáticamente
+Fecha: 2025-10-20
+"""
+
+import argparse
+import email
+import email.policy
+import io
+import os
+import shutil
+import signal
+import sys
+import time
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+from adjuntos_zip import ZIP_PATTERN, xml_en_zip
+from almacen_comprimido import FORMATOS_COMPRESION, ZSTD_AVAILABLE, CompresorXML, buscar_diccionario
+from config import (
+    MAX_XML_SIZE_MB,
+    NESTED_MESSAGE_MAX_DEPTH,
+    WATCH_BATCH_MAX,
+    WATCH_DEBOUNCE_SECONDS,
+    WATCH_POLL_SECONDS,
+    WATCH_RESCAN_SECONDS,
+    ZIP_INSPECT_ATTACHMENTS,
+)
+from disposicion_salida import (
+    DisposicionSalida, agregar_argumentos_disposicion, buscar_clave_en_bytes, sanitizar_componente,
+)
+from pipeline_extraccion import AdjuntoExtraido
+from registro_errores import RegistroErrores
+
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+    INOTIFY_AVAILABLE = True
+except (ImportError, OSError):
+    INOTIFY_AVAILABLE = False
+
+try:
+    import extract_msg
+    EXTRACT_MSG_AVAILABLE = True
+except ImportError:
+    EXTRACT_MSG_AVAILABLE = False
+
+EXTENSIONES_CORREO = {".eml", ".msg"}
+CARPETA_PROCESADOS = "procesados"
+CARPETA_ERRORES = "errores"
+
+
+def tag_raiz(datos):
+    """Nombre local del elemento raíz de un XML en memoria ('' si no es XML)."""
+    try:
+        for _event, elem in ET.iterparse(io.BytesIO(datos), events=("start",)):
+            return elem.tag.split("}", 1)[1] if "}" in elem.tag else elem.tag
+    except ET.ParseError:
+        return ""
+    return ""
+
+
+def xml_de_adjunto(nombre, datos):
+    """(nombre, datos) de un adjunto .xml, o de los miembros .xml si es un .zip."""
+    if nombre.lower().endswith(".xml"):
+        yield nombre, datos
+    elif ZIP_INSPECT_ATTACHMENTS and ZIP_PATTERN.match(nombre):
+        xml, _omitidos = xml_en_zip(datos)
+        for nombre_xml, datos_xml, _etiqueta in xml:
+            yield nombre_xml, datos_xml
+
+
+def adjuntos_eml(ruta):
+    """Adjuntos .xml de un archivo .eml (incluidos los de .zip y los de mensajes reenviados como adjunto)."""
+    with open(ruta, "rb") as f:
+        mensaje = email.message_from_binary_file(f, policy=email.policy.default)
+    yield from _adjuntos_mensaje_eml(mensaje, ("desconocido", "sin_asunto", None), 0)
+
+
+def _adjuntos_mensaje_eml(mensaje, padre, profundidad):
+    """Adjuntos .xml de un mensaje de email y, hasta NESTED_MESSAGE_MAX_DEPTH, de los correos adjuntos."""
+    remitente = str(mensaje.get("From") or "") or padre[0]
+    asunto = str(mensaje.get("Subject") or "") or padre[1]
+    try:
+        fecha = parsedate_to_datetime(str(mensaje.get("Date")))
+    except (TypeError, ValueError):
+        fecha = padre[2]
+    yield from _partes_eml(mensaje, (remitente, asunto, fecha), profundidad)
+
+
+def _partes_eml(parte, metadatos, profundidad):
+    # Un message/rfc822 es otro correo: lleva su propio remitente y asunto, y cuenta un nivel
+    if parte.get_content_type() == "message/rfc822":
+        if profundidad < NESTED_MESSAGE_MAX_DEPTH:
+            for embebido in parte.get_payload():
+                yield from _adjuntos_mensaje_eml(embebido, metadatos, profundidad + 1)
+        return
+    if parte.is_multipart():
+        for subparte in parte.get_payload():
+            yield from _partes_eml(subparte, metadatos, profundidad)
+        return
+    nombre = parte.get_filename()
+    if not nombre:
+        return
+    datos = parte.get_payload(decode=True)
+    if datos:
+        for nombre_xml, datos_xml in xml_de_adjunto(nombre, datos):
+            yield (nombre_xml, datos_xml, *metadatos)
+
+
+def adjuntos_msg(ruta):
+    """Adjuntos .xml (sueltos, en un .zip o en correos adjuntos) de un archivo .msg (requiere extract_msg)."""
+    if not EXTRACT_MSG_AVAILABLE:
+        raise ValueError("Leer archivos .msg requiere el paquete 'extract-msg' (pip install extract-msg)")
+    mensaje = extract_msg.Message(str(ruta))
+    try:
+        yield from _adjuntos_mensaje_msg(mensaje, ("desconocido", "sin_asunto", None), 0)
+    finally:
+        mensaje.close()
+
+
+def _adjuntos_mensaje_msg(mensaje, padre, profundidad):
+    """Adjuntos .xml de un mensaje de extract_msg y, hasta NESTED_MESSAGE_MAX_DEPTH, de los correos adjuntos."""
+    remitente = mensaje.sender or padre[0]
+    asunto = mensaje.subject or padre[1]
+    fecha = mensaje.date or padre[2]
+    for adjunto in mensaje.attachments:
+        datos = getattr(adjunto, "data", None)
+        # Un correo adjunto llega como mensaje ya abierto, sin pasar por disco
+        if hasattr(datos, "attachments"):
+            if profundidad < NESTED_MESSAGE_MAX_DEPTH:
+                yield from _adjuntos_mensaje_msg(datos, (remitente, asunto, fecha), profundidad + 1)
+            continue
+        nombre = getattr(adjunto, "longFilename", None) or getattr(adjunto, "shortFilename", None)
+        if nombre and isinstance(datos, bytes) and datos:
+            for nombre_xml, datos_xml in xml_de_adjunto(nombre, datos):
+                yield nombre_xml, datos_xml, remitente, asunto, fecha
+
+
+class VigilanteCorreo:
+    """Procesa de forma continua los correos que aparecen en una carpeta."""
+
+    def __init__(self, entrada, salida, disposicion=None, compresor=None,
+                 espera=WATCH_DEBOUNCE_SECONDS, lote_max=WATCH_BATCH_MAX, sondeo=WATCH_POLL_SECONDS,
+                 usar_inotify=True):
+        """
+        Inicializar el vigilante.
+
+        Args:
+            entrada (str): Carpeta donde la pasarela deja los .eml/.msg
+            salida (str): Directorio de salida (mismo formato que el extractor PST)
+            disposicion (DisposicionSalida): Organización de xml_facturacion/
+            compresor (CompresorXML): Compresión de los XML guardados (opcional)
+            espera (float): Segundos sin cambios antes de procesar un archivo
+            lote_max (int): Correos por lote como máximo
+            sondeo (float): Intervalo de sondeo si no hay inotify
+            usar_inotify (bool): Permitir inotify cuando está disponible
+        """
+        self.entrada = Path(entrada)
+        self.output_dir = Path(salida)
+        self.xml_root = self.output_dir / "xml_facturacion"
+        self.disposicion = disposicion or DisposicionSalida()
+        self.compresor = compresor
+        self.espera = espera
+        self.lote_max = lote_max
+        self.sondeo = sondeo
+        self.usar_inotify = usar_inotify and INOTIFY_AVAILABLE
+
+        self.log_file = self.output_dir / "remitentes_vigilante.csv"
+        self.errors = RegistroErrores()
+        self._log_handle = None
+        self._inotify = None
+        self._pendientes = {}  # ruta -> (tamaño, mtime, instante del último cambio)
+        self._proximo_sondeo = 0.0
+        self._activo = False
+
+        # Contadores
+        self.correos_procesados = 0
+        self.xml_archivados = 0
+        self.mensajes_hacienda = 0
+        self.duplicados = 0
+
+    # === Preparación ===
+
+    def iniciar(self):
+        """Crear directorios, abrir el log y registrar los archivos ya presentes."""
+        self.entrada.mkdir(parents=True, exist_ok=True)
+        self.xml_root.mkdir(parents=True, exist_ok=True)
+        (self.output_dir / "reportes").mkdir(exist_ok=True)
+        self.disposicion.guardar(self.xml_root)
+
+        nuevo = not self.log_file.exists()
+        self._log_handle = open(self.log_file, "a", encoding="utf-8", buffering=1)
+        if nuevo:
+            self._log_handle.write("archivo_xml,remitente,asunto,fecha_email,fecha_procesamiento,carpeta_origen,tamaño_bytes\n")
+        self.errors.abrir(self.output_dir / "reportes" / f"errores_vigilante_{datetime.now():%Y%m%d_%H%M%S}.jsonl")
+
+        if self.usar_inotify:
+            self._inotify = INotify()
+            self._inotify.add_watch(str(self.entrada), inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO)
+
+        # Lo que llegó mientras el vigilante estaba detenido
+        self._sondear()
+
+    def cerrar(self):
+        """Cerrar el log, el registro de errores e inotify."""
+        if self._inotify is not None:
+            self._inotify.close()
+            self._inotify = None
+        if self._log_handle:
+            self._log_handle.close()
+            self._log_handle = None
+        self.errors.cerrar()
+
+    # === Detección de archivos nuevos ===
+
+    @staticmethod
+    def _es_correo(nombre):
+        return Path(nombre).suffix.lower() in EXTENSIONES_CORREO
+
+    def _anotar(self, ruta):
+        try:
+            info = ruta.stat()
+        except OSError:
+            self._pendientes.pop(ruta, None)
+            return
+        firma = (info.st_size, info.st_mtime_ns)
+        anterior = self._pendientes.get(ruta)
+        if anterior is None or anterior[:2] != firma:
+            self._pendientes[ruta] = (*firma, time.monotonic())
+
+    def _sondear(self):
+        """Revisar solo el primer nivel de la carpeta de entrada."""
+        self._proximo_sondeo = time.monotonic() + WATCH_RESCAN_SECONDS
+        with os.scandir(self.entrada) as entradas:
+            for entrada in entradas:
+                if entrada.is_file() and self._es_correo(entrada.name):
+                    self._anotar(Path(entrada.path))
+        # Volver a mirar los pendientes: con sondeo solo así se sabe si dejaron de crecer
+        for ruta in list(self._pendientes):
+            self._anotar(ruta)
+
+    def _esperar_eventos(self, espera):
+        if self._inotify is not None:
+            desbordado = False
+            for evento in self._inotify.read(timeout=int(espera * 1000)):
+                if evento.mask & inotify_flags.Q_OVERFLOW:
+                    desbordado = True
+                elif evento.name and self._es_correo(evento.name):
+                    self._anotar(self.entrada / evento.name)
+            # Si la cola de eventos se desbordó se perdieron eventos; además, cada
+            # WATCH_RESCAN_SECONDS se sondea por si alguno no llegó
+            if desbordado or time.monotonic() >= self._proximo_sondeo:
+                self._sondear()
+        else:
+            time.sleep(espera)
+            self._sondear()
+
+    def _listos(self):
+        ahora = time.monotonic()
+        listos = [ruta for ruta, (_t, _m, cambio) in self._pendientes.items() if ahora - cambio >= self.espera]
+        listos.sort(key=lambda ruta: self._pendientes[ruta][2])
+        return listos[:self.lote_max]
+
+    # === Procesamiento ===
+
+    def ejecutar(self):
+        """Bucle principal: esperar archivos, agruparlos y procesarlos hasta recibir Ctrl+C o SIGTERM."""
+        self._activo = True
+        modo = "inotify" if self._inotify is not None else f"sondeo cada {self.sondeo}s"
+        print(f"👀 Vigilando {self.entrada} ({modo}); salida en {self.output_dir}")
+        while self._activo:
+            espera = self.espera if self._pendientes else self.sondeo
+            self._esperar_eventos(espera)
+            listos = self._listos()
+            if listos:
+                self.procesar_lote(listos)
+
+    def detener(self, *_args):
+        self._activo = False
+
+    def procesar_lote(self, rutas):
+        """Procesar un lote de correos listos."""
+        inicio = time.perf_counter()
+        xml_antes = self.xml_archivados
+        for ruta in rutas:
+            self._pendientes.pop(ruta, None)
+            self.procesar_correo(ruta)
+        duracion = time.perf_counter() - inicio
+        print(f"📥 Lote: {len(rutas)} correo(s), {self.xml_archivados - xml_antes} XML en {duracion:.2f}s "
+              f"(total {self.correos_procesados:,} correos, {self.xml_archivados:,} XML)", flush=True)
+
+    def procesar_correo(self, ruta):
+        """Extraer, clasificar y archivar los XML de un correo; luego retirarlo de la entrada."""
+        try:
+            if ruta.suffix.lower() == ".msg":
+                adjuntos = list(adjuntos_msg(ruta))
+            else:
+                adjuntos = list(adjuntos_eml(ruta))
+        except Exception as e:
+            self.errors.registrar("correo", f"No se pudo leer {ruta.name}: {e}", archivo=ruta.name)
+            self._retirar(ruta, CARPETA_ERRORES)
+            return
+
+        for nombre, datos, remitente, asunto, fecha in adjuntos:
+            if len(datos) > MAX_XML_SIZE_MB * 1024 * 1024:
+                self.errors.registrar("adjunto", f"{nombre} supera {MAX_XML_SIZE_MB} MB", archivo=ruta.name)
+                continue
+            adjunto = AdjuntoExtraido(nombre, datos, remitente, asunto, fecha, self.entrada.name)
+            try:
+                self.archivar_xml(adjunto, ruta.name)
+            except OSError as e:
+                self.errors.registrar("escritura", f"Error guardando {nombre} de {ruta.name}: {e}",
+                                      archivo=ruta.name)
+
+        self.correos_procesados += 1
+        self._retirar(ruta, Path(CARPETA_PROCESADOS) / datetime.now().strftime("%Y-%m-%d"))
+
+    def _directorio_destino(self, adjunto, clave, es_mensaje_hacienda):
+        partes = self.disposicion.partes(ruta_carpeta=adjunto.ruta_carpeta,
+                                         fecha=adjunto.fecha if hasattr(adjunto.fecha, "year") else None,
+                                         clave=clave, datos=adjunto.datos)
+        if not es_mensaje_hacienda:
+            return self.xml_root.joinpath(*partes)
+        # Misma ubicación que deja filtrar_xml_hacienda.py
+        if self.disposicion.fragmentada:
+            return self.xml_root.joinpath("HaciendaResponse", *partes)
+        return self.xml_root.joinpath(*partes, "HaciendaResponse")
+
+    def archivar_xml(self, adjunto, origen):
+        """Guardar un XML ya clasificado y nombrado por su Clave."""
+        es_mensaje_hacienda = tag_raiz(adjunto.datos) == "MensajeHacienda"
+        clave = buscar_clave_en_bytes(adjunto.datos)
+        destino_dir = self._directorio_destino(adjunto, clave, es_mensaje_hacienda)
+        destino_dir.mkdir(parents=True, exist_ok=True)
+
+        base = clave or sanitizar_componente(Path(adjunto.nombre).stem, "documento")
+        extension = ".xml" + (self.compresor.extension if self.compresor else "")
+        datos = self.compresor.comprimir(adjunto.datos) if self.compresor else adjunto.datos
+
+        ruta = self._crear_exclusivo(destino_dir / f"{base}{extension}", datos)
+        if ruta is None:
+            if clave:
+                # Ya existe un XML con esta Clave: va a Copias/ como en rename_xml_por_clave.py
+                self.duplicados += 1
+                copias = destino_dir / "Copias"
+                copias.mkdir(exist_ok=True)
+                ruta = (self._crear_exclusivo(copias / f"{base}{extension}", datos)
+                        or self._crear_con_sufijo(copias, base, extension, datos, "_copia_"))
+            else:
+                ruta = self._crear_con_sufijo(destino_dir, base, extension, datos, "_")
+
+        self.xml_archivados += 1
+        if es_mensaje_hacienda:
+            self.mensajes_hacienda += 1
+        self.registrar_en_log(ruta.relative_to(self.xml_root).as_posix(), adjunto, origen)
+
+    @staticmethod
+    def _crear_exclusivo(ruta, datos):
+        try:
+            with open(ruta, "xb") as f:
+                f.write(datos)
+            return ruta
+        except FileExistsError:
+            return None
+
+    def _crear_con_sufijo(self, directorio, base, extension, datos, separador):
+        contador = 1
+        while True:
+            ruta = self._crear_exclusivo(directorio / f"{base}{separador}{contador:03d}{extension}", datos)
+            if ruta is not None:
+                return ruta
+            contador += 1
+
+    def _retirar(self, ruta, subcarpeta):
+        """Mover el correo fuera de la carpeta de entrada."""
+        destino_dir = self.entrada / subcarpeta
+        destino_dir.mkdir(parents=True, exist_ok=True)
+        destino = destino_dir / ruta.name
+        contador = 1
+        while destino.exists():
+            destino = destino_dir / f"{ruta.stem}_{contador:03d}{ruta.suffix}"
+            contador += 1
+        try:
+            shutil.move(str(ruta), str(destino))
+        except OSError as e:
+            self.errors.registrar("correo", f"No se pudo mover {ruta.name} a {subcarpeta}: {e}", archivo=ruta.name)
+
+    def registrar_en_log(self, xml_file, adjunto, origen):
+        """Añadir una línea al CSV con el mismo formato que el extractor PST."""
+        def limpiar(texto, largo=None):
+            return str(texto).replace(",", ";").replace("\n", " ").strip()[:largo]
+
+        ahora = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        self._log_handle.write(
+            f"{xml_file},{limpiar(adjunto.remitente, 100)},{limpiar(adjunto.asunto, 150)},"
+            f"{limpiar(adjunto.fecha)},{ahora},{limpiar(origen)},{len(adjunto.datos)}\n"
+        )
+
+
+def main():
+    """Ejecutar el vigilante de carpeta."""
+    parser = argparse.ArgumentParser(
+        description="Vigilar una carpeta de correos exportados (.eml/.msg) y archivar sus XML de forma continua"
+    )
+    parser.add_argument("-i", "--input-dir", required=True, help="Carpeta donde llegan los .eml/.msg")
+    parser.add_argument("-o", "--output-dir", required=True, help="Directorio de salida")
+    parser.add_argument("--debounce", type=float, default=WATCH_DEBOUNCE_SECONDS,
+                        help=f"Segundos sin cambios antes de procesar un archivo (por defecto {WATCH_DEBOUNCE_SECONDS})")
+    parser.add_argument("--batch-size", type=int, default=WATCH_BATCH_MAX,
+                        help=f"Correos por lote como máximo (por defecto {WATCH_BATCH_MAX})")
+    parser.add_argument("--poll", action="store_true", help="Sondear la carpeta aunque inotify esté disponible")
+    parser.add_argument("--compress", choices=FORMATOS_COMPRESION, default="ninguna",
+                        help="Guardar cada XML comprimido (.xml.gz / .xml.zst)")
+    agregar_argumentos_disposicion(parser)
+    args = parser.parse_args()
+
+    if args.compress == "zstd" and not ZSTD_AVAILABLE:
+        parser.error("--compress zstd requiere el paquete 'zstandard' (pip install zstandard)")
+
+    compresor = None
+    if args.compress != "ninguna":
+        diccionario = buscar_diccionario(Path(args.output_dir) / "xml_facturacion") if args.compress == "zstd" else None
+        compresor = CompresorXML(args.compress, diccionario=diccionario)
+
+    vigilante = VigilanteCorreo(args.input_dir, args.output_dir,
+                                disposicion=DisposicionSalida(args.layout, args.hash_levels),
+                                compresor=compresor, espera=args.debounce, lote_max=args.batch_size,
+                                usar_inotify=not args.poll)
+    signal.signal(signal.SIGINT, vigilante.detener)
+    if hasattr(signal, "SIGTERM"):
+        signal.signal(signal.SIGTERM, vigilante.detener)
+
+    try:
+        vigilante.iniciar()
+        vigilante.ejecutar()
+    except Exception as e:
+        print(f"❌ Error en el vigilante: {e}")
+        sys.exit(1)
+    finally:
+        vigilante.cerrar()
+        print(f"⏹️ Vigilante detenido: {vigilante.correos_procesados:,} correos, "
+              f"{vigilante.xml_archivados:,} XML ({vigilante.mensajes_hacienda:,} MensajeHacienda, "
+              f"{vigilante.duplicados:,} duplicados), {len(vigilante.errors):,} errores")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Presupuesto de arranque de ``pstextractor.py``.
+
+Ejecuta ``python -X importtime pstextractor.py <comando> --help`` y comprueba
+que ningún comando carga dependencias pesadas que solo se usan al trabajar
+(tkinter, lxml, cryptography, win32com y, fuera de la extracción, zstandard)
+y que lo que importa el comando, descontado el arranque del intérprete, no
+supera ``PRESUPUESTO_MS``.
+
+    python -m unittest discover tests
+"""
+
+import os
+import re
+import subprocess
+import sys
+import unittest
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parent.parent / "src"
+PRESUPUESTO_MS = 80  # Suma de los tiempos acumulados de los módulos del comando (mejor de 3 ejecuciones)
+REPETICIONES = 3
+
+PESADOS = ("tkinter", "_tkinter", "lxml", "cryptography", "win32com", "pythoncom")
+# Comando -> módulos pesados adicionales que no debe cargar
+COMANDOS = {
+    "extract": PESADOS,
+    "filter-hacienda": PESADOS + ("zstandard",),
+    "rename-by-clave": PESADOS + ("zstandard",),
+    "packages": PESADOS + ("zstandard",),
+    "key-index": PESADOS + ("zstandard",),
+    "results": PESADOS + ("zstandard",),
+}
+
+_LINEA = re.compile(r"import time:\s+\d+ \|\s+(\d+) \| ( *)(\S+)")
+
+
+def tiempos_importacion(*argumentos):
+    """{módulo de primer nivel: µs acumulados} y conjunto de todos los módulos importados."""
+    entorno = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    proceso = subprocess.run([sys.executable, "-X", "importtime", *argumentos], cwd=SRC, env=entorno,
+                             stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, timeout=60)
+    primer_nivel, todos = {}, set()
+    for linea in proceso.stderr.splitlines():
+        coincidencia = _LINEA.match(linea)
+        if coincidencia is None:
+            continue
+        acumulado, sangria, modulo = coincidencia.groups()
+        todos.add(modulo)
+        if not sangria:
+            primer_nivel[modulo] = int(acumulado)
+    return proceso.returncode, primer_nivel, todos
+
+
+class TestArranque(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # Lo que importa el intérprete por sí solo (site, encodings...) no cuenta
+        _codigo, interprete, _todos = tiempos_importacion("-c", "pass")
+        cls.base = set(interprete)
+
+    def test_comandos_sin_dependencias_pesadas(self):
+        for comando, prohibidos in COMANDOS.items():
+            with self.subTest(comando=comando):
+                codigo, _primer_nivel, todos = tiempos_importacion("pstextractor.py", comando, "--help")
+                self.assertEqual(codigo, 0)
+                cargados = sorted(m for m in todos if m.split(".", 1)[0] in prohibidos)
+                self.assertEqual(cargados, [], f"'{comando} --help' importa {', '.join(cargados)}")
+
+    def test_presupuesto_de_arranque(self):
+        for comando in COMANDOS:
+            with self.subTest(comando=comando):
+                mejor = None
+                for _ in range(REPETICIONES):
+                    _codigo, primer_nivel, _todos = tiempos_importacion("pstextractor.py", comando, "--help")
+                    total = sum(us for modulo, us in primer_nivel.items() if modulo not in self.base) / 1000
+                    mejor = total if mejor is None else min(mejor, total)
+                self.assertLessEqual(mejor, PRESUPUESTO_MS,
+                                     f"'{comando} --help' tarda {mejor:.1f} ms en importar sus módulos")
+
+    def test_listar_comandos_no_importa_ninguno(self):
+        _codigo, primer_nivel, _todos = tiempos_importacion("pstextractor.py", "--help")
+        propios = {ruta.stem for ruta in SRC.glob("*.py")} - {"pstextractor"}
+        self.assertEqual(sorted(propios & set(primer_nivel)), [])
+
+
+if __name__ == "__main__":
+    unittest.main()